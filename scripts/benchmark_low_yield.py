@@ -0,0 +1,74 @@
+"""
+Benchmark LOW_YIELD detection (low_yield_sql) on a synthetic yield table
+
+Builds a temp copy of fact_production_performance_v2 (same indexes) with
+generated orders spread over 24 monthly periods, then times:
+1. Full evaluation (all periods) - what detect_alerts runs
+2. Per-period evaluation - what a ZRPP062 upload runs
+
+Run with:
+    python scripts/benchmark_low_yield.py [rows]
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+import json
+import time
+from sqlalchemy import text
+
+from src.db.connection import engine
+from src.core.alerts import low_yield_sql
+from src.config import LOW_YIELD_THRESHOLD, LOW_YIELD_THRESHOLD_BY_CATEGORY
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PERIODS = 24
+
+print("=" * 70)
+print(f"BENCHMARK: LOW_YIELD detection ({ROWS:,} yield rows, {PERIODS} periods)")
+print("=" * 70)
+
+
+def timed(conn, label, params):
+    start = time.perf_counter()
+    rows = conn.execute(text(low_yield_sql('yield_bench')), params).fetchall()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<32} {elapsed * 1000:>9.1f} ms  ({len(rows):,} alerts)")
+    return elapsed
+
+
+with engine.connect() as conn:
+    conn.execute(text("""
+        CREATE TEMP TABLE yield_bench (LIKE fact_production_performance_v2 INCLUDING DEFAULTS INCLUDING INDEXES)
+        ON COMMIT DROP
+    """))
+    start = time.perf_counter()
+    conn.execute(text("""
+        INSERT INTO yield_bench (
+            process_order_id, batch_id, material_code, material_description,
+            output_actual_kg, input_actual_kg, loss_kg, loss_pct, reference_date
+        )
+        SELECT (1000000 + g)::TEXT, 'B' || g, 'MAT' || (g % 5000), 'Material ' || (g % 5000),
+               1000, 1000 + loss * 10, loss * 10, loss,
+               (DATE '2024-01-01' + ((g % :periods) || ' month')::INTERVAL)::DATE
+        FROM (
+            SELECT g, ROUND((random() ^ 4 * 40)::NUMERIC, 4) AS loss
+            FROM generate_series(1, :rows) AS g
+        ) s
+    """), {'rows': ROWS, 'periods': PERIODS})
+    conn.execute(text("ANALYZE yield_bench"))
+    print(f"  Generated in {time.perf_counter() - start:.1f}s")
+    print()
+
+    base = {
+        'default_threshold': LOW_YIELD_THRESHOLD,
+        'thresholds': json.dumps(LOW_YIELD_THRESHOLD_BY_CATEGORY),
+    }
+    full = timed(conn, "Full evaluation", {**base, 'scoped': False, 'periods': []})
+    period = timed(conn, "One period (2025-06)", {**base, 'scoped': True, 'periods': ['2025-06-01']})
+    conn.rollback()
+
+print()
+print(f"  Per-period speedup: {full / period:.1f}x")
+print("=" * 70)
@@ -0,0 +1,129 @@
+"""
+Benchmark SalesAnalytics churn risk / segment medians on a synthetic billing table
+
+Builds a temp copy of fact_billing (same indexes) with CUSTOMERS customers
+and ROWS billing lines over the last 90 days, then times each analysis two ways:
+1. Legacy - per-customer lookups (N+1) and medians / quartiles sorted in Python
+2. Set-based - churn_risk_sql / classified_segments_sql, one query each
+
+Run with:
+    python scripts/benchmark_sales_analytics.py [rows] [customers]
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+import time
+from datetime import date, timedelta
+from sqlalchemy import text
+
+from src.db.connection import engine
+from src.core.sales_analytics import churn_periods, churn_risk_sql, classified_segments_sql
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+CUSTOMERS = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+CHURN_LIMIT = 20
+
+# Billing lines of the current month - the segmentation period
+BENCH_LINES_SQL = """
+    SELECT customer_name, so_number, net_value
+    FROM billing_bench
+    WHERE billing_date >= :month_start AND billing_date < :end_before
+"""
+
+print("=" * 70)
+print(f"BENCHMARK: SalesAnalytics ({ROWS:,} billing lines, {CUSTOMERS:,} customers)")
+print("=" * 70)
+
+
+def timed(label, run):
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<40} {elapsed * 1000:>9.1f} ms  ({len(result):,} rows)")
+    return elapsed, result
+
+
+def legacy_churn(conn, periods):
+    """Former get_churn_risk: Python quartile, NOT IN, one query per at-risk customer"""
+    revenues = sorted(r[0] for r in conn.execute(text("""
+        SELECT SUM(net_value) FROM billing_bench
+        WHERE billing_date >= :last_start AND billing_date < :today
+        GROUP BY customer_name
+    """), periods) if r[0])
+    threshold = revenues[-1] if len(revenues) < 4 else revenues[int(len(revenues) * 0.75)]
+    at_risk = conn.execute(text("""
+        SELECT customer_name, SUM(net_value) as revenue FROM billing_bench
+        WHERE billing_date >= :last_start AND billing_date < :today
+        GROUP BY customer_name
+        HAVING SUM(net_value) >= :threshold
+           AND customer_name NOT IN (
+               SELECT DISTINCT customer_name FROM billing_bench WHERE billing_date >= :current_start
+           )
+        LIMIT :limit
+    """), {**periods, 'threshold': threshold, 'limit': CHURN_LIMIT}).fetchall()
+    for customer_name, _ in at_risk:
+        conn.execute(text("""
+            SELECT SUM(net_value) FROM billing_bench
+            WHERE customer_name = :customer_name
+              AND billing_date >= :previous_start AND billing_date < :last_start
+        """), {**periods, 'customer_name': customer_name}).scalar()
+    return at_risk
+
+
+def legacy_segments(conn, params):
+    """Former get_customer_segmentation_with_classification: medians sorted in Python"""
+    segments = conn.execute(text(f"""
+        SELECT customer_name, COUNT(DISTINCT so_number), SUM(net_value)
+        FROM ({BENCH_LINES_SQL}) lines
+        GROUP BY customer_name
+    """), params).fetchall()
+    revenues = sorted(float(s[2] or 0) for s in segments)
+    frequencies = sorted(s[1] for s in segments)
+    median_rev = revenues[len(revenues) // 2]
+    median_freq = frequencies[len(frequencies) // 2]
+    return [
+        (s[0], s[1] >= median_freq, float(s[2] or 0) >= median_rev)
+        for s in segments
+    ]
+
+
+with engine.connect() as conn:
+    conn.execute(text("""
+        CREATE TEMP TABLE billing_bench (LIKE fact_billing INCLUDING DEFAULTS INCLUDING INDEXES)
+        ON COMMIT DROP
+    """))
+    start = time.perf_counter()
+    conn.execute(text("""
+        INSERT INTO billing_bench (
+            billing_document, billing_item, billing_date, dist_channel,
+            customer_name, so_number, net_value
+        )
+        SELECT 'BD' || g, 10, CURRENT_DATE - (g % 90), (ARRAY['11', '13', '15'])[1 + g % 3],
+               'Customer ' || ((g * 7919) % :customers), 'SO' || (g / 4),
+               ROUND((random() * 10000)::NUMERIC, 2)
+        FROM generate_series(1, :rows) AS g
+    """), {'rows': ROWS, 'customers': CUSTOMERS})
+    conn.execute(text("ANALYZE billing_bench"))
+    print(f"  Generated in {time.perf_counter() - start:.1f}s")
+    print()
+
+    today = date.today()
+    periods = churn_periods(today)
+    segment_params = {'month_start': today.replace(day=1), 'end_before': today + timedelta(days=1)}
+
+    legacy_churn_s, _ = timed("Churn risk - legacy (N+1)", lambda: legacy_churn(conn, periods))
+    churn_s, _ = timed("Churn risk - set-based", lambda: conn.execute(
+        text(churn_risk_sql('billing_bench')), {**periods, 'limit': CHURN_LIMIT}
+    ).fetchall())
+    legacy_segments_s, _ = timed("Segment medians - legacy (Python)", lambda: legacy_segments(conn, segment_params))
+    segments_s, _ = timed("Segment medians - percentile_cont", lambda: conn.execute(
+        text(classified_segments_sql(BENCH_LINES_SQL)), segment_params
+    ).fetchall())
+    conn.rollback()
+
+print()
+print(f"  Churn risk speedup:      {legacy_churn_s / churn_s:.1f}x")
+print(f"  Segment medians speedup: {legacy_segments_s / segments_s:.1f}x")
+print("=" * 70)
@@ -0,0 +1,68 @@
+"""
+Benchmark autocomplete against the 20 ms target on the live search views
+
+Times autocomplete_materials / autocomplete_customers (src.api.search) for a
+few short and long terms taken from the views themselves, with EXPLAIN
+showing whether the trigram indexes are used.
+
+Run with:
+    python scripts/benchmark_search.py [repeats]
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+import statistics
+import time
+from sqlalchemy import text
+
+from src.db.connection import SessionLocal
+from src.api.search import autocomplete_customers, autocomplete_materials
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+TARGET_MS = 20
+
+print("=" * 70)
+print(f"BENCHMARK: Autocomplete ({REPEATS} runs per term, target < {TARGET_MS} ms)")
+print("=" * 70)
+
+
+def timed(db, label, search, term):
+    search(db, term, 10)  # warm-up
+    runs = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        search(db, term, 10)
+        runs.append((time.perf_counter() - start) * 1000)
+    median = statistics.median(runs)
+    status = "OK" if median < TARGET_MS else "SLOW"
+    print(f"  {label:<40} median {median:>7.1f} ms  max {max(runs):>7.1f} ms  {status}")
+
+
+db = SessionLocal()
+try:
+    counts = db.execute(text("""
+        SELECT (SELECT COUNT(*) FROM view_search_materials), (SELECT COUNT(*) FROM view_search_customers)
+    """)).one()
+    print(f"  {counts[0]:,} materials, {counts[1]:,} customers")
+    print()
+
+    material = db.execute(text("SELECT material_code FROM view_search_materials LIMIT 1")).scalar() or 'MAT'
+    customer = db.execute(text("SELECT customer_name FROM view_search_customers LIMIT 1")).scalar() or 'CUSTOMER'
+    for term in (material[:2], material[2:8] or material, 'zz-no-match'):
+        timed(db, f"material '{term}'", autocomplete_materials, term)
+    for term in (customer[:2], customer[1:7] or customer, 'zz-no-match'):
+        timed(db, f"customer '{term}'", autocomplete_customers, term)
+
+    print()
+    plan = db.execute(text("""
+        EXPLAIN SELECT customer_name FROM view_search_customers WHERE customer_name ILIKE :pattern
+    """), {'pattern': f"%{customer[1:7]}%"}).scalars().all()
+    print("  Customer match plan:")
+    for line in plan:
+        print(f"    {line}")
+finally:
+    db.close()
+
+print("=" * 70)
@@ -0,0 +1,102 @@
+"""
+Load test: latency of the dashboard endpoints under concurrent requests
+
+Fires CONCURRENCY simultaneous GETs (rotating over the endpoints a
+dashboard page load issues) for ROUNDS rounds against a running API and
+prints p50 / p95 / p99 / max latency per endpoint and overall.
+
+Run once on the old build and once on the new one (same data, same
+worker count) to compare:
+    uvicorn src.api.main:app --workers 1 --port 8000
+    python scripts/load_test_api.py [base_url] [rounds]
+
+Credentials come from LOAD_TEST_USER / LOAD_TEST_PASSWORD (default admin/admin).
+
+Skills: backend-development
+"""
+import json
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = sys.argv[1].rstrip('/') if len(sys.argv) > 1 else 'http://localhost:8000'
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+CONCURRENCY = 50
+
+ENDPOINTS = [
+    '/api/v1/dashboards/executive/summary',
+    '/api/v1/dashboards/executive/revenue-by-division',
+    '/api/v1/dashboards/executive/top-customers',
+    '/api/v1/dashboards/inventory/summary',
+    '/api/v1/dashboards/inventory/items',
+    '/api/v1/dashboards/sales/summary',
+    '/api/v1/dashboards/sales/churn-risk',
+    '/api/v1/dashboards/ar-aging/summary',
+    '/api/v1/dashboards/mto-orders/summary',
+    '/api/v1/leadtime/summary',
+    '/api/v1/alerts/summary',
+    '/health',
+]
+
+
+def login() -> str:
+    form = urllib.parse.urlencode({
+        'username': os.getenv('LOAD_TEST_USER', 'admin'),
+        'password': os.getenv('LOAD_TEST_PASSWORD', 'admin'),
+    }).encode()
+    with urllib.request.urlopen(f"{BASE_URL}/api/v1/auth/login", data=form) as resp:
+        return json.load(resp)['access_token']
+
+
+def fetch(path: str, token: str):
+    request = urllib.request.Request(BASE_URL + path, headers={'Authorization': f'Bearer {token}'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return path, status, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(label, values):
+    ms = [v * 1000 for v in values]
+    print(f"  {label:<52} {percentile(ms, 50):>8.0f} {percentile(ms, 95):>8.0f} "
+          f"{percentile(ms, 99):>8.0f} {max(ms):>8.0f}")
+
+
+print("=" * 90)
+print(f"LOAD TEST: {CONCURRENCY} concurrent requests x {ROUNDS} rounds against {BASE_URL}")
+print("=" * 90)
+
+token = login()
+latencies = defaultdict(list)
+errors = 0
+wall_start = time.perf_counter()
+
+with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+    for _ in range(ROUNDS):
+        paths = [ENDPOINTS[i % len(ENDPOINTS)] for i in range(CONCURRENCY)]
+        for path, status, elapsed in pool.map(lambda p: fetch(p, token), paths):
+            latencies[path].append(elapsed)
+            errors += status >= 400
+
+wall = time.perf_counter() - wall_start
+total = [v for values in latencies.values() for v in values]
+
+print(f"  {'endpoint (ms)':<52} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+for path in ENDPOINTS:
+    report(path, latencies[path])
+print("-" * 90)
+report('ALL', total)
+print(f"\n  {len(total):,} requests in {wall:.1f}s ({len(total) / wall:.1f} req/s), {errors} errors")
@@ -0,0 +1,44 @@
+"""
+Migration: Create fact_alert_conditions (open conditions of time-based alert rules)
+
+Creates the table with its (alert_type, entity_id) unique index and the
+(alert_type, open_since) sweep index, then runs one full alert evaluation
+to seed the open conditions. Afterwards uploads keep them in sync and
+`python -m src.main sweep` promotes them periodically.
+
+Run with:
+    python scripts/migrate_add_alert_conditions.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine, SessionLocal
+from src.db.models import FactAlertCondition
+from src.etl.transform import Transformer
+
+print("=" * 70)
+print("MIGRATION: Create fact_alert_conditions")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        FactAlertCondition.__table__.create(conn, checkfirst=True)
+        conn.commit()
+        print("✓ fact_alert_conditions ready")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+db = SessionLocal()
+try:
+    Transformer(db).detect_alerts()
+finally:
+    db.close()
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
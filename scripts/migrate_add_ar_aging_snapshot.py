@@ -0,0 +1,56 @@
+"""
+Migration: Create fact_ar_aging_snapshot (per-snapshot AR rollup) and the
+(snapshot_date, customer) indexes on fact_ar_aging
+
+Creates the table and fills it for every snapshot already in fact_ar_aging.
+Afterwards each snapshot is rebuilt by Transformer.transform_zrfi005 at
+upload time - the AR aging endpoints no longer transform on read.
+
+Run with:
+    python scripts/migrate_add_ar_aging_snapshot.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from sqlalchemy import text
+
+from src.db.connection import engine, SessionLocal
+from src.db.models import FactArAging, FactArAgingSnapshot
+from src.etl.transform import Transformer
+
+print("=" * 70)
+print("MIGRATION: Create fact_ar_aging_snapshot")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        FactArAgingSnapshot.__table__.create(conn, checkfirst=True)
+        for index in FactArAging.__table__.indexes:
+            if index.name.startswith('idx_fact_ar_aging_snapshot_'):
+                index.create(conn, checkfirst=True)
+        conn.commit()
+        print("✓ fact_ar_aging_snapshot ready")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+db = SessionLocal()
+try:
+    transformer = Transformer(db)
+    snapshots = db.execute(text(
+        "SELECT DISTINCT snapshot_date FROM fact_ar_aging WHERE snapshot_date IS NOT NULL ORDER BY 1"
+    )).scalars().all()
+    for snapshot_date in snapshots:
+        transformer.refresh_ar_snapshot_rollup(snapshot_date)
+    db.commit()
+    print(f"✓ Rolled up {len(snapshots)} snapshots")
+finally:
+    db.close()
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
@@ -0,0 +1,50 @@
+"""
+Migration: Create fact_batch_netting (persisted LIFO netting state)
+
+Creates the table with its (plant_code, batch, mvt_pair) unique constraint,
+then performs the initial full netting from raw_mb51, which also fills
+fact_inventory.is_netted / net_qty (every row is still unflagged). Later MB51
+uploads only re-net and re-flag the batches they touch.
+
+Run with:
+    python scripts/migrate_add_batch_netting.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine, SessionLocal
+from src.db.models import FactBatchNetting, FactInventory
+from src.db.views import VIEWS
+from src.etl.transform import Transformer
+from sqlalchemy import text
+
+print("=" * 70)
+print("MIGRATION: Create fact_batch_netting")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        FactBatchNetting.__table__.create(conn, checkfirst=True)
+        for index in FactInventory.__table__.indexes:
+            if index.name == 'idx_fact_inventory_unflagged':
+                index.create(conn, checkfirst=True)
+        conn.execute(text(VIEWS["view_batch_netting_status"]))
+        conn.commit()
+        print("✓ fact_batch_netting, idx_fact_inventory_unflagged and view_batch_netting_status ready")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+db = SessionLocal()
+try:
+    Transformer(db).transform_batch_netting()
+finally:
+    db.close()
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
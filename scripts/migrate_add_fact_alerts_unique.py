@@ -0,0 +1,58 @@
+"""
+Migration: Add unique index on fact_alerts(alert_type, entity_id)
+
+Required by the ON CONFLICT merge in Transformer.detect_alerts.
+Existing duplicates are removed first (keeps the oldest alert per key,
+i.e. the one the old existence check kept).
+
+Run with:
+    python scripts/migrate_add_fact_alerts_unique.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine
+from sqlalchemy import text
+
+print("=" * 70)
+print("MIGRATION: Add unique index uq_fact_alerts_type_entity")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        result = conn.execute(text("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'fact_alerts' AND indexname = 'uq_fact_alerts_type_entity'
+        """))
+        
+        if result.fetchone():
+            print("✓ uq_fact_alerts_type_entity already exists")
+        else:
+            # Remove duplicate alerts (keep lowest id)
+            deleted = conn.execute(text("""
+                DELETE FROM fact_alerts f
+                USING fact_alerts older
+                WHERE f.alert_type = older.alert_type
+                  AND f.entity_id = older.entity_id
+                  AND f.id > older.id
+            """)).rowcount
+            print(f"✓ Removed {deleted} duplicate alerts")
+            
+            conn.execute(text("""
+                CREATE UNIQUE INDEX uq_fact_alerts_type_entity
+                ON fact_alerts (alert_type, entity_id)
+            """))
+            print("✓ Unique index created on fact_alerts(alert_type, entity_id)")
+        conn.commit()
+            
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
@@ -0,0 +1,57 @@
+"""
+Migration: Add unique index on fact_billing(billing_document, billing_item)
+
+Required by the bulk ON CONFLICT upsert in Transformer.transform_zrsd002.
+Existing duplicates are removed first (keeps the most recent row per key).
+
+Run with:
+    python scripts/migrate_add_fact_billing_unique.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine
+from sqlalchemy import text
+
+print("=" * 70)
+print("MIGRATION: Add unique index uq_fact_billing_doc_item")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        result = conn.execute(text("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'fact_billing' AND indexname = 'uq_fact_billing_doc_item'
+        """))
+        
+        if result.fetchone():
+            print("✓ uq_fact_billing_doc_item already exists")
+        else:
+            # Remove duplicate business keys (keep highest id)
+            deleted = conn.execute(text("""
+                DELETE FROM fact_billing f
+                USING fact_billing newer
+                WHERE f.billing_document = newer.billing_document
+                  AND f.billing_item = newer.billing_item
+                  AND f.id < newer.id
+            """)).rowcount
+            print(f"✓ Removed {deleted} duplicate rows")
+            
+            conn.execute(text("""
+                CREATE UNIQUE INDEX uq_fact_billing_doc_item
+                ON fact_billing (billing_document, billing_item)
+            """))
+            conn.commit()
+            print("✓ Unique index created on fact_billing(billing_document, billing_item)")
+            
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
@@ -0,0 +1,66 @@
+"""
+Migration: Add unique index on fact_delivery(delivery, line_item)
+
+Required by the bulk ON CONFLICT upsert in Transformer.transform_zrsd004.
+NULLS NOT DISTINCT (PostgreSQL 15+) so lines without line_item also conflict;
+an index created by an earlier run without it is rebuilt.
+Existing duplicates are removed first (keeps the most recent row per key).
+
+Run with:
+    python scripts/migrate_add_fact_delivery_unique.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine
+from sqlalchemy import text
+
+print("=" * 70)
+print("MIGRATION: Add unique index uq_fact_delivery_delivery_line")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        if int(conn.execute(text("SHOW server_version_num")).scalar()) < 150000:
+            raise RuntimeError("NULLS NOT DISTINCT requires PostgreSQL 15 or later")
+        
+        indexdef = conn.execute(text("""
+            SELECT indexdef FROM pg_indexes
+            WHERE tablename = 'fact_delivery' AND indexname = 'uq_fact_delivery_delivery_line'
+        """)).scalar()
+        
+        if indexdef and 'NULLS NOT DISTINCT' in indexdef:
+            print("✓ uq_fact_delivery_delivery_line already exists")
+        else:
+            if indexdef:
+                conn.execute(text("DROP INDEX uq_fact_delivery_delivery_line"))
+                print("✓ Dropped uq_fact_delivery_delivery_line (NULL line_item not covered)")
+            
+            # Remove duplicate business keys (keep highest id)
+            deleted = conn.execute(text("""
+                DELETE FROM fact_delivery f
+                USING fact_delivery newer
+                WHERE f.delivery = newer.delivery
+                  AND f.line_item IS NOT DISTINCT FROM newer.line_item
+                  AND f.id < newer.id
+            """)).rowcount
+            print(f"✓ Removed {deleted} duplicate rows")
+            
+            conn.execute(text("""
+                CREATE UNIQUE INDEX uq_fact_delivery_delivery_line
+                ON fact_delivery (delivery, line_item) NULLS NOT DISTINCT
+            """))
+            conn.commit()
+            print("✓ Unique index created on fact_delivery(delivery, line_item)")
+            
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
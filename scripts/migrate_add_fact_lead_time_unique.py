@@ -0,0 +1,64 @@
+"""
+Migration: Add row_hash + unique index on fact_lead_time(order_number, batch)
+
+Required by the bulk ON CONFLICT refresh in Transformer.transform_lead_time.
+NULLS NOT DISTINCT (PostgreSQL 15+) so orders without batch also have one row.
+Existing duplicates are removed first (keeps the most recent row per key).
+
+Run with:
+    python scripts/migrate_add_fact_lead_time_unique.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine
+from sqlalchemy import text
+
+print("=" * 70)
+print("MIGRATION: Add unique index uq_fact_lead_time_order_batch")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        if int(conn.execute(text("SHOW server_version_num")).scalar()) < 150000:
+            raise RuntimeError("NULLS NOT DISTINCT requires PostgreSQL 15 or later")
+        
+        conn.execute(text("ALTER TABLE fact_lead_time ADD COLUMN IF NOT EXISTS row_hash VARCHAR(32)"))
+        print("✓ row_hash column ready")
+        
+        result = conn.execute(text("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'fact_lead_time' AND indexname = 'uq_fact_lead_time_order_batch'
+        """))
+        
+        if result.fetchone():
+            print("✓ uq_fact_lead_time_order_batch already exists")
+        else:
+            # Remove duplicate business keys (keep highest id)
+            deleted = conn.execute(text("""
+                DELETE FROM fact_lead_time f
+                USING fact_lead_time newer
+                WHERE f.order_number IS NOT DISTINCT FROM newer.order_number
+                  AND f.batch IS NOT DISTINCT FROM newer.batch
+                  AND f.id < newer.id
+            """)).rowcount
+            print(f"✓ Removed {deleted} duplicate rows")
+            
+            conn.execute(text("""
+                CREATE UNIQUE INDEX uq_fact_lead_time_order_batch
+                ON fact_lead_time (order_number, batch) NULLS NOT DISTINCT
+            """))
+            print("✓ Unique index created on fact_lead_time(order_number, batch)")
+        conn.commit()
+            
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
@@ -0,0 +1,42 @@
+"""
+Migration: Create fact_lead_time_daily (lead-time rollup for the /leadtime endpoints)
+
+Creates the table and fills it from fact_lead_time. Afterwards it is
+rebuilt at the end of every Transformer.transform_lead_time run.
+
+Run with:
+    python scripts/migrate_add_lead_time_daily.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine, SessionLocal
+from src.db.models import FactLeadTimeDaily
+from src.etl.transform import Transformer
+
+print("=" * 70)
+print("MIGRATION: Create fact_lead_time_daily")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        FactLeadTimeDaily.__table__.create(conn, checkfirst=True)
+        conn.commit()
+        print("✓ fact_lead_time_daily ready")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+db = SessionLocal()
+try:
+    Transformer(db).refresh_lead_time_daily()
+finally:
+    db.close()
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
@@ -0,0 +1,37 @@
+"""
+Migration: Add raw_zrsd002 indexes for the upload-scoped billing transform
+
+Transformer.transform_zrsd002(since=...) selects the billing documents loaded
+since an upload started (loaded_at) and re-reads all raw rows of those
+documents (billing_document); both lookups need an index on raw_zrsd002.
+
+Run with:
+    python scripts/migrate_add_raw_zrsd002_indexes.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine
+from src.db.models import RawZrsd002
+
+print("=" * 70)
+print("MIGRATION: Add raw_zrsd002 loaded_at / billing_document indexes")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        for index in RawZrsd002.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        conn.commit()
+        print("✓ idx_raw_zrsd002_* ready")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
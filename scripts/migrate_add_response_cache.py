@@ -0,0 +1,36 @@
+"""
+Migration: Create data_generation and api_response_cache (dashboard response cache)
+
+api_response_cache is UNLOGGED - shared by all API workers, no WAL overhead,
+emptied after a crash.
+
+Run with:
+    python scripts/migrate_add_response_cache.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine
+from src.db.models import DataGeneration, ApiResponseCache
+
+print("=" * 70)
+print("MIGRATION: Create data_generation + api_response_cache")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        for model in (DataGeneration, ApiResponseCache):
+            model.__table__.create(conn, checkfirst=True)
+            print(f"✓ {model.__tablename__} ready")
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
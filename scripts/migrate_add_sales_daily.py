@@ -0,0 +1,42 @@
+"""
+Migration: Create fact_sales_daily (billing rollup for the executive dashboard)
+
+Creates the table and fills it from fact_billing. Afterwards it is
+rebuilt at the end of every Transformer.transform_zrsd002 run.
+
+Run with:
+    python scripts/migrate_add_sales_daily.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine, SessionLocal
+from src.db.models import FactSalesDaily
+from src.etl.transform import Transformer
+
+print("=" * 70)
+print("MIGRATION: Create fact_sales_daily")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        FactSalesDaily.__table__.create(conn, checkfirst=True)
+        conn.commit()
+        print("✓ fact_sales_daily ready")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+db = SessionLocal()
+try:
+    Transformer(db).refresh_sales_daily()
+finally:
+    db.close()
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
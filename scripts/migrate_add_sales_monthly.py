@@ -0,0 +1,48 @@
+"""
+Migration: Create fact_sales_monthly and the billing_date composite indexes
+
+Creates fact_sales_monthly (monthly rollup for /sales/trend and
+/sales/segmentation) and fills it from fact_sales_daily, and adds the
+(billing_date, dist_channel) / (billing_date, customer_name) indexes used by
+the half-open date filters of the sales endpoints. Afterwards the rollup is
+rebuilt at the end of every Transformer.transform_zrsd002 run.
+
+Run with:
+    python scripts/migrate_add_sales_monthly.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine, SessionLocal
+from src.db.models import FactBilling, FactSalesMonthly
+from src.etl.transform import Transformer
+
+print("=" * 70)
+print("MIGRATION: Create fact_sales_monthly + fact_billing date indexes")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        FactSalesMonthly.__table__.create(conn, checkfirst=True)
+        for index in FactBilling.__table__.indexes:
+            if index.name.startswith('idx_fact_billing_date_'):
+                index.create(conn, checkfirst=True)
+        conn.commit()
+        print("✓ fact_sales_monthly + idx_fact_billing_date_* ready")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+db = SessionLocal()
+try:
+    Transformer(db).refresh_sales_monthly()
+finally:
+    db.close()
+
+print()
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
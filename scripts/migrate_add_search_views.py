@@ -0,0 +1,48 @@
+"""
+Migration: Trigram search views for material / customer search
+
+Enables pg_trgm, adds idx_fact_billing_customer and creates the
+view_search_materials / view_search_customers materialized views with their
+GIN (gin_trgm_ops) indexes (view_search_customers is rebuilt, so a copy
+created before NULL AR customer names were excluded is replaced). They back /api/v1/search/autocomplete and the
+material / customer filters of the inventory and sales endpoints, and are
+refreshed with the other materialized views after each upload.
+
+Run with:
+    python scripts/migrate_add_search_views.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from sqlalchemy import text
+
+from src.db.connection import engine
+from src.db.models import FactBilling
+from src.db.views import create_all_views
+
+print("=" * 70)
+print("MIGRATION: Trigram search views")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for index in FactBilling.__table__.indexes:
+            if index.name == 'idx_fact_billing_customer':
+                index.create(conn, checkfirst=True)
+        conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS view_search_customers"))
+        conn.commit()
+        print("✓ pg_trgm + idx_fact_billing_customer ready")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+# Creates the missing (search) materialized views, keeps the existing ones
+create_all_views()
+
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
@@ -0,0 +1,41 @@
+"""
+Migration: Replace the aggregating reporting views with materialized views
+
+Creates view_refresh_log, then drops each plain view listed in
+MATERIALIZED_VIEWS and recreates it materialized (same name, unique index).
+Materialized views whose unique index no longer matches the declared key
+(e.g. view_sales_performance) are rebuilt.
+Afterwards the views are refreshed CONCURRENTLY after every upload / CLI
+transform that changes their source tables.
+
+Run with:
+    python scripts/migrate_materialize_views.py
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+from src.db.connection import engine
+from src.db.models import ViewRefreshLog
+from src.db.views import create_all_views
+
+print("=" * 70)
+print("MIGRATION: Materialize reporting views")
+print("=" * 70)
+
+with engine.connect() as conn:
+    try:
+        ViewRefreshLog.__table__.create(conn, checkfirst=True)
+        conn.commit()
+        print("✓ view_refresh_log ready")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        conn.rollback()
+        raise
+
+create_all_views()
+
+print("=" * 70)
+print("Migration completed successfully!")
+print("=" * 70)
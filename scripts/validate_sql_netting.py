@@ -0,0 +1,80 @@
+"""
+Validate SQL-native netting (view_batch_net_valid_movements) against StackNettingEngine
+
+Generates random movements for every pair in MVT_REVERSAL_PAIRS (plus
+unrelated MVTs, several plants sharing batch numbers and same-day postings)
+into a temp table, runs the view's window-function query on it and compares
+the surviving movement ids with the Python engine.
+
+Run with:
+    python scripts/validate_sql_netting.py [rows]
+
+Skills: database-operations
+"""
+import sys
+sys.path.insert(0, '.')
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.db.connection import engine
+from src.db.views import net_valid_movements_sql
+from src.core.netting import StackNettingEngine, NETTING_PAIRS
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+print("=" * 70)
+print(f"VALIDATE: SQL netting vs StackNettingEngine ({ROWS:,} movements)")
+print("=" * 70)
+
+rng = np.random.default_rng(2026)
+mvts = [m for pair in NETTING_PAIRS for m in pair] + [999, 543]
+df = pd.DataFrame({
+    'id': np.arange(1, ROWS + 1),
+    'posting_date': (pd.Timestamp(2025, 1, 1) + pd.to_timedelta(rng.integers(0, 365, ROWS), unit='D')).date,
+    'mvt_type': rng.choice(mvts, ROWS),
+    'plant_code': rng.choice([1201, 1401, 1301], ROWS),
+    'batch': rng.choice([f'B{i:06d}' for i in range(ROWS // 20 + 1)], ROWS),
+    'material_code': 'MAT001',
+    'qty': rng.integers(1, 100, ROWS).astype(float),
+    'qty_kg': 0.0,
+    'material_document': None,
+    'raw_id': 0,
+})
+
+with engine.connect() as conn:
+    conn.execute(text("""
+        CREATE TEMP TABLE netting_check (
+            id INTEGER PRIMARY KEY, posting_date DATE, mvt_type INTEGER, plant_code INTEGER,
+            batch VARCHAR(50), material_code VARCHAR(50), qty NUMERIC(18, 4), qty_kg NUMERIC(18, 4),
+            material_document VARCHAR(50), raw_id INTEGER
+        ) ON COMMIT DROP
+    """))
+    conn.execute(text("""
+        INSERT INTO netting_check VALUES
+        (:id, :posting_date, :mvt_type, :plant_code, :batch, :material_code, :qty, :qty_kg, :material_document, :raw_id)
+    """), df.to_dict('records'))
+    conn.execute(text("ANALYZE netting_check"))
+    sql_valid = pd.DataFrame(conn.execute(text(net_valid_movements_sql('netting_check'))).mappings().all())
+    conn.rollback()
+
+netting = StackNettingEngine(df.rename(columns={
+    'posting_date': 'col_0_posting_date', 'mvt_type': 'col_1_mvt_type', 'plant_code': 'col_2_plant',
+    'batch': 'col_6_batch', 'material_code': 'col_4_material', 'qty': 'col_7_qty',
+}))
+
+failed = 0
+for fwd, rev in NETTING_PAIRS:
+    expected = set(netting.get_valid_movements(fwd, rev)['id'])
+    actual = set(sql_valid.loc[sql_valid['mvt_pair'] == f"{fwd}/{rev}", 'id']) if not sql_valid.empty else set()
+    status = "✓" if expected == actual else "❌"
+    failed += expected != actual
+    print(f"  {status} {fwd}/{rev}: {len(actual)} valid (python {len(expected)}, "
+          f"missing {len(expected - actual)}, extra {len(actual - expected)})")
+
+print()
+print("=" * 70)
+print("Validation passed" if not failed else f"Validation FAILED for {failed} pairs")
+print("=" * 70)
+sys.exit(1 if failed else 0)
@@ -0,0 +1,101 @@
+"""
+Generation-keyed response cache for dashboard read endpoints
+
+Usage:
+    @router.get("/summary")
+    @cached_response('fact_billing', 'fact_ar_aging')
+    def get_summary(start_date: Optional[str] = None, db: Session = Depends(get_db)):
+        ...
+
+Key = sha256(endpoint, normalized query params, generations of the source
+tables, today). Entries live in the UNLOGGED api_response_cache table, so
+all uvicorn workers share them; src.db.generations.bump_generations
+invalidates them when an upload or CLI transform changes a source table.
+The day in the key expires handlers that window on the current date (churn
+periods, end_date = today) at midnight, the same boundary as their ETag
+(src.api.middleware.data_etag).
+
+Cache errors never fail the request - the handler simply runs uncached.
+"""
+import functools
+import hashlib
+import json
+from datetime import date
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.api.middleware import not_modified
+from src.config import RESPONSE_CACHE_ENABLED
+from src.db.generations import current_generations
+
+
+# Handler arguments that are dependencies, not part of the response identity
+NON_KEY_ARGS = {'db', 'current_user'}
+
+
+def cache_key(endpoint: str, params: dict, generations: dict) -> str:
+    """Stable key: params in sorted order, values JSON-normalized, plus today"""
+    payload = json.dumps(
+        [endpoint, jsonable_encoder(params), generations, date.today().isoformat()],
+        sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cached_response(*tables: str):
+    """Cache a sync route handler's JSON result until one of `tables` changes"""
+    source_tables = sorted(tables)
+
+    def decorator(func):
+        endpoint = f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(**kwargs):
+            db = kwargs.get('db')
+            if db is None:
+                return func(**kwargs)
+
+            try:
+                generations = current_generations(db, source_tables)
+            except SQLAlchemyError:
+                db.rollback()
+                return func(**kwargs)
+            # Dependencies (auth) have run; a matching If-None-Match skips the handler
+            unchanged = not_modified(generations)
+            if unchanged is not None:
+                return unchanged
+            if not RESPONSE_CACHE_ENABLED:
+                return func(**kwargs)
+
+            params = {k: v for k, v in kwargs.items() if k not in NON_KEY_ARGS}
+            key = cache_key(endpoint, params, generations)
+            try:
+                body = db.execute(
+                    text("SELECT body FROM api_response_cache WHERE cache_key = :key"),
+                    {'key': key}
+                ).scalar()
+            except SQLAlchemyError:
+                db.rollback()
+                return func(**kwargs)
+            if body is not None:
+                return json.loads(body)
+
+            result = func(**kwargs)
+            try:
+                db.execute(text("""
+                    INSERT INTO api_response_cache (cache_key, endpoint, source_tables, body, created_at)
+                    VALUES (:key, :endpoint, :tables, :body, NOW())
+                    ON CONFLICT (cache_key) DO NOTHING
+                """), {
+                    'key': key, 'endpoint': endpoint, 'tables': source_tables,
+                    'body': json.dumps(jsonable_encoder(result)),
+                })
+                db.commit()
+            except SQLAlchemyError:
+                db.rollback()
+            return result
+
+        return wrapper
+    return decorator
@@ -37,7 +37,7 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
@@ -102,7 +102,7 @@ def require_permission(resource: str, action: str):
         ):
             ...
     """
-    async def permission_checker(
+    def permission_checker(
         current_user: User = Depends(get_current_user)
     ) -> User:
         # Check if user has required permission
@@ -7,7 +7,14 @@ Provides authentication, dashboards, and AR aging endpoints.
 Follows CLAUDE.md: KISS, clean structure.
 
 Run: uvicorn src.api.main:app --reload
+
+Route handlers that touch the database are plain `def` - FastAPI runs them
+in its threadpool, sized just below the SQLAlchemy connection pool at
+startup (API_THREADPOOL_SIZE).
 """
+from contextlib import asynccontextmanager
+
+from anyio import to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -15,8 +22,19 @@ from src.api.routers import (
     alerts, lead_time,
     auth, ar_aging, mto_orders, 
     sales_performance, executive,
-    inventory, upload, yield_v3
+    inventory, upload, yield_v3,
+    search
 )
+from src.api.middleware import ConditionalGetMiddleware, JSONGZipMiddleware
+from src.api.pagination import NEXT_CURSOR_HEADER
+from src.config import API_THREADPOOL_SIZE
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Size the sync-handler threadpool below the DB connection pool"""
+    to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+    yield
 
 
 # Create FastAPI app
@@ -25,10 +43,15 @@ app = FastAPI(
     description="ELT Analytics Dashboard with AR Collection Summary",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    lifespan=lifespan
 )
 
 
+# Conditional GETs (ETag / 304) inside compression; CORS stays outermost
+app.add_middleware(ConditionalGetMiddleware)
+app.add_middleware(JSONGZipMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +59,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],  # Keyset pagination (src.api.pagination)
 )
 
 
@@ -50,6 +74,7 @@ app.include_router(ar_aging.router, prefix="/api/v1/dashboards")
 app.include_router(inventory.router, prefix="/api/v1/dashboards")
 app.include_router(mto_orders.router, prefix="/api/v1/dashboards")
 app.include_router(sales_performance.router, prefix="/api/v1/dashboards")
+app.include_router(search.router, prefix="/api/v1")
 
 # V3 API - Operational Efficiency Hub (Historical Trends)
 app.include_router(yield_v3.router, prefix="/api/v3/yield", tags=["Yield V3"])
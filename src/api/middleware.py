@@ -0,0 +1,129 @@
+"""
+HTTP middleware: conditional GETs and response compression
+
+ConditionalGetMiddleware - makes the request's If-None-Match available to
+@cached_response (src.api.cache). Once the route's dependencies have
+authenticated the caller, the handler derives a strong ETag from the data
+generations of its source tables (plus path, query and day) on the request's
+own session and answers 304 before any of its queries run. 200 responses
+carry the ETag.
+
+JSONGZipMiddleware - Starlette's GZipMiddleware for JSON bodies of
+RESPONSE_COMPRESSION_MIN_BYTES and up; other content types (streamed CSV /
+NDJSON exports) are sent as is.
+
+Skills: backend-development
+"""
+import hashlib
+import json
+from contextvars import ContextVar
+from datetime import date
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.responses import Response
+
+from src.config import RESPONSE_COMPRESSION_MIN_BYTES
+
+# Content types JSONGZipMiddleware compresses
+COMPRESSIBLE_TYPES = ('application/json',)
+
+
+class ConditionalRequest:
+    """If-None-Match of the current GET; the handler records the ETag it computed"""
+
+    def __init__(self, path: str, query_string: str, if_none_match: str):
+        self.path = path
+        self.query_string = query_string
+        self.if_none_match = if_none_match
+        self.etag: Optional[str] = None
+
+
+_conditional_request: ContextVar[Optional[ConditionalRequest]] = ContextVar('conditional_request', default=None)
+
+
+def data_etag(path: str, query_string: str, generations: Dict[str, int]) -> str:
+    """Strong ETag of a GET: path + sorted query + table generations + today"""
+    payload = json.dumps(
+        [path, sorted(parse_qsl(query_string, keep_blank_values=True)), generations, date.today().isoformat()],
+        sort_keys=True, separators=(',', ':')
+    )
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match (list or *) covers `etag`"""
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def not_modified(generations: Dict[str, int]) -> Optional[Response]:
+    """
+    304 response when the current GET's If-None-Match matches, else None
+
+    Called by @cached_response after the route's dependencies ran; outside a
+    ConditionalGetMiddleware request (direct calls, tests) it does nothing.
+    """
+    request = _conditional_request.get()
+    if request is None:
+        return None
+    request.etag = data_etag(request.path, request.query_string, generations)
+    if not etag_matches(request.if_none_match, request.etag):
+        return None
+    return Response(status_code=304, headers={'ETag': request.etag, 'Vary': 'Authorization'})
+
+
+class ConditionalGetMiddleware:
+    """ETag / If-None-Match → 304 for data-generation-keyed GET routes"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            return await self.app(scope, receive, send)
+
+        request = ConditionalRequest(
+            scope['path'], scope['query_string'].decode('latin-1'),
+            Headers(scope=scope).get('if-none-match', '')
+        )
+
+        async def send_with_etag(message):
+            if message['type'] == 'http.response.start' and message['status'] == 200 and request.etag:
+                headers = MutableHeaders(scope=message)
+                headers['ETag'] = request.etag
+                headers.add_vary_header('Authorization')
+            await send(message)
+
+        # Sync handlers run in the threadpool with a copy of this context
+        token = _conditional_request.set(request)
+        try:
+            await self.app(scope, receive, send_with_etag)
+        finally:
+            _conditional_request.reset(token)
+
+
+class JSONGZipResponder(GZipResponder):
+    """GZipResponder that passes non-JSON responses through untouched"""
+
+    async def send_with_gzip(self, message):
+        await super().send_with_gzip(message)
+        if message['type'] == 'http.response.start':
+            content_type = Headers(raw=message['headers']).get('content-type', '')
+            if not content_type.startswith(COMPRESSIBLE_TYPES):
+                self.content_encoding_set = True  # Sent as is, like an already encoded body
+
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """gzip JSON response bodies of at least `minimum_size` bytes"""
+
+    def __init__(self, app, minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES, compresslevel: int = 6):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and 'gzip' in Headers(scope=scope).get('accept-encoding', ''):
+            responder = JSONGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            return await responder(scope, receive, send)
+        await self.app(scope, receive, send)
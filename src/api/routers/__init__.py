@@ -2,12 +2,14 @@ from . import (
     alerts, lead_time,
     auth, ar_aging, mto_orders, 
     sales_performance, executive,
-    inventory, upload, yield_v3
+    inventory, upload, yield_v3,
+    search
 )
 
 __all__ = [
     "alerts", "lead_time",
     "auth", "ar_aging", "mto_orders", 
     "sales_performance", "executive",
-    "inventory", "upload", "yield_v3"
+    "inventory", "upload", "yield_v3",
+    "search"
 ]
@@ -17,7 +17,9 @@ from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
+from src.api.cache import cached_response
 from src.db.connection import get_db
+from src.db.generations import publish_changes
 
 router = APIRouter(prefix="/api/v1/alerts", tags=["alerts"])
 
@@ -48,7 +50,8 @@ class AlertDetail(BaseModel):
 # API Endpoints
 
 @router.get("/summary", response_model=AlertSummary)
-async def get_alert_summary(
+@cached_response('fact_alerts')
+def get_alert_summary(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     db: Session = Depends(get_db)
@@ -86,7 +89,8 @@ async def get_alert_summary(
 
 
 @router.get("/stuck-inventory", response_model=List[AlertDetail])
-async def get_stuck_inventory_alerts(
+@cached_response('fact_alerts')
+def get_stuck_inventory_alerts(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     db: Session = Depends(get_db)
@@ -136,7 +140,8 @@ async def get_stuck_inventory_alerts(
 
 
 @router.get("/low-yield", response_model=List[AlertDetail])
-async def get_low_yield_alerts(db: Session = Depends(get_db)):
+@cached_response('fact_alerts')
+def get_low_yield_alerts(db: Session = Depends(get_db)):
     """
     Get active low yield alerts (<85%)
     
@@ -177,7 +182,7 @@ async def get_low_yield_alerts(db: Session = Depends(get_db)):
 
 
 @router.post("/{alert_id}/resolve")
-async def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
+def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
     """
     Mark alert as resolved
     
@@ -203,6 +208,7 @@ async def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
             WHERE id = :alert_id
         """), {"alert_id": alert_id})
         db.commit()
+        publish_changes(db, ['fact_alerts'])  # view_executive_kpis counts active alerts
         
         return {"message": f"Alert {alert_id} resolved successfully"}
     except HTTPException:
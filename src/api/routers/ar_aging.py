@@ -2,7 +2,8 @@
 AR Aging (Công Nợ) API Router
 
 Provides AR collection summary by division and detailed aging analysis.
-Data resets monthly from zrfi005 daily uploads.
+Data resets monthly from zrfi005 daily uploads. Snapshots are materialized
+at upload time (Transformer.transform_zrfi005) - endpoints here only read.
 
 Follows CLAUDE.md: KISS, DRY, file <200 lines.
 """
@@ -12,7 +13,9 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from pydantic import BaseModel
 
+from src.api.cache import cached_response
 from src.api.deps import get_db, get_current_user
+from src.api.pagination import EXPORT_FORMATS, keyset_filter, keyset_page, stream_export
 
 
 router = APIRouter(prefix="/ar-aging", tags=["AR Aging"])
@@ -72,41 +75,58 @@ class SnapshotDate(BaseModel):
 
 # ========== Endpoints ==========
 
+DIVISION_SQL = """CASE dist_channel
+                WHEN '11' THEN 'Industry'
+                WHEN '13' THEN 'Retails'
+                WHEN '15' THEN 'Project'
+                ELSE 'Other'
+            END"""
+
+RISK_SQL = """CASE 
+                WHEN COALESCE(target_over_180, 0) > 0 THEN 'HIGH'
+                WHEN COALESCE(target_91_120, 0) + COALESCE(target_121_180, 0) > 0 THEN 'MEDIUM'
+                ELSE 'LOW'
+            END"""
+
+
+def resolve_snapshot(db: Session, snapshot_date: Optional[str]) -> Optional[str]:
+    """Requested snapshot, or the latest one in the fact_ar_aging_snapshot rollup"""
+    if snapshot_date:
+        return snapshot_date
+    latest = db.execute(text("SELECT MAX(snapshot_date) FROM fact_ar_aging_snapshot")).scalar()
+    return latest.isoformat() if latest else None
+
+
 @router.get("/snapshots", response_model=list[SnapshotDate])
-async def get_available_snapshots(
+@cached_response('fact_ar_aging_snapshot')
+def get_available_snapshots(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """
-    Get list of available snapshot dates from fact_ar_aging.
+    Get list of available snapshot dates from the fact_ar_aging_snapshot rollup.
     
     Returns list of dates with row counts, ordered by date descending.
     Used by frontend to populate snapshot date dropdown.
     """
-    from src.db.models import FactArAging
-    from sqlalchemy import func
-    
-    results = db.query(
-        FactArAging.snapshot_date,
-        func.count(FactArAging.id).label('row_count')
-    ).filter(
-        FactArAging.snapshot_date != None
-    ).group_by(
-        FactArAging.snapshot_date
-    ).order_by(
-        FactArAging.snapshot_date.desc()
-    ).all()
+    results = db.execute(text("""
+        SELECT snapshot_date, SUM(row_count)
+        FROM fact_ar_aging_snapshot
+        GROUP BY snapshot_date
+        ORDER BY snapshot_date DESC
+    """)).fetchall()
     
     return [
         SnapshotDate(
             snapshot_date=r[0].strftime('%Y-%m-%d'),
-            row_count=r[1]
+            row_count=int(r[1])
         )
         for r in results
     ]
 
 @router.get("/summary", response_model=ARCollectionTotal)
-async def get_ar_collection_summary(
+@cached_response('fact_ar_aging_snapshot')
+def get_ar_collection_summary(
     snapshot_date: Optional[str] = Query(None, description="Snapshot date (YYYY-MM-DD). If not provided, uses latest."),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -114,54 +134,29 @@ async def get_ar_collection_summary(
     """
     Get AR Collection Summary by Division for a specific snapshot date.
     
+    Reads the per-division rows of fact_ar_aging_snapshot, which
+    Transformer.transform_zrfi005 maintains at upload time.
+    
     Args:
         snapshot_date: Optional date filter (YYYY-MM-DD). Defaults to latest snapshot.
     
     Returns:
         Industry, Retails, Project breakdown with collection rates
     """
-    # If no date provided, get latest snapshot and rebuild fact table
-    if not snapshot_date:
-        from src.db.models import RawZrfi005
-        from sqlalchemy import func
-        from src.etl.transform import Transformer
-        
-        latest = db.query(func.max(RawZrfi005.snapshot_date)).filter(
-            RawZrfi005.snapshot_date != None
-        ).scalar()
-        
-        if latest:
-            # Rebuild fact table with latest snapshot
-            transformer = Transformer(db)
-            transformer.transform_zrfi005()
-            snapshot_date = latest.strftime('%Y-%m-%d')
-    else:
-        # Rebuild fact table with specified snapshot date
-        from src.etl.transform import Transformer
-        transformer = Transformer(db)
-        transformer.transform_zrfi005(target_date=snapshot_date)
-    
-    # Query fact_ar_aging directly with snapshot filter instead of view
     results = db.execute(text("""
         SELECT 
-            CASE dist_channel
-                WHEN '11' THEN 'Industry'
-                WHEN '13' THEN 'Retails'
-                WHEN '15' THEN 'Project'
-                ELSE 'Other'
-            END as division,
+            division,
             dist_channel,
-            SUM(COALESCE(total_target, 0)) as total_target,
-            SUM(COALESCE(total_realization, 0)) as total_realization,
+            total_target,
+            total_realization,
             CASE 
-                WHEN SUM(COALESCE(total_target, 0)) > 0 
-                THEN ROUND((SUM(COALESCE(total_realization, 0)) / SUM(total_target) * 100)::numeric, 0)
+                WHEN total_target > 0 
+                THEN ROUND((total_realization / total_target * 100)::numeric, 0)
                 ELSE 0 
             END as collection_rate_pct,
-            MAX(report_date)::text as report_date
-        FROM fact_ar_aging
-        WHERE snapshot_date = :snapshot_date
-        GROUP BY dist_channel
+            report_date::text as report_date
+        FROM fact_ar_aging_snapshot
+        WHERE snapshot_date = CAST(:snapshot_date AS date)
         ORDER BY 
             CASE dist_channel
                 WHEN '11' THEN 1
@@ -169,7 +164,7 @@ async def get_ar_collection_summary(
                 WHEN '15' THEN 3
                 ELSE 4
             END
-    """), {"snapshot_date": snapshot_date}).fetchall()
+    """), {"snapshot_date": resolve_snapshot(db, snapshot_date)}).fetchall()
     
     divisions = [ARCollectionSummary(
         division=r[0], dist_channel=r[1],
@@ -193,50 +188,31 @@ async def get_ar_collection_summary(
 
 
 @router.get("/by-bucket", response_model=list[ARAgingBucket])
-async def get_ar_by_bucket(
+@cached_response('fact_ar_aging_snapshot')
+def get_ar_by_bucket(
     snapshot_date: Optional[str] = Query(None),
     division: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Get AR amounts grouped by aging bucket (7 buckets)"""
-    
-    # Default to latest snapshot if not provided
-    if not snapshot_date:
-        latest = db.execute(text("""
-            SELECT snapshot_date 
-            FROM fact_ar_aging 
-            ORDER BY snapshot_date DESC 
-            LIMIT 1
-        """)).scalar()
-        snapshot_date = latest.isoformat() if latest else None
-    
-    # Build WHERE clause with snapshot_date filter (CRITICAL: prevents data inflation)
-    where_clauses = ["snapshot_date = :snapshot_date"]
-    params = {"snapshot_date": snapshot_date}
-    
-    if division:
-        where_clauses.append("""CASE dist_channel
-            WHEN '11' THEN 'Industry'
-            WHEN '13' THEN 'Retails'
-            WHEN '15' THEN 'Project' ELSE 'Other'
-        END = :division""")
-        params["division"] = division
-    
-    where = "WHERE " + " AND ".join(where_clauses)
-    
-    r = db.execute(text(f"""
+    """Get AR amounts grouped by aging bucket (7 buckets, fact_ar_aging_snapshot rollup)"""
+    # snapshot_date filter is CRITICAL: summing across snapshots inflates the totals
+    r = db.execute(text("""
         SELECT 
-            SUM(COALESCE(realization_not_due, 0)),
-            SUM(COALESCE(target_1_30, 0)), SUM(COALESCE(target_31_60, 0)),
-            SUM(COALESCE(target_61_90, 0)), SUM(COALESCE(target_91_120, 0)),
-            SUM(COALESCE(target_121_180, 0)), SUM(COALESCE(target_over_180, 0)),
-            SUM(COALESCE(realization_1_30, 0)), SUM(COALESCE(realization_31_60, 0)),
-            SUM(COALESCE(realization_61_90, 0)), SUM(COALESCE(realization_91_120, 0)),
-            SUM(COALESCE(realization_121_180, 0)), SUM(COALESCE(realization_over_180, 0))
-        FROM fact_ar_aging
-        {where}
-    """), params).fetchone()
+            SUM(not_due),
+            SUM(target_1_30), SUM(target_31_60),
+            SUM(target_61_90), SUM(target_91_120),
+            SUM(target_121_180), SUM(target_over_180),
+            SUM(realization_1_30), SUM(realization_31_60),
+            SUM(realization_61_90), SUM(realization_91_120),
+            SUM(realization_121_180), SUM(realization_over_180)
+        FROM fact_ar_aging_snapshot
+        WHERE snapshot_date = CAST(:snapshot_date AS date)
+          AND (:division IS NULL OR division = :division)
+    """), {
+        "snapshot_date": resolve_snapshot(db, snapshot_date),
+        "division": division
+    }).fetchone()
     
     if not r:
         return []
@@ -254,39 +230,32 @@ async def get_ar_by_bucket(
     ]
 
 
-@router.get("/customers", response_model=list[ARAgingDetail])
-async def get_ar_by_customer(
-    snapshot_date: Optional[str] = Query(None, description="Snapshot date (YYYY-MM-DD). If not provided, uses latest."),
-    division: Optional[str] = Query(None),
-    risk_level: Optional[str] = Query(None),
-    salesman: Optional[str] = Query(None),
-    limit: int = Query(50, ge=1, le=500),
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    """Get AR aging details per customer with risk levels for specific snapshot"""
-    # Default to latest snapshot if not provided
-    if not snapshot_date:
-        latest = db.execute(text("""
-            SELECT snapshot_date 
-            FROM fact_ar_aging 
-            ORDER BY snapshot_date DESC 
-            LIMIT 1
-        """)).scalar()
-        snapshot_date = latest.isoformat() if latest else None
+# Sort key of /customers (target DESC, then customer / salesman / division) - see src.api.pagination
+CUSTOMER_KEYS = [
+    ("COALESCE(total_target, 0)", "numeric"),
+    ("customer_name", "text"),
+    ("COALESCE(salesman_name, '')", "text"),
+    (DIVISION_SQL, "text"),
+]
+
+
+def ar_customers_sql(
+    snapshot_date: Optional[str],
+    division: Optional[str],
+    risk_level: Optional[str],
+    salesman: Optional[str],
+    cursor_sql: str = "TRUE"
+) -> tuple[str, dict]:
+    """SELECT of /customers for a resolved snapshot (without LIMIT) and its params"""
+    order_sql = ", ".join(f"{expr} DESC" for expr, _ in CUSTOMER_KEYS)
     
-    # Query fact_ar_aging directly with snapshot filter (prevents duplicates across snapshots)
-    results = db.execute(text("""
+    # Snapshot filter (prevents duplicates across snapshots) leads idx_fact_ar_aging_snapshot_target
+    return f"""
         SELECT 
-            CASE dist_channel
-                WHEN '11' THEN 'Industry'
-                WHEN '13' THEN 'Retails'
-                WHEN '15' THEN 'Project'
-                ELSE 'Other'
-            END as division,
+            {DIVISION_SQL} as division,
             salesman_name,
             customer_name,
-            total_target,
+            COALESCE(total_target, 0) as total_target,
             total_realization,
             CASE 
                 WHEN total_target > 0 
@@ -300,35 +269,45 @@ async def get_ar_by_customer(
             COALESCE(target_91_120, 0) as target_91_120,
             COALESCE(target_121_180, 0) as target_121_180,
             COALESCE(target_over_180, 0) as target_over_180,
-            CASE 
-                WHEN COALESCE(target_over_180, 0) > 0 THEN 'HIGH'
-                WHEN COALESCE(target_91_120, 0) + COALESCE(target_121_180, 0) > 0 THEN 'MEDIUM'
-                ELSE 'LOW'
-            END as risk_level
+            {RISK_SQL} as risk_level
         FROM fact_ar_aging
-        WHERE snapshot_date = :snapshot_date
+        WHERE snapshot_date = CAST(:snapshot_date AS date)
           AND (total_target > 0 OR total_realization > 0)
-          AND (:division IS NULL OR CASE dist_channel
-                WHEN '11' THEN 'Industry'
-                WHEN '13' THEN 'Retails'
-                WHEN '15' THEN 'Project'
-                ELSE 'Other'
-              END = :division)
-          AND (:risk IS NULL OR CASE 
-                WHEN COALESCE(target_over_180, 0) > 0 THEN 'HIGH'
-                WHEN COALESCE(target_91_120, 0) + COALESCE(target_121_180, 0) > 0 THEN 'MEDIUM'
-                ELSE 'LOW'
-              END = :risk)
+          AND (:division IS NULL OR {DIVISION_SQL} = :division)
+          AND (:risk IS NULL OR {RISK_SQL} = :risk)
           AND (:salesman IS NULL OR salesman_name ILIKE '%' || :salesman || '%')
-        ORDER BY total_target DESC
-        LIMIT :limit
-    """), {
+          AND {cursor_sql}
+        ORDER BY {order_sql}
+    """, {
         "snapshot_date": snapshot_date,
         "division": division, 
         "risk": risk_level,
-        "salesman": salesman, 
-        "limit": limit
-    }).fetchall()
+        "salesman": salesman
+    }
+
+
+@router.get("/customers", response_model=list[ARAgingDetail])
+@keyset_page(lambda item: [item['total_target'], item['customer_name'],
+                           item['salesman_name'] or '', item['division']])
+@cached_response('fact_ar_aging', 'fact_ar_aging_snapshot')
+def get_ar_by_customer(
+    snapshot_date: Optional[str] = Query(None, description="Snapshot date (YYYY-MM-DD). If not provided, uses latest."),
+    division: Optional[str] = Query(None),
+    risk_level: Optional[str] = Query(None),
+    salesman: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Get AR aging details per customer with risk levels for specific snapshot (keyset paged)"""
+    cursor_sql, cursor_params = keyset_filter(cursor, CUSTOMER_KEYS)
+    sql, params = ar_customers_sql(
+        resolve_snapshot(db, snapshot_date), division, risk_level, salesman, cursor_sql
+    )
+    results = db.execute(
+        text(sql + " LIMIT :limit"), {**params, **cursor_params, "limit": limit}
+    ).fetchall()
     
     return [ARAgingDetail(
         division=r[0], salesman_name=r[1], customer_name=r[2],
@@ -339,3 +318,18 @@ async def get_ar_by_customer(
         target_121_180=float(r[11] or 0), target_over_180=float(r[12] or 0),
         risk_level=r[13]
     ) for r in results]
+
+
+@router.get("/customers/export")
+def export_ar_by_customer(
+    snapshot_date: Optional[str] = Query(None, description="Snapshot date (YYYY-MM-DD). If not provided, uses latest."),
+    division: Optional[str] = Query(None),
+    risk_level: Optional[str] = Query(None),
+    salesman: Optional[str] = Query(None),
+    format: str = Query("csv", pattern=EXPORT_FORMATS),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Stream all /customers rows of a snapshot as CSV or NDJSON (server-side cursor, bounded memory)"""
+    sql, params = ar_customers_sql(resolve_snapshot(db, snapshot_date), division, risk_level, salesman)
+    return stream_export(db, text(sql), params, format, "ar_customers")
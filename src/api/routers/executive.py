@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from pydantic import BaseModel
 
+from src.api.cache import cached_response
 from src.api.deps import get_db, get_current_user
 
 
@@ -69,83 +70,80 @@ class ProductionTrend(BaseModel):
 
 # ========== Endpoints ==========
 
+# Date range on the fact_sales_daily rollup (applied only when both bounds are given)
+BILLING_RANGE = "(NOT :has_range OR billing_date BETWEEN CAST(:start_date AS date) AND CAST(:end_date AS date))"
+ORDER_RANGE = "(NOT :has_range OR so_date BETWEEN CAST(:start_date AS date) AND CAST(:end_date AS date))"
+
+
+def range_params(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """Bind parameters for BILLING_RANGE / ORDER_RANGE"""
+    return {
+        'has_range': bool(start_date and end_date),
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+
+
 @router.get("/summary", response_model=ExecutiveKPIs)
-async def get_executive_summary(
+@cached_response('fact_sales_daily', 'fact_ar_aging_snapshot', 'fact_inventory')
+def get_executive_summary(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Get executive dashboard summary KPIs"""
-    
-    # Revenue metrics from fact_billing (with date filter support)
-    date_filter = ""
-    if start_date and end_date:
-        date_filter = f"WHERE billing_date BETWEEN '{start_date}' AND '{end_date}'"
-    
-    revenue_result = db.execute(text(f"""
-        SELECT 
-            COALESCE(SUM(net_value), 0) as total_revenue,
-            COUNT(DISTINCT customer_name) as total_customers
-        FROM fact_billing
-        {date_filter}
-    """)).fetchone()
-    
-    # Sales Order metrics (fixed: was counting production orders)
-    sales_date_filter = ""
-    if start_date and end_date:
-        sales_date_filter = f"WHERE order_date BETWEEN '{start_date}' AND '{end_date}'"
-    
-    sales_order_result = db.execute(text(f"""
-        SELECT 
-            COUNT(*) as total_orders,
-            COUNT(CASE WHEN invoice_count > 0 THEN 1 END) as completed_orders,
-            COALESCE(AVG(invoice_count), 0) as avg_invoices_per_order
-        FROM view_sales_orders
-        {sales_date_filter}
-    """)).fetchone()
-    
-    # Inventory metrics
-    inventory_result = db.execute(text("""
-        SELECT 
-            COUNT(DISTINCT material_code) as inventory_items,
-            COALESCE(SUM(current_qty), 0) as total_qty
-        FROM view_inventory_current
-    """)).fetchone()
-    
-    # AR metrics - Total AR from latest snapshot only (not sum of all snapshots)
-    ar_result = db.execute(text("""
-        SELECT 
-            COALESCE(SUM(total_target), 0) as total_ar,
-            COALESCE(SUM(COALESCE(target_31_60, 0) + COALESCE(target_61_90, 0) + 
-                         COALESCE(target_91_120, 0) + COALESCE(target_121_180, 0) + 
-                         COALESCE(target_over_180, 0)), 0) as overdue_ar
-        FROM fact_ar_aging
-        WHERE snapshot_date = (
-            SELECT MAX(snapshot_date) 
-            FROM fact_ar_aging 
-            WHERE snapshot_date IS NOT NULL
+    """
+    Get executive dashboard summary KPIs
+    
+    One statement: revenue / customers (billing_date) and sales orders
+    (order date) from the fact_sales_daily rollup, inventory from
+    view_inventory_current, AR from the latest fact_ar_aging_snapshot rows.
+    """
+    row = db.execute(text(f"""
+        WITH sales AS (
+            SELECT
+                COALESCE(SUM(net_value) FILTER (WHERE {BILLING_RANGE}), 0) as total_revenue,
+                COUNT(DISTINCT customer_name) FILTER (WHERE {BILLING_RANGE}) as total_customers,
+                COUNT(DISTINCT so_number) FILTER (WHERE {ORDER_RANGE}) as total_orders,
+                COUNT(DISTINCT so_number) FILTER (WHERE {ORDER_RANGE} AND invoice_count > 0) as completed_orders
+            FROM fact_sales_daily
+            WHERE {BILLING_RANGE} OR {ORDER_RANGE}
+        ),
+        inventory AS (
+            SELECT COUNT(DISTINCT material_code) as inventory_items
+            FROM view_inventory_current
+        ),
+        ar AS (
+            -- Total AR from latest snapshot only (not sum of all snapshots)
+            SELECT 
+                COALESCE(SUM(total_target), 0) as total_ar,
+                COALESCE(SUM(COALESCE(target_31_60, 0) + COALESCE(target_61_90, 0) + 
+                             COALESCE(target_91_120, 0) + COALESCE(target_121_180, 0) + 
+                             COALESCE(target_over_180, 0)), 0) as overdue_ar
+            FROM fact_ar_aging_snapshot
+            WHERE snapshot_date = (SELECT MAX(snapshot_date) FROM fact_ar_aging_snapshot)
         )
-    """)).fetchone()
+        SELECT * FROM sales, inventory, ar
+    """), range_params(start_date, end_date)).one()
     
-    total_orders = int(sales_order_result[0] or 0)
-    completed_orders = int(sales_order_result[1] or 0)
+    total_orders = int(row.total_orders or 0)
+    completed_orders = int(row.completed_orders or 0)
     completion_rate = (completed_orders / total_orders * 100) if total_orders > 0 else 0
     
-    total_ar = float(ar_result[0] or 0)
-    overdue_ar = float(ar_result[1] or 0)
+    total_ar = float(row.total_ar or 0)
+    overdue_ar = float(row.overdue_ar or 0)
     overdue_pct = (overdue_ar / total_ar * 100) if total_ar > 0 else 0
     
     return ExecutiveKPIs(
-        total_revenue=float(revenue_result[0] or 0),
+        total_revenue=float(row.total_revenue or 0),
         revenue_growth_pct=0.0,  # TODO: Calculate period comparison
-        total_customers=int(revenue_result[1] or 0),
-        active_customers=int(revenue_result[1] or 0),
+        total_customers=int(row.total_customers or 0),
+        active_customers=int(row.total_customers or 0),
         total_orders=total_orders,
         completed_orders=completed_orders,
         completion_rate=round(completion_rate, 2),
         total_inventory_value=0.0,  # TODO: Add valuation
-        inventory_items=int(inventory_result[0] or 0),
+        inventory_items=int(row.inventory_items or 0),
         total_ar=total_ar,
         overdue_ar=overdue_ar,
         overdue_pct=round(overdue_pct, 2)
@@ -153,30 +151,27 @@ async def get_executive_summary(
 
 
 @router.get("/revenue-by-division", response_model=list[RevenueByDivision])
-async def get_revenue_by_division(
+@cached_response('fact_sales_daily')
+def get_revenue_by_division(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     limit: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Get revenue breakdown by distribution channel"""
-    date_filter = ""
-    if start_date and end_date:
-        date_filter = f"WHERE billing_date BETWEEN '{start_date}' AND '{end_date}'"
-    
+    """Get revenue breakdown by distribution channel (fact_sales_daily rollup)"""
     result = db.execute(text(f"""
         SELECT 
-            COALESCE(dist_channel, 'N/A') as division_code,
+            COALESCE(division_code, 'N/A') as division_code,
             SUM(net_value) as revenue,
             COUNT(DISTINCT COALESCE(customer_name, 'Unknown')) as customer_count,
             COUNT(DISTINCT so_number) as order_count
-        FROM fact_billing
-        {date_filter}
-        GROUP BY dist_channel
+        FROM fact_sales_daily
+        WHERE {BILLING_RANGE}
+        GROUP BY division_code
         ORDER BY revenue DESC
-        LIMIT {limit}
-    """))
+        LIMIT :limit
+    """), {**range_params(start_date, end_date), 'limit': limit})
     
     return [
         RevenueByDivision(
@@ -190,29 +185,26 @@ async def get_revenue_by_division(
 
 
 @router.get("/top-customers", response_model=list[TopCustomer])
-async def get_top_customers(
+@cached_response('fact_sales_daily')
+def get_top_customers(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     limit: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Get top customers by revenue"""
-    date_filter = ""
-    if start_date and end_date:
-        date_filter = f"AND billing_date BETWEEN '{start_date}' AND '{end_date}'"
-    
+    """Get top customers by revenue (fact_sales_daily rollup)"""
     result = db.execute(text(f"""
         SELECT 
-            COALESCE(customer_name, 'Unknown') as customer_name,
+            customer_name,
             SUM(net_value) as revenue,
             COUNT(DISTINCT so_number) as order_count
-        FROM fact_billing
-        WHERE customer_name IS NOT NULL {date_filter}
+        FROM fact_sales_daily
+        WHERE customer_name IS NOT NULL AND {BILLING_RANGE}
         GROUP BY customer_name
         ORDER BY revenue DESC
-        LIMIT {limit}
-    """))
+        LIMIT :limit
+    """), {**range_params(start_date, end_date), 'limit': limit})
     
     return [
         TopCustomer(
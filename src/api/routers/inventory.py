@@ -11,7 +11,10 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from pydantic import BaseModel
 
+from src.api.cache import cached_response
 from src.api.deps import get_db, get_current_user
+from src.api.pagination import EXPORT_FORMATS, keyset_filter, keyset_page, stream_export
+from src.api.search import MATERIAL_MATCH_SQL, contains_pattern
 
 
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
@@ -48,7 +51,8 @@ class FlowTrend(BaseModel):
 # ========== Endpoints ==========
 
 @router.get("/flow-trends", response_model=list[FlowTrend])
-async def get_flow_trends(
+@cached_response('fact_inventory')
+def get_flow_trends(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
@@ -101,7 +105,8 @@ async def get_flow_trends(
 
 
 @router.get("/summary", response_model=InventoryKPI)
-async def get_inventory_summary(
+@cached_response('fact_inventory')
+def get_inventory_summary(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
@@ -134,19 +139,25 @@ async def get_inventory_summary(
     )
 
 
-@router.get("/items", response_model=list[InventoryItem])
-async def get_inventory_items(
-    plant_code: Optional[str] = Query(None),
-    material_code: Optional[str] = Query(None),
-    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    """Get inventory items with net change and transaction count from fact_inventory"""
+# Sort key of /items (ABS(net kg) DESC, then the group columns) - see src.api.pagination
+ITEM_KEYS = [
+    ("ABS(COALESCE(SUM(qty_kg), 0))", "numeric"),
+    ("plant_code::text", "text"),
+    ("material_code", "text"),
+    ("COALESCE(material_description, '')", "text"),
+]
+
+
+def inventory_items_sql(
+    plant_code: Optional[str],
+    material_code: Optional[str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    having_sql: str = "TRUE"
+) -> tuple[str, dict]:
+    """SELECT of /items (without LIMIT) and its params"""
     where_clauses = []
-    params = {"limit": limit}
+    params = {}
     
     if start_date and end_date:
         where_clauses.append("posting_date BETWEEN :start_date AND :end_date")
@@ -158,26 +169,51 @@ async def get_inventory_items(
         params["plant_code"] = plant_code
     
     if material_code:
-        where_clauses.append("material_code ILIKE '%' || :material_code || '%'")
-        params["material_code"] = material_code
+        # Resolved to codes through the trigram-indexed search view first
+        where_clauses.append(MATERIAL_MATCH_SQL)
+        params["material_pattern"] = contains_pattern(material_code)
     
     where_sql = "WHERE " + " AND " .join(where_clauses) if where_clauses else ""
+    order_sql = ", ".join(f"{expr} DESC" for expr, _ in ITEM_KEYS)
     
-    results = db.execute(text(f"""
+    return f"""
         SELECT 
-            plant_code::text,
+            plant_code::text as plant_code,
             material_code,
-            material_description,
+            COALESCE(material_description, '') as material_description,
             COUNT(*) as current_qty,
             SUM(qty_kg) as current_qty_kg,
             MAX(uom) as uom,
             MAX(posting_date)::text as last_movement
         FROM fact_inventory
         {where_sql}
-        GROUP BY plant_code, material_code, material_description
-        ORDER BY ABS(SUM(qty_kg)) DESC
-        LIMIT :limit
-    """), params).fetchall()
+        GROUP BY plant_code, material_code, COALESCE(material_description, '')
+        HAVING {having_sql}
+        ORDER BY {order_sql}
+    """, params
+
+
+@router.get("/items", response_model=list[InventoryItem])
+@keyset_page(lambda item: [abs(item['current_qty_kg']), item['plant_code'],
+                           item['material_code'], item['material_description']])
+@cached_response('fact_inventory')
+def get_inventory_items(
+    plant_code: Optional[str] = Query(None),
+    material_code: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Get inventory items with net change and transaction count from fact_inventory (keyset paged)"""
+    having_sql, cursor_params = keyset_filter(cursor, ITEM_KEYS)
+    sql, params = inventory_items_sql(plant_code, material_code, start_date, end_date, having_sql)
+    
+    results = db.execute(
+        text(sql + " LIMIT :limit"), {**params, **cursor_params, "limit": limit}
+    ).fetchall()
     
     return [InventoryItem(
         plant_code=str(r[0]) if r[0] else '',
@@ -190,8 +226,24 @@ async def get_inventory_items(
     ) for r in results]
 
 
+@router.get("/items/export")
+def export_inventory_items(
+    plant_code: Optional[str] = Query(None),
+    material_code: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    format: str = Query("csv", pattern=EXPORT_FORMATS),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Stream all /items rows as CSV or NDJSON (server-side cursor, bounded memory)"""
+    sql, params = inventory_items_sql(plant_code, material_code, start_date, end_date)
+    return stream_export(db, text(sql), params, format, "inventory_items")
+
+
 @router.get("/by-plant", response_model=list[dict])
-async def get_inventory_by_plant(
+@cached_response('fact_inventory')
+def get_inventory_by_plant(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
@@ -230,7 +282,8 @@ async def get_inventory_by_plant(
 # ========== NEW VISUAL INTELLIGENCE ENDPOINTS ==========
 
 @router.get("/abc-analysis")
-async def get_abc_analysis(
+@cached_response('fact_inventory', 'fact_production')
+def get_abc_analysis(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
@@ -260,7 +313,8 @@ async def get_abc_analysis(
 
 
 @router.get("/top-movers-and-dead-stock")
-async def get_top_movers_and_dead_stock(
+@cached_response('fact_inventory', 'fact_production')
+def get_top_movers_and_dead_stock(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     limit: int = Query(10, ge=5, le=20, description="Number of items per list"),
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case, cast, Numeric, tuple_
 from typing import List, Optional
 from datetime import date
 from pydantic import BaseModel
 
+from src.api.cache import cached_response
+from src.api.pagination import EXPORT_FORMATS, decode_cursor, keyset_page, stream_export
 from src.db.connection import get_db
-from src.db.models import FactLeadTime, DimMaterial, FactPurchaseOrder, FactInventory, FactDelivery
+from src.db.models import FactLeadTime, FactLeadTimeDaily, DimMaterial, FactPurchaseOrder, FactInventory, FactDelivery
+from src.core.leadtime_analytics import LeadTimeAnalytics, filter_end_date
 
 router = APIRouter(prefix="/leadtime", tags=["leadtime"])
 
@@ -14,32 +17,35 @@ router = APIRouter(prefix="/leadtime", tags=["leadtime"])
 # 1. Summary KPIs
 # -----------------------------------------------------------------------------
 @router.get("/summary")
+@cached_response('fact_lead_time_daily')
 def get_leadtime_summary(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
-    """Get overall Lead Time KPIs"""
+    """Get overall Lead Time KPIs (one query over the fact_lead_time_daily rollup)"""
+    D = FactLeadTimeDaily
     
-    # Build date filter if provided
-    base_query = db.query(FactLeadTime)
-    if start_date and end_date:
-        base_query = base_query.filter(
-            FactLeadTime.end_date >= start_date,
-            FactLeadTime.end_date <= end_date
+    def avg_leadtime(order_types):
+        is_type = D.order_type.in_(order_types)
+        return cast(func.sum(case((is_type, D.sum_lead_time_days))), Numeric) / func.nullif(
+            func.sum(case((is_type & D.lead_time_days.isnot(None), D.order_count))), 0
         )
     
-    total_orders = base_query.count() or 0
-    avg_leadtime = base_query.with_entities(func.avg(FactLeadTime.lead_time_days)).scalar() or 0
-    
-    avg_mto = base_query.filter(FactLeadTime.order_type == 'MTO')\
-        .with_entities(func.avg(FactLeadTime.lead_time_days)).scalar() or 0
-        
-    avg_mts = base_query.filter(FactLeadTime.order_type.in_(['MTS', 'PURCHASE']))\
-        .with_entities(func.avg(FactLeadTime.lead_time_days)).scalar() or 0
+    query = db.query(
+        func.sum(D.order_count),
+        avg_leadtime(['MTO']),
+        avg_leadtime(['MTS', 'PURCHASE']),
+        func.sum(case((D.lead_time_days > 30, D.order_count))),
+        func.sum(case((D.lead_time_days > 45, D.order_count)))
+    )
+    row = filter_end_date(query, start_date, end_date).one()
     
-    delayed_orders = base_query.filter(FactLeadTime.lead_time_days > 30).count() or 0
-    critical_orders = base_query.filter(FactLeadTime.lead_time_days > 45).count() or 0
+    total_orders = int(row[0] or 0)
+    avg_mto = row[1] or 0
+    avg_mts = row[2] or 0
+    delayed_orders = int(row[3] or 0)
+    critical_orders = int(row[4] or 0)
         
     on_time = total_orders - delayed_orders
     
@@ -53,76 +59,27 @@ def get_leadtime_summary(
     }
 
 @router.get("/breakdown")
+@cached_response('fact_lead_time_daily')
 def get_leadtime_breakdown(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
-    """Get MTO/MTS breakdown statistics by stage"""
-    
-    def get_stats(order_type_filter):
-        q = db.query(
-            func.avg(FactLeadTime.preparation_days),
-            func.avg(FactLeadTime.production_days),
-            func.avg(FactLeadTime.transit_days),
-            func.avg(FactLeadTime.storage_days),
-            func.avg(FactLeadTime.delivery_days),
-            func.avg(FactLeadTime.lead_time_days),
-            func.count(FactLeadTime.id)
-        )
-        
-        # Apply date filter
-        if start_date and end_date:
-            q = q.filter(
-                FactLeadTime.end_date >= start_date,
-                FactLeadTime.end_date <= end_date
-            )
-        
-        if isinstance(order_type_filter, list):
-            q = q.filter(FactLeadTime.order_type.in_(order_type_filter))
-        else:
-            q = q.filter(FactLeadTime.order_type == order_type_filter)
-        return q.first()
+    """Get MTO/MTS breakdown statistics by stage (MTS includes PURCHASE)"""
+    analytics = LeadTimeAnalytics(db)
+    return [item.dict() for item in analytics.get_stage_averages(start_date, end_date)]
 
-    results = []
-    
-    # MTO
-    mto = get_stats('MTO')
-    results.append({
-        "order_category": "MTO",
-        "avg_preparation": float(mto[0] or 0),
-        "avg_production": float(mto[1] or 0),
-        "avg_transit": float(mto[2] or 0),
-        "avg_storage": float(mto[3] or 0),
-        "avg_delivery": float(mto[4] or 0),
-        "avg_total": float(mto[5] or 0),
-        "order_count": mto[6]
-    })
-    
-    # MTS (Includes PURCHASE)
-    mts = get_stats(['MTS', 'PURCHASE'])
-    results.append({
-        "order_category": "MTS",
-        "avg_preparation": float(mts[0] or 0),
-        "avg_production": float(mts[1] or 0),
-        "avg_transit": float(mts[2] or 0),
-        "avg_storage": float(mts[3] or 0),
-        "avg_delivery": float(mts[4] or 0),
-        "avg_total": float(mts[5] or 0),
-        "order_count": mts[6]
-    })
-    
-    return results
+# Sort key of /orders (latest finish first) - see src.api.pagination
+NO_END_DATE = date(1, 1, 1)
+ORDER_KEYS = [
+    func.coalesce(FactLeadTime.end_date, NO_END_DATE),
+    func.coalesce(FactLeadTime.order_number, ''),
+    func.coalesce(FactLeadTime.batch, 'N/A'),
+]
 
-@router.get("/orders")
-def get_leadtime_orders(
-    start_date: Optional[str] = Query(None),
-    end_date: Optional[str] = Query(None),
-    limit: int = 100,
-    db: Session = Depends(get_db)
-):
-    """Get list of orders with real batch and stage details"""
-    
+
+def leadtime_orders_query(db: Session, start_date: Optional[str], end_date: Optional[str]):
+    """Fact rows of /orders joined with their material description, newest first"""
     # Join with DimMaterial to get material_description
     query = db.query(
         FactLeadTime,
@@ -139,7 +96,30 @@ def get_leadtime_orders(
             FactLeadTime.end_date <= end_date
         )
     
-    results_with_desc = query.order_by(desc(FactLeadTime.end_date)).limit(limit).all()
+    return query.order_by(*[desc(key) for key in ORDER_KEYS])
+
+
+@router.get("/orders")
+@keyset_page(lambda item: [item['actual_finish_date'] or NO_END_DATE, item['order_number'] or '', item['batch']])
+@cached_response('fact_lead_time', 'dim_material')
+def get_leadtime_orders(
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """Get list of orders with real batch and stage details (keyset paged)"""
+    query = leadtime_orders_query(db, start_date, end_date)
+    if cursor:
+        finished, order_number, batch = decode_cursor(cursor, len(ORDER_KEYS))
+        try:
+            finished = date.fromisoformat(finished)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(tuple_(*ORDER_KEYS) < tuple_(finished, order_number, batch))
+    
+    results_with_desc = query.limit(limit).all()
         
     results = []
     for o, material_desc in results_with_desc:
@@ -166,6 +146,32 @@ def get_leadtime_orders(
         
     return results
 
+
+@router.get("/orders/export")
+def export_leadtime_orders(
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    format: str = Query("csv", pattern=EXPORT_FORMATS),
+    db: Session = Depends(get_db)
+):
+    """Stream all /orders rows as CSV or NDJSON (server-side cursor, bounded memory)"""
+    query = leadtime_orders_query(db, start_date, end_date).with_entities(
+        FactLeadTime.order_number,
+        func.coalesce(FactLeadTime.batch, 'N/A').label('batch'),
+        FactLeadTime.order_type.label('order_category'),
+        func.coalesce(DimMaterial.material_description, FactLeadTime.material_code).label('material_description'),
+        FactLeadTime.plant_code,
+        FactLeadTime.preparation_days.label('preparation_time'),
+        FactLeadTime.production_days.label('production_time'),
+        FactLeadTime.transit_days.label('transit_time'),
+        FactLeadTime.storage_days.label('storage_time'),
+        FactLeadTime.delivery_days.label('delivery_time'),
+        FactLeadTime.lead_time_days.label('total_leadtime'),
+        FactLeadTime.start_date.label('release_date'),
+        FactLeadTime.end_date.label('actual_finish_date'),
+    )
+    return stream_export(db, query.statement, {}, format, "leadtime_orders")
+
 # -----------------------------------------------------------------------------
 # 4. By Channel (Original placeholder - now removed)
 # -----------------------------------------------------------------------------
@@ -175,6 +181,7 @@ def get_leadtime_orders(
 # 5. By Channel Analysis
 # -----------------------------------------------------------------------------
 @router.get("/by-channel")
+@cached_response('fact_lead_time_daily')
 def get_by_channel(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
@@ -192,23 +199,22 @@ def get_by_channel(
         '15': 'Project'
     }
     
-    # Query grouped by channel and order_type
+    # Query grouped by channel and order_type (fact_lead_time_daily rollup)
+    D = FactLeadTimeDaily
     query = db.query(
-        FactLeadTime.channel_code,
-        FactLeadTime.order_type,
-        func.count(FactLeadTime.id).label('order_count'),
-        func.avg(FactLeadTime.lead_time_days).label('avg_lead_time')
+        D.channel_code,
+        D.order_type,
+        func.sum(D.order_count).label('order_count'),
+        (cast(func.sum(D.sum_lead_time_days), Numeric) / func.nullif(
+            func.sum(case((D.lead_time_days.isnot(None), D.order_count))), 0
+        )).label('avg_lead_time')
     )\
-    .filter(FactLeadTime.channel_code.isnot(None))
+    .filter(D.channel_code.isnot(None))
     
     # Apply date filter
-    if start_date and end_date:
-        query = query.filter(
-            FactLeadTime.end_date >= start_date,
-            FactLeadTime.end_date <= end_date
-        )
+    query = filter_end_date(query, start_date, end_date)
     
-    results = query.group_by(FactLeadTime.channel_code, FactLeadTime.order_type).all()
+    results = query.group_by(D.channel_code, D.order_type).all()
     
     # Aggregate by channel
     channel_data = {}
@@ -251,6 +257,7 @@ def get_by_channel(
 # 6. Batch Trace
 # -----------------------------------------------------------------------------
 @router.get("/trace/{batch_id}")
+@cached_response('fact_lead_time', 'fact_production')
 def trace_batch(batch_id: str, db: Session = Depends(get_db)):
     """Trace a specific batch"""
     # 1. Get Summary from FactLeadTime
@@ -388,6 +395,7 @@ class RecentOrderRecord(BaseModel):
 
 
 @router.get("/recent-orders", response_model=List[RecentOrderRecord])
+@cached_response('fact_delivery')
 def get_recent_orders(
     limit: int = Query(50, le=500),
     db: Session = Depends(get_db)
@@ -436,6 +444,7 @@ def get_recent_orders(
 
 
 @router.get("/otif-summary")
+@cached_response('fact_delivery')
 def get_otif_summary(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
@@ -488,7 +497,8 @@ def get_otif_summary(
 # ========== STAGE BREAKDOWN & HISTOGRAM ENDPOINTS ==========
 
 @router.get("/stage-breakdown")
-async def get_stage_breakdown(
+@cached_response('fact_lead_time', 'dim_material')
+def get_stage_breakdown(
     limit: int = Query(20, ge=10, le=50, description="Number of recent orders"),
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
@@ -504,7 +514,6 @@ async def get_stage_breakdown(
     
     Returns: Prep/Production/Delivery time breakdown per order
     """
-    from src.core.leadtime_analytics import LeadTimeAnalytics
     from datetime import datetime
     
     analytics = LeadTimeAnalytics(db)
@@ -523,16 +532,17 @@ async def get_stage_breakdown(
 
 
 @router.get("/histogram")
-async def get_leadtime_histogram(
+@cached_response('fact_lead_time_daily')
+def get_leadtime_histogram(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db)
 ):
     """
     Lead time distribution histogram
-    Returns: Bins of lead time distribution
+    Returns: Bins of lead time distribution (LEADTIME_HISTOGRAM_BUCKETS)
     """
-    from src.core.leadtime_analytics import LeadTimeAnalytics
-    
     analytics = LeadTimeAnalytics(db)
-    result = analytics.get_leadtime_histogram()
+    result = analytics.get_leadtime_histogram(start_date, end_date)
     
     return [item.dict() for item in result]
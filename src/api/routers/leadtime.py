@@ -464,7 +464,7 @@ def trace_batch(
 # ========== NEW VISUAL INTELLIGENCE ENDPOINTS ==========
 
 @router.get("/leadtime/stage-breakdown")
-async def get_stage_breakdown(
+def get_stage_breakdown(
     limit: int = Query(20, ge=10, le=50, description="Number of recent orders"),
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
@@ -484,7 +484,7 @@ async def get_stage_breakdown(
 
 
 @router.get("/leadtime/histogram")
-async def get_leadtime_histogram(
+def get_leadtime_histogram(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
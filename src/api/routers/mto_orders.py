@@ -10,7 +10,9 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from pydantic import BaseModel
 
+from src.api.cache import cached_response
 from src.api.deps import get_db, get_current_user
+from src.api.pagination import EXPORT_FORMATS, keyset_filter, keyset_page, stream_export
 
 
 router = APIRouter(prefix="/mto-orders", tags=["MTO Orders"])
@@ -45,7 +47,8 @@ class MTOKPIs(BaseModel):
 # ========== Endpoints ==========
 
 @router.get("/summary", response_model=MTOKPIs)
-async def get_mto_summary(
+@cached_response('fact_production')  # view_mto_orders is refreshed with it
+def get_mto_summary(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
@@ -81,19 +84,25 @@ async def get_mto_summary(
     )
 
 
-@router.get("/orders", response_model=list[MTOOrder])
-async def get_mto_orders(
-    plant_code: Optional[str] = Query(None),
-    status: Optional[str] = Query(None),
-    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    limit: int = Query(100, ge=1, le=500),
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    """Get MTO orders with optional filters including date range"""
-    where_clauses = []
-    params = {"limit": limit}
+# Sort key of /orders (newest release first) - see src.api.pagination
+NO_RELEASE_DATE = '0001-01-01'
+ORDER_KEYS = [
+    (f"COALESCE(release_date, DATE '{NO_RELEASE_DATE}')", "date"),
+    ("COALESCE(order_number, '')", "text"),
+    ("COALESCE(sales_order, '')", "text"),
+]
+
+
+def mto_orders_sql(
+    plant_code: Optional[str],
+    status: Optional[str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    cursor_sql: str = "TRUE"
+) -> tuple[str, dict]:
+    """SELECT of /orders (without LIMIT) and its params"""
+    where_clauses = [cursor_sql]
+    params = {}
     
     if plant_code:
         where_clauses.append("plant_code = :plant_code")
@@ -108,18 +117,41 @@ async def get_mto_orders(
         params["start_date"] = start_date
         params["end_date"] = end_date
     
-    where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    where_sql = "WHERE " + " AND ".join(where_clauses)
+    order_sql = ", ".join(f"{expr} DESC" for expr, _ in ORDER_KEYS)
     
-    results = db.execute(text(f"""
+    return f"""
         SELECT 
             plant_code, sales_order, order_number, material_code,
             material_description, order_qty, delivered_qty, uom,
-            status, release_date::text, actual_finish_date::text
+            status, release_date::text as release_date, actual_finish_date::text as actual_finish_date
         FROM view_mto_orders
         {where_sql}
-        ORDER BY release_date DESC
-        LIMIT :limit
-    """), params).fetchall()
+        ORDER BY {order_sql}
+    """, params
+
+
+@router.get("/orders", response_model=list[MTOOrder])
+@keyset_page(lambda item: [item['release_date'] or NO_RELEASE_DATE,
+                           item['order_number'], item['sales_order']])
+@cached_response('fact_production')
+def get_mto_orders(
+    plant_code: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Get MTO orders with optional filters including date range (keyset paged)"""
+    cursor_sql, cursor_params = keyset_filter(cursor, ORDER_KEYS)
+    sql, params = mto_orders_sql(plant_code, status, start_date, end_date, cursor_sql)
+    
+    results = db.execute(
+        text(sql + " LIMIT :limit"), {**params, **cursor_params, "limit": limit}
+    ).fetchall()
     
     return [MTOOrder(
         plant_code=str(r[0]) if r[0] else '',
@@ -136,8 +168,24 @@ async def get_mto_orders(
     ) for r in results]
 
 
+@router.get("/orders/export")
+def export_mto_orders(
+    plant_code: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    format: str = Query("csv", pattern=EXPORT_FORMATS),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Stream all /orders rows as CSV or NDJSON (server-side cursor, bounded memory)"""
+    sql, params = mto_orders_sql(plant_code, status, start_date, end_date)
+    return stream_export(db, text(sql), params, format, "mto_orders")
+
+
 @router.get("/by-status", response_model=list[dict])
-async def get_orders_by_status(
+@cached_response('fact_production')
+def get_orders_by_status(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
@@ -171,7 +219,8 @@ async def get_orders_by_status(
 # ========== NEW VISUAL INTELLIGENCE ENDPOINTS ==========
 
 @router.get("/funnel")
-async def get_production_funnel(
+@cached_response('fact_production')
+def get_production_funnel(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
@@ -201,7 +250,8 @@ async def get_production_funnel(
 
 
 @router.get("/top-orders")
-async def get_top_orders(
+@cached_response('fact_production')
+def get_top_orders(
     limit: int = Query(10, ge=5, le=20, description="Number of top orders"),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -219,7 +269,8 @@ async def get_top_orders(
 
 
 @router.get("/completion-trend")
-async def get_completion_trend(
+@cached_response('fact_production')
+def get_completion_trend(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
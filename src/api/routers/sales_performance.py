@@ -2,16 +2,23 @@
 Sales Performance Dashboard API Router
 
 Tracks sales metrics, trends, and customer performance.
-Query directly from fact_billing for proper date filtering.
+Query directly from fact_billing for proper date filtering; period filters are
+half-open billing_date ranges (index-friendly), /trend and /segmentation read
+the fact_sales_monthly rollup.
 Follows CLAUDE.md: KISS, DRY, file <200 lines.
 """
 from typing import Optional
-from fastapi import APIRouter, Depends, Query
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from pydantic import BaseModel
 
+from src.api.cache import cached_response
 from src.api.deps import get_db, get_current_user
+from src.api.pagination import EXPORT_FORMATS, keyset_filter, keyset_page, stream_export
+from src.api.search import CUSTOMER_MATCH_SQL, contains_pattern
+from src.core.sales_analytics import period_bounds
 
 
 router = APIRouter(prefix="/sales", tags=["Sales Performance"])
@@ -47,20 +54,30 @@ class MonthlySalesData(BaseModel):
 
 # ========== Helper ==========
 
+BILLING_RANGE_SQL = "billing_date >= :start_date AND billing_date < :end_before"
+
+
+def billing_range_params(start_date: str, end_date: str) -> dict:
+    """Params of BILLING_RANGE_SQL: the inclusive range as half-open [start, end + 1 day)"""
+    try:
+        start, end_before = period_bounds(date.fromisoformat(start_date), date.fromisoformat(end_date))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    return {"start_date": start, "end_before": end_before}
+
+
 def build_date_filter(start_date: Optional[str], end_date: Optional[str]) -> tuple[str, dict]:
-    """Build date filter SQL and params"""
+    """Build date filter SQL (always a WHERE clause) and params"""
     if start_date and end_date:
-        return "WHERE billing_date BETWEEN :start_date AND :end_date", {
-            "start_date": start_date,
-            "end_date": end_date
-        }
-    return "", {}
+        return f"WHERE {BILLING_RANGE_SQL}", billing_range_params(start_date, end_date)
+    return "WHERE TRUE", {}
 
 
 # ========== Endpoints ==========
 
 @router.get("/summary", response_model=SalesKPIs)
-async def get_sales_summary(
+@cached_response('fact_billing')
+def get_sales_summary(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
@@ -91,45 +108,78 @@ async def get_sales_summary(
     )
 
 
-@router.get("/customers", response_model=list[SalesRecord])
-async def get_sales_by_customer(
-    division_code: Optional[str] = Query(None),
-    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    limit: int = Query(100, ge=1, le=500),
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    """Get sales by customer with optional division and date filters"""
+# Sort key of /customers (sales DESC, then the group columns) - see src.api.pagination
+CUSTOMER_KEYS = [
+    ("COALESCE(SUM(net_value), 0)", "numeric"),
+    ("COALESCE(customer_name, '')", "text"),
+    ("COALESCE(dist_channel, '')", "text"),
+]
+
+
+def sales_customers_sql(
+    division_code: Optional[str],
+    customer: Optional[str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    having_sql: str = "TRUE"
+) -> tuple[str, dict]:
+    """SELECT of /customers (without LIMIT) and its params"""
     where_clauses = []
-    params = {"limit": limit}
+    params = {}
     
     if division_code:
         where_clauses.append("dist_channel = :division_code")
         params["division_code"] = division_code
     
+    if customer:
+        # Resolved to names through the trigram-indexed search view first
+        where_clauses.append(CUSTOMER_MATCH_SQL)
+        params["customer_pattern"] = contains_pattern(customer)
+    
     if start_date and end_date:
-        where_clauses.append("billing_date BETWEEN :start_date AND :end_date")
-        params["start_date"] = start_date
-        params["end_date"] = end_date
+        where_clauses.append(BILLING_RANGE_SQL)
+        params.update(billing_range_params(start_date, end_date))
     
     where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    order_sql = ", ".join(f"{expr} DESC" for expr, _ in CUSTOMER_KEYS)
     
     # Fixed: Count unique sales orders, not invoices
-    results = db.execute(text(f"""
+    return f"""
         SELECT 
-            customer_name,
+            COALESCE(customer_name, '') as customer_name,
             COALESCE(dist_channel, '') as division_code,
-            SUM(net_value) as sales_amount,
+            COALESCE(SUM(net_value), 0) as sales_amount,
             SUM(billing_qty) as sales_qty,
             COUNT(DISTINCT so_number) as order_count,
             AVG(net_value) as avg_order_value
         FROM fact_billing
         {where_sql}
-        GROUP BY customer_name, dist_channel
-        ORDER BY sales_amount DESC
-        LIMIT :limit
-    """), params).fetchall()
+        GROUP BY COALESCE(customer_name, ''), COALESCE(dist_channel, '')
+        HAVING {having_sql}
+        ORDER BY {order_sql}
+    """, params
+
+
+@router.get("/customers", response_model=list[SalesRecord])
+@keyset_page(lambda item: [item['sales_amount'], item['customer_name'], item['division_code']])
+@cached_response('fact_billing')
+def get_sales_by_customer(
+    division_code: Optional[str] = Query(None),
+    customer: Optional[str] = Query(None, description="Customer name contains"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Get sales by customer with optional division and date filters (keyset paged)"""
+    having_sql, cursor_params = keyset_filter(cursor, CUSTOMER_KEYS)
+    sql, params = sales_customers_sql(division_code, customer, start_date, end_date, having_sql)
+    
+    results = db.execute(
+        text(sql + " LIMIT :limit"), {**params, **cursor_params, "limit": limit}
+    ).fetchall()
     
     return [SalesRecord(
         customer_name=str(r[0]) if r[0] else '',
@@ -141,8 +191,24 @@ async def get_sales_by_customer(
     ) for r in results]
 
 
+@router.get("/customers/export")
+def export_sales_by_customer(
+    division_code: Optional[str] = Query(None),
+    customer: Optional[str] = Query(None, description="Customer name contains"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    format: str = Query("csv", pattern=EXPORT_FORMATS),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Stream all /customers rows as CSV or NDJSON (server-side cursor, bounded memory)"""
+    sql, params = sales_customers_sql(division_code, customer, start_date, end_date)
+    return stream_export(db, text(sql), params, format, "sales_customers")
+
+
 @router.get("/by-division", response_model=list[dict])
-async def get_sales_by_division(
+@cached_response('fact_billing')
+def get_sales_by_division(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
@@ -178,7 +244,8 @@ async def get_sales_by_division(
 
 
 @router.get("/top-customers", response_model=list[SalesRecord])
-async def get_top_customers(
+@cached_response('fact_billing')
+def get_top_customers(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     limit: int = Query(10, ge=1, le=50),
@@ -222,25 +289,26 @@ async def get_top_customers(
 
 
 @router.get("/trend", response_model=list[MonthlySalesData])
-async def get_monthly_sales_trend(
+@cached_response('fact_sales_monthly')
+def get_monthly_sales_trend(
     year: int = Query(2026, ge=2024, le=2030, description="Year for trend analysis"),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Get monthly sales trend for specified year"""
-    params = {"year": year}
+    """Get monthly sales trend for specified year (fact_sales_monthly rollup)"""
+    params = {"year_start": date(year, 1, 1), "next_year_start": date(year + 1, 1, 1)}
     
     # Fixed: Count unique sales orders, not invoices
     results = db.execute(text("""
         SELECT 
-            EXTRACT(MONTH FROM billing_date)::int as month_num,
-            TRIM(TO_CHAR(billing_date, 'Month')) as month_name,
+            EXTRACT(MONTH FROM billing_month)::int as month_num,
+            TRIM(TO_CHAR(billing_month, 'Month')) as month_name,
             SUM(net_value) as total_revenue,
             COUNT(DISTINCT so_number) as order_count
-        FROM fact_billing
-        WHERE EXTRACT(YEAR FROM billing_date) = :year
-        GROUP BY EXTRACT(MONTH FROM billing_date), TO_CHAR(billing_date, 'Month')
-        ORDER BY month_num ASC
+        FROM fact_sales_monthly
+        WHERE billing_month >= :year_start AND billing_month < :next_year_start
+        GROUP BY billing_month
+        ORDER BY billing_month ASC
     """), params).fetchall()
     
     # Handle empty results gracefully
@@ -258,7 +326,8 @@ async def get_monthly_sales_trend(
 # ========== NEW VISUAL INTELLIGENCE ENDPOINTS ==========
 
 @router.get("/segmentation")
-async def get_customer_segmentation(
+@cached_response('fact_sales_monthly', 'fact_sales_daily')
+def get_customer_segmentation(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     db: Session = Depends(get_db),
@@ -288,7 +357,8 @@ async def get_customer_segmentation(
 
 
 @router.get("/churn-risk")
-async def get_churn_risk(
+@cached_response('fact_billing')
+def get_churn_risk(
     limit: int = Query(5, ge=1, le=20, description="Number of at-risk customers"),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -0,0 +1,43 @@
+"""
+Search API Router
+
+Autocomplete for the material / customer filters of the dashboards,
+served from the pg_trgm-indexed search views (see src.api.search).
+Follows CLAUDE.md: KISS, DRY, file <200 lines.
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+
+from src.api.deps import get_db, get_current_user
+from src.api.search import autocomplete_customers, autocomplete_materials
+
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+
+# ========== Pydantic Models ==========
+
+class Suggestion(BaseModel):
+    """Autocomplete suggestion"""
+    value: str  # material_code / customer_name to filter by
+    label: str
+
+
+# ========== Endpoints ==========
+
+@router.get("/autocomplete", response_model=list[Suggestion])
+def autocomplete(
+    q: str = Query(..., min_length=1, max_length=100),
+    kind: str = Query("material", pattern="^(material|customer)$"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Materials (code / description) or customers matching q, prefix matches first"""
+    term = q.strip()
+    if not term:
+        return []
+    if kind == "customer":
+        return autocomplete_customers(db, term, limit)
+    return autocomplete_materials(db, term, limit)
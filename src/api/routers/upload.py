@@ -20,9 +20,10 @@ import uuid
 
 from src.api.deps import get_db
 from src.db.models import UploadHistory
+from src.etl.shadow_rebuild import rebuild_in_progress
 from src.core.upload_service import (
     save_upload_file,
-    process_file,
+    process_upload,
     compute_file_hash,
     validate_file_structure
 )
@@ -79,7 +80,7 @@ ALLOWED_EXTENSIONS = {'.xlsx', '.xls'}
 
 
 @router.post("/", response_model=UploadResponse)
-async def upload_file(
+def upload_file(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     snapshot_date: Optional[str] = Form(None),
@@ -101,8 +102,15 @@ async def upload_file(
             detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
+    # Uploads would be lost when the rebuilt warehouse is swapped in
+    if rebuild_in_progress(db):
+        raise HTTPException(
+            status_code=409,
+            detail="Warehouse rebuild in progress - retry the upload after it finishes"
+        )
+    
     # Validate file size (read content to check)
-    content = await file.read()
+    content = file.file.read()
     file_size = len(content)
     
     if file_size > MAX_FILE_SIZE:
@@ -118,7 +126,7 @@ async def upload_file(
         )
     
     # Reset file pointer for saving
-    await file.seek(0)
+    file.file.seek(0)
     
     try:
         # Generate unique filename
@@ -130,7 +138,7 @@ async def upload_file(
         UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
         # Save file
-        saved_size = await save_upload_file(file, file_path)
+        saved_size = save_upload_file(file, file_path)
         
         # Compute file hash
         file_hash = compute_file_hash(file_path)
@@ -193,7 +201,7 @@ async def upload_file(
         db.refresh(upload)
         
         # Schedule background processing
-        background_tasks.add_task(process_file, upload.id, file_path, db)
+        background_tasks.add_task(process_upload, upload.id, file_path)
         
         return UploadResponse(
             upload_id=upload.id,
@@ -216,7 +224,7 @@ async def upload_file(
 
 
 @router.get("/{upload_id}/status", response_model=UploadStatusResponse)
-async def get_upload_status(
+def get_upload_status(
     upload_id: int,
     db: Session = Depends(get_db)
 ):
@@ -250,7 +258,7 @@ async def get_upload_status(
 
 
 @router.get("/history", response_model=List[UploadHistoryItem])
-async def get_upload_history(
+def get_upload_history(
     limit: int = 20,
     db: Session = Depends(get_db)
 ):
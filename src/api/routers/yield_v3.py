@@ -25,9 +25,13 @@ from pathlib import Path
 import shutil
 import tempfile
 
+from src.api.cache import cached_response
 from src.api.deps import get_db, get_current_user
+from src.db.generations import publish_changes
 from src.db.models import FactProductionPerformanceV2, UploadHistory
 from src.etl.loaders import Zrpp062Loader, Zrsd006Loader
+from src.etl.shadow_rebuild import rebuild_in_progress, warehouse_lock
+from src.etl.transform import Transformer
 import hashlib
 
 
@@ -139,7 +143,7 @@ def format_period(d: date) -> str:
 # ============================================================================
 
 @router.post("/upload", response_model=UploadResponse)
-async def upload_yield_data(
+def upload_yield_data(
     file: UploadFile = File(..., description="Excel file (zrpp062.xlsx format)"),
     month: int = Form(..., ge=1, le=12, description="Month (1-12)"),
     year: int = Form(..., ge=2020, le=2100, description="Year (2020-2100)"),
@@ -167,12 +171,19 @@ async def upload_yield_data(
             detail="Invalid file type. Please upload an Excel file (.xlsx or .xls)"
         )
     
+    # LOW_YIELD alerts written now would be lost when the rebuilt warehouse is swapped in
+    if rebuild_in_progress(db):
+        raise HTTPException(
+            status_code=409,
+            detail="Warehouse rebuild in progress - retry the upload after it finishes"
+        )
+    
     # Create reference date (first day of month)
     reference_date = date(year, month, 1)
     
     # Calculate file hash for deduplication
-    file_content = await file.read()
-    await file.seek(0)  # Reset file pointer
+    file_content = file.file.read()
+    file.file.seek(0)  # Reset file pointer
     file_hash = hashlib.sha256(file_content).hexdigest()
     
     # Create upload history record
@@ -202,8 +213,16 @@ async def upload_yield_data(
     
     # Load data using UPSERT loader
     try:
-        loader = Zrpp062Loader(db)
-        stats = loader.load_with_period(tmp_path, reference_date)
+        with warehouse_lock(exclusive=False):
+            loader = Zrpp062Loader(db)
+            stats = loader.load_with_period(tmp_path, reference_date)
+            
+            # Re-evaluate LOW_YIELD alerts for the uploaded period only
+            try:
+                Transformer(db).evaluate_alert_rules({'fact_production_performance_v2': {reference_date.isoformat()}})
+            except Exception as e:
+                db.rollback()
+                print(f"  ⚠ Yield alert evaluation failed: {e}")
         
         # Update upload record with success
         upload_record.status = 'completed'
@@ -213,6 +232,12 @@ async def upload_yield_data(
         upload_record.processed_at = datetime.utcnow()
         db.commit()
         
+        try:
+            publish_changes(db, ['fact_production_performance_v2', 'fact_alerts'])
+        except Exception as e:
+            db.rollback()
+            print(f"  ⚠ Publishing changes failed: {e}")
+        
         return UploadResponse(
             success=True,
             message=f"Successfully uploaded data for {month:02d}/{year}",
@@ -239,7 +264,7 @@ async def upload_yield_data(
 
 
 @router.post("/upload-master-data", response_model=UploadResponse)
-async def upload_master_data(
+def upload_master_data(
     file: UploadFile = File(..., description="Excel file (zrsd006.xlsx format with PH hierarchy)"),
     db: Session = Depends(get_db),
     # user = Depends(get_current_user)
@@ -271,8 +296,8 @@ async def upload_master_data(
         )
     
     # Calculate file hash for deduplication
-    file_content = await file.read()
-    await file.seek(0)  # Reset file pointer
+    file_content = file.file.read()
+    file.file.seek(0)  # Reset file pointer
     file_hash = hashlib.sha256(file_content).hexdigest()
     
     # Create upload history record
@@ -316,6 +341,12 @@ async def upload_master_data(
         upload_record.processed_at = datetime.utcnow()
         db.commit()
         
+        try:
+            publish_changes(db, ['dim_product_hierarchy'])
+        except Exception as e:
+            db.rollback()
+            print(f"  ⚠ Publishing changes failed: {e}")
+        
         return UploadResponse(
             success=True,
             message=f"Successfully uploaded master data - {stats.get('loaded', 0)} materials loaded, {stats.get('skipped', 0)} skipped",
@@ -342,7 +373,8 @@ async def upload_master_data(
 
 
 @router.get("/periods", response_model=List[AvailablePeriod])
-async def get_available_periods(
+@cached_response('fact_production_performance_v2')
+def get_available_periods(
     db: Session = Depends(get_db),
 ):
     """
@@ -367,7 +399,8 @@ async def get_available_periods(
 
 
 @router.get("/kpi", response_model=YieldKPI)
-async def get_kpi(
+@cached_response('fact_production_performance_v2')
+def get_kpi(
     period_start: str = Query(..., description="Start period in MM/YYYY format"),
     period_end: str = Query(..., description="End period in MM/YYYY format"),
     db: Session = Depends(get_db),
@@ -428,7 +461,8 @@ async def get_kpi(
 
 
 @router.get("/trend", response_model=List[TrendDataPoint])
-async def get_trend(
+@cached_response('fact_production_performance_v2')
+def get_trend(
     period_start: str = Query(..., description="Start period in MM/YYYY format"),
     period_end: str = Query(..., description="End period in MM/YYYY format"),
     db: Session = Depends(get_db),
@@ -483,7 +517,8 @@ async def get_trend(
 
 
 @router.get("/distribution", response_model=List[DistributionDataPoint])
-async def get_distribution(
+@cached_response('fact_production_performance_v2', 'dim_product_hierarchy')
+def get_distribution(
     period_start: str = Query(..., description="Start period in MM/YYYY format"),
     period_end: str = Query(..., description="End period in MM/YYYY format"),
     group_by: str = Query(default="ph_level_3", description="Group by field: ph_level_3 (Brand/Grade), ph_level_2 (Product Line), or product_group_1 (Raw)"),
@@ -565,7 +600,8 @@ async def get_distribution(
 
 
 @router.get("/pareto", response_model=List[ParetoDataPoint])
-async def get_pareto(
+@cached_response('fact_production_performance_v2')
+def get_pareto(
     period_start: str = Query(..., description="Start period in MM/YYYY format"),
     period_end: str = Query(..., description="End period in MM/YYYY format"),
     limit: int = Query(default=10, ge=5, le=50, description="Number of top materials"),
@@ -656,7 +692,8 @@ class DrillDownMaterial(BaseModel):
 
 
 @router.get("/distribution/details", response_model=List[DrillDownMaterial])
-async def get_distribution_details(
+@cached_response('fact_production_performance_v2', 'dim_product_hierarchy')
+def get_distribution_details(
     period_start: str = Query(..., description="Start period in MM/YYYY format"),
     period_end: str = Query(..., description="End period in MM/YYYY format"),
     category: str = Query(..., description="PH Level 3 category (e.g., 'PREMIUM')"),
@@ -727,7 +764,8 @@ async def get_distribution_details(
 
 
 @router.get("/category-performance", response_model=List[CategoryPerformance])
-async def get_category_performance(
+@cached_response('fact_production_performance_v2', 'dim_product_hierarchy')
+def get_category_performance(
     period_start: str = Query(..., description="Start period in MM/YYYY format"),
     period_end: str = Query(..., description="End period in MM/YYYY format"),
     db: Session = Depends(get_db),
@@ -796,7 +834,8 @@ async def get_category_performance(
 
 
 @router.get("/quality", response_model=List[QualityDataPoint])
-async def get_quality(
+@cached_response('fact_production_performance_v2')
+def get_quality(
     period_start: str = Query(..., description="Start period in MM/YYYY format"),
     period_end: str = Query(..., description="End period in MM/YYYY format"),
     limit: int = Query(default=100, ge=10, le=500, description="Max points to return"),
@@ -857,7 +896,7 @@ async def get_quality(
 
 
 @router.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+def health_check(db: Session = Depends(get_db)):
     """Health check endpoint for V3 yield API"""
     try:
         result = db.execute(text("""
@@ -0,0 +1,86 @@
+"""
+Material / customer search over the pg_trgm-indexed search views
+
+view_search_materials and view_search_customers (src.db.views) hold one row
+per material / customer with GIN gin_trgm_ops indexes, so substring and
+prefix matches are index scans instead of sequential scans of the fact
+tables. List endpoints resolve a search term to codes here first:
+
+    where_clauses.append(MATERIAL_MATCH_SQL)
+    params["material_pattern"] = contains_pattern(material_code)
+
+Terms shorter than TRIGRAM_MIN_LENGTH have no inner trigram, so
+autocomplete only prefix-matches them (still served by the index).
+
+Skills: backend-development
+"""
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+TRIGRAM_MIN_LENGTH = 3
+
+MATERIAL_MATCH_SQL = """material_code IN (
+    SELECT material_code FROM view_search_materials WHERE material_code ILIKE :material_pattern
+)"""
+
+CUSTOMER_MATCH_SQL = """customer_name IN (
+    SELECT customer_name FROM view_search_customers WHERE customer_name ILIKE :customer_pattern
+)"""
+
+
+def escape_like(term: str) -> str:
+    """Term with LIKE wildcards taken literally (backslash is the default escape)"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def contains_pattern(term: str) -> str:
+    """ILIKE pattern matching `term` anywhere"""
+    return f"%{escape_like(term)}%"
+
+
+def autocomplete_materials(db: Session, term: str, limit: int) -> List[dict]:
+    """Materials whose code (or, from 3 chars, code + description) match `term`"""
+    if len(term) >= TRIGRAM_MIN_LENGTH:
+        match_sql = "search_text LIKE :contains"
+    else:
+        match_sql = "material_code ILIKE :prefix"
+    rows = db.execute(text(f"""
+        SELECT material_code, material_description
+        FROM view_search_materials
+        WHERE {match_sql}
+        ORDER BY
+            (material_code ILIKE :prefix) DESC,
+            similarity(search_text, :term) DESC,
+            material_code
+        LIMIT :limit
+    """), {
+        'term': term.lower(),
+        'contains': contains_pattern(term.lower()),
+        'prefix': f"{escape_like(term)}%",
+        'limit': limit,
+    }).fetchall()
+    return [{'value': r[0], 'label': f"{r[0]} - {r[1]}" if r[1] else r[0]} for r in rows]
+
+
+def autocomplete_customers(db: Session, term: str, limit: int) -> List[dict]:
+    """Customers whose name contains (under 3 chars: starts with) `term`"""
+    pattern = contains_pattern(term) if len(term) >= TRIGRAM_MIN_LENGTH else f"{escape_like(term)}%"
+    rows = db.execute(text("""
+        SELECT customer_name
+        FROM view_search_customers
+        WHERE customer_name ILIKE :pattern
+        ORDER BY
+            (customer_name ILIKE :prefix) DESC,
+            similarity(customer_name, :term) DESC,
+            customer_name
+        LIMIT :limit
+    """), {
+        'term': term,
+        'pattern': pattern,
+        'prefix': f"{escape_like(term)}%",
+        'limit': limit,
+    }).fetchall()
+    return [{'value': r[0], 'label': r[0]} for r in rows]
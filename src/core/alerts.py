@@ -4,16 +4,78 @@ Alert System - Detect stuck inventory and low yield
 Alerts:
 1. Stuck in Transit: Goods received but not issued within 48 hours
 2. Low Yield: Production yield below 85%
+
+Rules are registered in ALERT_RULES with the fact tables / key columns they
+depend on, so ingestion re-evaluates only the rules (and keys) an upload
+touched. Time-based rules keep an "open since" condition per entity
+(fact_alert_conditions) that a cheap periodic sweep promotes to alerts.
 """
+import json
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, List, Dict, Optional
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from dataclasses import dataclass
+from sqlalchemy import text
+from sqlalchemy.orm import Session
 
-from src.config import STUCK_IN_TRANSIT_HOURS, LOW_YIELD_THRESHOLD
+from src.config import STUCK_IN_TRANSIT_HOURS, LOW_YIELD_THRESHOLD, LOW_YIELD_THRESHOLD_BY_CATEGORY
 from src.core.netting import StackNettingEngine
 
 
+# Candidate frame columns emitted by each rule (one row per alert, fact_alerts names)
+ALERT_COLUMNS = [
+    'alert_type', 'severity', 'entity_type', 'entity_id', 'batch', 'material', 'plant',
+    'stuck_hours', 'yield_pct', 'loss_kg', 'message'
+]
+
+# Open condition frame columns (fact_alert_conditions names)
+CONDITION_COLUMNS = ['alert_type', 'entity_id', 'batch', 'material', 'plant', 'open_since']
+
+# LOW_YIELD entity: one alert per ZRPP062 process order / batch
+YIELD_ENTITY_SQL = "f.process_order_id || COALESCE('/' || f.batch_id, '')"
+
+
+def low_yield_sql(source: str = 'fact_production_performance_v2') -> str:
+    """
+    LOW_YIELD candidates (ALERT_COLUMNS) in one statement
+    
+    Yield % = 100 - loss_pct (same convention as the yield endpoints).
+    Threshold per dim_product_hierarchy.ph_level_3 from :thresholds (JSONB
+    category → min yield %), :default_threshold otherwise. :scoped / :periods
+    restrict the evaluation to some reference_date periods.
+    """
+    return f"""
+        SELECT 'LOW_YIELD' AS alert_type,
+               CASE WHEN y.yield_pct < 70 THEN 'CRITICAL'
+                    WHEN y.yield_pct < 80 THEN 'HIGH'
+                    ELSE 'MEDIUM' END AS severity,
+               'ORDER' AS entity_type,
+               y.entity_id, y.batch, y.material,
+               NULL::INTEGER AS plant,
+               NULL::NUMERIC AS stuck_hours,
+               y.yield_pct, y.loss_kg,
+               'Yield ' || y.yield_pct || '% < ' || y.threshold || '% (Loss: '
+                   || COALESCE(ROUND(y.loss_kg, 1)::TEXT, '?') || ' KG) - '
+                   || COALESCE(y.material_description, y.material, '') AS message
+        FROM (
+            SELECT {YIELD_ENTITY_SQL} AS entity_id,
+                   f.batch_id AS batch, f.material_code AS material, f.material_description,
+                   ROUND(100 - f.loss_pct, 2) AS yield_pct,
+                   f.loss_kg,
+                   COALESCE((t.threshold)::NUMERIC, :default_threshold) AS threshold
+            FROM {source} f
+            LEFT JOIN dim_product_hierarchy d ON d.material_code = f.material_code
+            LEFT JOIN jsonb_each_text(CAST(:thresholds AS JSONB)) AS t(category, threshold)
+              ON t.category = d.ph_level_3
+            WHERE f.loss_pct IS NOT NULL
+              AND (NOT :scoped OR f.reference_date = ANY(CAST(:periods AS DATE[])))
+        ) y
+        WHERE y.yield_pct < y.threshold
+    """
+
+
 @dataclass
 class Alert:
     """Alert data structure"""
@@ -41,22 +103,70 @@ class AlertDetector:
     
     def __init__(
         self,
-        mb51_df: pd.DataFrame,
+        mb51_df: Optional[pd.DataFrame] = None,
         production_chain_df: Optional[pd.DataFrame] = None,
         stuck_threshold_hours: int = STUCK_IN_TRANSIT_HOURS,
         yield_threshold_pct: float = LOW_YIELD_THRESHOLD,
-        uom_converter = None
+        uom_converter = None,
+        netting_state: Optional[pd.DataFrame] = None,
+        db: Optional[Session] = None
     ):
-        self.netting_engine = StackNettingEngine(mb51_df)
+        """
+        Args:
+            netting_state: Persisted 101/102 netting (fact_batch_netting, net_all_batches
+                columns). When given, MB51 history is not re-netted in memory.
+            db: Caller's session - rules read through it (same transaction).
+                A private session is opened only when omitted.
+        """
+        self.netting_state = netting_state
         self.mb51_df = mb51_df
         self.production_chain_df = production_chain_df
         self.stuck_threshold = stuck_threshold_hours
         self.yield_threshold = yield_threshold_pct
         self.uom_converter = uom_converter
+        self.db = db
+        self._netting_engine = None
+    
+    @property
+    def netting_engine(self) -> StackNettingEngine:
+        """In-memory netting over mb51_df (only built when no netting_state is given)"""
+        if self._netting_engine is None:
+            self._netting_engine = StackNettingEngine(self.mb51_df)
+        return self._netting_engine
+    
+    @contextmanager
+    def _session(self):
+        """The caller's session, or a private one closed afterwards"""
+        from src.db.connection import SessionLocal
+        
+        db = self.db or SessionLocal()
+        try:
+            yield db
+        finally:
+            if db is not self.db:
+                db.close()
+    
+    def _read_frame(self, query) -> pd.DataFrame:
+        """Run an ORM query on the caller's session (or a private one) into a DataFrame"""
+        with self._session() as db:
+            rows = query.with_session(db).all()
+            return pd.DataFrame(rows, columns=[c['name'] for c in query.column_descriptions])
+    
+    def _fetch(self, sql: str, params: Dict) -> List[Dict]:
+        """Run a SQL statement on the caller's session (or a private one) into row mappings"""
+        with self._session() as db:
+            return db.execute(text(sql), params).mappings().all()
     
     def detect_stuck_in_transit(self, plant: int = 1401) -> List[Alert]:
+        """Delayed transit alerts (see stuck_in_transit_candidates)"""
+        return self.frame_to_alerts(self.stuck_in_transit_candidates(plant))
+    
+    def stuck_in_transit_candidates(self, plant: int = 1401, batches: Optional[List[str]] = None) -> pd.DataFrame:
         """
-        Detect delayed transit from Factory to DC
+        Detect delayed transit from Factory to DC (candidate set, ALERT_COLUMNS)
+        
+        Args:
+            batches: Only evaluate these batches (None = all)
         
         Transit Time = Time from production finish to DC receipt
         
@@ -72,71 +182,99 @@ class AlertDetector:
         IMPORTANT: Only applies to P01 (Finished Goods)
         - P02/P03 (Semi-finished) don't go to finished goods warehouse
         """
-        alerts = []
-        current_time = datetime.now()
-        
-        # Get P01 batches with production finish dates from database
+        from sqlalchemy.orm import Query
         from src.db.models import FactProduction
-        from src.db.connection import SessionLocal
         
-        db = SessionLocal()
-        try:
-            # Get P01 batches with actual finish dates
-            p01_batches = db.query(
-                FactProduction.batch,
-                FactProduction.actual_finish_date,
-                FactProduction.material_code
-            ).filter(
-                FactProduction.mrp_controller == 'P01',
-                FactProduction.batch.isnot(None),
-                FactProduction.actual_finish_date.isnot(None)
-            ).all()
-            
-            for batch_row in p01_batches:
-                batch = batch_row.batch
-                actual_finish_date = batch_row.actual_finish_date
-                material = batch_row.material_code
-                
-                # Convert to datetime if it's a date
-                if isinstance(actual_finish_date, datetime):
-                    finish_dt = actual_finish_date
-                else:
-                    finish_dt = datetime.combine(actual_finish_date, datetime.min.time())
-                
-                # Get MVT 101 receipt date at Plant 1401 (after netting 101/102)
-                result_101 = self.netting_engine.apply_stack_netting(batch, plant, 101, 102)
-                
-                if result_101.is_fully_reversed:
-                    continue  # No valid receipt
-                
-                receipt_date = result_101.last_valid_date
-                if receipt_date is None:
-                    continue
-                
-                # Calculate transit time from production finish to DC receipt
-                transit_hours = (receipt_date - finish_dt).total_seconds() / 3600
-                
-                # Only alert if transit time exceeded threshold
-                if transit_hours > self.stuck_threshold:
-                    severity = self._get_stuck_severity(transit_hours)
-                    alerts.append(Alert(
-                        alert_type='DELAYED_TRANSIT',
-                        severity=severity,
-                        entity_type='BATCH',
-                        entity_id=batch,
-                        batch=batch,
-                        material=material,
-                        plant=plant,
-                        metric_value=round(transit_hours, 1),
-                        threshold=self.stuck_threshold,
-                        message=f"Batch {batch} transit delayed {round(transit_hours, 1)} hours (Factory → DC)",
-                        detected_at=current_time
-                    ))
-        finally:
-            db.close()
+        # Latest valid MVT 101 receipt per batch at this plant (after netting 101/102)
+        netting = self.netting_state
+        if netting is None:
+            netting = self.netting_engine.net_all_batches(101, 102, plant)
+        netting = netting[(netting['plant'] == plant) & ~netting['is_fully_reversed'].astype(bool)]
+        receipts = netting[['batch', 'last_valid_date']].drop_duplicates('batch')
         
+        # P01 batches with actual finish dates (first production row per batch)
+        query = Query([
+            FactProduction.batch,
+            FactProduction.actual_finish_date,
+            FactProduction.material_code
+        ]).filter(
+            FactProduction.mrp_controller == 'P01',
+            FactProduction.batch.isnot(None),
+            FactProduction.actual_finish_date.isnot(None)
+        )
+        if batches is not None:
+            query = query.filter(FactProduction.batch.in_(batches))
+        p01 = self._read_frame(query.order_by(FactProduction.id))
+        p01 = p01.drop_duplicates('batch')
         
-        return alerts
+        # No valid receipt (never received or fully reversed) → no alert
+        df = p01.merge(receipts, on='batch', how='inner')
+        finish = pd.to_datetime(df['actual_finish_date'])
+        transit_hours = (pd.to_datetime(df['last_valid_date']) - finish).dt.total_seconds() / 3600
+        
+        # Only alert if transit time exceeded threshold
+        df = df.assign(transit_hours=transit_hours)[transit_hours > self.stuck_threshold]
+        hours = df['transit_hours'].round(1)
+        return pd.DataFrame({
+            'alert_type': 'DELAYED_TRANSIT',
+            'severity': np.select(
+                [df['transit_hours'] > 72, df['transit_hours'] > 48], ['CRITICAL', 'HIGH'], default='MEDIUM'
+            ),
+            'entity_type': 'BATCH',
+            'entity_id': df['batch'],
+            'batch': df['batch'],
+            'material': df['material_code'],
+            'plant': plant,
+            'stuck_hours': hours,
+            'yield_pct': None,
+            'loss_kg': None,
+            'message': "Batch " + df['batch'].astype(str) + " transit delayed "
+                       + hours.astype(str) + " hours (Factory → DC)",
+        }, columns=ALERT_COLUMNS)
+    
+    def received_not_issued_conditions(self, plant: int = 1401, batches: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Open STUCK_IN_TRANSIT conditions (CONDITION_COLUMNS) from fact_batch_netting
+        
+        A batch is open from its latest valid MVT 101 at the plant while no
+        valid MVT 601 exists there (both after netting).
+        """
+        rows = self._fetch("""
+            SELECT 'STUCK_IN_TRANSIT' AS alert_type, r.batch AS entity_id, r.batch,
+                   r.material_code AS material, r.plant_code AS plant, r.last_valid_date AS open_since
+            FROM fact_batch_netting r
+            LEFT JOIN fact_batch_netting i
+              ON i.plant_code = r.plant_code AND i.batch = r.batch
+             AND i.mvt_pair = '601/602' AND NOT i.is_fully_reversed
+            WHERE r.mvt_pair = '101/102' AND r.plant_code = :plant
+              AND NOT r.is_fully_reversed AND r.last_valid_date IS NOT NULL
+              AND i.id IS NULL
+              AND (NOT :scoped OR r.batch = ANY(:batches))
+        """, {'plant': plant, 'scoped': batches is not None, 'batches': list(batches or [])})
+        return pd.DataFrame(rows, columns=CONDITION_COLUMNS)
+    
+    def stuck_candidates(self, conditions: pd.DataFrame, now: Optional[datetime] = None) -> pd.DataFrame:
+        """Promote open conditions older than the stuck threshold to alerts (ALERT_COLUMNS)"""
+        now = now or datetime.now()
+        hours = (now - pd.to_datetime(conditions['open_since'])).dt.total_seconds() / 3600
+        df = conditions.assign(open_hours=hours)[hours > self.stuck_threshold]
+        rounded = df['open_hours'].round(1)
+        return pd.DataFrame({
+            'alert_type': df['alert_type'],
+            'severity': np.select(
+                [df['open_hours'] > 72, df['open_hours'] > 48], ['CRITICAL', 'HIGH'], default='MEDIUM'
+            ),
+            'entity_type': 'BATCH',
+            'entity_id': df['entity_id'],
+            'batch': df['batch'],
+            'material': df['material'],
+            'plant': df['plant'],
+            'stuck_hours': rounded,
+            'yield_pct': None,
+            'loss_kg': None,
+            'message': "Batch " + df['batch'].astype(str) + " received, not issued for "
+                       + rounded.astype(str) + " hours",
+        }, columns=ALERT_COLUMNS)
     
     def _get_stuck_severity(self, hours: float) -> str:
         """Determine alert severity based on hours stuck"""
@@ -148,62 +286,37 @@ class AlertDetector:
             return 'MEDIUM'
     
     def detect_low_yield(self) -> List[Alert]:
+        """Low yield alerts (see low_yield_candidates)"""
+        return self.frame_to_alerts(self.low_yield_candidates())
+    
+    def low_yield_candidates(self, periods: Optional[List[str]] = None) -> pd.DataFrame:
         """
-        Detect low P02→P01 yield using dual validation
+        Detect low production yield from fact_production_performance_v2 (ZRPP062)
         
-        Logic:
-        1. Sequential batch pattern: P01 = P02 - 1
-        2. Material name validation: P01 starts with P02 + suffix
-        3. Yield calculation: (P01 KG / P02 KG) × 100
+        One set-based statement (low_yield_sql) with per-category thresholds
+        from dim_product_hierarchy.
         
-        Coverage: ~31% of P02 batches (406 valid pairs)
+        Args:
+            periods: Only evaluate these reference_date periods (ISO dates, None = all)
         """
-        alerts = []
-        
-        # Import P02→P01 yield calculator
-        from src.core.p02_p01_yield import calculate_p02_p01_yield
-        
-        # Get all P02 batches (MVT 261 @ Plant 1201)
-        p02_batches = self.mb51_df[
-            (self.mb51_df['col_1_mvt_type'] == 261) &
-            (self.mb51_df['col_2_plant'] == 1201)
-        ]['col_6_batch'].unique()
-        
-        current_time = datetime.now()
-        
-        for p02_batch in p02_batches:
-            if not p02_batch:
-                continue
-            
-            # Calculate yield using dual validation
-            yield_data = calculate_p02_p01_yield(
-                p02_batch,
-                self.mb51_df,
-                self.uom_converter
-            )
-            
-            if not yield_data:
-                continue
-            
-            # Check if yield is below threshold
-            if yield_data.yield_pct < self.yield_threshold:
-                severity = self._get_yield_severity(yield_data.yield_pct)
-                
-                alerts.append(Alert(
-                    alert_type='LOW_YIELD',
-                    severity=severity,
-                    entity_type='BATCH_PAIR',
-                    entity_id=f"{p02_batch}→{yield_data.p01_batch}",
-                    batch=p02_batch,
-                    material=yield_data.p01_material_code,
-                    plant=1201,
-                    metric_value=yield_data.yield_pct,
-                    threshold=self.yield_threshold,
-                    message=f"P02→P01 yield: {yield_data.yield_pct}% (Loss: {yield_data.loss_kg} KG) - {yield_data.p01_material_desc}",
-                    detected_at=current_time
-                ))
-        
-        return alerts
+        rows = self._fetch(low_yield_sql(), self._yield_params(periods))
+        return pd.DataFrame(rows, columns=ALERT_COLUMNS)
+    
+    def yield_entities(self, periods: List[str]) -> List[str]:
+        """LOW_YIELD entity ids of the given periods (scope for auto-resolution)"""
+        rows = self._fetch(f"""
+            SELECT {YIELD_ENTITY_SQL} AS entity_id FROM fact_production_performance_v2 f
+            WHERE f.reference_date = ANY(CAST(:periods AS DATE[]))
+        """, {'periods': list(periods)})
+        return [row['entity_id'] for row in rows]
+    
+    def _yield_params(self, periods: Optional[List[str]]) -> Dict:
+        return {
+            'default_threshold': self.yield_threshold,
+            'thresholds': json.dumps(LOW_YIELD_THRESHOLD_BY_CATEGORY),
+            'scoped': periods is not None,
+            'periods': list(periods or []),
+        }
     
     def _get_yield_severity(self, yield_pct: float) -> str:
         """Determine alert severity based on yield percentage"""
@@ -215,14 +328,13 @@ class AlertDetector:
             return 'MEDIUM'
     
     def detect_all_alerts(self) -> List[Alert]:
-        """Run all alert detections"""
+        """Run all registered alert rules (ALERT_RULES) over all entities"""
         alerts = []
-        
-        # Stuck in transit at Factory (1201)
-        alerts.extend(self.detect_stuck_in_transit(plant=1201))
-        
-        # Low yield
-        alerts.extend(self.detect_low_yield())
+        for rule in ALERT_RULES.values():
+            candidates = rule.evaluate(self, None)
+            if rule.is_time_based:
+                candidates = rule.promote(self, candidates)
+            alerts.extend(self.frame_to_alerts(candidates))
         
         # Sort by severity
         severity_order = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2}
@@ -230,6 +342,27 @@ class AlertDetector:
         
         return alerts
     
+    def frame_to_alerts(self, candidates: pd.DataFrame) -> List[Alert]:
+        """Convert a candidate frame (ALERT_COLUMNS) to Alert objects"""
+        current_time = datetime.now()
+        alerts = []
+        for row in candidates.itertuples(index=False):
+            is_yield = row.alert_type == 'LOW_YIELD'
+            alerts.append(Alert(
+                alert_type=row.alert_type,
+                severity=row.severity,
+                entity_type=row.entity_type,
+                entity_id=row.entity_id,
+                batch=row.batch,
+                material=row.material,
+                plant=row.plant,
+                metric_value=row.yield_pct if is_yield else row.stuck_hours,
+                threshold=self.yield_threshold if is_yield else self.stuck_threshold,
+                message=row.message,
+                detected_at=current_time
+            ))
+        return alerts
+    
     def alerts_to_dataframe(self, alerts: List[Alert]) -> pd.DataFrame:
         """Convert alerts to DataFrame"""
         if not alerts:
@@ -248,3 +381,73 @@ class AlertDetector:
             'message': a.message,
             'detected_at': a.detected_at
         } for a in alerts])
+
+
+@dataclass
+class AlertRule:
+    """
+    Registered alert rule
+    
+    depends_on maps each fact table the rule reads to the column holding the
+    rule's key there (the entity key, or e.g. a period mapped to entities by
+    entity_scope); ingestion evaluates the rule only for the keys written to
+    those tables. evaluate(detector, keys) returns candidates
+    (ALERT_COLUMNS), or open conditions (CONDITION_COLUMNS) when promote is
+    set - the periodic sweep then turns conditions into alerts via promote.
+    """
+    alert_type: str
+    depends_on: Dict[str, str]
+    evaluate: Callable[[AlertDetector, Optional[List[str]]], pd.DataFrame]
+    promote: Optional[Callable[[AlertDetector, pd.DataFrame], pd.DataFrame]] = None
+    entity_scope: Optional[Callable[[AlertDetector, List[str]], List[str]]] = None
+    
+    def scope_entities(self, detector: 'AlertDetector', keys: Optional[List[str]]) -> Optional[List[str]]:
+        """Entity ids covered by an evaluation over `keys` (keys themselves unless entity_scope maps them)"""
+        if keys is None or self.entity_scope is None:
+            return keys
+        return self.entity_scope(detector, keys)
+    
+    @property
+    def is_time_based(self) -> bool:
+        return self.promote is not None
+
+
+ALERT_RULES: Dict[str, AlertRule] = {}
+
+
+def alert_rule(alert_type: str, depends_on: Dict[str, str], promote=None, entity_scope=None):
+    """Register the decorated evaluate(detector, keys) function as an alert rule"""
+    def register(evaluate):
+        ALERT_RULES[alert_type] = AlertRule(alert_type, depends_on, evaluate, promote, entity_scope)
+        return evaluate
+    return register
+
+
+def rules_for(tables: Iterable[str]) -> List[AlertRule]:
+    """Registered rules depending on any of the given fact tables"""
+    tables = set(tables)
+    return [rule for rule in ALERT_RULES.values() if tables & set(rule.depends_on)]
+
+
+@alert_rule('DELAYED_TRANSIT', depends_on={'fact_production': 'batch', 'fact_batch_netting': 'batch'})
+def delayed_transit_rule(detector: AlertDetector, keys: Optional[List[str]]) -> pd.DataFrame:
+    """P01 batch reached DC 1401 more than the stuck threshold after production finish"""
+    return detector.stuck_in_transit_candidates(plant=1401, batches=keys)
+
+
+@alert_rule(
+    'STUCK_IN_TRANSIT', depends_on={'fact_batch_netting': 'batch'},
+    promote=lambda detector, conditions: detector.stuck_candidates(conditions)
+)
+def stuck_in_transit_rule(detector: AlertDetector, keys: Optional[List[str]]) -> pd.DataFrame:
+    """Batch received at DC 1401 and not issued (open since the receipt)"""
+    return detector.received_not_issued_conditions(plant=1401, batches=keys)
+
+
+@alert_rule(
+    'LOW_YIELD', depends_on={'fact_production_performance_v2': 'reference_date'},
+    entity_scope=lambda detector, periods: detector.yield_entities(periods)
+)
+def low_yield_rule(detector: AlertDetector, keys: Optional[List[str]]) -> pd.DataFrame:
+    """ZRPP062 order yield below its category threshold (keys = reference_date periods)"""
+    return detector.low_yield_candidates(periods=keys)
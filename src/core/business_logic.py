@@ -12,7 +12,7 @@ from datetime import datetime, timedelta
 from dataclasses import dataclass
 
 from src.config import MTO_MRP_CONTROLLER, PLANT_ROLES
-from src.core.netting import StackNettingEngine
+from src.core.leadtime_engine import LeadTimeEngine
 
 
 @dataclass
@@ -165,7 +165,7 @@ class OrderClassifier:
 
 class LeadTimeCalculator:
     """
-    Lead-time Calculator
+    Lead-time Calculator (facade over LeadTimeEngine)
     
     MTS Lead-time (Make-to-Stock):
     - Production Time: Release → Finish
@@ -178,6 +178,9 @@ class LeadTimeCalculator:
     - Transit Time: Finish → Receipt
     - Storage Time: Receipt → Issue
     - Delivery Time: Issue → Actual GI Date
+    
+    Pass netting_state (Transformer.load_batch_netting) to read receipt /
+    issue dates from fact_batch_netting instead of re-netting mb51_df.
     """
     
     def __init__(
@@ -185,72 +188,79 @@ class LeadTimeCalculator:
         cooispi_df: pd.DataFrame,
         mb51_df: pd.DataFrame,
         zrmm024_df: Optional[pd.DataFrame] = None,
-        zrsd004_df: Optional[pd.DataFrame] = None
+        zrsd004_df: Optional[pd.DataFrame] = None,
+        netting_state: Optional[pd.DataFrame] = None
     ):
         self.orders = cooispi_df
-        self.netting_engine = StackNettingEngine(mb51_df)
+        self.engine = LeadTimeEngine(mb51_df, zrmm024_df, zrsd004_df, netting_state)
+        self.netting_engine = self.engine.netting_engine
         self.movements = mb51_df
         self.po_data = zrmm024_df
         self.delivery_data = zrsd004_df
         
         self.classifier = OrderClassifier()
     
-    def _safe_days(self, date1: Optional[datetime], date2: Optional[datetime]) -> Optional[int]:
-        """Calculate days between two dates, handling None"""
-        if date1 is None or date2 is None:
-            return None
-        try:
-            if isinstance(date1, str):
-                date1 = pd.to_datetime(date1)
-            if isinstance(date2, str):
-                date2 = pd.to_datetime(date2)
-            return (date2 - date1).days
-        except:
-            return None
+    @staticmethod
+    def _column(orders: pd.DataFrame, *names: str) -> pd.Series:
+        """First non-null value among alternative column names (snake_case / COOISPI headers)"""
+        result = pd.Series(None, index=orders.index, dtype=object)
+        for name in names:
+            if name in orders.columns:
+                result = result.where(result.notna(), orders[name])
+        return result
     
-    def _find_po_date(self, batch: str, plant: int) -> Optional[datetime]:
-        """
-        Find PO Date from MB51 → ZRMM024
-        
-        CRITICAL: Only consider PO starting with '44' (sales orders)
-        """
-        if self.po_data is None:
-            return None
-        
-        # Find MVT 101 with PO starting with '44'
-        mvt_101 = self.movements[
-            (self.movements.get('col_6_batch', '') == batch) &
-            (self.movements.get('col_1_mvt_type', 0) == 101)
-        ]
-        
-        for _, row in mvt_101.iterrows():
-            po_number = row.get('col_15_purchase_order')
-            if self.classifier.is_sales_po(po_number):
-                # Find in ZRMM024
-                po_info = self.po_data[
-                    self.po_data.get('purch_order', '') == po_number
-                ]
-                if not po_info.empty:
-                    return pd.to_datetime(po_info.iloc[0].get('purch_date'))
-        
-        return None
+    def _compute(self, orders: pd.DataFrame, is_mto: pd.Series) -> pd.DataFrame:
+        """Engine input from COOISPI rows, then lead-time stages for all of them"""
+        frame = pd.DataFrame({
+            'batch': self._column(orders, 'batch', 'Batch'),
+            'plant': pd.to_numeric(self._column(orders, 'plant', 'Plant'), errors='coerce').fillna(0).astype(int),
+            'order': self._column(orders, 'order', 'Order'),
+            'release_date': self._column(orders, 'release_date_actual', 'Release date (actual)'),
+            'finish_date': self._column(orders, 'actual_finish_date', 'Actual finish date'),
+            'is_mto': is_mto,
+        }, index=orders.index)
+        result = self.engine.compute(frame, issue='last')
+        
+        # PO / GI dates only belong to MTO lead-times
+        result['po_date'] = result['po_date'].where(is_mto)
+        result['gi_date'] = result['gi_date'].where(is_mto)
+        result['status'] = orders.apply(self.classifier.get_order_status, axis=1) if len(orders) else []
+        result['is_valid'] = result['total_time'].notna()
+        return result
     
-    def _find_gi_date(self, batch: str, delivery_ref: str) -> Optional[datetime]:
-        """Find Actual GI Date from ZRSD004"""
-        if self.delivery_data is None:
-            return None
-        
-        if pd.isna(delivery_ref):
-            return None
-        
-        delivery = self.delivery_data[
-            self.delivery_data.get('delivery', '') == str(delivery_ref)
-        ]
-        
-        if not delivery.empty:
-            return pd.to_datetime(delivery.iloc[0].get('actual_gi_date'))
+    def _to_result(self, row: pd.Series) -> LeadTimeResult:
+        """One computed row → LeadTimeResult (NA → None)"""
+        def value(key):
+            v = row[key]
+            if pd.isna(v):
+                return None
+            return int(v) if key.endswith('_time') else v
         
-        return None
+        return LeadTimeResult(
+            batch=value('batch'),
+            order=value('order'),
+            order_type=row['order_type'],
+            preparation_time=value('preparation_time'),
+            production_time=value('production_time'),
+            transit_time=value('transit_time'),
+            storage_time=value('storage_time'),
+            delivery_time=value('delivery_time'),
+            total_time=value('total_time'),
+            po_date=value('po_date'),
+            release_date=value('release_date'),
+            finish_date=value('finish_date'),
+            receipt_date=value('receipt_date'),
+            issue_date=value('issue_date'),
+            gi_date=value('gi_date'),
+            status=row['status'],
+            is_valid=bool(row['is_valid']),
+            error_message=None
+        )
+    
+    def _calculate_one(self, order_row: pd.Series, is_mto: bool) -> LeadTimeResult:
+        orders = order_row.to_frame().T
+        result = self._compute(orders, pd.Series(is_mto, index=orders.index))
+        return self._to_result(result.iloc[0])
     
     def calculate_mts_leadtime(self, order_row: pd.Series) -> LeadTimeResult:
         """
@@ -261,48 +271,7 @@ class LeadTimeCalculator:
         2. Transit Time: Finish → Receipt (MVT 101)
         3. Storage Time: Receipt → Issue (MVT 601)
         """
-        batch = order_row.get('batch') or order_row.get('Batch')
-        plant = int(order_row.get('plant') or order_row.get('Plant') or 0)
-        order = order_row.get('order') or order_row.get('Order')
-        
-        release_date = pd.to_datetime(order_row.get('release_date_actual') or order_row.get('Release date (actual)'))
-        finish_date = pd.to_datetime(order_row.get('actual_finish_date') or order_row.get('Actual finish date'))
-        
-        # 1. Production Time
-        production_time = self._safe_days(release_date, finish_date)
-        
-        # 2. Receipt Date (MVT 101 after netting)
-        receipt_date = self.netting_engine.get_valid_receipt_date(batch, plant)
-        transit_time = self._safe_days(finish_date, receipt_date)
-        
-        # 3. Issue Date (MVT 601 after netting)
-        issue_date = self.netting_engine.get_valid_issue_date(batch, plant)
-        storage_time = self._safe_days(receipt_date, issue_date)
-        
-        # Total
-        times = [t for t in [production_time, transit_time, storage_time] if t is not None]
-        total_time = sum(times) if times else None
-        
-        return LeadTimeResult(
-            batch=batch,
-            order=order,
-            order_type='MTS',
-            preparation_time=None,  # N/A for MTS
-            production_time=production_time,
-            transit_time=transit_time,
-            storage_time=storage_time,
-            delivery_time=None,  # N/A for MTS
-            total_time=total_time,
-            po_date=None,
-            release_date=release_date,
-            finish_date=finish_date,
-            receipt_date=receipt_date,
-            issue_date=issue_date,
-            gi_date=None,
-            status=self.classifier.get_order_status(order_row),
-            is_valid=total_time is not None,
-            error_message=None
-        )
+        return self._calculate_one(order_row, is_mto=False)
     
     def calculate_mto_leadtime(self, order_row: pd.Series) -> LeadTimeResult:
         """
@@ -315,98 +284,25 @@ class LeadTimeCalculator:
         4. Storage Time: Receipt → Issue (MVT 601)
         5. Delivery Time: Issue → Actual GI Date
         """
-        batch = order_row.get('batch') or order_row.get('Batch')
-        plant = int(order_row.get('plant') or order_row.get('Plant') or 0)
-        order = order_row.get('order') or order_row.get('Order')
-        
-        release_date = pd.to_datetime(order_row.get('release_date_actual') or order_row.get('Release date (actual)'))
-        finish_date = pd.to_datetime(order_row.get('actual_finish_date') or order_row.get('Actual finish date'))
-        
-        # 1. PO Date (only for PO '44')
-        po_date = self._find_po_date(batch, plant)
-        preparation_time = self._safe_days(po_date, release_date)
-        
-        # 2. Production Time
-        production_time = self._safe_days(release_date, finish_date)
-        
-        # 3. Receipt Date
-        receipt_date = self.netting_engine.get_valid_receipt_date(batch, plant)
-        transit_time = self._safe_days(finish_date, receipt_date)
-        
-        # 4. Issue Date
-        issue_date = self.netting_engine.get_valid_issue_date(batch, plant)
-        storage_time = self._safe_days(receipt_date, issue_date)
-        
-        # 5. Delivery Time (from MVT 601 reference to ZRSD004)
-        delivery_ref = None
-        mvt_601 = self.movements[
-            (self.movements.get('col_6_batch', '') == batch) &
-            (self.movements.get('col_1_mvt_type', 0) == 601)
-        ]
-        if not mvt_601.empty:
-            delivery_ref = mvt_601.iloc[0].get('col_12_reference')
-        
-        gi_date = self._find_gi_date(batch, delivery_ref)
-        delivery_time = self._safe_days(issue_date, gi_date)
-        
-        # Total
-        times = [t for t in [preparation_time, production_time, transit_time, storage_time, delivery_time] if t is not None]
-        total_time = sum(times) if times else None
-        
-        return LeadTimeResult(
-            batch=batch,
-            order=order,
-            order_type='MTO',
-            preparation_time=preparation_time,
-            production_time=production_time,
-            transit_time=transit_time,
-            storage_time=storage_time,
-            delivery_time=delivery_time,
-            total_time=total_time,
-            po_date=po_date,
-            release_date=release_date,
-            finish_date=finish_date,
-            receipt_date=receipt_date,
-            issue_date=issue_date,
-            gi_date=gi_date,
-            status=self.classifier.get_order_status(order_row),
-            is_valid=total_time is not None,
-            error_message=None
-        )
+        return self._calculate_one(order_row, is_mto=True)
     
     def calculate_leadtime(self, order_row: pd.Series) -> LeadTimeResult:
         """
         Calculate lead-time for an order (auto-detect MTO/MTS)
         """
-        if self.classifier.is_mto(order_row):
-            return self.calculate_mto_leadtime(order_row)
-        else:
-            return self.calculate_mts_leadtime(order_row)
+        return self._calculate_one(order_row, is_mto=self.classifier.is_mto(order_row))
     
     def calculate_all_leadtimes(self) -> pd.DataFrame:
-        """Calculate lead-times for all orders"""
-        results = []
-        
-        for _, row in self.orders.iterrows():
-            result = self.calculate_leadtime(row)
-            results.append({
-                'batch': result.batch,
-                'order': result.order,
-                'order_type': result.order_type,
-                'status': result.status,
-                'preparation_time': result.preparation_time,
-                'production_time': result.production_time,
-                'transit_time': result.transit_time,
-                'storage_time': result.storage_time,
-                'delivery_time': result.delivery_time,
-                'total_time': result.total_time,
-                'po_date': result.po_date,
-                'release_date': result.release_date,
-                'finish_date': result.finish_date,
-                'receipt_date': result.receipt_date,
-                'issue_date': result.issue_date,
-                'gi_date': result.gi_date,
-                'is_valid': result.is_valid
-            })
-        
-        return pd.DataFrame(results)
+        """Calculate lead-times for all orders (single join-based pass)"""
+        if self.orders.empty:
+            return pd.DataFrame()
+        
+        is_mto = self.orders.apply(self.classifier.is_mto, axis=1).astype(bool)
+        result = self._compute(self.orders, is_mto)
+        return result[[
+            'batch', 'order', 'order_type', 'status',
+            'preparation_time', 'production_time', 'transit_time',
+            'storage_time', 'delivery_time', 'total_time',
+            'po_date', 'release_date', 'finish_date',
+            'receipt_date', 'issue_date', 'gi_date', 'is_valid'
+        ]].reset_index(drop=True)
@@ -1,13 +1,17 @@
 """
 Lead Time Analytics Service
 Provides stage breakdown and histogram analysis
+
+Aggregates (histogram, stage averages) read fact_lead_time_daily, the rollup
+refreshed at the end of Transformer.transform_lead_time.
 """
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from pydantic import BaseModel
 from datetime import datetime, date, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, case, cast, Numeric
 from sqlalchemy.orm import Session
-from src.db.models import FactLeadTime, DimMaterial
+from src.db.models import FactLeadTime, FactLeadTimeDaily, DimMaterial
+from src.config import LEADTIME_HISTOGRAM_BUCKETS
 
 
 class StageBreakdownItem(BaseModel):
@@ -30,6 +34,32 @@ class HistogramBucket(BaseModel):
     order_count: int
 
 
+class StageAverages(BaseModel):
+    """Average days per stage for an order category"""
+    order_category: str
+    avg_preparation: float
+    avg_production: float
+    avg_transit: float
+    avg_storage: float
+    avg_delivery: float
+    avg_total: float
+    order_count: int
+
+
+# Order categories of the stage averages (PURCHASE counts as MTS)
+STAGE_CATEGORIES = {'MTO': ['MTO'], 'MTS': ['MTS', 'PURCHASE']}
+
+
+def filter_end_date(query, start_date=None, end_date=None):
+    """Restrict a fact_lead_time_daily query to end_date in [start_date, end_date]"""
+    if start_date and end_date:
+        query = query.filter(
+            FactLeadTimeDaily.end_date >= start_date,
+            FactLeadTimeDaily.end_date <= end_date
+        )
+    return query
+
+
 class LeadTimeAnalytics:
     """Lead time analytics: stage breakdown & distribution"""
     
@@ -119,35 +149,81 @@ class LeadTimeAnalytics:
         
         return results
     
-    def get_leadtime_histogram(self) -> List[HistogramBucket]:
+    def get_stage_averages(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+    ) -> List[StageAverages]:
+        """
+        Average stage durations per category (MTO, MTS incl. PURCHASE)
+        
+        One query over fact_lead_time_daily (sums / order counts).
+        """
+        D = FactLeadTimeDaily
+        category = case(
+            *[(D.order_type.in_(types), name) for name, types in STAGE_CATEGORIES.items()]
+        ).label('category')
+        
+        def avg(column):
+            return cast(func.sum(column), Numeric) / func.nullif(func.sum(case((column.isnot(None), D.order_count))), 0)
+        
+        query = self.db.query(
+            category,
+            avg(D.sum_preparation_days),
+            avg(D.sum_production_days),
+            avg(D.sum_transit_days),
+            avg(D.sum_storage_days),
+            avg(D.sum_delivery_days),
+            avg(D.sum_lead_time_days),
+            func.sum(D.order_count)
+        ).filter(D.order_type.in_([t for types in STAGE_CATEGORIES.values() for t in types]))
+        rows = {r[0]: r for r in filter_end_date(query, start_date, end_date).group_by(category).all()}
+        
+        results = []
+        for name in STAGE_CATEGORIES:
+            row = rows.get(name, (name, None, None, None, None, None, None, 0))
+            results.append(StageAverages(
+                order_category=name,
+                avg_preparation=float(row[1] or 0),
+                avg_production=float(row[2] or 0),
+                avg_transit=float(row[3] or 0),
+                avg_storage=float(row[4] or 0),
+                avg_delivery=float(row[5] or 0),
+                avg_total=float(row[6] or 0),
+                order_count=int(row[7] or 0)
+            ))
+        return results
+    
+    def get_leadtime_histogram(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        buckets: Optional[List[Tuple[int, int, str]]] = None
+    ) -> List[HistogramBucket]:
         """
         Create histogram of lead time distribution
         
-        Buckets: 0-3, 4-7, 8-14, 15-21, 22-30, >30 days
+        Buckets: LEADTIME_HISTOGRAM_BUCKETS (default 0-3, 4-7, 8-14, 15-21, 22-30, >30 days),
+        counted in one query over fact_lead_time_daily
         
         Returns:
             List of histogram buckets with order counts
         """
-        buckets_def = [
-            (0, 3, '0-3 days'),
-            (4, 7, '4-7 days'),
-            (8, 14, '8-14 days'),
-            (15, 21, '15-21 days'),
-            (22, 30, '22-30 days'),
-            (31, 999, '>30 days'),
-        ]
+        buckets_def = buckets or LEADTIME_HISTOGRAM_BUCKETS
+        D = FactLeadTimeDaily
         
-        results = []
-        for min_days, max_days, label in buckets_def:
-            count = self.db.query(func.count(FactLeadTime.id)).filter(
-                FactLeadTime.lead_time_days.between(min_days, max_days)
-            ).scalar() or 0
-            
-            results.append(HistogramBucket(
+        bucket = case(
+            *[(D.lead_time_days.between(min_days, max_days), i) for i, (min_days, max_days, _) in enumerate(buckets_def)]
+        ).label('bucket')
+        query = self.db.query(bucket, func.sum(D.order_count)).filter(D.lead_time_days.isnot(None))
+        counts = dict(filter_end_date(query, start_date, end_date).group_by(bucket).all())
+        
+        return [
+            HistogramBucket(
                 range_label=label,
                 min_days=min_days,
                 max_days=max_days,
-                order_count=count
-            ))
-        
-        return results
+                order_count=int(counts.get(i) or 0)
+            )
+            for i, (min_days, max_days, label) in enumerate(buckets_def)
+        ]
@@ -0,0 +1,205 @@
+"""
+Lead-time Engine - join-based lead-time stages for a whole frame of orders
+
+Shared by business_logic.LeadTimeCalculator and
+leadtime_calculator.LeadTimeCalculator (both are thin facades):
+1. Per-batch date lookups built once from MB51:
+   - Receipt / issue dates from the persisted netting (fact_batch_netting via
+     Transformer.load_batch_netting) when given, else StackNettingEngine.net_all_batches
+     over the frame (101/102, 601/602)
+   - PO date: first MVT 101 with a sales PO ('44') found in ZRMM024
+   - GI date: reference of the first MVT 601 → ZRSD004 actual GI date
+2. Orders merged with the lookups, stage durations as column arithmetic
+3. Status thresholds applied with np.select
+
+Stages (days):
+- Preparation: PO Date → Release (MTO only)
+- Production:  Release → Finish
+- Transit:     Finish → Receipt (MVT 101)
+- Storage:     Receipt → Issue (MVT 601)
+- Delivery:    Issue → Actual GI Date (MTO only)
+"""
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from src.core.netting import StackNettingEngine
+
+
+# Target lead-time per order type (days) and tolerance before CRITICAL
+LEADTIME_TARGET_DAYS = {'MTS': 14, 'MTO': 21}
+DELAYED_TOLERANCE = 1.2  # 20% over target = DELAYED, beyond = CRITICAL
+
+STAGE_COLUMNS = ['preparation_time', 'production_time', 'transit_time', 'storage_time', 'delivery_time']
+
+# fact_inventory column names → raw_mb51 names expected by StackNettingEngine
+FACT_TO_RAW_COLUMNS = {
+    'posting_date': 'col_0_posting_date',
+    'mvt_type': 'col_1_mvt_type',
+    'plant_code': 'col_2_plant',
+    'material_code': 'col_4_material',
+    'batch': 'col_6_batch',
+    'qty': 'col_7_qty',
+    'material_document': 'col_11_material_doc',
+    'reference': 'col_12_reference',
+    'purchase_order': 'col_15_purchase_order',
+}
+
+
+def leadtime_status(total_days: pd.Series, target_days) -> np.ndarray:
+    """
+    Vectorized lead-time status
+
+    Returns: UNKNOWN (missing / 0), ON_TIME (<= target),
+             DELAYED (<= target * 1.2) or CRITICAL
+    """
+    total = pd.to_numeric(total_days, errors='coerce').astype(float)
+    target = np.asarray(target_days, dtype=float)
+    return np.select(
+        [
+            total.isna() | (total == 0),
+            total <= target,
+            total <= target * DELAYED_TOLERANCE,
+        ],
+        ['UNKNOWN', 'ON_TIME', 'DELAYED'],
+        default='CRITICAL'
+    )
+
+
+def _days(start: pd.Series, end: pd.Series) -> pd.Series:
+    """Whole days between two date columns (NA if either is missing)"""
+    return (pd.to_datetime(end) - pd.to_datetime(start)).dt.days.astype('Int64')
+
+
+class LeadTimeEngine:
+    """
+    Join-based lead-time calculation
+
+    Accepts MB51 movements with raw_mb51 (col_*) or fact_inventory column names.
+    netting_state: persisted 101/102 and 601/602 netting rows
+    (Transformer.load_batch_netting); without it the frame is netted in memory.
+    Lookups are built lazily once and reused for every compute() call.
+    """
+
+    def __init__(
+        self,
+        mb51_df: pd.DataFrame,
+        zrmm024_df: Optional[pd.DataFrame] = None,
+        zrsd004_df: Optional[pd.DataFrame] = None,
+        netting_state: Optional[pd.DataFrame] = None
+    ):
+        if 'col_1_mvt_type' not in mb51_df.columns:
+            mb51_df = mb51_df.rename(columns=FACT_TO_RAW_COLUMNS)
+        self.netting_engine = StackNettingEngine(mb51_df)
+        self.movements = self.netting_engine.df
+        self.netting_state = netting_state
+        self.po_data = zrmm024_df
+        self.delivery_data = zrsd004_df
+
+        self._receipts = None
+        self._issues = None
+        self._po_dates = None
+        self._gi_dates = None
+
+    def _netted(self, mvt_forward: int, mvt_reverse: int) -> pd.DataFrame:
+        """Surviving (not fully reversed) netting rows of one MVT pair, persisted or in memory"""
+        if self.netting_state is None:
+            netted = self.netting_engine.net_all_batches(mvt_forward, mvt_reverse)
+        else:
+            state = self.netting_state
+            netted = state[(state['forward_mvt'] == mvt_forward) & (state['reverse_mvt'] == mvt_reverse)]
+        netted = netted[~netted['is_fully_reversed'].astype(bool)]
+        return netted.assign(plant=pd.to_numeric(netted['plant'], errors='coerce').astype('Int64'))
+
+    @property
+    def receipts(self) -> pd.DataFrame:
+        """(batch, plant) → first valid MVT 101 date after 101/102 netting"""
+        if self._receipts is None:
+            netted = self._netted(101, 102)
+            self._receipts = netted[['batch', 'plant', 'first_valid_date']].rename(columns={'first_valid_date': 'receipt_date'})
+        return self._receipts
+
+    @property
+    def issues(self) -> pd.DataFrame:
+        """(batch, plant) → first / last valid MVT 601 date after 601/602 netting"""
+        if self._issues is None:
+            netted = self._netted(601, 602)
+            self._issues = netted[['batch', 'plant', 'first_valid_date', 'last_valid_date']].rename(columns={'first_valid_date': 'first_issue_date', 'last_valid_date': 'last_issue_date'})
+        return self._issues
+
+    @property
+    def po_dates(self) -> pd.DataFrame:
+        """batch → PO date of the first MVT 101 whose sales PO ('44') exists in ZRMM024"""
+        if self._po_dates is None:
+            self._po_dates = pd.DataFrame(columns=['batch', 'po_date'])
+            mv = self.movements
+            if self.po_data is not None and not self.po_data.empty and 'purchase_order' in mv.columns:
+                po = mv['purchase_order']
+                is_sales_po = po.notna() & po.astype(str).str.strip().str.startswith('44')
+                receipts = mv[(mv['mvt_type'] == 101) & is_sales_po & mv['batch'].notna()]
+
+                po_date_map = self.po_data.drop_duplicates('purch_order').set_index('purch_order')['purch_date']
+                matched = receipts.assign(po_date=pd.to_datetime(receipts['purchase_order'].map(po_date_map)))
+                matched = matched[matched['po_date'].notna()]
+                self._po_dates = matched.drop_duplicates('batch')[['batch', 'po_date']]
+        return self._po_dates
+
+    @property
+    def gi_dates(self) -> pd.DataFrame:
+        """batch → actual GI date of the delivery referenced by the first MVT 601"""
+        if self._gi_dates is None:
+            self._gi_dates = pd.DataFrame(columns=['batch', 'gi_date'])
+            mv = self.movements
+            if self.delivery_data is not None and not self.delivery_data.empty and 'reference' in mv.columns:
+                first_issue = mv[(mv['mvt_type'] == 601) & mv['batch'].notna()].drop_duplicates('batch')
+                refs = first_issue['reference'].where(first_issue['reference'].isna(), first_issue['reference'].astype(str))
+
+                gi_map = self.delivery_data.drop_duplicates('delivery').set_index('delivery')['actual_gi_date']
+                first_issue = first_issue.assign(gi_date=pd.to_datetime(refs.map(gi_map)))
+                self._gi_dates = first_issue[first_issue['gi_date'].notna()][['batch', 'gi_date']]
+        return self._gi_dates
+
+    def compute(self, orders: pd.DataFrame, issue: str = 'last') -> pd.DataFrame:
+        """
+        Lead-time stages for all orders at once
+
+        Args:
+            orders: Columns batch, plant, release_date, finish_date, is_mto
+            issue: 'last' or 'first' valid MVT 601 as the issue date
+
+        Returns:
+            orders (same index) + po_date, receipt_date, issue_date, gi_date,
+            stage columns (Int64 days), total_time, order_type, leadtime_status
+        """
+        df = orders.copy()
+        df['batch'] = df['batch'].astype(object)
+        df['plant'] = pd.to_numeric(df['plant'], errors='coerce').astype('Int64')
+        df['release_date'] = pd.to_datetime(df['release_date'], errors='coerce')
+        df['finish_date'] = pd.to_datetime(df['finish_date'], errors='coerce')
+        is_mto = df['is_mto'].fillna(False).astype(bool)
+
+        issues = self.issues.rename(columns={f'{issue}_issue_date': 'issue_date'})[['batch', 'plant', 'issue_date']]
+        keys = ['batch', 'plant']
+        # Lookups are unique per key → left merges keep one row per order, in order
+        df = (
+            df.merge(self.receipts, on=keys, how='left')
+            .merge(issues, on=keys, how='left')
+            .merge(self.po_dates, on='batch', how='left')
+            .merge(self.gi_dates, on='batch', how='left')
+        )
+        df.index = orders.index
+        is_mto.index = df.index
+        for col in ('receipt_date', 'issue_date', 'po_date', 'gi_date'):
+            df[col] = pd.to_datetime(df[col])
+
+        df['preparation_time'] = _days(df['po_date'], df['release_date']).where(is_mto)
+        df['production_time'] = _days(df['release_date'], df['finish_date'])
+        df['transit_time'] = _days(df['finish_date'], df['receipt_date'])
+        df['storage_time'] = _days(df['receipt_date'], df['issue_date'])
+        df['delivery_time'] = _days(df['issue_date'], df['gi_date']).where(is_mto)
+        df['total_time'] = df[STAGE_COLUMNS].sum(axis=1, min_count=1).astype('Int64')
+
+        df['order_type'] = np.where(is_mto, 'MTO', 'MTS')
+        target = df['order_type'].map(LEADTIME_TARGET_DAYS)
+        df['leadtime_status'] = leadtime_status(df['total_time'], target)
+        return df
@@ -6,6 +6,7 @@ Implements "Cặp Đôi Bù Trừ" principle using Stack (LIFO) algorithm
 - 601 (GI for Delivery) ↔ 602 (Reversal)
 """
 import pandas as pd
+import numpy as np
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 from dataclasses import dataclass
@@ -28,7 +29,7 @@ class NettingResult:
     
     # After netting
     remaining_forward: int
-    netted_count: int
+    netted_count: int  # Forwards cancelled (total_forward - remaining_forward); unmatched reverses excluded
     
     # Valid transactions after netting
     remaining_transactions: pd.DataFrame
@@ -173,7 +174,7 @@ class StackNettingEngine:
             total_forward=total_forward,
             total_reverse=total_reverse,
             remaining_forward=len(stack),
-            netted_count=min(total_forward, total_reverse),
+            netted_count=total_forward - len(stack),  # Reverses on an empty stack cancel nothing
             remaining_transactions=remaining_df,
             last_valid_date=last_valid_date,
             net_quantity=net_quantity,
@@ -251,6 +252,113 @@ class StackNettingEngine:
             return None
         return result.last_valid_date
     
+    def _flag_valid_movements(
+        self,
+        mvt_forward: int = 601,
+        mvt_reverse: int = 602,
+        plant: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Single-pass LIFO netting over ALL (plant, batch) groups
+        
+        Sorts once by (plant, batch, posting_date) and replaces the per-batch
+        stack with its closed form. With s = +1 (forward) / -1 (reverse):
+        - stack height  h = cumsum(s) - min(0, cummin(cumsum(s)))
+          (a reverse on an empty stack is ignored)
+        - the forward pushed at height h survives iff the height never drops
+          below h afterwards: min(h[later rows]) >= h
+        
+        Returns: Sorted forward/reverse rows with 'is_valid' (surviving forward)
+        """
+        df = self.df[
+            self.df['mvt_type'].isin([mvt_forward, mvt_reverse])
+            & self.df['batch'].notna()
+            & self.df['plant'].notna()
+        ]
+        if plant:
+            df = df[df['plant'] == plant]
+        
+        # Stable sort keeps original order for equal posting dates
+        df = df.sort_values(['plant', 'batch', 'posting_date'], kind='mergesort')
+        keys = [df['plant'], df['batch']]
+        
+        is_forward = (df['mvt_type'] == mvt_forward).to_numpy(dtype=bool)
+        step = pd.Series(is_forward.astype(int) * 2 - 1, index=df.index)
+        
+        running = step.groupby(keys).cumsum()
+        height = running - running.groupby(keys).cummin().clip(upper=0)
+        
+        # Min height over LATER rows of the same group (+inf for the last row)
+        reversed_height = height.iloc[::-1]
+        suffix_min = reversed_height.groupby([k.iloc[::-1] for k in keys]).cummin().iloc[::-1]
+        later_min = suffix_min.groupby(keys).shift(-1).fillna(float('inf'))
+        
+        result = df.copy()
+        result['is_valid'] = is_forward & (later_min >= height).to_numpy()
+        return result
+    
+    def net_all_batches(
+        self,
+        mvt_forward: int = 601,
+        mvt_reverse: int = 602,
+        plant: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Bulk equivalent of apply_stack_netting for every (plant, batch) at once
+        
+        Returns DataFrame (one row per plant/batch with forward or reverse
+        movements) with NettingResult fields:
+        - batch, plant, material, forward_mvt, reverse_mvt
+        - total_forward, total_reverse, remaining_forward, netted_count
+        - last_valid_date, first_valid_date, net_quantity, is_fully_reversed
+        """
+        columns = [
+            'batch', 'plant', 'material', 'forward_mvt', 'reverse_mvt',
+            'total_forward', 'total_reverse', 'remaining_forward', 'netted_count',
+            'last_valid_date', 'first_valid_date', 'net_quantity', 'is_fully_reversed'
+        ]
+        flagged = self._flag_valid_movements(mvt_forward, mvt_reverse, plant)
+        if flagged.empty:
+            return pd.DataFrame(columns=columns)
+        
+        keys = ['plant', 'batch']
+        valid = flagged[flagged['is_valid']]
+        
+        summary = flagged.assign(
+            is_fwd=flagged['mvt_type'] == mvt_forward,
+            is_rev=flagged['mvt_type'] == mvt_reverse,
+        ).groupby(keys, sort=False).agg(
+            total_forward=('is_fwd', 'sum'),
+            total_reverse=('is_rev', 'sum'),
+        )
+        survivors = valid.groupby(keys, sort=False).agg(
+            remaining_forward=('is_valid', 'size'),
+            last_valid_date=('posting_date', 'max'),
+            first_valid_date=('posting_date', 'min'),
+            net_quantity=('qty', 'sum'),
+        )
+        # Material = first row of the batch in original (unsorted) order
+        material = flagged.sort_index().drop_duplicates(keys).set_index(keys)['material']
+        
+        result = summary.join(survivors).join(material).reset_index()
+        result['remaining_forward'] = result['remaining_forward'].fillna(0).astype(int)
+        result['net_quantity'] = result['net_quantity'].fillna(0).abs()
+        result['netted_count'] = result['total_forward'] - result['remaining_forward']
+        result['is_fully_reversed'] = result['remaining_forward'] == 0
+        result['forward_mvt'] = mvt_forward
+        result['reverse_mvt'] = mvt_reverse
+        return result[columns]
+    
+    def get_valid_movements(
+        self,
+        mvt_forward: int = 601,
+        mvt_reverse: int = 602,
+        plant: Optional[int] = None
+    ) -> pd.DataFrame:
+        """Forward movements surviving LIFO netting, for all batches"""
+        flagged = self._flag_valid_movements(mvt_forward, mvt_reverse, plant)
+        return flagged[flagged['is_valid']].drop(columns='is_valid')
+    
     def get_all_batches(self, plant: Optional[int] = None) -> List[str]:
         """Get all unique batches, optionally filtered by plant"""
         if plant:
@@ -271,38 +379,73 @@ class StackNettingEngine:
         - total_forward, total_reverse, remaining, netted
         - last_valid_date, net_quantity, is_fully_reversed
         """
-        results = []
-        
         # Get unique batch-plant combinations
         if plant:
             combinations = self.df[self.df['plant'] == plant][['batch', 'plant']].drop_duplicates()
         else:
             combinations = self.df[['batch', 'plant']].drop_duplicates()
+        combinations = combinations.dropna()
+        
+        # Single pass over all batches (batches without forward/reverse rows → empty result)
+        netted = self.net_all_batches(mvt_forward, mvt_reverse, plant)
+        result = combinations.merge(netted, on=['batch', 'plant'], how='left')
+        
+        no_movements = result['total_forward'].isna()
+        result.loc[no_movements, 'material'] = ''
+        for col in ('total_forward', 'total_reverse', 'remaining_forward', 'netted_count'):
+            result[col] = result[col].fillna(0).astype(int)
+        result['net_quantity'] = result['net_quantity'].fillna(0)
+        result['is_fully_reversed'] = result['is_fully_reversed'].fillna(True).astype(bool)
+        result['plant'] = result['plant'].astype(int)
+        result['status'] = np.where(result['is_fully_reversed'], 'FULLY_REVERSED', 'ACTIVE')
         
-        for _, row in combinations.iterrows():
-            batch = row['batch']
-            plant_code = row['plant']
-            
-            if pd.isna(batch) or pd.isna(plant_code):
-                continue
-            
-            result = self.apply_stack_netting(batch, int(plant_code), mvt_forward, mvt_reverse)
-            
-            results.append({
-                'batch': result.batch,
-                'plant': result.plant,
-                'material': result.material,
-                'total_forward': result.total_forward,
-                'total_reverse': result.total_reverse,
-                'remaining': result.remaining_forward,
-                'netted_count': result.netted_count,
-                'last_valid_date': result.last_valid_date,
-                'net_quantity': result.net_quantity,
-                'is_fully_reversed': result.is_fully_reversed,
-                'status': 'FULLY_REVERSED' if result.is_fully_reversed else 'ACTIVE'
-            })
-        
-        return pd.DataFrame(results)
+        return result.rename(columns={'remaining_forward': 'remaining'})[[
+            'batch', 'plant', 'material', 'total_forward', 'total_reverse',
+            'remaining', 'netted_count', 'last_valid_date', 'net_quantity',
+            'is_fully_reversed', 'status'
+        ]].reset_index(drop=True)
+
+
+# Forward/reverse pairs netted and persisted (forward = lower MVT code)
+NETTING_PAIRS = sorted((fwd, rev) for fwd, rev in MVT_REVERSAL_PAIRS.items() if fwd < rev)
+
+
+def extend_stack(
+    stack: List[Dict],
+    movements: pd.DataFrame,
+    mvt_forward: int,
+    mvt_reverse: int
+) -> Tuple[List[Dict], int, int]:
+    """
+    Continue a persisted LIFO stack with newer movements
+    
+    Args:
+        stack: Surviving forward movements (oldest first), modified in place
+        movements: New rows in posting order (raw_id, posting_date, mvt_type, qty, material_doc)
+    
+    Returns: (stack, forward_count, reverse_count)
+    """
+    forward_count = 0
+    reverse_count = 0
+    for row in movements.itertuples(index=False):
+        if row.mvt_type == mvt_forward:
+            stack.append(stack_entry(row.raw_id, row.posting_date, row.qty, row.material_doc))
+            forward_count += 1
+        elif row.mvt_type == mvt_reverse:
+            if stack:
+                stack.pop()  # LIFO: cancel most recent
+            reverse_count += 1
+    return stack, forward_count, reverse_count
+
+
+def stack_entry(raw_id, posting_date, qty, material_doc) -> Dict:
+    """JSON-serializable surviving stack item"""
+    return {
+        'raw_id': int(raw_id),
+        'posting_date': None if pd.isna(posting_date) else pd.Timestamp(posting_date).isoformat(),
+        'qty': None if pd.isna(qty) else float(qty),
+        'material_doc': None if pd.isna(material_doc) else str(material_doc),
+    }
 
 
 def get_stock_impact(mvt_type: int) -> int:
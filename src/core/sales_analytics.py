@@ -1,13 +1,155 @@
 """
 Sales Analytics Service
 Provides customer segmentation and churn risk analysis
+
+Each method is one set-based query: thresholds (medians, top quartile) are
+percentile_cont aggregates in PostgreSQL, not Python sorts, and churn risk
+compares the months with FILTERed aggregates instead of one query per
+customer. The SQL builders take their source so
+scripts/benchmark_sales_analytics.py can run them on a synthetic table.
 """
 from typing import List, Tuple, Optional
 from pydantic import BaseModel
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, and_
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from src.db.models import FactBilling
+
+
+# (customer_name, so_number, net_value) of [:start, :end_before) - whole months
+# from fact_sales_monthly, the partial edges from fact_sales_daily; both keep
+# so_number, so order counts stay exact (unique sales orders, not billing documents)
+PERIOD_LINES_SQL = """
+    SELECT customer_name, so_number, net_value
+    FROM fact_sales_monthly
+    WHERE billing_month >= :month_start AND billing_month < :month_end_before
+    UNION ALL
+    SELECT customer_name, so_number, net_value
+    FROM fact_sales_daily
+    WHERE billing_date >= :start AND billing_date < :end_before
+      AND (billing_date < :month_start OR billing_date >= :month_end_before)
+"""
+
+# Segment color mapping
+SEGMENT_COLORS = {
+    'VIP': '#3B82F6',
+    'LOYAL': '#F59E0B',
+    'HIGH_VALUE': '#10B981',
+    'CASUAL': '#94A3B8'
+}
+
+
+def period_bounds(start_date: date, end_date: date) -> Tuple[date, date]:
+    """Inclusive [start_date, end_date] as half-open [start, end_before)"""
+    return start_date, end_date + timedelta(days=1)
+
+
+def whole_months(start: date, end_before: date) -> Tuple[date, date]:
+    """
+    [month_start, month_end_before) of the calendar months fully inside
+    [start, end_before); empty (month_start >= month_end_before) if none
+    """
+    if start.day == 1:
+        month_start = start
+    else:
+        month_start = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return month_start, end_before.replace(day=1)
+
+
+def period_params(start_date: date, end_date: date) -> dict:
+    """Bind parameters of PERIOD_LINES_SQL for the inclusive [start_date, end_date]"""
+    start, end_before = period_bounds(start_date, end_date)
+    month_start, month_end_before = whole_months(start, end_before)
+    return {
+        'start': start,
+        'end_before': end_before,
+        'month_start': month_start,
+        'month_end_before': month_end_before,
+    }
+
+
+def churn_periods(today: date) -> dict:
+    """Bounds of churn_risk_sql: previous month, last month (to yesterday), current month"""
+    last_start = (today - timedelta(days=30)).replace(day=1)
+    return {
+        'previous_start': (last_start - timedelta(days=30)).replace(day=1),
+        'last_start': last_start,
+        'current_start': today.replace(day=1),
+        'today': today,
+    }
+
+
+def segments_sql(lines_sql: str = PERIOD_LINES_SQL) -> str:
+    """Per customer: order frequency + revenue over `lines_sql`"""
+    return f"""
+        SELECT customer_name, COUNT(DISTINCT so_number) as order_frequency, SUM(net_value) as total_revenue
+        FROM ({lines_sql}) lines
+        GROUP BY customer_name
+    """
+
+
+def classified_segments_sql(lines_sql: str = PERIOD_LINES_SQL) -> str:
+    """segments_sql + VIP / LOYAL / HIGH_VALUE / CASUAL against the medians (percentile_cont)"""
+    return f"""
+        WITH segments AS ({segments_sql(lines_sql)}),
+        thresholds AS (
+            SELECT 
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY COALESCE(total_revenue, 0)) as median_rev,
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY order_frequency) as median_freq
+            FROM segments
+        )
+        SELECT 
+            s.customer_name,
+            s.order_frequency,
+            COALESCE(s.total_revenue, 0) as total_revenue,
+            CASE 
+                WHEN s.order_frequency >= t.median_freq AND COALESCE(s.total_revenue, 0) >= t.median_rev THEN 'VIP'
+                WHEN s.order_frequency >= t.median_freq THEN 'LOYAL'
+                WHEN COALESCE(s.total_revenue, 0) >= t.median_rev THEN 'HIGH_VALUE'
+                ELSE 'CASUAL'
+            END as segment_class,
+            t.median_rev,
+            t.median_freq
+        FROM segments s
+        CROSS JOIN thresholds t
+    """
+
+
+def churn_risk_sql(source: str = 'fact_billing') -> str:
+    """
+    Churn-risk customers of `source` in one pass over billing_date >= :previous_start
+    
+    - last_rev: revenue in [:last_start, :today) (the window used for the threshold)
+    - threshold: 75th percentile of last_rev (max when under 4 customers)
+    - at risk: last_rev >= threshold and no billing since :current_start
+    """
+    return f"""
+        WITH customers AS (
+            SELECT 
+                customer_name,
+                SUM(net_value) FILTER (WHERE billing_date >= :last_start AND billing_date < :today) as last_rev,
+                SUM(net_value) FILTER (WHERE billing_date < :last_start) as previous_rev,
+                BOOL_OR(billing_date >= :current_start) as billed_this_month
+            FROM {source}
+            WHERE billing_date >= :previous_start
+              AND customer_name IS NOT NULL
+            GROUP BY customer_name
+        ),
+        threshold AS (
+            SELECT 
+                CASE WHEN COUNT(*) < 4 THEN MAX(last_rev)
+                     ELSE percentile_cont(0.75) WITHIN GROUP (ORDER BY last_rev)
+                END as revenue
+            FROM customers
+            WHERE last_rev <> 0
+        )
+        SELECT c.customer_name, c.last_rev, COALESCE(c.previous_rev, 0) as previous_rev
+        FROM customers c
+        CROSS JOIN threshold t
+        WHERE c.last_rev >= t.revenue
+          AND NOT c.billed_this_month
+        ORDER BY c.last_rev DESC, c.customer_name
+        LIMIT :limit
+    """
 
 
 class CustomerSegment(BaseModel):
@@ -31,6 +173,15 @@ class SalesAnalytics:
     def __init__(self, db: Session):
         self.db = db
     
+    @staticmethod
+    def _default_period(start_date: Optional[date], end_date: Optional[date]) -> Tuple[date, date]:
+        """Default to current month if not specified"""
+        if end_date is None:
+            end_date = datetime.utcnow().date()
+        if start_date is None:
+            start_date = end_date.replace(day=1)
+        return start_date, end_date
+    
     def get_customer_segmentation_with_classification(
         self,
         start_date: Optional[date] = None,
@@ -46,50 +197,23 @@ class SalesAnalytics:
         Returns:
             List of customers with frequency, revenue AND segment_class (VIP/LOYAL/HIGH_VALUE/CASUAL)
         """
-        # Get base segmentation
-        segments = self.get_customer_segmentation(start_date, end_date)
+        rows = self.db.execute(
+            text(classified_segments_sql()),
+            period_params(*self._default_period(start_date, end_date))
+        ).fetchall()
         
-        if not segments:
-            return []
-        
-        # Calculate thresholds from data
-        revenues = sorted([s.total_revenue for s in segments])
-        frequencies = sorted([s.order_frequency for s in segments])
-        
-        median_rev = revenues[len(revenues) // 2]
-        median_freq = frequencies[len(frequencies) // 2]
-        
-        # Segment color mapping
-        segment_colors = {
-            'VIP': '#3B82F6',
-            'LOYAL': '#F59E0B',
-            'HIGH_VALUE': '#10B981',
-            'CASUAL': '#94A3B8'
-        }
-        
-        # Classify each customer
-        result = []
-        for seg in segments:
-            if seg.order_frequency >= median_freq and seg.total_revenue >= median_rev:
-                classification = 'VIP'
-            elif seg.order_frequency >= median_freq and seg.total_revenue < median_rev:
-                classification = 'LOYAL'
-            elif seg.order_frequency < median_freq and seg.total_revenue >= median_rev:
-                classification = 'HIGH_VALUE'
-            else:
-                classification = 'CASUAL'
-            
-            result.append({
-                'customer_name': seg.customer_name,
-                'order_frequency': seg.order_frequency,
-                'total_revenue': seg.total_revenue,
-                'segment_class': classification,
-                'segment_color': segment_colors[classification],
-                'revenue_threshold': median_rev,
-                'frequency_threshold': median_freq
-            })
-        
-        return result
+        return [
+            {
+                'customer_name': r.customer_name,
+                'order_frequency': r.order_frequency,
+                'total_revenue': float(r.total_revenue),
+                'segment_class': r.segment_class,
+                'segment_color': SEGMENT_COLORS[r.segment_class],
+                'revenue_threshold': float(r.median_rev),
+                'frequency_threshold': float(r.median_freq)
+            }
+            for r in rows
+        ]
     
     def get_customer_segmentation(
         self,
@@ -106,26 +230,10 @@ class SalesAnalytics:
         Returns:
             List of customers with frequency and revenue for scatter plot
         """
-        # Default to current month if not specified
-        if end_date is None:
-            end_date = datetime.utcnow().date()
-        if start_date is None:
-            start_date = end_date.replace(day=1)
-        
-        # Fixed: Count unique sales orders (so_number), not billing documents
-        query = self.db.query(
-            FactBilling.customer_name,
-            func.count(func.distinct(FactBilling.so_number)).label('order_count'),
-            func.sum(FactBilling.net_value).label('total_revenue')
-        )
-        
-        # Apply date filter on billing_date
-        query = query.filter(
-            FactBilling.billing_date >= start_date,
-            FactBilling.billing_date <= end_date
-        )
-        
-        results = query.group_by(FactBilling.customer_name).all()
+        results = self.db.execute(
+            text(segments_sql()),
+            period_params(*self._default_period(start_date, end_date))
+        ).fetchall()
         
         return [
             CustomerSegment(
@@ -148,85 +256,19 @@ class SalesAnalytics:
             limit: Number of at-risk customers to return
         
         Returns:
-            List of churn-risk customers
+            List of churn-risk customers (highest last-month revenue first)
         """
-        now = datetime.utcnow().date()
-        last_month_start = (now - timedelta(days=30)).replace(day=1)
-        last_month_end = (now - timedelta(days=1))
-        current_month_start = now.replace(day=1)
-        
-        # Get customers with revenue in last month
-        last_month_revenue = self.db.query(
-            FactBilling.customer_name,
-            func.sum(FactBilling.net_value).label('revenue')
-        ).filter(
-            and_(
-                FactBilling.billing_date >= last_month_start,
-                FactBilling.billing_date <= last_month_end
-            )
-        ).group_by(
-            FactBilling.customer_name
-        ).subquery()
-        
-        # Get top quartile threshold (75th percentile)
-        revenue_data = self.db.query(last_month_revenue.c.revenue).all()
-        if not revenue_data:
-            return []
-        
-        revenues = sorted([r[0] for r in revenue_data if r[0]])
-        if len(revenues) < 4:
-            threshold = revenues[-1] if revenues else 0
-        else:
-            threshold = revenues[int(len(revenues) * 0.75)]
-        
-        # Get customers with high revenue last month
-        high_revenue_customers = self.db.query(
-            last_month_revenue.c.customer_name,
-            last_month_revenue.c.revenue
-        ).filter(
-            last_month_revenue.c.revenue >= threshold
-        ).subquery()
+        rows = self.db.execute(
+            text(churn_risk_sql()),
+            {**churn_periods(datetime.utcnow().date()), 'limit': limit}
+        ).fetchall()
         
-        # Check if they have orders this month
-        current_month_orders = self.db.query(
-            FactBilling.customer_name
-        ).filter(
-            FactBilling.billing_date >= current_month_start
-        ).distinct().subquery()
-        
-        # Find those NOT in current month (churn risk)
-        at_risk = self.db.query(
-            high_revenue_customers.c.customer_name,
-            high_revenue_customers.c.revenue
-        ).filter(
-            ~high_revenue_customers.c.customer_name.in_(
-                self.db.query(current_month_orders)
+        return [
+            ChurnRiskCustomer(
+                customer_name=r.customer_name,
+                last_month_revenue=float(r.last_rev or 0),
+                previous_month_revenue=float(r.previous_rev or 0),
+                revenue_trend='CHURN_RISK' if r.last_rev > 0 else 'DECLINING'
             )
-        ).limit(limit).all()
-        
-        # Get previous month revenue for comparison
-        previous_month_start = (last_month_start - timedelta(days=30)).replace(day=1)
-        previous_month_end = (last_month_start - timedelta(days=1))
-        
-        results = []
-        for customer_name, last_month_rev in at_risk:
-            prev_month_rev = self.db.query(
-                func.sum(FactBilling.net_value)
-            ).filter(
-                and_(
-                    FactBilling.customer_name == customer_name,
-                    FactBilling.billing_date >= previous_month_start,
-                    FactBilling.billing_date <= previous_month_end
-                )
-            ).scalar() or 0
-            
-            trend = 'CHURN_RISK' if last_month_rev > 0 else 'DECLINING'
-            
-            results.append(ChurnRiskCustomer(
-                customer_name=customer_name,
-                last_month_revenue=float(last_month_rev or 0),
-                previous_month_revenue=float(prev_month_rev or 0),
-                revenue_trend=trend
-            ))
-        
-        return results
+            for r in rows
+        ]
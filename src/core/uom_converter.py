@@ -3,11 +3,21 @@ UOM Conversion - PC to KG normalization
 
 Uses billing data as source of truth for KG/PC ratio:
 Formula: Sum(Net Weight) / Sum(Billing Qty) per Material
+
+The persisted table (dim_uom_conversion) is cached once per process and
+reloaded only when its version (row count + last_updated) changes.
 """
+import threading
 import pandas as pd
 import numpy as np
 from typing import Dict, Optional, Tuple
 from dataclasses import dataclass
+from sqlalchemy import text
+
+
+# Process-wide cache of dim_uom_conversion, shared by all UomConverter instances
+_DIM_CACHE: Dict = {'version': None, 'table': {}}
+_DIM_CACHE_LOCK = threading.Lock()
 
 
 @dataclass
@@ -32,10 +42,66 @@ class UomConverter:
     - P01 (Packaged FG)     → UOM: PC
     
     Conversion source: Billing data (most accurate)
+    
+    When created with a db session, the conversion table is lazily loaded
+    from dim_uom_conversion on first use.
     """
     
-    def __init__(self):
-        self.conversion_table: Dict[str, ConversionResult] = {}
+    # Units converted with kg_per_unit
+    CONVERTIBLE_UOMS = ('PC', 'SET', 'EA')
+    
+    # normalize_frame method codes (categorical, in evaluation order)
+    METHOD_CODES = ['null_qty', 'already_kg', 'converted', 'no_conversion_factor', 'unknown_uom']
+    
+    def __init__(self, db=None):
+        self.db = db
+        self._conversion_table: Dict[str, ConversionResult] = {}
+        self._loaded = db is None
+    
+    @property
+    def conversion_table(self) -> Dict[str, ConversionResult]:
+        """Material → ConversionResult (loads dim_uom_conversion on first access)"""
+        if not self._loaded:
+            self.load_from_db()
+        return self._conversion_table
+    
+    def load_from_db(self, force: bool = False) -> int:
+        """
+        Load conversion table from dim_uom_conversion
+        
+        Uses the process-wide cache unless the table version changed
+        (or force=True, e.g. right after build_uom_conversion).
+        
+        Returns: Number of materials loaded
+        """
+        version = tuple(self.db.execute(text(
+            "SELECT COUNT(*), MAX(last_updated) FROM dim_uom_conversion"
+        )).one())
+        
+        with _DIM_CACHE_LOCK:
+            if force or _DIM_CACHE['version'] != version:
+                rows = self.db.execute(text("""
+                    SELECT material_code, material_description, kg_per_unit,
+                           sample_count, source, variance_pct
+                    FROM dim_uom_conversion
+                """)).all()
+                _DIM_CACHE['table'] = {
+                    r.material_code: ConversionResult(
+                        material_code=r.material_code,
+                        material_description=r.material_description or '',
+                        kg_per_unit=float(r.kg_per_unit) if r.kg_per_unit is not None else 0.0,
+                        sample_count=r.sample_count or 0,
+                        source=r.source or 'billing',
+                        variance_pct=float(r.variance_pct) if r.variance_pct is not None else None,
+                        is_valid=r.kg_per_unit is not None and r.kg_per_unit > 0
+                    )
+                    for r in rows
+                }
+                _DIM_CACHE['version'] = version
+            self._conversion_table = dict(_DIM_CACHE['table'])
+        
+        self._loaded = True
+        return len(self._conversion_table)
     
     def build_from_billing(
         self, 
@@ -155,7 +221,7 @@ class UomConverter:
         if uom == 'KG':
             return float(qty), 'already_kg'
         
-        if uom in ('PC', 'SET', 'EA'):
+        if uom in self.CONVERTIBLE_UOMS:
             kg_per_unit = self.get_kg_per_unit(material_code)
             if kg_per_unit:
                 return float(qty) * kg_per_unit, 'converted'
@@ -165,6 +231,56 @@ class UomConverter:
         # Unknown UOM
         return None, f'unknown_uom:{uom}'
     
+    def get_factor_map(self) -> Dict[str, float]:
+        """Material → KG per unit, valid conversions only"""
+        return {
+            material: result.kg_per_unit
+            for material, result in self.conversion_table.items()
+            if result.is_valid
+        }
+    
+    def normalize_frame(
+        self,
+        df: pd.DataFrame,
+        qty_column: str,
+        uom_column: str,
+        material_column: str,
+        output_column: str = 'qty_kg'
+    ) -> pd.DataFrame:
+        """
+        Vectorized normalize_to_kg over a whole dataframe
+        
+        Same rules as normalize_to_kg: KG passes through, PC/SET/EA are
+        multiplied by kg_per_unit, anything else is left unconverted.
+        
+        Returns: Copy of df with output_column (float, NaN when not converted)
+                 and f'{output_column}_method' (categorical, see METHOD_CODES)
+        """
+        qty = pd.to_numeric(df[qty_column], errors='coerce')
+        uom = df[uom_column].astype('string').str.strip().str.upper()
+        factor = df[material_column].astype(str).map(self.get_factor_map()).astype(float)
+        
+        is_unit = uom.isin(self.CONVERTIBLE_UOMS).to_numpy(dtype=bool)
+        conditions = [
+            qty.isna().to_numpy(),
+            uom.eq('KG').fillna(False).to_numpy(dtype=bool),
+            is_unit & factor.notna().to_numpy(),
+            is_unit,
+        ]
+        qty_values = qty.to_numpy(dtype=float)
+        
+        result_df = df.copy()
+        result_df[output_column] = np.select(
+            conditions,
+            [np.nan, qty_values, qty_values * factor.to_numpy(), np.nan],
+            default=np.nan
+        )
+        result_df[f'{output_column}_method'] = pd.Categorical(
+            np.select(conditions, self.METHOD_CODES[:4], default='unknown_uom'),
+            categories=self.METHOD_CODES
+        )
+        return result_df
+    
     def normalize_dataframe(
         self, 
         df: pd.DataFrame, 
@@ -174,7 +290,7 @@ class UomConverter:
         output_column: str = 'qty_kg'
     ) -> pd.DataFrame:
         """
-        Add normalized KG column to dataframe
+        Add normalized KG column to dataframe (normalize_frame + stats print)
         
         Args:
             df: Input dataframe
@@ -185,29 +301,13 @@ class UomConverter:
         
         Returns: DataFrame with new output_column
         """
-        result_df = df.copy()
-        
-        normalized = []
-        methods = []
-        
-        for _, row in result_df.iterrows():
-            qty = row.get(qty_column)
-            uom = row.get(uom_column)
-            material = row.get(material_column)
-            
-            kg_val, method = self.normalize_to_kg(qty, uom, material)
-            normalized.append(kg_val)
-            methods.append(method)
-        
-        result_df[output_column] = normalized
-        result_df[f'{output_column}_method'] = methods
+        result_df = self.normalize_frame(df, qty_column, uom_column, material_column, output_column)
         
         # Stats
-        converted = sum(1 for m in methods if m == 'converted')
-        already_kg = sum(1 for m in methods if m == 'already_kg')
-        failed = sum(1 for m in methods if m.startswith('no_') or m.startswith('unknown'))
+        counts = result_df[f'{output_column}_method'].value_counts()
+        failed = counts['no_conversion_factor'] + counts['unknown_uom']
         
-        print(f"UOM Normalization: {already_kg} already KG, {converted} converted, {failed} failed")
+        print(f"UOM Normalization: {counts['already_kg']} already KG, {counts['converted']} converted, {failed} failed")
         
         return result_df
     
@@ -15,15 +15,31 @@ import shutil
 from pathlib import Path
 from datetime import datetime, date, timedelta
 from typing import Dict, Optional
-import aiofiles
 from openpyxl import load_workbook
 from sqlalchemy.orm import Session
 
+from src.db.connection import SessionLocal
+from src.db.generations import publish_changes
 from src.db.models import UploadHistory
 from src.etl.loaders import get_loader_for_type, Zrfi005Loader
+from src.etl.shadow_rebuild import warehouse_lock
 from src.etl.transform import Transformer
 
 
+# Warehouse tables rewritten by process_file per file type (see publish_changes)
+LEAD_TIME_TABLES = ['fact_lead_time', 'fact_lead_time_daily']
+UPLOAD_CHANGED_TABLES = {
+    'COOISPI': ['fact_production', *LEAD_TIME_TABLES, 'fact_alerts', 'fact_alert_conditions'],
+    'MB51': ['fact_inventory', 'fact_batch_netting', *LEAD_TIME_TABLES, 'fact_alerts', 'fact_alert_conditions'],
+    'ZRMM024': ['fact_purchase_order', *LEAD_TIME_TABLES],
+    'ZRSD002': ['fact_billing', 'fact_sales_daily', 'fact_sales_monthly', 'dim_uom_conversion', *LEAD_TIME_TABLES],
+    'ZRSD004': ['fact_delivery', *LEAD_TIME_TABLES],
+    'ZRSD006': ['dim_product_hierarchy', *LEAD_TIME_TABLES],
+    'ZRFI005': ['fact_ar_aging', 'fact_ar_aging_snapshot'],
+    'TARGET': ['fact_target'],
+}
+
+
 def compute_file_hash(file_path: Path) -> str:
     """Compute MD5 hash of file for duplicate detection"""
     md5_hash = hashlib.md5()
@@ -140,23 +156,55 @@ def validate_file_structure(file_path: Path, expected_type: Optional[str] = None
         }
 
 
-async def save_upload_file(upload_file, destination: Path) -> int:
+def save_upload_file(upload_file, destination: Path) -> int:
     """
     Save uploaded file to destination
     
+    Blocking copy - called from sync route handlers (FastAPI threadpool).
+    
     Returns:
         File size in bytes
     """
     destination.parent.mkdir(parents=True, exist_ok=True)
     
-    async with aiofiles.open(destination, 'wb') as out_file:
-        content = await upload_file.read()
-        await out_file.write(content)
+    with open(destination, 'wb') as out_file:
+        shutil.copyfileobj(upload_file.file, out_file)
     
-    return len(content)
+    return destination.stat().st_size
 
 
-async def process_file(upload_id: int, file_path: Path, db: Session) -> Dict:
+def process_upload(upload_id: int, file_path: Path) -> Dict:
+    """
+    Background-task entry point for process_file
+    
+    Runs in the threadpool after the response is sent, so it uses its own
+    session instead of the (already closed) request session - bound to the
+    connection holding the shared warehouse lock, so no warehouse rebuild
+    swaps tables out while the upload writes to them.
+    """
+    try:
+        with warehouse_lock(exclusive=False) as conn:
+            db = SessionLocal(bind=conn)
+            try:
+                return process_file(upload_id, file_path, db)
+            finally:
+                db.close()
+    except RuntimeError as e:
+        # Rebuild running: record the failure, process_file never started
+        db = SessionLocal()
+        try:
+            upload = db.query(UploadHistory).filter_by(id=upload_id).first()
+            if upload and upload.status == 'pending':
+                upload.status = 'failed'
+                upload.error_message = str(e)
+                upload.processed_at = datetime.utcnow()
+                db.commit()
+        finally:
+            db.close()
+        raise
+
+
+def process_file(upload_id: int, file_path: Path, db: Session) -> Dict:
     """
     Process uploaded file with appropriate loader
     
@@ -193,6 +241,9 @@ async def process_file(upload_id: int, file_path: Path, db: Session) -> Dict:
         mode = 'upsert'
         db.commit()
         
+        # Rows loaded / updated from here on scope the incremental transforms
+        loaded_since = datetime.utcnow()
+        
         # Get appropriate loader (REUSE existing loaders)
         if file_type == 'ZRFI005':
             # AR special handling: pass snapshot_date to loader
@@ -213,29 +264,33 @@ async def process_file(upload_id: int, file_path: Path, db: Session) -> Dict:
             # COOISPI impacts production chains, lead time, and alerts
             transformer.build_production_chains()
             transformer.calculate_p02_p01_yields()
-            transformer.transform_lead_time()  # Calculate transit days for P01 batches
-            transformer.detect_alerts()
+            scope = transformer.lead_time_scope(file_type, loaded_since)
+            transformer.transform_lead_time(scope=scope)  # Calculate transit days for P01 batches
+            transformer.evaluate_alert_rules({'fact_production': scope.batches})
         elif file_type == 'MB51':
             transformer.transform_mb51()
+            netted_batches = transformer.transform_batch_netting()  # Re-net only batches touched by this upload
             # MB51 impacts production chains, lead time, and alerts
             transformer.build_production_chains()
             transformer.calculate_p02_p01_yields()
-            transformer.transform_lead_time()
-            transformer.detect_alerts()
+            transformer.transform_lead_time(scope=transformer.lead_time_scope(file_type, loaded_since))
+            transformer.evaluate_alert_rules({'fact_batch_netting': netted_batches})
         elif file_type == 'ZRMM024':
             transformer.transform_zrmm024()
             # ZRMM024 impacts lead time (purchase time)
-            transformer.transform_lead_time()
+            transformer.transform_lead_time(scope=transformer.lead_time_scope(file_type, loaded_since))
         elif file_type == 'ZRSD002':
-            transformer.transform_zrsd002()
+            transformer.transform_zrsd002(since=loaded_since)
             transformer.build_uom_conversion()  # Update UOM conversion from billing data
             # ZRSD002 impacts lead time (sales order data)
-            transformer.transform_lead_time()
+            transformer.transform_lead_time(scope=transformer.lead_time_scope(file_type, loaded_since))
         elif file_type == 'ZRSD004':
             transformer.transform_zrsd004()
+            # ZRSD004 deliveries resolve to issued batches (storage time)
+            transformer.transform_lead_time(scope=transformer.lead_time_scope(file_type, loaded_since))
         elif file_type == 'ZRSD006':
             # ZRSD006 is used by lead time for channel lookup
-            transformer.transform_lead_time()
+            transformer.transform_lead_time(scope=transformer.lead_time_scope(file_type, loaded_since))
         elif file_type == 'ZRFI005':
             # Pass snapshot_date to transformer to ensure correct data is aggregated
             transformer.transform_zrfi005(target_date=snapshot_date.isoformat() if snapshot_date else None)
@@ -255,6 +310,13 @@ async def process_file(upload_id: int, file_path: Path, db: Session) -> Dict:
         upload.processed_at = datetime.utcnow()
         db.commit()
         
+        # Refresh dependent materialized views, invalidate cached dashboard responses
+        try:
+            publish_changes(db, UPLOAD_CHANGED_TABLES.get(file_type, []))
+        except Exception as e:
+            db.rollback()
+            print(f"  ⚠ Publishing changes failed: {e}")
+        
         return stats
     
     except Exception as e:
@@ -5,14 +5,14 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import QueuePool
 
-from src.config import DATABASE_URL
+from src.config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW
 
 # Create engine with connection pooling
 engine = create_engine(
     DATABASE_URL,
     poolclass=QueuePool,
-    pool_size=5,
-    max_overflow=10,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     pool_pre_ping=True,
     echo=False  # Set True for SQL debugging
 )
@@ -0,0 +1,62 @@
+"""
+Data generations - per-table change counters for the API response cache
+
+Every writer of warehouse data calls publish_changes() with the tables it
+changed once its transaction has committed (upload_service.process_file,
+yield_v3 uploads, CLI transforms): dependent materialized views are refreshed,
+then the generations are bumped. Cached responses are keyed by the
+generations of their source tables, so an entry is never served after one of
+them changed. Bumping also deletes the now unreachable cache entries.
+
+Skills: database-operations
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.db.views import refresh_materialized_views
+
+
+def current_generations(db: Session, tables: Iterable[str]) -> Dict[str, int]:
+    """Table → generation (0 for tables never bumped)"""
+    tables = sorted(set(tables))
+    rows = db.execute(
+        text("SELECT table_name, generation FROM data_generation WHERE table_name = ANY(:tables)"),
+        {'tables': tables}
+    ).all()
+    generations = dict.fromkeys(tables, 0)
+    generations.update({r.table_name: r.generation for r in rows})
+    return generations
+
+
+def bump_generations(db: Session, tables: Iterable[str]):
+    """
+    Increment the generation of each table and drop its cached responses
+
+    Call after the data change is committed - a request that reads the new
+    generation must also see the new data.
+    """
+    tables = sorted(set(tables))
+    if not tables:
+        return
+    db.execute(text("""
+        INSERT INTO data_generation (table_name, generation, bumped_at)
+        SELECT t, 1, NOW() FROM unnest(CAST(:tables AS varchar[])) AS t
+        ON CONFLICT (table_name) DO UPDATE SET
+            generation = data_generation.generation + 1,
+            bumped_at = EXCLUDED.bumped_at
+    """), {'tables': tables})
+    # Entries of earlier days are unreachable too (the day is part of the key)
+    db.execute(text("""
+        DELETE FROM api_response_cache
+        WHERE source_tables && CAST(:tables AS varchar[]) OR created_at < CURRENT_DATE
+    """), {'tables': tables})
+    db.commit()
+
+
+def publish_changes(db: Session, tables: Iterable[str]):
+    """Refresh materialized views fed by `tables`, then bump their generations"""
+    tables = sorted(set(tables))
+    refresh_materialized_views(tables)
+    bump_generations(db, tables)
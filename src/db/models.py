@@ -9,10 +9,10 @@ Note: User/Role models in auth_models.py (separation of concerns)
 """
 from datetime import datetime, date
 from sqlalchemy import (
-    Column, Integer, String, Float, Date, DateTime, 
-    Numeric, Text, Boolean, ForeignKey, Index, UniqueConstraint
+    Column, Integer, BigInteger, String, Float, Date, DateTime, 
+    Numeric, Text, Boolean, ForeignKey, Index, UniqueConstraint, text
 )
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY
 from src.db.connection import Base
 
 
@@ -163,6 +163,12 @@ class RawZrsd002(Base):
     loaded_at = Column(DateTime, default=datetime.utcnow)
     raw_data = Column(JSONB)
     row_hash = Column(String(32))  # MD5 hash for change detection
+    
+    __table_args__ = (
+        # Upload-scoped transform_zrsd002: documents loaded since the upload started
+        Index('idx_raw_zrsd002_loaded_at', 'loaded_at'),
+        Index('idx_raw_zrsd002_billing_document', 'billing_document'),
+    )
 
 
 class RawZrsd004(Base):
@@ -332,6 +338,56 @@ class UploadHistory(Base):
     snapshot_date = Column(Date)  # For ZRFI005 daily snapshots
 
 
+class DataGeneration(Base):
+    """
+    Per-table data generation counter
+    
+    Bumped (src.db.generations.bump_generations) after an upload or CLI
+    transform commits new warehouse data. Part of the API response cache key.
+    """
+    __tablename__ = "data_generation"
+    
+    table_name = Column(String(100), primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+    bumped_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ApiResponseCache(Base):
+    """
+    Cached dashboard responses, shared by all API workers
+    
+    cache_key = sha256(endpoint, normalized params, generations of source_tables, day).
+    UNLOGGED: no WAL, emptied after a crash - it is only a cache.
+    """
+    __tablename__ = "api_response_cache"
+    
+    cache_key = Column(String(64), primary_key=True)
+    endpoint = Column(String(200), nullable=False)
+    source_tables = Column(ARRAY(String(100)), nullable=False)
+    body = Column(Text, nullable=False)  # JSON-encoded response
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_api_response_cache_tables', 'source_tables', postgresql_using='gin'),
+        {'prefixes': ['UNLOGGED']},
+    )
+
+
+class ViewRefreshLog(Base):
+    """Materialized view builds / refreshes with their duration (src/db/views.py)"""
+    __tablename__ = "view_refresh_log"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    view_name = Column(String(100), nullable=False)
+    mode = Column(String(20), nullable=False)  # CONCURRENT, FULL, BUILD
+    duration_ms = Column(Integer, nullable=False)
+    refreshed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_view_refresh_log_view', 'view_name', 'refreshed_at'),
+    )
+
+
 # =============================================================================
 # LAYER 3: DATA WAREHOUSE (Star Schema)
 # =============================================================================
@@ -405,13 +461,20 @@ class FactInventory(Base):
     
     # Derived fields
     stock_impact = Column(Integer)  # +1, -1, 0
-    is_netted = Column(Boolean, default=False)  # After netting algorithm
-    net_qty = Column(Numeric(18, 4))  # Quantity after netting
+    is_netted = Column(Boolean, default=False)  # Cancelled by LIFO netting (see fact_batch_netting)
+    net_qty = Column(Numeric(18, 4))  # Quantity after netting (NULL until flagged)
     
     # Audit
     row_hash = Column(String(32))
     raw_id = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Partition/order key of the window-function netting (view_batch_net_valid_movements)
+        Index('idx_fact_inventory_netting', 'plant_code', 'batch', 'posting_date', 'id'),
+        # Movements not flagged from the netting state yet (Transformer._apply_netting_flags)
+        Index('idx_fact_inventory_unflagged', 'id', postgresql_where=text('net_qty IS NULL')),
+    )
 
 
 class FactPurchaseOrder(Base):
@@ -488,6 +551,16 @@ class FactBilling(Base):
     row_hash = Column(String(32))
     raw_id = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Business key - target of ON CONFLICT upsert in transform_zrsd002
+        Index('uq_fact_billing_doc_item', 'billing_document', 'billing_item', unique=True),
+        # Customer filters resolve names via view_search_customers, then probe this
+        Index('idx_fact_billing_customer', 'customer_name'),
+        # Half-open billing_date ranges of the sales endpoints
+        Index('idx_fact_billing_date_division', 'billing_date', 'dist_channel'),
+        Index('idx_fact_billing_date_customer', 'billing_date', 'customer_name'),
+    )
 
 
 class FactDelivery(Base):
@@ -525,6 +598,13 @@ class FactDelivery(Base):
     row_hash = Column(String(32))
     raw_id = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Business key - target of ON CONFLICT upsert in transform_zrsd004;
+        # NULL line_item counts as a value (PostgreSQL 15+)
+        Index('uq_fact_delivery_delivery_line', 'delivery', 'line_item',
+              unique=True, postgresql_nulls_not_distinct=True),
+    )
 
 
 class FactArAging(Base):
@@ -559,6 +639,50 @@ class FactArAging(Base):
     row_hash = Column(String(32))
     raw_id = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_fact_ar_aging_snapshot_customer', 'snapshot_date', 'customer_name'),
+        Index('idx_fact_ar_aging_snapshot_target', 'snapshot_date', 'total_target'),
+    )
+
+
+class FactArAgingSnapshot(Base):
+    """
+    Aggregate: fact_ar_aging bucket totals per (snapshot_date, dist_channel)
+    
+    Rebuilt with each snapshot by Transformer.transform_zrfi005, in the same
+    transaction as the fact rows; read by /ar-aging/summary, /by-bucket and /snapshots.
+    """
+    __tablename__ = "fact_ar_aging_snapshot"
+    
+    id = Column(Integer, primary_key=True)
+    snapshot_date = Column(Date, nullable=False)
+    dist_channel = Column(String(20))
+    division = Column(String(20), nullable=False)  # 11 Industry / 13 Retails / 15 Project / Other
+    row_count = Column(Integer, nullable=False)
+    report_date = Column(Date)
+    
+    total_target = Column(Numeric(18, 4))
+    total_realization = Column(Numeric(18, 4))
+    not_due = Column(Numeric(18, 4))
+    target_1_30 = Column(Numeric(18, 4))
+    target_31_60 = Column(Numeric(18, 4))
+    target_61_90 = Column(Numeric(18, 4))
+    target_91_120 = Column(Numeric(18, 4))
+    target_121_180 = Column(Numeric(18, 4))
+    target_over_180 = Column(Numeric(18, 4))
+    realization_1_30 = Column(Numeric(18, 4))
+    realization_31_60 = Column(Numeric(18, 4))
+    realization_61_90 = Column(Numeric(18, 4))
+    realization_91_120 = Column(Numeric(18, 4))
+    realization_121_180 = Column(Numeric(18, 4))
+    realization_over_180 = Column(Numeric(18, 4))
+    
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_fact_ar_aging_snapshot_date', 'snapshot_date', 'dist_channel'),
+    )
 
 
 class FactTarget(Base):
@@ -708,7 +832,7 @@ class FactAlert(Base):
     id = Column(Integer, primary_key=True)
     alert_type = Column(String(50), nullable=False)  # STUCK_IN_TRANSIT, LOW_YIELD
     severity = Column(String(20))  # CRITICAL, HIGH, MEDIUM
-    status = Column(String(20), default='ACTIVE')  # ACTIVE, RESOLVED
+    status = Column(String(20), default='ACTIVE')  # ACTIVE, RESOLVED (manual), AUTO_RESOLVED
     
     # Related entity
     entity_type = Column(String(50))  # BATCH, ORDER, etc.
@@ -730,6 +854,38 @@ class FactAlert(Base):
     
     # Description
     message = Column(Text)
+    
+    __table_args__ = (
+        # One alert per (type, entity) - detection merges with ON CONFLICT
+        Index('uq_fact_alerts_type_entity', 'alert_type', 'entity_id', unique=True),
+    )
+
+
+class FactAlertCondition(Base):
+    """
+    Fact: Open conditions of time-based alert rules
+    
+    One row per (alert_type, entity) while the condition holds, maintained at
+    ingestion; the periodic sweep (Transformer.sweep_alerts) promotes rows
+    open longer than the rule threshold to fact_alerts.
+    """
+    __tablename__ = "fact_alert_conditions"
+    
+    id = Column(Integer, primary_key=True)
+    alert_type = Column(String(50), nullable=False)
+    entity_id = Column(String(50), nullable=False)
+    batch = Column(String(50))
+    material = Column(String(50))
+    plant = Column(Integer)
+    open_since = Column(DateTime, nullable=False)
+    row_hash = Column(String(32))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('uq_fact_alert_conditions_type_entity', 'alert_type', 'entity_id', unique=True),
+        # Sweep: open_since < now - threshold per rule
+        Index('idx_fact_alert_conditions_open_since', 'alert_type', 'open_since'),
+    )
 
 class FactLeadTime(Base):
     """Fact: Lead Time Analysis (Unified MTO/MTS/Purchase)"""
@@ -759,7 +915,142 @@ class FactLeadTime(Base):
     delivery_days = Column(Integer, default=0)
     
     # Audit
+    row_hash = Column(String(32))  # Change detection for bulk upsert
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # One row per (order, batch); NULL batch counts as a value (PostgreSQL 15+)
+        Index('uq_fact_lead_time_order_batch', 'order_number', 'batch',
+              unique=True, postgresql_nulls_not_distinct=True),
+    )
+
+
+class FactLeadTimeDaily(Base):
+    """
+    Aggregate: fact_lead_time rolled up per (end_date, channel, order type, lead_time_days)
+    
+    Rebuilt at the end of Transformer.transform_lead_time. One row per exact
+    lead-time value, so histogram buckets are applied at query time and
+    arbitrary end_date ranges (and months) stay exact.
+    Stage columns are sums - divide by order_count for averages.
+    """
+    __tablename__ = "fact_lead_time_daily"
+    
+    id = Column(Integer, primary_key=True)
+    end_date = Column(Date)
+    channel_code = Column(String(10))
+    order_type = Column(String(20))
+    lead_time_days = Column(Integer)
+    
+    order_count = Column(Integer, nullable=False)
+    sum_lead_time_days = Column(BigInteger)
+    sum_preparation_days = Column(BigInteger)
+    sum_production_days = Column(BigInteger)
+    sum_transit_days = Column(BigInteger)
+    sum_storage_days = Column(BigInteger)
+    sum_delivery_days = Column(BigInteger)
+    
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_fact_lead_time_daily_date', 'end_date', 'order_type'),
+    )
+
+
+class FactSalesDaily(Base):
+    """
+    Aggregate: fact_billing rolled up per (billing_date, division, customer, sales order)
+    
+    Rebuilt at the end of Transformer.transform_zrsd002. Keeping customer and
+    sales order in the grain keeps COUNT(DISTINCT ...) exact for any date
+    range; used by the executive summary, revenue-by-division and top-customers.
+    """
+    __tablename__ = "fact_sales_daily"
+    
+    id = Column(Integer, primary_key=True)
+    billing_date = Column(Date)
+    division_code = Column(String(20))  # fact_billing.dist_channel
+    customer_name = Column(String(200))
+    so_number = Column(String(50))
+    so_date = Column(Date)
+    
+    net_value = Column(Numeric(18, 4))
+    line_count = Column(Integer, nullable=False)
+    invoice_count = Column(Integer, nullable=False)  # Distinct billing documents
+    
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_fact_sales_daily_date', 'billing_date', 'division_code'),
+        Index('idx_fact_sales_daily_so_date', 'so_date'),
+    )
+
+
+class FactSalesMonthly(Base):
+    """
+    Aggregate: fact_sales_daily rolled up per (month, division, customer, sales order)
+    
+    Rebuilt after fact_sales_daily at the end of Transformer.transform_zrsd002.
+    billing_month is date_trunc('month', billing_date); read by /sales/trend and
+    by /sales/segmentation for the whole months of its period.
+    """
+    __tablename__ = "fact_sales_monthly"
+    
+    id = Column(Integer, primary_key=True)
+    billing_month = Column(Date, nullable=False)
+    division_code = Column(String(20))  # fact_billing.dist_channel
+    customer_name = Column(String(200))
+    so_number = Column(String(50))
+    
+    net_value = Column(Numeric(18, 4))
+    line_count = Column(Integer, nullable=False)
+    
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_fact_sales_monthly_month', 'billing_month', 'customer_name'),
+    )
+
+
+class FactBatchNetting(Base):
+    """
+    Fact: Persisted LIFO netting state per (plant, batch, MVT pair)
+    
+    Maintained incrementally from raw_mb51 by Transformer.transform_batch_netting.
+    surviving_stack holds the forward movements left after netting
+    (list of {raw_id, posting_date, qty, material_doc}, oldest first).
+    """
+    __tablename__ = "fact_batch_netting"
+    
+    id = Column(Integer, primary_key=True)
+    plant_code = Column(Integer, nullable=False)
+    batch = Column(String(50), nullable=False, index=True)
+    mvt_pair = Column(String(10), nullable=False)  # e.g. '601/602'
+    forward_mvt = Column(Integer, nullable=False)
+    reverse_mvt = Column(Integer, nullable=False)
+    material_code = Column(String(50))
+    
+    # Netting result
+    total_forward = Column(Integer, default=0)
+    total_reverse = Column(Integer, default=0)
+    remaining_forward = Column(Integer, default=0)
+    netted_count = Column(Integer, default=0)
+    first_valid_date = Column(DateTime)  # Earliest surviving forward
+    last_valid_date = Column(DateTime)   # Latest surviving forward
+    net_qty = Column(Numeric(18, 4))
+    is_fully_reversed = Column(Boolean, default=True)
+    surviving_stack = Column(JSONB)
+    
+    # Incremental state
+    last_raw_id = Column(Integer)           # Highest raw_mb51.id netted
+    last_posting_date = Column(DateTime)    # NULL = undated rows present (always replay)
+    source_fingerprint = Column(String(32)) # md5 over (raw_mb51.id, row_hash) of netted rows
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('plant_code', 'batch', 'mvt_pair', name='uq_batch_netting_key'),
+        Index('idx_batch_netting_pair_plant', 'mvt_pair', 'plant_code'),
+    )
 
 
 # class FactP02P01Yield(Base):
@@ -3,87 +3,106 @@ Create Analytics SQL Views
 
 Views provide pre-aggregated data for dashboards.
 Follows CLAUDE.md: Keep SQL readable, no complex CTEs.
+
+Aggregating reporting views are MATERIALIZED_VIEWS: stored results with a
+unique index, refreshed CONCURRENTLY by refresh_materialized_views() after
+the transforms that change their source tables (durations are logged in
+view_refresh_log). The shadow rebuild builds them next to the shadow tables
+and swaps them in together.
 """
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from sqlalchemy import text
 from src.db.connection import engine
+from src.config import MVT_REVERSAL_PAIRS
 
 
-# All view definitions
-VIEWS = {
-    # View 1: Current inventory snapshot
-    "view_inventory_current": """
-        CREATE OR REPLACE VIEW view_inventory_current AS
-        SELECT 
-            fi.plant_code,
-            fi.material_code,
-            MAX(fi.material_description) as material_description,
-            SUM(fi.qty) as current_qty,
-            SUM(COALESCE(fi.qty_kg, 0)) as current_qty_kg,
-            MAX(fi.uom) as uom,
-            MAX(fi.posting_date) as last_movement
-        FROM fact_inventory fi
-        GROUP BY fi.plant_code, fi.material_code
-        HAVING SUM(fi.qty) > 0
-        ORDER BY fi.plant_code, fi.material_code
-    """,
-    
-    # View 2: MTO orders with delivery status
-    "view_mto_orders": """
-        CREATE OR REPLACE VIEW view_mto_orders AS
-        SELECT 
-            fp.plant_code,
-            fp.sales_order,
-            fp.order_number,
-            fp.material_code,
-            fp.material_description,
-            fp.order_qty,
-            fp.delivered_qty,
-            fp.uom,
-            CASE 
-                WHEN fp.delivered_qty >= fp.order_qty THEN 'COMPLETE'
-                WHEN fp.delivered_qty > 0 THEN 'PARTIAL'
-                ELSE 'PENDING'
-            END as status,
-            fp.release_date,
-            fp.actual_finish_date
-        FROM fact_production fp
-        WHERE fp.is_mto = TRUE
-        ORDER BY fp.release_date DESC
-    """,
+# Forward/reverse MVT pairs netted in SQL (forward = lower code)
+NETTING_PAIR_VALUES = ', '.join(
+    f"({fwd}, {rev}, '{fwd}/{rev}')"
+    for fwd, rev in sorted(MVT_REVERSAL_PAIRS.items()) if fwd < rev
+)
+
+
+def net_valid_movements_sql(source: str = 'fact_inventory') -> str:
+    """
+    Stack (LIFO) netting as window functions - same result as StackNettingEngine
     
-    # View 3: Production yield dashboard (REMOVED - legacy genealogy decommissioned 2026-01-12)
-    # "view_yield_dashboard": """...""",
+    Per (plant, batch, MVT pair), ordered by posting_date then id (plant
+    isolation: plants are never mixed). With s = +1 forward / -1 reverse:
+    - running      = running SUM(s)
+    - stack_height = running - LEAST(0, running MIN(running))
+                     (a reverse on an empty stack is ignored)
+    - a forward survives iff the height never drops below its own later on
     
-    # View 4: Sales performance vs targets
-    "view_sales_performance": """
-        CREATE OR REPLACE VIEW view_sales_performance AS
+    Returns: SELECT of the surviving forward movements of `source`
+    """
+    return f"""
         SELECT 
-            fb.salesman_name,
-            ft.semester,
-            ft.year,
-            COUNT(DISTINCT fb.billing_document) as total_invoices,
-            SUM(fb.billing_qty) as total_qty,
-            fb.uom,
-            SUM(fb.net_value) as total_revenue,
-            ft.target as semester_target,
-            CASE 
-                WHEN ft.target > 0 
-                THEN ROUND((SUM(fb.net_value) / ft.target * 100)::numeric, 1)
-                ELSE 0 
-            END as achievement_pct
-        FROM fact_billing fb
-        LEFT JOIN fact_target ft 
-            ON fb.salesman_name = ft.salesman_name
-            AND EXTRACT(YEAR FROM fb.billing_date) = ft.year
-            AND CASE 
-                WHEN EXTRACT(MONTH FROM fb.billing_date) <= 6 THEN 1 
-                ELSE 2 
-            END = ft.semester
-        WHERE fb.salesman_name IS NOT NULL
-        GROUP BY fb.salesman_name, ft.semester, ft.year, fb.uom, ft.target
-        ORDER BY total_revenue DESC
-    """,
-    
+            v.id,
+            v.plant_code,
+            v.batch,
+            v.material_code,
+            v.mvt_type,
+            v.reverse_mvt,
+            v.mvt_pair,
+            v.posting_date,
+            v.qty,
+            v.qty_kg,
+            v.material_document,
+            v.raw_id
+        FROM (
+            SELECT 
+                h.*,
+                MIN(h.stack_height) OVER (
+                    PARTITION BY h.plant_code, h.batch, h.mvt_pair
+                    ORDER BY h.posting_date, h.id
+                    ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING
+                ) as later_min_height
+            FROM (
+                SELECT 
+                    r.*,
+                    r.running - LEAST(0, MIN(r.running) OVER (
+                        PARTITION BY r.plant_code, r.batch, r.mvt_pair
+                        ORDER BY r.posting_date, r.id
+                        ROWS UNBOUNDED PRECEDING
+                    )) as stack_height
+                FROM (
+                    SELECT 
+                        fi.id,
+                        fi.plant_code,
+                        fi.batch,
+                        fi.material_code,
+                        fi.mvt_type,
+                        p.forward_mvt,
+                        p.reverse_mvt,
+                        p.mvt_pair,
+                        fi.posting_date,
+                        fi.qty,
+                        fi.qty_kg,
+                        fi.material_document,
+                        fi.raw_id,
+                        SUM(CASE WHEN fi.mvt_type = p.forward_mvt THEN 1 ELSE -1 END) OVER (
+                            PARTITION BY fi.plant_code, fi.batch, p.mvt_pair
+                            ORDER BY fi.posting_date, fi.id
+                            ROWS UNBOUNDED PRECEDING
+                        ) as running
+                    FROM {source} fi
+                    JOIN (VALUES {NETTING_PAIR_VALUES}) AS p(forward_mvt, reverse_mvt, mvt_pair)
+                        ON fi.mvt_type IN (p.forward_mvt, p.reverse_mvt)
+                    WHERE fi.batch IS NOT NULL AND fi.plant_code IS NOT NULL
+                ) r
+            ) h
+        ) v
+        WHERE v.mvt_type = v.forward_mvt
+          AND (v.later_min_height IS NULL OR v.later_min_height >= v.stack_height)
+    """
+
+
+# Plain views - always live (cheap projections, or must reflect writes immediately)
+VIEWS = {
     # View 5: Active alerts summary
     "view_active_alerts": """
         CREATE OR REPLACE VIEW view_active_alerts AS
@@ -113,93 +132,348 @@ VIEWS = {
             a.detected_at DESC
     """,
     
-    # View 6: Executive KPIs (Updated 2026-01-12: removed legacy yield reference)
-    "view_executive_kpis": """
-        CREATE OR REPLACE VIEW view_executive_kpis AS
-        SELECT 
-            (SELECT COALESCE(SUM(net_value), 0) FROM fact_billing) as total_revenue,
-            (SELECT COUNT(*) FROM fact_production WHERE is_mto = TRUE) as total_mto_orders,
-            (SELECT COUNT(*) FROM fact_production WHERE is_mto = FALSE) as total_mts_orders,
-            0::numeric as avg_yield_pct,
-            (SELECT COUNT(*) FROM fact_alert WHERE status = 'ACTIVE') as active_alerts,
-            (SELECT COUNT(*) FROM fact_inventory) as total_inventory_movements,
-            (SELECT COUNT(*) FROM fact_purchase_order) as total_purchase_orders
-    """,
-    
-    # View 7: AR Collection Summary by Division
-    "view_ar_collection_summary": """
-        CREATE OR REPLACE VIEW view_ar_collection_summary AS
+    # View 9: Batch netting status (persisted LIFO state, see fact_batch_netting)
+    "view_batch_netting_status": """
+        CREATE OR REPLACE VIEW view_batch_netting_status AS
         SELECT 
-            CASE dist_channel
-                WHEN '11' THEN 'Industry'
-                WHEN '13' THEN 'Retails'
-                WHEN '15' THEN 'Project'
-                ELSE 'Other'
-            END as division,
-            dist_channel,
-            SUM(COALESCE(total_target, 0)) as total_target,
-            SUM(COALESCE(total_realization, 0)) as total_realization,
+            bn.plant_code,
+            bn.batch,
+            bn.mvt_pair,
+            bn.material_code,
+            bn.total_forward,
+            bn.total_reverse,
+            bn.remaining_forward,
+            bn.net_qty,
+            bn.first_valid_date,
+            bn.last_valid_date,
             CASE 
-                WHEN SUM(COALESCE(total_target, 0)) > 0 
-                THEN ROUND((SUM(COALESCE(total_realization, 0)) / SUM(total_target) * 100)::numeric, 0)
-                ELSE 0 
-            END as collection_rate_pct,
-            MAX(report_date) as report_date
-        FROM fact_ar_aging
-        GROUP BY dist_channel
-        ORDER BY 
-            CASE dist_channel
-                WHEN '11' THEN 1
-                WHEN '13' THEN 2
-                WHEN '15' THEN 3
-                ELSE 4
-            END
+                WHEN bn.is_fully_reversed THEN 'FULLY_REVERSED'
+                WHEN bn.netted_count > 0 THEN 'PARTIALLY_REVERSED'
+                ELSE 'ACTIVE'
+            END as netting_status,
+            bn.updated_at
+        FROM fact_batch_netting bn
     """,
     
-    # View 8: AR Aging Detail
-    "view_ar_aging_detail": """
-        CREATE OR REPLACE VIEW view_ar_aging_detail AS
-        SELECT 
-            CASE dist_channel
-                WHEN '11' THEN 'Industry'
-                WHEN '13' THEN 'Retails'
-                WHEN '15' THEN 'Project'
-                ELSE 'Other'
-            END as division,
-            salesman_name,
-            customer_name,
-            total_target,
-            total_realization,
-            CASE 
-                WHEN total_target > 0 
-                THEN ROUND((total_realization / total_target * 100)::numeric, 0)
-                ELSE 0 
-            END as collection_rate_pct,
-            COALESCE(realization_not_due, 0) as not_due,
-            COALESCE(target_1_30, 0) as target_1_30,
-            COALESCE(target_31_60, 0) as target_31_60,
-            COALESCE(target_61_90, 0) as target_61_90,
-            COALESCE(target_91_120, 0) as target_91_120,
-            COALESCE(target_121_180, 0) as target_121_180,
-            COALESCE(target_over_180, 0) as target_over_180,
-            CASE 
-                WHEN COALESCE(target_over_180, 0) > 0 THEN 'HIGH'
-                WHEN COALESCE(target_91_120, 0) + COALESCE(target_121_180, 0) > 0 THEN 'MEDIUM'
-                ELSE 'LOW'
-            END as risk_level,
-            report_date
-        FROM fact_ar_aging
-        WHERE total_target > 0 OR total_realization > 0
+    # View 10: Movements surviving LIFO netting, computed in SQL from fact_inventory
+    "view_batch_net_valid_movements": f"""
+        CREATE OR REPLACE VIEW view_batch_net_valid_movements AS
+        {net_valid_movements_sql('fact_inventory')}
     """
 }
 
 
+@dataclass(frozen=True)
+class MaterializedView:
+    """
+    Reporting view stored as a materialized view
+    
+    unique_columns:   unique index, required by REFRESH ... CONCURRENTLY
+    source_tables:    the view is refreshed after transforms that change these
+    trigram_columns:  pg_trgm GIN index each (substring / ILIKE search)
+    """
+    query: str
+    unique_columns: Tuple[str, ...]
+    source_tables: Tuple[str, ...]
+    indexes: Tuple[Tuple[str, ...], ...] = ()
+    trigram_columns: Tuple[str, ...] = ()
+
+
+# Materialized views - same names as the former plain views, so readers are unchanged
+MATERIALIZED_VIEWS: Dict[str, MaterializedView] = {
+    # View 1: Current inventory snapshot
+    "view_inventory_current": MaterializedView(
+        query="""
+            SELECT 
+                fi.plant_code,
+                fi.material_code,
+                MAX(fi.material_description) as material_description,
+                SUM(fi.qty) as current_qty,
+                SUM(COALESCE(fi.qty_kg, 0)) as current_qty_kg,
+                MAX(fi.uom) as uom,
+                MAX(fi.posting_date) as last_movement
+            FROM fact_inventory fi
+            GROUP BY fi.plant_code, fi.material_code
+            HAVING SUM(fi.qty) > 0
+            ORDER BY fi.plant_code, fi.material_code
+        """,
+        unique_columns=('plant_code', 'material_code'),
+        source_tables=('fact_inventory',),
+    ),
+    
+    # View 2: MTO orders with delivery status (id: fact_production row, unique key)
+    "view_mto_orders": MaterializedView(
+        query="""
+            SELECT 
+                fp.id,
+                fp.plant_code,
+                fp.sales_order,
+                fp.order_number,
+                fp.material_code,
+                fp.material_description,
+                fp.order_qty,
+                fp.delivered_qty,
+                fp.uom,
+                CASE 
+                    WHEN fp.delivered_qty >= fp.order_qty THEN 'COMPLETE'
+                    WHEN fp.delivered_qty > 0 THEN 'PARTIAL'
+                    ELSE 'PENDING'
+                END as status,
+                fp.release_date,
+                fp.actual_finish_date
+            FROM fact_production fp
+            WHERE fp.is_mto = TRUE
+            ORDER BY fp.release_date DESC
+        """,
+        unique_columns=('id',),
+        source_tables=('fact_production',),
+        indexes=(('release_date',), ('status', 'release_date')),
+    ),
+    
+    # View 3: Production yield dashboard (REMOVED - legacy genealogy decommissioned 2026-01-12)
+    
+    # View 4: Sales performance vs targets
+    # (semester / year / target come from a LEFT JOIN and uom may be NULL, so the
+    # unique key is target_id / uom_key: 0 / '' when there is no target / unit)
+    "view_sales_performance": MaterializedView(
+        query="""
+            SELECT 
+                fb.salesman_name,
+                COALESCE(ft.id, 0) as target_id,
+                COALESCE(fb.sales_unit, '') as uom_key,
+                ft.semester,
+                ft.year,
+                COUNT(DISTINCT fb.billing_document) as total_invoices,
+                SUM(fb.billing_qty) as total_qty,
+                fb.sales_unit as uom,
+                SUM(fb.net_value) as total_revenue,
+                ft.target as semester_target,
+                CASE 
+                    WHEN ft.target > 0 
+                    THEN ROUND((SUM(fb.net_value) / ft.target * 100)::numeric, 1)
+                    ELSE 0 
+                END as achievement_pct
+            FROM fact_billing fb
+            LEFT JOIN fact_target ft 
+                ON fb.salesman_name = ft.salesman_name
+                AND EXTRACT(YEAR FROM fb.billing_date) = ft.year
+                AND CASE 
+                    WHEN EXTRACT(MONTH FROM fb.billing_date) <= 6 THEN 1 
+                    ELSE 2 
+                END = ft.semester
+            WHERE fb.salesman_name IS NOT NULL
+            GROUP BY fb.salesman_name, ft.id, ft.semester, ft.year, fb.sales_unit, ft.target
+            ORDER BY total_revenue DESC
+        """,
+        unique_columns=('salesman_name', 'target_id', 'uom_key'),
+        source_tables=('fact_billing', 'fact_target'),
+    ),
+    
+    # View 6: Executive KPIs (single row, kpi_row is its unique key)
+    "view_executive_kpis": MaterializedView(
+        query="""
+            SELECT 
+                1 as kpi_row,
+                (SELECT COALESCE(SUM(net_value), 0) FROM fact_billing) as total_revenue,
+                (SELECT COUNT(*) FROM fact_production WHERE is_mto = TRUE) as total_mto_orders,
+                (SELECT COUNT(*) FROM fact_production WHERE is_mto = FALSE) as total_mts_orders,
+                0::numeric as avg_yield_pct,
+                (SELECT COUNT(*) FROM fact_alerts WHERE status = 'ACTIVE') as active_alerts,
+                (SELECT COUNT(*) FROM fact_inventory) as total_inventory_movements,
+                (SELECT COUNT(*) FROM fact_purchase_order) as total_purchase_orders
+        """,
+        unique_columns=('kpi_row',),
+        source_tables=('fact_billing', 'fact_production', 'fact_alerts', 'fact_inventory', 'fact_purchase_order'),
+    ),
+    
+    # View 7: AR Collection Summary by Division
+    "view_ar_collection_summary": MaterializedView(
+        query="""
+            SELECT 
+                CASE dist_channel
+                    WHEN '11' THEN 'Industry'
+                    WHEN '13' THEN 'Retails'
+                    WHEN '15' THEN 'Project'
+                    ELSE 'Other'
+                END as division,
+                dist_channel,
+                SUM(COALESCE(total_target, 0)) as total_target,
+                SUM(COALESCE(total_realization, 0)) as total_realization,
+                CASE 
+                    WHEN SUM(COALESCE(total_target, 0)) > 0 
+                    THEN ROUND((SUM(COALESCE(total_realization, 0)) / SUM(total_target) * 100)::numeric, 0)
+                    ELSE 0 
+                END as collection_rate_pct,
+                MAX(report_date) as report_date
+            FROM fact_ar_aging
+            GROUP BY dist_channel
+            ORDER BY 
+                CASE dist_channel
+                    WHEN '11' THEN 1
+                    WHEN '13' THEN 2
+                    WHEN '15' THEN 3
+                    ELSE 4
+                END
+        """,
+        unique_columns=('dist_channel',),
+        source_tables=('fact_ar_aging',),
+    ),
+    
+    # View 8: AR Aging Detail (id: fact_ar_aging row, unique key)
+    "view_ar_aging_detail": MaterializedView(
+        query="""
+            SELECT 
+                id,
+                CASE dist_channel
+                    WHEN '11' THEN 'Industry'
+                    WHEN '13' THEN 'Retails'
+                    WHEN '15' THEN 'Project'
+                    ELSE 'Other'
+                END as division,
+                salesman_name,
+                customer_name,
+                total_target,
+                total_realization,
+                CASE 
+                    WHEN total_target > 0 
+                    THEN ROUND((total_realization / total_target * 100)::numeric, 0)
+                    ELSE 0 
+                END as collection_rate_pct,
+                COALESCE(realization_not_due, 0) as not_due,
+                COALESCE(target_1_30, 0) as target_1_30,
+                COALESCE(target_31_60, 0) as target_31_60,
+                COALESCE(target_61_90, 0) as target_61_90,
+                COALESCE(target_91_120, 0) as target_91_120,
+                COALESCE(target_121_180, 0) as target_121_180,
+                COALESCE(target_over_180, 0) as target_over_180,
+                CASE 
+                    WHEN COALESCE(target_over_180, 0) > 0 THEN 'HIGH'
+                    WHEN COALESCE(target_91_120, 0) + COALESCE(target_121_180, 0) > 0 THEN 'MEDIUM'
+                    ELSE 'LOW'
+                END as risk_level,
+                report_date
+            FROM fact_ar_aging
+            WHERE total_target > 0 OR total_realization > 0
+        """,
+        unique_columns=('id',),
+        source_tables=('fact_ar_aging',),
+    ),
+    
+    # View 11: Material search dimension (autocomplete + material filters, see src.api.search)
+    "view_search_materials": MaterializedView(
+        query="""
+            SELECT 
+                material_code,
+                MAX(material_description) as material_description,
+                lower(material_code || ' ' || COALESCE(MAX(material_description), '')) as search_text
+            FROM (
+                SELECT material_code, material_description FROM dim_material
+                UNION ALL
+                SELECT material_code, MAX(material_description) FROM fact_inventory GROUP BY material_code
+                UNION ALL
+                SELECT material_code, MAX(material_description) FROM fact_billing GROUP BY material_code
+            ) m
+            WHERE material_code IS NOT NULL
+            GROUP BY material_code
+        """,
+        unique_columns=('material_code',),
+        source_tables=('dim_material', 'fact_inventory', 'fact_billing'),
+        trigram_columns=('material_code', 'search_text'),
+    ),
+    
+    # View 12: Customer search dimension (autocomplete + customer filters, see src.api.search)
+    "view_search_customers": MaterializedView(
+        query="""
+            SELECT customer_name
+            FROM fact_billing
+            WHERE customer_name IS NOT NULL
+            UNION
+            SELECT customer_name
+            FROM fact_ar_aging
+            WHERE customer_name IS NOT NULL
+        """,
+        unique_columns=('customer_name',),
+        source_tables=('fact_billing', 'fact_ar_aging'),
+        trigram_columns=('customer_name',),
+    ),
+}
+
+
+def materialized_view_ddl(name: str, schema: Optional[str] = None) -> List[str]:
+    """CREATE MATERIALIZED VIEW (WITH DATA) + its indexes, optionally in another schema"""
+    view = MATERIALIZED_VIEWS[name]
+    qualified = f"{schema}.{name}" if schema else name
+    statements = [
+        f"CREATE MATERIALIZED VIEW {qualified} AS {view.query}",
+        f"CREATE UNIQUE INDEX uq_{name} ON {qualified} ({', '.join(view.unique_columns)})",
+    ]
+    for i, columns in enumerate(view.indexes, start=1):
+        statements.append(f"CREATE INDEX idx_{name}_{i} ON {qualified} ({', '.join(columns)})")
+    for column in view.trigram_columns:
+        statements.append(
+            f"CREATE INDEX idx_{name}_{column}_trgm ON {qualified} USING gin ({column} gin_trgm_ops)"
+        )
+    return statements
+
+
+def unique_index_current(conn, name: str) -> bool:
+    """Whether the existing materialized view's unique index has the declared columns"""
+    indexdef = conn.execute(text(
+        "SELECT indexdef FROM pg_indexes WHERE indexname = :index AND schemaname = current_schema()"
+    ), {'index': f"uq_{name}"}).scalar()
+    return bool(indexdef) and indexdef.endswith(f"({', '.join(MATERIALIZED_VIEWS[name].unique_columns)})")
+
+
+def views_for_tables(tables: Optional[Iterable[str]] = None) -> List[str]:
+    """Materialized views fed by any of `tables` (None = all)"""
+    if tables is None:
+        return list(MATERIALIZED_VIEWS)
+    tables = set(tables)
+    return [name for name, view in MATERIALIZED_VIEWS.items() if tables & set(view.source_tables)]
+
+
+def record_refresh(conn, view_name: str, mode: str, seconds: float):
+    """Append a view_refresh_log row"""
+    conn.execute(text("""
+        INSERT INTO view_refresh_log (view_name, mode, duration_ms, refreshed_at)
+        VALUES (:view_name, :mode, :duration_ms, NOW())
+    """), {'view_name': view_name, 'mode': mode, 'duration_ms': int(seconds * 1000)})
+
+
+def refresh_materialized_views(tables: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    Refresh the materialized views fed by `tables` (None = all)
+    
+    CONCURRENTLY: readers keep the previous contents during the refresh.
+    Each view refreshes in its own transaction; a failing view does not
+    stop the others.
+    
+    Returns: view name → refresh seconds
+    """
+    durations = {}
+    for name in views_for_tables(tables):
+        try:
+            with engine.begin() as conn:
+                start = time.perf_counter()
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+                durations[name] = time.perf_counter() - start
+                record_refresh(conn, name, 'CONCURRENT', durations[name])
+            print(f"  ✓ Refreshed {name} ({durations[name] * 1000:.0f} ms)")
+        except Exception as e:
+            print(f"  ✗ Refresh {name}: {str(e)[:100]}")
+    return durations
+
+
 def create_all_views():
     """Create all analytics views"""
     print("\n🔧 Creating analytics views...")
     success_count = 0
     error_count = 0
     
+    # Trigram operator classes for the search views' GIN indexes
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    
     for view_name, view_sql in VIEWS.items():
         # Use separate connection for each view to avoid transaction errors
         try:
@@ -211,6 +485,30 @@ def create_all_views():
             print(f"  ✗ {view_name}: {str(e)[:100]}")
             error_count += 1
     
+    for view_name in MATERIALIZED_VIEWS:
+        try:
+            with engine.begin() as conn:
+                exists = conn.execute(text(
+                    "SELECT 1 FROM pg_matviews WHERE matviewname = :name AND schemaname = current_schema()"
+                ), {'name': view_name}).fetchone()
+                if exists and unique_index_current(conn, view_name):
+                    print(f"  ✓ {view_name} (materialized, exists)")
+                else:
+                    if exists:
+                        # Definition changed (unique key) - rebuild
+                        conn.execute(text(f"DROP MATERIALIZED VIEW {view_name} CASCADE"))
+                    # Replaces the former plain view of the same name
+                    conn.execute(text(f"DROP VIEW IF EXISTS {view_name} CASCADE"))
+                    start = time.perf_counter()
+                    for statement in materialized_view_ddl(view_name):
+                        conn.execute(text(statement))
+                    record_refresh(conn, view_name, 'BUILD', time.perf_counter() - start)
+                    print(f"  ✓ {view_name} (materialized)")
+                success_count += 1
+        except Exception as e:
+            print(f"  ✗ {view_name}: {str(e)[:100]}")
+            error_count += 1
+    
     print(f"\n✓ Created {success_count} views ({error_count} errors)\n")
 
 
@@ -224,6 +522,9 @@ def drop_all_views():
                 print(f"  ✓ Dropped {view_name}")
             except Exception as e:
                 print(f"  ✗ {view_name}: {e}")
+        for view_name in MATERIALIZED_VIEWS:
+            conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {view_name} CASCADE"))
+            print(f"  ✓ Dropped {view_name}")
     print("✓ All views dropped\n")
 
 
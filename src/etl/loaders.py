@@ -184,6 +184,8 @@ class BaseLoader:
             # Record exists with different data - update all fields
             for key, value in record_data.items():
                 setattr(existing, key, value)
+            if hasattr(existing, 'loaded_at'):
+                existing.loaded_at = datetime.utcnow()  # Marks the row as touched by this upload
             self.updated_count += 1
             return 'updated'
         else:
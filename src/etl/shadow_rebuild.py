@@ -0,0 +1,318 @@
+"""
+Shadow Rebuild - Warehouse refresh without emptying live tables
+
+Instead of TRUNCATE + transform on the live tables (dashboards see empty
+results for minutes), the full transform runs against empty copies in a
+shadow schema and is swapped in at the end:
+
+1. prepare_shadow_tables(): empty copies in schema `warehouse_next`
+   (only unique indexes - ON CONFLICT upserts need them during load);
+   fact_alerts starts from the live alerts so acknowledged / resolved
+   statuses survive re-detection
+2. Transformer.transform_all() on a session with
+   search_path = warehouse_next, public
+   (raw_* and non-rebuilt tables still resolve to public)
+3. build_deferred_indexes(): remaining indexes built once, then ANALYZE
+4. build_shadow_views(): materialized views built over the shadow tables
+5. swap_in(): one short transaction moves live tables / materialized views
+   to `warehouse_prev` and the shadow ones to public (SET SCHEMA is
+   catalog-only, same cost as a RENAME), then re-points the plain views;
+   alerts resolved while the rebuild ran are carried over first
+6. rollback_generation(): puts `warehouse_prev` back if the new data is bad
+
+rebuild_warehouse() / rollback_generation() hold warehouse_lock() exclusively
+and uploads (upload_service.process_upload) hold it shared, so no upload
+commits to a live table that is about to be swapped out.
+
+Skills: database-operations
+"""
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+from sqlalchemy import MetaData, Table, Index, text
+
+from src.db.connection import engine, SessionLocal, Base
+from src.db import models  # noqa: F401 - register models on Base.metadata
+from src.db.views import VIEWS, MATERIALIZED_VIEWS, materialized_view_ddl, record_refresh
+
+
+SHADOW_SCHEMA = 'warehouse_next'
+PREVIOUS_SCHEMA = 'warehouse_prev'
+
+# Tables fully rebuilt by Transformer.transform_all()
+# (dim_dist_channel / dim_material are not repopulated by transforms - stay live)
+REBUILD_TABLES = [
+    # Fact tables
+    'fact_production',
+    'fact_inventory',
+    'fact_purchase_order',
+    'fact_billing',
+    'fact_delivery',
+    'fact_ar_aging',
+    'fact_ar_aging_snapshot',
+    'fact_target',
+    'fact_alerts',
+    'fact_alert_conditions',
+    'fact_lead_time',
+    'fact_lead_time_daily',
+    'fact_sales_daily',
+    'fact_sales_monthly',
+    'fact_batch_netting',
+    # Dimension tables
+    'dim_uom_conversion',
+    'dim_plant',
+    'dim_mvt',
+]
+
+# Max wait for the ACCESS EXCLUSIVE locks taken by the swap
+SWAP_LOCK_TIMEOUT = '10s'
+
+# pg advisory lock key: rebuild / rollback (exclusive) vs uploads (shared)
+WAREHOUSE_LOCK_KEY = 73240030
+
+
+@contextmanager
+def warehouse_lock(exclusive: bool):
+    """
+    Hold the warehouse advisory lock on a dedicated connection (yielded)
+
+    Raises RuntimeError at once instead of waiting when the lock is taken -
+    a rebuild runs for minutes, an upload should not sit on a pool slot.
+    """
+    mode = '' if exclusive else '_shared'
+    conn = engine.connect()
+    try:
+        locked = conn.execute(
+            text(f"SELECT pg_try_advisory_lock{mode}(:key)"), {'key': WAREHOUSE_LOCK_KEY}
+        ).scalar()
+        conn.commit()
+        if not locked:
+            raise RuntimeError(
+                "Uploads are running - retry the rebuild later" if exclusive
+                else "Warehouse rebuild in progress - retry the upload after it finishes"
+            )
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.execute(text(f"SELECT pg_advisory_unlock{mode}(:key)"), {'key': WAREHOUSE_LOCK_KEY})
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def rebuild_in_progress(db) -> bool:
+    """Whether a rebuild / rollback holds the warehouse lock (cheap pre-check for upload routes)"""
+    return bool(db.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_locks
+            WHERE locktype = 'advisory' AND mode = 'ExclusiveLock' AND granted
+              AND classid = 0 AND objid = :key AND objsubid = 1
+        )
+    """), {'key': WAREHOUSE_LOCK_KEY}).scalar())
+
+
+def _shadow_table(name: str) -> Tuple[Table, List[Index]]:
+    """Copy of a warehouse table in SHADOW_SCHEMA, non-unique indexes split off"""
+    source = Base.metadata.tables[name]
+    table = source.to_metadata(MetaData(), schema=SHADOW_SCHEMA)
+    
+    # Re-declare indexes with the live names (so they survive the swap unchanged)
+    table.indexes.clear()
+    deferred = []
+    for idx in source.indexes:
+        copy = Index(
+            str(idx.name), *[table.c[col.name] for col in idx.columns],
+            unique=idx.unique, **idx.dialect_kwargs
+        )
+        if not idx.unique:
+            deferred.append(copy)
+    for idx in deferred:
+        table.indexes.discard(idx)
+    return table, deferred
+
+
+def _repoint_views(conn):
+    """Views bind to table OIDs - recreate them so they follow the swapped tables"""
+    for view_sql in VIEWS.values():
+        conn.execute(text(view_sql))
+
+
+def _seed_alert_state(conn):
+    """Start the shadow fact_alerts from the live one (ids, statuses, detected_at)"""
+    if conn.execute(text("SELECT to_regclass('public.fact_alerts')")).scalar() is None:
+        return 0
+    columns = ', '.join(c.name for c in Base.metadata.tables['fact_alerts'].columns)
+    count = conn.execute(text(
+        f"INSERT INTO {SHADOW_SCHEMA}.fact_alerts ({columns}) SELECT {columns} FROM public.fact_alerts"
+    )).rowcount
+    conn.execute(text(f"""
+        SELECT setval(pg_get_serial_sequence('{SHADOW_SCHEMA}.fact_alerts', 'id'),
+                      COALESCE((SELECT MAX(id) FROM {SHADOW_SCHEMA}.fact_alerts), 0) + 1, false)
+    """))
+    return count
+
+
+def _carry_alert_resolutions(conn, source: str, target: str):
+    """
+    Copy manual resolutions from source.fact_alerts to the generation about
+    to go live (target) - alerts resolved after it was built would reopen
+    """
+    if conn.execute(text(f"SELECT to_regclass('{source}.fact_alerts')")).scalar() is None:
+        return 0
+    conn.execute(text(f"LOCK TABLE {source}.fact_alerts IN EXCLUSIVE MODE"))
+    return conn.execute(text(f"""
+        UPDATE {target}.fact_alerts t
+        SET status = 'RESOLVED', resolved_at = s.resolved_at
+        FROM {source}.fact_alerts s
+        WHERE s.alert_type = t.alert_type AND s.entity_id = t.entity_id
+          AND s.status = 'RESOLVED' AND t.status <> 'RESOLVED'
+    """)).rowcount
+
+
+def _move_materialized_views(conn, source: str, target: str):
+    """Move the materialized views (with their indexes) from one schema to another"""
+    for name in MATERIALIZED_VIEWS:
+        conn.execute(text(f"ALTER MATERIALIZED VIEW IF EXISTS {source}.{name} SET SCHEMA {target}"))
+
+
+def _drop_plain_predecessors(conn):
+    """Drop live plain views that are now materialized (first swap after the upgrade)"""
+    rows = conn.execute(text(
+        "SELECT viewname FROM pg_views WHERE schemaname = 'public' AND viewname = ANY(:names)"
+    ), {'names': list(MATERIALIZED_VIEWS)}).fetchall()
+    for row in rows:
+        conn.execute(text(f"DROP VIEW public.{row.viewname} CASCADE"))
+
+
+def prepare_shadow_tables():
+    """Drop the previous generation and create empty shadow tables"""
+    print("Preparing shadow tables...")
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {PREVIOUS_SCHEMA} CASCADE"))
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SHADOW_SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SHADOW_SCHEMA}"))
+        for name in REBUILD_TABLES:
+            table, _ = _shadow_table(name)
+            table.create(conn)
+        alerts = _seed_alert_state(conn)
+    print(f"  ✓ Created {len(REBUILD_TABLES)} tables in {SHADOW_SCHEMA} ({alerts} alerts carried over)")
+
+
+@contextmanager
+def shadow_session():
+    """
+    Session whose unqualified table names resolve to the shadow schema first
+
+    Bound to a single connection so search_path survives commits; the
+    setting is reset before the connection goes back to the pool.
+    """
+    conn = engine.connect()
+    try:
+        conn.execute(text(f"SET search_path TO {SHADOW_SCHEMA}, public"))
+        conn.commit()
+        db = SessionLocal(bind=conn)
+        try:
+            yield db
+        finally:
+            db.close()
+    finally:
+        conn.rollback()
+        conn.execute(text("RESET search_path"))
+        conn.commit()
+        conn.close()
+
+
+def build_deferred_indexes():
+    """Build non-unique indexes on the loaded shadow tables, then ANALYZE"""
+    print("Building indexes on shadow tables...")
+    count = 0
+    with engine.begin() as conn:
+        for name in REBUILD_TABLES:
+            _, deferred = _shadow_table(name)
+            for idx in deferred:
+                idx.create(conn)
+                count += 1
+            conn.execute(text(f"ANALYZE {SHADOW_SCHEMA}.{name}"))
+    print(f"  ✓ Built {count} indexes, analyzed {len(REBUILD_TABLES)} tables")
+
+
+def build_shadow_views():
+    """Build the materialized views over the loaded shadow tables"""
+    print("Building materialized views on shadow tables...")
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL search_path TO {SHADOW_SCHEMA}, public"))
+        for name in MATERIALIZED_VIEWS:
+            start = time.perf_counter()
+            for statement in materialized_view_ddl(name, schema=SHADOW_SCHEMA):
+                conn.execute(text(statement))
+            record_refresh(conn, name, 'BUILD', time.perf_counter() - start)
+    print(f"  ✓ Built {len(MATERIALIZED_VIEWS)} materialized views")
+
+
+def swap_in():
+    """Atomically replace live tables with the shadow generation"""
+    print("Swapping shadow tables in...")
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {PREVIOUS_SCHEMA}"))
+        resolved = _carry_alert_resolutions(conn, 'public', SHADOW_SCHEMA)
+        _drop_plain_predecessors(conn)
+        _move_materialized_views(conn, 'public', PREVIOUS_SCHEMA)
+        _move_materialized_views(conn, SHADOW_SCHEMA, 'public')
+        for name in REBUILD_TABLES:
+            conn.execute(text(f"ALTER TABLE IF EXISTS public.{name} SET SCHEMA {PREVIOUS_SCHEMA}"))
+            conn.execute(text(f"ALTER TABLE {SHADOW_SCHEMA}.{name} SET SCHEMA public"))
+        _repoint_views(conn)
+        conn.execute(text(f"DROP SCHEMA {SHADOW_SCHEMA}"))
+    print(f"  ✓ Swapped {len(REBUILD_TABLES)} tables + {len(MATERIALIZED_VIEWS)} materialized views (old generation kept in {PREVIOUS_SCHEMA})")
+    if resolved:
+        print(f"  ✓ Kept {resolved} alerts resolved during the rebuild")
+
+
+def rollback_generation() -> bool:
+    """
+    Swap the previous generation back in
+
+    Returns:
+        False if there is no previous generation to restore
+    """
+    print("Rolling back to previous warehouse generation...")
+    with warehouse_lock(exclusive=True), engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM information_schema.schemata WHERE schema_name = :s"),
+            {'s': PREVIOUS_SCHEMA}
+        ).fetchone()
+        if not exists:
+            print(f"  ⚠ No previous generation ({PREVIOUS_SCHEMA} not found)")
+            return False
+
+        conn.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SHADOW_SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SHADOW_SCHEMA}"))
+        _carry_alert_resolutions(conn, 'public', PREVIOUS_SCHEMA)
+        _move_materialized_views(conn, 'public', SHADOW_SCHEMA)
+        _move_materialized_views(conn, PREVIOUS_SCHEMA, 'public')
+        for name in REBUILD_TABLES:
+            conn.execute(text(f"ALTER TABLE IF EXISTS public.{name} SET SCHEMA {SHADOW_SCHEMA}"))
+            conn.execute(text(f"ALTER TABLE IF EXISTS {PREVIOUS_SCHEMA}.{name} SET SCHEMA public"))
+        _repoint_views(conn)
+        conn.execute(text(f"DROP SCHEMA {PREVIOUS_SCHEMA}"))
+    print(f"  ✓ Restored previous generation (rolled-back tables left in {SHADOW_SCHEMA})")
+    return True
+
+
+def rebuild_warehouse():
+    """Full transform into shadow tables + atomic swap (replaces truncate + transform)"""
+    from src.etl.transform import Transformer
+
+    with warehouse_lock(exclusive=True):
+        prepare_shadow_tables()
+
+        with shadow_session() as db:
+            Transformer(db).transform_all()
+
+        build_deferred_indexes()
+        build_shadow_views()
+        swap_in()
@@ -10,11 +10,12 @@ Applies all business logic:
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+from datetime import date, datetime, timedelta
+from dataclasses import dataclass, field
 import hashlib
 import json
-from sqlalchemy import func, text
+from sqlalchemy import func, text, table as sa_table, column as sa_column
 
 from sqlalchemy.orm import Session
 
@@ -30,10 +31,10 @@ from src.db.models import (
     # Dimension tables
     DimMaterial, DimUomConversion, DimPlant, DimMvt,
 )
-from src.core.netting import StackNettingEngine, get_stock_impact
+from src.core.netting import StackNettingEngine, get_stock_impact, NETTING_PAIRS, extend_stack, stack_entry
 from src.core.uom_converter import UomConverter
 from src.core.business_logic import OrderClassifier, LeadTimeCalculator
-from src.core.alerts import AlertDetector
+from src.core.alerts import AlertDetector, AlertRule, ALERT_RULES, rules_for
 from src.config import PLANT_ROLES, MVT_REVERSAL_PAIRS, STOCK_IMPACT
 
 
@@ -99,6 +100,59 @@ def compute_row_hash(data: Dict) -> str:
     return hashlib.md5(json_str.encode()).hexdigest()
 
 
+@dataclass
+class LeadTimeScope:
+    """
+    Source keys changed by an upload - transform_lead_time(scope=...) only
+    recomputes the lead-time rows that depend on them
+    
+    Deliveries and purchase orders are resolved to batches through MB51
+    (MVT 601 reference / MVT 101 PO); sales orders and materials select the
+    production orders whose channel lookup they feed.
+    """
+    order_numbers: Set[str] = field(default_factory=set)
+    batches: Set[str] = field(default_factory=set)
+    purchase_orders: Set[str] = field(default_factory=set)
+    deliveries: Set[str] = field(default_factory=set)
+    sales_orders: Set[str] = field(default_factory=set)
+    materials: Set[str] = field(default_factory=set)
+    
+    def is_empty(self) -> bool:
+        return not any((
+            self.order_numbers, self.batches, self.purchase_orders,
+            self.deliveries, self.sales_orders, self.materials
+        ))
+
+
+# Raw rows loaded since an upload started → LeadTimeScope field (per file type)
+LEAD_TIME_SCOPE_SOURCES = {
+    'COOISPI': [
+        ('order_numbers', 'SELECT DISTINCT TRIM("order") FROM raw_cooispi WHERE loaded_at >= :since'),
+        ('batches', 'SELECT DISTINCT TRIM(batch) FROM raw_cooispi WHERE loaded_at >= :since'),
+    ],
+    'MB51': [
+        ('batches', 'SELECT DISTINCT TRIM(col_6_batch) FROM raw_mb51 WHERE loaded_at >= :since'),
+        ('purchase_orders', 'SELECT DISTINCT TRIM(col_15_purchase_order) FROM raw_mb51 WHERE loaded_at >= :since'),
+    ],
+    'ZRMM024': [
+        ('purchase_orders', 'SELECT DISTINCT TRIM(purch_order) FROM raw_zrmm024 WHERE loaded_at >= :since'),
+    ],
+    'ZRSD002': [
+        ('sales_orders', 'SELECT DISTINCT TRIM(so_number) FROM raw_zrsd002 WHERE loaded_at >= :since'),
+    ],
+    'ZRSD004': [
+        ('deliveries', 'SELECT DISTINCT TRIM(delivery) FROM raw_zrsd004 WHERE loaded_at >= :since'),
+    ],
+    'ZRSD006': [
+        ('materials', """
+            SELECT DISTINCT TRIM(CASE WHEN jsonb_typeof(raw_data) = 'string'
+                                      THEN (raw_data #>> '{}')::jsonb ELSE raw_data END ->> 'Material Code')
+            FROM raw_zrsd006 WHERE loaded_at >= :since
+        """),
+    ],
+}
+
+
 class Transformer:
     """
     Transform raw data to warehouse with business logic applied
@@ -107,11 +161,16 @@ class Transformer:
     def __init__(self, db: Session):
         self.db = db
         self.classifier = OrderClassifier()
-        self.uom_converter = UomConverter()
+        self.uom_converter = UomConverter(db)  # Lazily loaded from dim_uom_conversion
         self.netting_engine = None  # Will be initialized when needed
     
     def truncate_warehouse(self):
-        """Truncate warehouse fact and dimension tables to prevent duplication"""
+        """
+        Truncate warehouse fact and dimension tables to prevent duplication
+        
+        Dashboards see empty tables until the next transform finishes;
+        full pipeline runs use src.etl.shadow_rebuild.rebuild_warehouse instead.
+        """
         print("Truncating warehouse tables...")
         
         from sqlalchemy import text
@@ -125,11 +184,17 @@ class Transformer:
             'fact_billing',
             'fact_delivery',
             'fact_ar_aging',
+            'fact_ar_aging_snapshot',
             'fact_target',
             'fact_production_chain',
             'fact_mto_orders',
             'fact_alerts',
+            'fact_alert_conditions',
             'fact_lead_time',
+            'fact_lead_time_daily',
+            'fact_sales_daily',
+            'fact_sales_monthly',
+            'fact_batch_netting',
             # Dimension tables
             'dim_uom_conversion',
             'dim_plant',
@@ -148,9 +213,12 @@ class Transformer:
         
         print("✓ Warehouse truncated")
     
-    def load_raw_to_df(self, model_class) -> pd.DataFrame:
-        """Load raw table to DataFrame"""
-        records = self.db.query(model_class).all()
+    def load_raw_to_df(self, model_class, where: Optional[str] = None, params: Optional[Dict] = None) -> pd.DataFrame:
+        """Load raw table to DataFrame (optionally only rows matching a SQL condition)"""
+        query = self.db.query(model_class)
+        if where:
+            query = query.filter(text(where)).params(**(params or {}))
+        records = query.all()
         if not records:
             return pd.DataFrame()
         
@@ -236,29 +304,20 @@ class Transformer:
             print("  ⚠ No data in raw_cooispi")
             return
         
+        # Normalize quantities to KG using UOM converter (vectorized)
+        raw_df = self.uom_converter.normalize_frame(
+            raw_df, 'order_quantity', 'unit_of_measure', 'material_number', 'order_qty_kg'
+        )
+        raw_df = self.uom_converter.normalize_frame(
+            raw_df, 'delivered_quantity', 'unit_of_measure', 'material_number', 'delivered_qty_kg'
+        )
+        
         count = 0
         for _, row in raw_df.iterrows():
             # Apply business logic
             is_mto = self.classifier.is_mto(row)
             order_status = self.classifier.get_order_status(row)
             
-            # Normalize quantities to KG using UOM converter
-            material_code = row.get('material_number')
-            uom = row.get('unit_of_measure')
-            order_qty = row.get('order_quantity')
-            delivered_qty = row.get('delivered_quantity')
-            
-            order_qty_kg = None
-            delivered_qty_kg = None
-            
-            if material_code and uom:
-                kg_per_unit = self.uom_converter.get_kg_per_unit(str(material_code))
-                if kg_per_unit:
-                    if order_qty:
-                        order_qty_kg = float(order_qty) * kg_per_unit if uom == 'PC' else float(order_qty)
-                    if delivered_qty:
-                        delivered_qty_kg = float(delivered_qty) * kg_per_unit if uom == 'PC' else float(delivered_qty)
-            
             # Compute hash for change detection
             hash_data = {
                 'order': row.get('order'),
@@ -300,8 +359,8 @@ class Transformer:
                     order_qty=clean_value(row.get('order_quantity')),
                     delivered_qty=clean_value(row.get('delivered_quantity')),
                     uom=clean_value(row.get('unit_of_measure')),
-                    order_qty_kg=clean_value(order_qty_kg),
-                    delivered_qty_kg=clean_value(delivered_qty_kg),
+                    order_qty_kg=clean_value(row.get('order_qty_kg')),
+                    delivered_qty_kg=clean_value(row.get('delivered_qty_kg')),
                     is_mto=is_mto,
                     order_status=order_status,
                     row_hash=row_hash,
@@ -352,29 +411,9 @@ class Transformer:
             lambda x: get_stock_impact(x) if pd.notna(x) else 0
         )
         
-        # Convert qty to KG for each transaction
-        def convert_to_kg(row):
-            material = row.get('col_4_material')
-            uom = row.get('col_8_uom')
-            qty = row.get('col_7_qty')
-            
-            if pd.isna(qty):
-                return 0.0
-            
-            # If already in KG, return as-is
-            if uom == 'KG':
-                return float(qty)
-            
-            # If in PC, need conversion
-            if uom == 'PC' and not pd.isna(material):
-                kg_per_unit = self.uom_converter.get_kg_per_unit(str(material))
-                if kg_per_unit:
-                    return float(qty) * kg_per_unit
-            
-            # Default: can't convert, return 0
-            return 0.0
-        
-        raw_df['qty_kg'] = raw_df.apply(convert_to_kg, axis=1)
+        # Convert qty to KG for each transaction (default: can't convert → 0)
+        raw_df = self.uom_converter.normalize_frame(raw_df, 'col_7_qty', 'col_8_uom', 'col_4_material')
+        raw_df['qty_kg'] = raw_df['qty_kg'].fillna(0.0)
         
         # Create INDIVIDUAL fact records (preserve real mvt_types: 601, 101, 261, etc.)
         count = 0
@@ -451,6 +490,270 @@ class Transformer:
         print(f"    Movement types preserved: 601, 101, 261, etc. (NO aggregation, NO mvt_type=999)")
 
     
+    def transform_batch_netting(self) -> Set[str]:
+        """
+        Maintain fact_batch_netting (persisted LIFO state per plant/batch/MVT pair)
+        
+        Incremental: only (plant, batch, pair) groups whose raw_mb51 rows changed
+        are re-netted. Rows appended after the stored state (higher id, posting
+        date not before last_posting_date) continue the stored stack; anything
+        else (edited/deleted rows, back-dated postings) replays the group.
+        
+        Returns:
+            Batches whose netting state changed (re-netted or removed)
+        """
+        print("Updating batch netting state (fact_batch_netting)...")
+        keys = ['plant_code', 'batch', 'mvt_pair']
+        pair_of = {}
+        for fwd, rev in NETTING_PAIRS:
+            pair_of[fwd] = pair_of[rev] = f"{fwd}/{rev}"
+        pair_values = ', '.join(f"({mvt}, '{pair}')" for mvt, pair in pair_of.items())
+        
+        # 1. Fingerprint every group in SQL, compare with stored state
+        current = pd.DataFrame(self.db.execute(text(f"""
+            SELECT m.col_2_plant AS plant_code, m.col_6_batch AS batch, p.mvt_pair,
+                   md5(string_agg(m.id::text || ':' || COALESCE(m.row_hash, ''), ',' ORDER BY m.id)) AS fingerprint
+            FROM raw_mb51 m
+            JOIN (VALUES {pair_values}) AS p(mvt_type, mvt_pair) ON p.mvt_type = m.col_1_mvt_type
+            WHERE m.col_6_batch IS NOT NULL AND m.col_2_plant IS NOT NULL
+            GROUP BY m.col_2_plant, m.col_6_batch, p.mvt_pair
+        """)).mappings().all(), columns=keys + ['fingerprint'])
+        stored = pd.DataFrame(self.db.execute(text("""
+            SELECT plant_code, batch, mvt_pair, source_fingerprint, last_raw_id,
+                   last_posting_date, surviving_stack, total_forward, total_reverse, material_code
+            FROM fact_batch_netting
+        """)).mappings().all(), columns=keys + [
+            'source_fingerprint', 'last_raw_id', 'last_posting_date',
+            'surviving_stack', 'total_forward', 'total_reverse', 'material_code'
+        ])
+        merged = current.merge(stored, on=keys, how='outer', indicator=True)
+        
+        gone = merged[merged['_merge'] == 'right_only']
+        if not gone.empty:
+            self.db.execute(
+                text("DELETE FROM fact_batch_netting WHERE plant_code = :plant_code AND batch = :batch AND mvt_pair = :mvt_pair"),
+                gone[keys].to_dict('records')
+            )
+        
+        touched = merged[
+            (merged['_merge'] == 'left_only')
+            | ((merged['_merge'] == 'both') & (merged['fingerprint'] != merged['source_fingerprint']))
+        ].drop(columns='_merge')
+        if touched.empty:
+            flagged = self._apply_netting_flags(gone[keys], pair_values)
+            self.db.commit()
+            print(f"  ✓ Netting up to date ({len(current)} groups, removed {len(gone)}, {flagged} movements flagged)")
+            return set(gone['batch'])
+        
+        # 2. Load movements of touched batches only
+        movements = pd.DataFrame(self.db.execute(text("""
+            SELECT id, col_0_posting_date, col_1_mvt_type, col_2_plant, col_6_batch,
+                   col_4_material, col_7_qty, col_11_material_doc, row_hash
+            FROM raw_mb51
+            WHERE col_6_batch = ANY(:batches) AND col_1_mvt_type = ANY(:mvts)
+            ORDER BY id
+        """), {
+            'batches': touched['batch'].unique().tolist(),
+            'mvts': list(pair_of),
+        }).mappings().all())
+        movements['mvt_pair'] = movements['col_1_mvt_type'].map(pair_of)
+        movements['col_0_posting_date'] = pd.to_datetime(movements['col_0_posting_date'], errors='coerce')
+        movements = movements.merge(
+            touched[keys + ['last_raw_id', 'last_posting_date', 'source_fingerprint']],
+            left_on=['col_2_plant', 'col_6_batch', 'mvt_pair'], right_on=keys
+        )
+        state_by_key = touched.set_index(keys)
+        
+        def fingerprint(rows: pd.DataFrame) -> str:
+            parts = [f"{i}:{h or ''}" for i, h in zip(rows['id'], rows['row_hash'])]
+            return hashlib.md5(','.join(parts).encode()).hexdigest()
+        
+        # 3. Decide per group: continue stored stack or replay
+        records = []
+        replay_keys = []
+        for key, rows in movements.groupby(keys, sort=False):
+            state = state_by_key.loc[key]
+            fwd, rev = (int(m) for m in key[2].split('/'))
+            last_raw_id = state['last_raw_id']
+            last_posting = state['last_posting_date']
+            
+            if pd.isna(last_raw_id) or pd.isna(last_posting):
+                replay_keys.append(key)
+                continue
+            old_rows = rows[rows['id'] <= last_raw_id]
+            new_rows = rows[rows['id'] > last_raw_id]
+            if (
+                fingerprint(old_rows) != state['source_fingerprint']
+                or new_rows['col_0_posting_date'].isna().any()
+                or new_rows['col_0_posting_date'].min() < pd.Timestamp(last_posting)
+            ):
+                replay_keys.append(key)
+                continue
+            
+            new_rows = new_rows.sort_values(['col_0_posting_date', 'id'], kind='mergesort').rename(columns={
+                'id': 'raw_id', 'col_0_posting_date': 'posting_date', 'col_1_mvt_type': 'mvt_type',
+                'col_7_qty': 'qty', 'col_11_material_doc': 'material_doc'
+            })
+            stack, n_fwd, n_rev = extend_stack(list(state['surviving_stack'] or []), new_rows, fwd, rev)
+            records.append(self._batch_netting_record(
+                key, fwd, rev, stack,
+                total_forward=int(state['total_forward'] or 0) + n_fwd,
+                total_reverse=int(state['total_reverse'] or 0) + n_rev,
+                material=state['material_code'],
+                rows=rows, fingerprint=fingerprint(rows)
+            ))
+        incremental = len(records)
+        
+        # Replay: single-pass engine per MVT pair over the affected groups
+        if replay_keys:
+            replay = movements.merge(pd.DataFrame(replay_keys, columns=keys), on=keys)
+            raw_columns = [
+                'id', 'col_0_posting_date', 'col_1_mvt_type', 'col_2_plant', 'col_6_batch',
+                'col_4_material', 'col_7_qty', 'col_11_material_doc'
+            ]
+            for fwd, rev in NETTING_PAIRS:
+                pair_rows = replay[replay['mvt_pair'] == f"{fwd}/{rev}"]
+                if pair_rows.empty:
+                    continue
+                valid = StackNettingEngine(pair_rows[raw_columns]).get_valid_movements(fwd, rev)
+                stacks = {
+                    (int(p), b): [stack_entry(r.id, r.posting_date, r.qty, r.material_doc) for r in grp.itertuples()]
+                    for (p, b), grp in valid.groupby(['plant', 'batch'], sort=False)
+                }
+                for key, rows in pair_rows.groupby(keys, sort=False):
+                    records.append(self._batch_netting_record(
+                        key, fwd, rev, stacks.get((int(key[0]), key[1]), []),
+                        total_forward=int((rows['col_1_mvt_type'] == fwd).sum()),
+                        total_reverse=int((rows['col_1_mvt_type'] == rev).sum()),
+                        material=rows['col_4_material'].iloc[0],
+                        rows=rows, fingerprint=fingerprint(rows)
+                    ))
+        
+        # 4. Upsert state
+        self.db.execute(text("""
+            INSERT INTO fact_batch_netting (
+                plant_code, batch, mvt_pair, forward_mvt, reverse_mvt, material_code,
+                total_forward, total_reverse, remaining_forward, netted_count,
+                first_valid_date, last_valid_date, net_qty, is_fully_reversed, surviving_stack,
+                last_raw_id, last_posting_date, source_fingerprint, updated_at
+            ) VALUES (
+                :plant_code, :batch, :mvt_pair, :forward_mvt, :reverse_mvt, :material_code,
+                :total_forward, :total_reverse, :remaining_forward, :netted_count,
+                :first_valid_date, :last_valid_date, :net_qty, :is_fully_reversed, CAST(:surviving_stack AS JSONB),
+                :last_raw_id, :last_posting_date, :source_fingerprint, NOW()
+            )
+            ON CONFLICT (plant_code, batch, mvt_pair) DO UPDATE SET
+                material_code = EXCLUDED.material_code,
+                total_forward = EXCLUDED.total_forward,
+                total_reverse = EXCLUDED.total_reverse,
+                remaining_forward = EXCLUDED.remaining_forward,
+                netted_count = EXCLUDED.netted_count,
+                first_valid_date = EXCLUDED.first_valid_date,
+                last_valid_date = EXCLUDED.last_valid_date,
+                net_qty = EXCLUDED.net_qty,
+                is_fully_reversed = EXCLUDED.is_fully_reversed,
+                surviving_stack = EXCLUDED.surviving_stack,
+                last_raw_id = EXCLUDED.last_raw_id,
+                last_posting_date = EXCLUDED.last_posting_date,
+                source_fingerprint = EXCLUDED.source_fingerprint,
+                updated_at = NOW()
+        """), records)
+        flagged = self._apply_netting_flags(pd.concat([touched[keys], gone[keys]]), pair_values)
+        self.db.commit()
+        print(f"  ✓ Netted {len(records)} changed groups "
+              f"(incremental: {incremental}, replayed: {len(records) - incremental}, removed: {len(gone)}, "
+              f"{flagged} movements flagged)")
+        return set(touched['batch']) | set(gone['batch'])
+    
+    def _apply_netting_flags(self, groups: pd.DataFrame, pair_values: str) -> int:
+        """
+        fact_inventory.is_netted / net_qty from the persisted surviving stacks
+        
+        A movement of a netting pair survives iff its raw_id is on the stack of
+        its (plant, batch, pair): survivors keep net_qty = qty, cancelled
+        forwards and reverses get is_netted and net_qty 0. Other movements pass
+        through (net_qty = qty). Updates the movements of `groups` (plant_code,
+        batch, mvt_pair) plus rows not flagged yet (net_qty NULL).
+        """
+        return self.db.execute(text(f"""
+            UPDATE fact_inventory fi
+            SET is_netted = n.is_netted, net_qty = n.net_qty
+            FROM (
+                SELECT f.id,
+                       (p.mvt_pair IS NOT NULL AND s.raw_id IS NULL) AS is_netted,
+                       CASE WHEN p.mvt_pair IS NOT NULL AND s.raw_id IS NULL THEN 0 ELSE f.qty END AS net_qty
+                FROM (
+                    SELECT f.* FROM fact_inventory f
+                    JOIN unnest(CAST(:plants AS INTEGER[]), CAST(:batches AS VARCHAR[])) AS g(plant_code, batch)
+                      ON g.plant_code = f.plant_code AND g.batch = f.batch
+                    UNION
+                    SELECT f.* FROM fact_inventory f WHERE f.net_qty IS NULL
+                ) f
+                LEFT JOIN (VALUES {pair_values}) AS p(mvt_type, mvt_pair)
+                  ON p.mvt_type = f.mvt_type AND f.batch IS NOT NULL
+                LEFT JOIN (
+                    SELECT bn.plant_code, bn.batch, bn.mvt_pair, (e ->> 'raw_id')::INTEGER AS raw_id
+                    FROM fact_batch_netting bn, jsonb_array_elements(bn.surviving_stack) e
+                ) s ON s.plant_code = f.plant_code AND s.batch = f.batch
+                   AND s.mvt_pair = p.mvt_pair AND s.raw_id = f.raw_id
+            ) n
+            WHERE fi.id = n.id
+              AND (fi.is_netted IS DISTINCT FROM n.is_netted OR fi.net_qty IS DISTINCT FROM n.net_qty)
+        """), {
+            'plants': [int(p) for p in groups['plant_code']],
+            'batches': [str(b) for b in groups['batch']],
+        }).rowcount
+    
+    def _batch_netting_record(
+        self, key, fwd: int, rev: int, stack: List[Dict],
+        total_forward: int, total_reverse: int, material, rows: pd.DataFrame, fingerprint: str
+    ) -> Dict:
+        """fact_batch_netting row from a surviving stack"""
+        dates = [pd.Timestamp(s['posting_date']) for s in stack if s['posting_date']]
+        posting = rows['col_0_posting_date']
+        return {
+            'plant_code': int(key[0]),
+            'batch': key[1],
+            'mvt_pair': key[2],
+            'forward_mvt': fwd,
+            'reverse_mvt': rev,
+            'material_code': clean_value(material),
+            'total_forward': total_forward,
+            'total_reverse': total_reverse,
+            'remaining_forward': len(stack),
+            'netted_count': total_forward - len(stack),
+            'first_valid_date': min(dates).to_pydatetime() if dates else None,
+            'last_valid_date': max(dates).to_pydatetime() if dates else None,
+            'net_qty': abs(sum(s['qty'] or 0 for s in stack)),
+            'is_fully_reversed': not stack,
+            'surviving_stack': json.dumps(stack),
+            'last_raw_id': int(rows['id'].max()),
+            'last_posting_date': None if posting.isna().any() else posting.max().to_pydatetime(),
+            'source_fingerprint': fingerprint,
+        }
+    
+    def load_batch_netting(
+        self, mvt_forward: int, mvt_reverse: int,
+        plant: Optional[int] = None, batches: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """Persisted netting state in StackNettingEngine.net_all_batches format (optionally for some batches)"""
+        rows = self.db.execute(text("""
+            SELECT batch, plant_code AS plant, material_code AS material, forward_mvt, reverse_mvt,
+                   total_forward, total_reverse, remaining_forward, netted_count,
+                   last_valid_date, first_valid_date, net_qty AS net_quantity, is_fully_reversed
+            FROM fact_batch_netting
+            WHERE mvt_pair = :pair AND (CAST(:plant AS INTEGER) IS NULL OR plant_code = :plant)
+              AND (NOT :scoped OR batch = ANY(:batches))
+        """), {
+            'pair': f"{mvt_forward}/{mvt_reverse}", 'plant': plant,
+            'scoped': batches is not None, 'batches': batches or []
+        }).mappings().all()
+        return pd.DataFrame(rows, columns=[
+            'batch', 'plant', 'material', 'forward_mvt', 'reverse_mvt',
+            'total_forward', 'total_reverse', 'remaining_forward', 'netted_count',
+            'last_valid_date', 'first_valid_date', 'net_quantity', 'is_fully_reversed'
+        ])
+    
     def transform_zrmm024(self):
         """Transform raw_zrmm024 to fact_purchase_order"""
         print("Transforming zrmm024 → fact_purchase_order...")
@@ -487,93 +790,188 @@ class Transformer:
         self.db.commit()
         print(f"  ✓ Transformed {count} purchase orders")
     
-    def transform_zrsd002(self):
-        """Transform raw_zrsd002 to fact_billing"""
+    def transform_zrsd002(self, since: Optional[datetime] = None):
+        """
+        Transform raw_zrsd002 to fact_billing with scoped replace
+        
+        Billing lines are bulk-upserted on (billing_document, billing_item);
+        only changed lines are rewritten, and items that disappeared from a
+        reloaded billing document are removed. Documents not present in
+        raw_zrsd002 are left untouched.
+        
+        Args:
+            since: Only re-transform billing documents with raw rows loaded
+                (or updated) since then - all their raw rows, so unchanged
+                items of a touched document are kept. None = all documents.
+        """
         print("Transforming zrsd002 → fact_billing...")
         
-        raw_df = self.load_raw_to_df(RawZrsd002)
+        if since is None:
+            raw_df = self.load_raw_to_df(RawZrsd002)
+        else:
+            raw_df = self.load_raw_to_df(RawZrsd002, """billing_document IN (
+                SELECT billing_document FROM raw_zrsd002 WHERE loaded_at >= :since
+            )""", {'since': since})
         if raw_df.empty:
-            print("  ⚠ No data in raw_zrsd002")
+            print("  ⚠ No new data in raw_zrsd002" if since else "  ⚠ No data in raw_zrsd002")
             return
         
-        # Clear existing fact_billing rows to avoid unique constraint collisions on reruns
-        deleted_billing = self.db.query(FactBilling).delete(synchronize_session=False)
-        if deleted_billing:
-            print(f"  🔄 Cleared {deleted_billing} existing billing rows")
-        
-        count = 0
-        for _, row in raw_df.iterrows():
-            billing_document = row.get('billing_document')
-            
-            # Skip rows with null billing_document (critical field)
-            if pd.isna(billing_document):
-                continue
-            
-            billing_date = row.get('billing_date')
-            semester_info = self.classifier.get_semester(billing_date)
-            
-            # Normalize billing_qty to KG
-            material_code = row.get('material')
-            sales_unit = row.get('sales_unit')
-            billing_qty = row.get('billing_qty')
-            
-            billing_qty_kg = None
-            if material_code and sales_unit and billing_qty:
-                kg_per_unit = self.uom_converter.get_kg_per_unit(str(material_code))
-                if kg_per_unit:
-                    billing_qty_kg = float(billing_qty) * kg_per_unit if sales_unit == 'PC' else float(billing_qty)
-            
-            hash_data = {
-                'doc': billing_document,
-                'item': row.get('billing_item'),
-                'net_value': row.get('net_value')
+        # Skip rows with null billing_document (critical field)
+        raw_df = raw_df[raw_df['billing_document'].notna()]
+        
+        # Semester / year (vectorized OrderClassifier.get_semester)
+        billing_dt = pd.to_datetime(raw_df['billing_date'], errors='coerce')
+        semester = pd.Series(np.where(billing_dt.dt.month <= 6, 1, 2), index=raw_df.index)
+        semester = semester.where(billing_dt.notna()).astype('Int64')
+        year = billing_dt.dt.year.astype('Int64')
+        
+        # Normalize billing_qty to KG
+        billing_qty_kg = self.uom_converter.normalize_frame(
+            raw_df, 'billing_qty', 'sales_unit', 'material', 'billing_qty_kg'
+        )['billing_qty_kg']
+        
+        records = []
+        for row, sem, yr, qty_kg in zip(raw_df.to_dict('records'), semester, year, billing_qty_kg):
+            record = {
+                'billing_date': clean_value(row.get('billing_date')),
+                'billing_document': clean_value(row.get('billing_document')),
+                'billing_item': clean_value(row.get('billing_item')),
+                'sloc': clean_value(row.get('sloc')),
+                'sales_office': clean_value(row.get('sales_office')),
+                'dist_channel': clean_value(row.get('dist_channel')),
+                'customer_name': clean_value(row.get('customer_name')),
+                'cust_group': clean_value(row.get('cust_group')),
+                'salesman_name': clean_value(row.get('salesman_name')),
+                'material_code': clean_value(row.get('material')),
+                'material_description': clean_value(row.get('material_desc')),
+                'prod_hierarchy': clean_value(row.get('prod_hierarchy')),
+                'billing_qty': clean_value(row.get('billing_qty')),
+                'sales_unit': clean_value(row.get('sales_unit')),
+                'billing_qty_kg': clean_value(qty_kg),
+                'currency': clean_value(row.get('currency')),
+                'exchange_rate': clean_value(row.get('exchange_rate')),
+                'price': clean_value(row.get('price')),
+                'total_price': clean_value(row.get('total_price')),
+                'discount_item': clean_value(row.get('discount_item')),
+                'net_value': clean_value(row.get('net_value')),
+                'tax': clean_value(row.get('tax')),
+                'total': clean_value(row.get('total')),
+                'net_weight': clean_value(row.get('net_weight')),
+                'weight_unit': clean_value(row.get('weight_unit')),
+                'volume': clean_value(row.get('volume')),
+                'volume_unit': clean_value(row.get('volume_unit')),
+                'so_number': clean_value(row.get('so_number')),
+                'so_date': clean_value(row.get('so_date')),
+                'doc_reference_od': clean_value(row.get('doc_reference_od')),
+                'semester': clean_value(sem),
+                'year': clean_value(yr),
             }
-            row_hash = compute_row_hash(hash_data)
-            
-            fact = FactBilling(
-                billing_date=billing_date,
-                billing_document=clean_value(billing_document),
-                billing_item=clean_value(row.get('billing_item')),
-                sloc=clean_value(row.get('sloc')),
-                sales_office=clean_value(row.get('sales_office')),
-                dist_channel=clean_value(row.get('dist_channel')),
-                customer_name=clean_value(row.get('customer_name')),
-                cust_group=clean_value(row.get('cust_group')),
-                salesman_name=clean_value(row.get('salesman_name')),
-                material_code=clean_value(row.get('material')),
-                material_description=clean_value(row.get('material_desc')),
-                prod_hierarchy=clean_value(row.get('prod_hierarchy')),
-                billing_qty=clean_value(row.get('billing_qty')),
-                sales_unit=clean_value(row.get('sales_unit')),
-                billing_qty_kg=clean_value(billing_qty_kg),
-                currency=clean_value(row.get('currency')),
-                exchange_rate=clean_value(row.get('exchange_rate')),
-                price=clean_value(row.get('price')),
-                total_price=clean_value(row.get('total_price')),
-                discount_item=clean_value(row.get('discount_item')),
-                net_value=clean_value(row.get('net_value')),
-                tax=clean_value(row.get('tax')),
-                total=clean_value(row.get('total')),
-                net_weight=clean_value(row.get('net_weight')),
-                weight_unit=clean_value(row.get('weight_unit')),
-                volume=clean_value(row.get('volume')),
-                volume_unit=clean_value(row.get('volume_unit')),
-                so_number=clean_value(row.get('so_number')),
-                so_date=clean_value(row.get('so_date')),
-                doc_reference_od=clean_value(row.get('doc_reference_od')),
-                semester=semester_info['semester'] if semester_info else None,
-                year=semester_info['year'] if semester_info else None,
-                row_hash=row_hash,
-                raw_id=clean_value(row.get('id'))
+            # Hash every derived column so any change (incl. UOM factor) is picked up
+            record['row_hash'] = compute_row_hash(record)
+            record['raw_id'] = clean_value(row.get('id'))
+            records.append(record)
+        
+        # Rollup days touched: current dates of the staged documents + their new dates
+        billing_dates = None
+        if since is not None:
+            billing_dates = {
+                d.date() if isinstance(d, datetime) else d for d in (r['billing_date'] for r in records)
+            }
+            billing_dates.update(self.db.execute(text(
+                "SELECT DISTINCT billing_date FROM fact_billing WHERE billing_document = ANY(:documents)"
+            ), {'documents': list({r['billing_document'] for r in records})}).scalars().all())
+        
+        stats = self._bulk_upsert(
+            'fact_billing', records,
+            key_columns=['billing_document', 'billing_item'],
+            scope_column='billing_document'
+        )
+        self.db.commit()
+        
+        if stats['deleted']:
+            print(f"  🔄 Removed {stats['deleted']} billing lines no longer in their documents")
+        print(f"  ✓ Transformed {stats['inserted']} new, {stats['updated']} updated, {stats['skipped']} unchanged, "
+              f"{stats['duplicates']} duplicate billing records")
+        
+        self.refresh_sales_daily(billing_dates)
+        self.refresh_sales_monthly(
+            None if billing_dates is None else {d.replace(day=1) for d in billing_dates if d is not None}
+        )
+    
+    def refresh_sales_daily(self, billing_dates: Optional[Set[date]] = None):
+        """
+        Rebuild fact_sales_daily from fact_billing (one GROUP BY)
+        
+        Grain: billing_date × division × customer × sales order, so distinct
+        customer / order counts stay exact over any date range.
+        
+        Args:
+            billing_dates: Only rebuild these days (None = full rebuild; a None
+                element covers lines without billing_date)
+        """
+        if billing_dates is not None and not billing_dates:
+            return
+        day_filter, params = "", {}
+        if billing_dates is not None:
+            day_filter = "WHERE billing_date = ANY(:billing_dates) OR (:null_date AND billing_date IS NULL)"
+            params = {'billing_dates': sorted(d for d in billing_dates if d is not None),
+                      'null_date': None in billing_dates}
+        
+        self.db.execute(text(f"DELETE FROM fact_sales_daily {day_filter}"), params)
+        count = self.db.execute(text(f"""
+            INSERT INTO fact_sales_daily (
+                billing_date, division_code, customer_name, so_number, so_date,
+                net_value, line_count, invoice_count, refreshed_at
             )
-            self.db.add(fact)
-            count += 1
+            SELECT billing_date, dist_channel, customer_name, so_number, MIN(so_date),
+                   SUM(net_value), COUNT(*), COUNT(DISTINCT billing_document), NOW()
+            FROM fact_billing
+            {day_filter}
+            GROUP BY billing_date, dist_channel, customer_name, so_number
+        """), params).rowcount
+        self.db.commit()
+        print(f"  [OK] Refreshed fact_sales_daily ({count} rows)")
+    
+    def refresh_sales_monthly(self, months: Optional[Set[date]] = None):
+        """
+        Rebuild fact_sales_monthly from fact_sales_daily (one GROUP BY date_trunc)
         
+        Keeps the sales order in the grain, so distinct order counts stay
+        exact over any range of whole months.
+        
+        Args:
+            months: Only rebuild these months (first days; None = full rebuild)
+        """
+        if months is not None and not months:
+            return
+        month_filter, day_filter, params = "", "", {}
+        if months is not None:
+            month_filter = "WHERE billing_month = ANY(:months)"
+            day_filter = "AND CAST(date_trunc('month', billing_date) AS date) = ANY(:months)"
+            params = {'months': sorted(months)}
+        
+        self.db.execute(text(f"DELETE FROM fact_sales_monthly {month_filter}"), params)
+        count = self.db.execute(text(f"""
+            INSERT INTO fact_sales_monthly (
+                billing_month, division_code, customer_name, so_number,
+                net_value, line_count, refreshed_at
+            )
+            SELECT CAST(date_trunc('month', billing_date) AS date), division_code, customer_name, so_number,
+                   SUM(net_value), SUM(line_count), NOW()
+            FROM fact_sales_daily
+            WHERE billing_date IS NOT NULL {day_filter}
+            GROUP BY CAST(date_trunc('month', billing_date) AS date), division_code, customer_name, so_number
+        """), params).rowcount
         self.db.commit()
-        print(f"  ✓ Transformed {count} billing records")
+        print(f"  [OK] Refreshed fact_sales_monthly ({count} rows)")
     
     def transform_zrsd004(self):
-        """Transform raw_zrsd004 to fact_delivery with upsert logic"""
+        """
+        Transform raw_zrsd004 to fact_delivery with bulk upsert
+        
+        Rows are staged once and merged on (delivery, line_item), NULL
+        line_item included; unchanged rows (same row_hash) are not rewritten.
+        """
         print("Transforming zrsd004 → fact_delivery...")
         
         raw_df = self.load_raw_to_df(RawZrsd004)
@@ -581,158 +979,197 @@ class Transformer:
             print("  ⚠ No data in raw_zrsd004")
             return
         
-        inserted = 0
-        updated = 0
-        skipped = 0
-        
-        for _, row in raw_df.iterrows():
-            delivery_number = row.get('delivery')
-            
-            # Skip rows with null delivery_number (critical field)
-            if pd.isna(delivery_number):
-                continue
-            
-            # Normalize delivery_qty to KG
-            material_code = row.get('material')
-            delivery_qty = row.get('delivery_qty')
-            
-            delivery_qty_kg = None
-            if material_code and delivery_qty:
-                kg_per_unit = self.uom_converter.get_kg_per_unit(str(material_code))
-                if kg_per_unit:
-                    # Assume PC unit for delivery, normalize if needed
-                    delivery_qty_kg = float(delivery_qty) * kg_per_unit
-            
-            hash_data = {
-                'delivery': delivery_number,
-                'item': row.get('line_item'),
-                'qty': row.get('delivery_qty')
+        # Skip rows with null delivery_number (critical field)
+        raw_df = raw_df[raw_df['delivery'].notna()]
+        
+        # Normalize delivery_qty to KG (ZRSD004 has no sales unit - assume PC)
+        delivery_qty_kg = self.uom_converter.normalize_frame(
+            raw_df.assign(delivery_uom='PC'), 'delivery_qty', 'delivery_uom', 'material', 'delivery_qty_kg'
+        )['delivery_qty_kg']
+        
+        records = []
+        for row, qty_kg in zip(raw_df.to_dict('records'), delivery_qty_kg):
+            record = {
+                'delivery_date': clean_value(row.get('delivery_date')),
+                'actual_gi_date': clean_value(row.get('actual_gi_date')),
+                'delivery': clean_value(row.get('delivery')),
+                'line_item': clean_value(row.get('line_item')),
+                'so_reference': clean_value(row.get('so_reference')),
+                'shipping_point': clean_value(row.get('shipping_point')),
+                'sloc': clean_value(row.get('sloc')),
+                'sales_office': clean_value(row.get('sales_office')),
+                'dist_channel': clean_value(row.get('dist_channel')),
+                'cust_group': clean_value(row.get('cust_group')),
+                'sold_to_party': clean_value(row.get('sold_to_party')),
+                'ship_to_party': clean_value(row.get('ship_to_party')),
+                'ship_to_name': clean_value(row.get('ship_to_name')),
+                'ship_to_city': clean_value(row.get('ship_to_city')),
+                'salesman_id': clean_value(row.get('salesman_id')),
+                'salesman_name': clean_value(row.get('salesman_name')),
+                'material_code': clean_value(row.get('material')),
+                'material_description': clean_value(row.get('material_desc')),
+                'delivery_qty': clean_value(row.get('delivery_qty')),
+                'delivery_qty_kg': clean_value(qty_kg),
+                'tonase': clean_value(row.get('tonase')),
+                'tonase_unit': clean_value(row.get('tonase_unit')),
+                'net_weight': clean_value(row.get('net_weight')),
+                'volume': clean_value(row.get('volume')),
+                'prod_hierarchy': clean_value(row.get('prod_hierarchy')),
             }
-            row_hash = compute_row_hash(hash_data)
-            
-            # Check if record exists (business key: delivery + line_item)
-            existing = self.db.query(FactDelivery).filter_by(
-                delivery=clean_value(delivery_number),
-                line_item=clean_value(row.get('line_item'))
-            ).first()
-            
-            if existing:
-                # Check if data changed
-                if existing.row_hash == row_hash:
-                    skipped += 1
-                    continue
-                
-                # Update existing record
-                existing.delivery_date = clean_value(row.get('delivery_date'))
-                existing.actual_gi_date = clean_value(row.get('actual_gi_date'))
-                existing.so_reference = clean_value(row.get('so_reference'))
-                existing.shipping_point = clean_value(row.get('shipping_point'))
-                existing.sloc = clean_value(row.get('sloc'))
-                existing.sales_office = clean_value(row.get('sales_office'))
-                existing.dist_channel = clean_value(row.get('dist_channel'))
-                existing.cust_group = clean_value(row.get('cust_group'))
-                existing.sold_to_party = clean_value(row.get('sold_to_party'))
-                existing.ship_to_party = clean_value(row.get('ship_to_party'))
-                existing.ship_to_name = clean_value(row.get('ship_to_name'))
-                existing.ship_to_city = clean_value(row.get('ship_to_city'))
-                existing.salesman_id = clean_value(row.get('salesman_id'))
-                existing.salesman_name = clean_value(row.get('salesman_name'))
-                existing.material_code = clean_value(row.get('material'))
-                existing.material_description = clean_value(row.get('material_desc'))
-                existing.delivery_qty = clean_value(row.get('delivery_qty'))
-                existing.delivery_qty_kg = clean_value(delivery_qty_kg)
-                existing.tonase = clean_value(row.get('tonase'))
-                existing.tonase_unit = clean_value(row.get('tonase_unit'))
-                existing.net_weight = clean_value(row.get('net_weight'))
-                existing.volume = clean_value(row.get('volume'))
-                existing.prod_hierarchy = clean_value(row.get('prod_hierarchy'))
-                existing.row_hash = row_hash
-                existing.raw_id = clean_value(row.get('id'))
-                updated += 1
-            else:
-                # Insert new record
-                fact = FactDelivery(
-                    delivery_date=clean_value(row.get('delivery_date')),
-                    actual_gi_date=clean_value(row.get('actual_gi_date')),
-                    delivery=clean_value(delivery_number),
-                    line_item=clean_value(row.get('line_item')),
-                    so_reference=clean_value(row.get('so_reference')),
-                    shipping_point=clean_value(row.get('shipping_point')),
-                    sloc=clean_value(row.get('sloc')),
-                    sales_office=clean_value(row.get('sales_office')),
-                    dist_channel=clean_value(row.get('dist_channel')),
-                    cust_group=clean_value(row.get('cust_group')),
-                    sold_to_party=clean_value(row.get('sold_to_party')),
-                    ship_to_party=clean_value(row.get('ship_to_party')),
-                    ship_to_name=clean_value(row.get('ship_to_name')),
-                    ship_to_city=clean_value(row.get('ship_to_city')),
-                    salesman_id=clean_value(row.get('salesman_id')),
-                    salesman_name=clean_value(row.get('salesman_name')),
-                    material_code=clean_value(row.get('material')),
-                    material_description=clean_value(row.get('material_desc')),
-                    delivery_qty=clean_value(row.get('delivery_qty')),
-                    delivery_qty_kg=clean_value(delivery_qty_kg),
-                    tonase=clean_value(row.get('tonase')),
-                    tonase_unit=clean_value(row.get('tonase_unit')),
-                    net_weight=clean_value(row.get('net_weight')),
-                    volume=clean_value(row.get('volume')),
-                    prod_hierarchy=clean_value(row.get('prod_hierarchy')),
-                    row_hash=row_hash,
-                    raw_id=clean_value(row.get('id'))
-                )
-                self.db.add(fact)
-                inserted += 1
+            # Hash every derived column so any change (incl. UOM factor) is picked up
+            record['row_hash'] = compute_row_hash(record)
+            record['raw_id'] = clean_value(row.get('id'))
+            records.append(record)
         
+        stats = self._bulk_upsert('fact_delivery', records, key_columns=['delivery', 'line_item'])
         self.db.commit()
-        print(f"  ✓ Transformed {inserted} new, {updated} updated, {skipped} skipped")
+        print(f"  ✓ Transformed {stats['inserted']} new, {stats['updated']} updated, {stats['skipped']} unchanged, "
+              f"{stats['duplicates']} duplicate")
+    
+    def _bulk_upsert(
+        self,
+        table_name: str,
+        records: List[Dict],
+        key_columns: List[str],
+        scope_column: Optional[str] = None,
+        prune: bool = False,
+        prune_where: Optional[str] = None,
+        prune_params: Optional[Dict] = None
+    ) -> Dict[str, int]:
+        """
+        Stage records in a temp table and merge them with one INSERT ... ON CONFLICT
+        
+        Requires a unique index on key_columns. Rows whose row_hash matches the
+        stored one are left untouched. Duplicate keys within the batch keep the
+        row with the highest raw_id (last loaded wins) when the table has raw_id.
+        
+        Args:
+            table_name: Target fact table (must have row_hash, created_at)
+            records: List of column dicts, all with the same keys
+            key_columns: Business key columns (ON CONFLICT target)
+            scope_column: Optional document column; existing rows of a staged
+                document whose key is no longer staged are deleted
+            prune: Full refresh - delete every existing row whose key is not staged
+            prune_where: Optional SQL condition on alias t limiting the prune
+                (scoped refresh), with prune_params binds
+        
+        Returns:
+            Dict with inserted / updated / skipped (unchanged) / duplicates
+            (in-batch repeats of a key) / deleted counts
+        """
+        prune_filter = f"AND ({prune_where})" if prune_where else ""
+        if not records:
+            deleted = 0
+            if prune:
+                deleted = self.db.execute(
+                    text(f"DELETE FROM {table_name} t WHERE TRUE {prune_filter}"), prune_params or {}
+                ).rowcount
+            return {'inserted': 0, 'updated': 0, 'skipped': 0, 'duplicates': 0, 'deleted': deleted}
+        
+        columns = list(records[0].keys())
+        col_list = ', '.join(columns)
+        keys = ', '.join(key_columns)
+        order_by = f"{keys}, raw_id DESC" if 'raw_id' in columns else keys
+        stage_name = f"stg_{table_name}"
+        
+        self.db.execute(text(f"DROP TABLE IF EXISTS {stage_name}"))
+        self.db.execute(text(f"""
+            CREATE TEMP TABLE {stage_name} ON COMMIT DROP AS
+            SELECT {col_list} FROM {table_name} WITH NO DATA
+        """))
+        stage = sa_table(stage_name, *[sa_column(c) for c in columns])
+        self.db.execute(stage.insert(), records)
+        staged = self.db.execute(text(f"SELECT COUNT(*) FROM (SELECT DISTINCT {keys} FROM {stage_name}) k")).scalar()
+        
+        updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in columns if c not in key_columns)
+        result = self.db.execute(text(f"""
+            INSERT INTO {table_name} ({col_list}, created_at)
+            SELECT DISTINCT ON ({keys}) {col_list}, NOW()
+            FROM {stage_name}
+            ORDER BY {order_by}
+            ON CONFLICT ({keys}) DO UPDATE SET {updates}
+            WHERE {table_name}.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+            RETURNING (xmax = 0) AS inserted
+        """))
+        flags = [row.inserted for row in result]
+        
+        deleted = 0
+        if scope_column:
+            key_match = ' AND '.join(f"s.{c} = t.{c}" for c in key_columns)
+            deleted = self.db.execute(text(f"""
+                DELETE FROM {table_name} t
+                WHERE t.{scope_column} IN (SELECT {scope_column} FROM {stage_name})
+                  AND NOT EXISTS (SELECT 1 FROM {stage_name} s WHERE {key_match})
+            """)).rowcount
+        elif prune:
+            # COALESCE keeps NULL key parts comparable (and the anti-join hashable)
+            key_match = ' AND '.join(f"COALESCE(s.{c}::text, '') = COALESCE(t.{c}::text, '')" for c in key_columns)
+            deleted = self.db.execute(text(f"""
+                DELETE FROM {table_name} t
+                WHERE NOT EXISTS (SELECT 1 FROM {stage_name} s WHERE {key_match})
+                {prune_filter}
+            """), prune_params or {}).rowcount
+        
+        self.db.execute(text(f"DROP TABLE {stage_name}"))
+        
+        inserted = sum(1 for f in flags if f)
+        return {
+            'inserted': inserted,
+            'updated': len(flags) - inserted,
+            'skipped': staged - len(flags),
+            'duplicates': len(records) - staged,
+            'deleted': deleted,
+        }
     
     def transform_zrfi005(self, target_date: Optional[str] = None):
         """
-        Transform raw_zrfi005 to fact_ar_aging
+        Transform raw_zrfi005 to fact_ar_aging (+ fact_ar_aging_snapshot rollup)
         
         Args:
             target_date: Optional snapshot date (YYYY-MM-DD) to transform.
-                        If None, uses the latest snapshot_date.
+                        If None, every snapshot_date in raw_zrfi005 is transformed.
         
         Business Rule: Support multiple historical snapshots
         - Raw table keeps all historical snapshots (never delete)
         - Fact table is rebuilt per snapshot (clear old, rebuild new for that date)
         - Users can select which snapshot to view via API parameter
+        
+        AR is materialized only here (ingestion path) - the AR endpoints are
+        pure reads of fact_ar_aging / fact_ar_aging_snapshot.
         """
         print("Transforming zrfi005 → fact_ar_aging...")
         
-        # Determine which snapshot to use
-        from sqlalchemy import func
+        # Determine which snapshots to use
         from datetime import datetime as dt
         
         if target_date:
             # Convert string to date
             try:
-                snapshot_to_use = dt.strptime(target_date, '%Y-%m-%d').date()
+                snapshots = [dt.strptime(target_date, '%Y-%m-%d').date()]
             except ValueError:
                 print(f"  ❌ Invalid date format: {target_date}. Expected YYYY-MM-DD")
                 return
         else:
-            # Find the latest snapshot_date in raw data
-            snapshot_to_use = self.db.query(
-                func.max(RawZrfi005.snapshot_date)
-            ).filter(
-                RawZrfi005.snapshot_date != None
-            ).scalar()
-        
-        if not snapshot_to_use:
+            snapshots = [
+                r[0] for r in self.db.query(RawZrfi005.snapshot_date)
+                .filter(RawZrfi005.snapshot_date != None)
+                .distinct().order_by(RawZrfi005.snapshot_date)
+            ]
+        
+        if not snapshots:
             print("  ⚠ No data with snapshot_date in raw_zrfi005")
             return
         
-        print(f"  📅 Transforming snapshot: {snapshot_to_use}")
+        for snapshot_to_use in snapshots:
+            self._transform_ar_snapshot(snapshot_to_use)
+    
+    def _transform_ar_snapshot(self, snapshot_to_use: date):
+        """
+        Rebuild one snapshot of fact_ar_aging and its rollup in one transaction
         
-        # Clear fact records for THIS snapshot only (keep other snapshots)
-        deleted = self.db.query(FactArAging).filter(
-            FactArAging.snapshot_date == snapshot_to_use
-        ).delete(synchronize_session=False)
-        self.db.commit()
-        if deleted > 0:
-            print(f"  ⚠ Cleared {deleted} records for snapshot {snapshot_to_use}")
+        Readers keep seeing the previous rows of the snapshot until commit.
+        """
+        print(f"  📅 Transforming snapshot: {snapshot_to_use}")
         
         # Load only the specified snapshot
         raw_df = pd.read_sql(
@@ -746,6 +1183,13 @@ class Transformer:
             print(f"  ⚠ No data for snapshot {snapshot_to_use}")
             return
         
+        # Clear fact records for THIS snapshot only (keep other snapshots)
+        deleted = self.db.query(FactArAging).filter(
+            FactArAging.snapshot_date == snapshot_to_use
+        ).delete(synchronize_session=False)
+        if deleted > 0:
+            print(f"  ⚠ Replacing {deleted} records for snapshot {snapshot_to_use}")
+        
         print(f"  📊 Processing {len(raw_df)} records from {snapshot_to_use}")
         
         count = 0
@@ -792,9 +1236,52 @@ class Transformer:
             self.db.add(fact)
             count += 1
         
+        self.db.flush()
+        self.refresh_ar_snapshot_rollup(snapshot_to_use)
         self.db.commit()
         print(f"  ✓ Transformed {count} AR aging records")
     
+    def refresh_ar_snapshot_rollup(self, snapshot_date: date):
+        """
+        Rebuild the fact_ar_aging_snapshot rows of one snapshot (per division)
+        
+        Runs inside the caller's transaction, right after the fact rows.
+        """
+        params = {'snapshot_date': snapshot_date}
+        self.db.execute(text("DELETE FROM fact_ar_aging_snapshot WHERE snapshot_date = :snapshot_date"), params)
+        self.db.execute(text("""
+            INSERT INTO fact_ar_aging_snapshot (
+                snapshot_date, dist_channel, division, row_count, report_date,
+                total_target, total_realization, not_due,
+                target_1_30, target_31_60, target_61_90, target_91_120, target_121_180, target_over_180,
+                realization_1_30, realization_31_60, realization_61_90, realization_91_120,
+                realization_121_180, realization_over_180, refreshed_at
+            )
+            SELECT 
+                snapshot_date,
+                dist_channel,
+                CASE dist_channel
+                    WHEN '11' THEN 'Industry'
+                    WHEN '13' THEN 'Retails'
+                    WHEN '15' THEN 'Project'
+                    ELSE 'Other'
+                END,
+                COUNT(*),
+                MAX(report_date),
+                SUM(COALESCE(total_target, 0)), SUM(COALESCE(total_realization, 0)),
+                SUM(COALESCE(realization_not_due, 0)),
+                SUM(COALESCE(target_1_30, 0)), SUM(COALESCE(target_31_60, 0)),
+                SUM(COALESCE(target_61_90, 0)), SUM(COALESCE(target_91_120, 0)),
+                SUM(COALESCE(target_121_180, 0)), SUM(COALESCE(target_over_180, 0)),
+                SUM(COALESCE(realization_1_30, 0)), SUM(COALESCE(realization_31_60, 0)),
+                SUM(COALESCE(realization_61_90, 0)), SUM(COALESCE(realization_91_120, 0)),
+                SUM(COALESCE(realization_121_180, 0)), SUM(COALESCE(realization_over_180, 0)),
+                NOW()
+            FROM fact_ar_aging
+            WHERE snapshot_date = :snapshot_date
+            GROUP BY snapshot_date, dist_channel
+        """), params)
+    
     def transform_target(self):
         """Transform raw_target to fact_target"""
         print("Transforming target → fact_target...")
@@ -835,49 +1322,65 @@ class Transformer:
         print(f"  ✓ Transformed {count} target records")
     
     def build_uom_conversion(self):
-        """Build UOM conversion table from billing data"""
+        """
+        Build UOM conversion table from billing data (in SQL)
+        
+        kg_per_unit = SUM(net_weight) / SUM(billing_qty) per material (raw_zrsd002),
+        variance_pct compares it with the same ratio from deliveries (raw_zrsd004).
+        Result is bulk-upserted into dim_uom_conversion in one statement.
+        """
         print("Building UOM conversion table...")
         
-        billing_df = self.load_raw_to_df(RawZrsd002)
-        delivery_df = self.load_raw_to_df(RawZrsd004)
+        result = self.db.execute(text("""
+            WITH billing AS (
+                SELECT material,
+                       MIN(material_desc) AS material_desc,
+                       SUM(COALESCE(net_weight, 0)) / SUM(billing_qty) AS kg_per_unit,
+                       COUNT(*) AS sample_count
+                FROM raw_zrsd002
+                WHERE billing_qty > 0 AND material IS NOT NULL
+                GROUP BY material
+            ),
+            delivery AS (
+                SELECT material,
+                       SUM(COALESCE(net_weight, 0)) / SUM(delivery_qty) AS kg_per_unit_delivery
+                FROM raw_zrsd004
+                WHERE delivery_qty > 0 AND material IS NOT NULL
+                GROUP BY material
+            )
+            INSERT INTO dim_uom_conversion (
+                material_code, material_description, kg_per_unit, source,
+                sample_count, variance_pct, last_updated
+            )
+            SELECT b.material, b.material_desc, b.kg_per_unit, 'billing', b.sample_count,
+                   CASE
+                       WHEN NOT EXISTS (SELECT 1 FROM delivery) THEN NULL
+                       WHEN b.kg_per_unit > 0 THEN
+                           ABS(b.kg_per_unit - COALESCE(d.kg_per_unit_delivery, 0)) / b.kg_per_unit * 100
+                       ELSE 0
+                   END,
+                   NOW()
+            FROM billing b
+            LEFT JOIN delivery d ON d.material = b.material
+            ON CONFLICT (material_code) DO UPDATE SET
+                kg_per_unit = EXCLUDED.kg_per_unit,
+                sample_count = EXCLUDED.sample_count,
+                variance_pct = EXCLUDED.variance_pct,
+                last_updated = EXCLUDED.last_updated
+            RETURNING (xmax = 0) AS inserted
+        """))
+        flags = [row.inserted for row in result]
+        self.db.commit()
         
-        if billing_df.empty:
+        if not flags:
             print("  ⚠ No billing data for UOM conversion")
             return
         
-        # Build conversion table
-        conversion_df = self.uom_converter.build_from_billing(billing_df, delivery_df)
+        # Refresh in-memory lookup (and the process-wide cache)
+        self.uom_converter.load_from_db(force=True)
         
-        if conversion_df.empty:
-            return
-        
-        # Save to dim_uom_conversion
-        count = 0
-        updated = 0
-        for _, row in conversion_df.iterrows():
-            existing = self.db.query(DimUomConversion).filter_by(
-                material_code=row['material']
-            ).first()
-            
-            if existing:
-                existing.kg_per_unit = row['kg_per_unit']
-                existing.sample_count = row['sample_count']
-                existing.variance_pct = row.get('variance_pct')
-                existing.last_updated = datetime.utcnow()
-                updated += 1
-            else:
-                dim = DimUomConversion(
-                    material_code=row['material'],
-                    material_description=row.get('material_desc', ''),
-                    kg_per_unit=row['kg_per_unit'],
-                    sample_count=row['sample_count'],
-                    source='billing',
-                    variance_pct=row.get('variance_pct')
-                )
-                self.db.add(dim)
-                count += 1
-        
-        self.db.commit()
+        count = sum(1 for f in flags if f)
+        updated = len(flags) - count
         print(f"Built UOM conversion table: {count + updated} materials (new: {count}, updated: {updated})")
     
     def transform_all(self):
@@ -895,6 +1398,7 @@ class Transformer:
         # 3. Transform fact tables
         self.transform_cooispi()
         self.transform_mb51()
+        self.transform_batch_netting()
         self.transform_zrmm024()
         self.transform_zrsd002()
         self.transform_zrsd004()
@@ -915,322 +1419,327 @@ class Transformer:
         
         print("=" * 60)
     
-    def transform_lead_time(self):
-        """Calculate Lead Time Metrics (Purchase + Production + Storage)"""
+    def lead_time_scope(self, file_type: str, since: datetime) -> LeadTimeScope:
+        """LeadTimeScope from the raw rows of `file_type` loaded (or updated) since `since`"""
+        scope = LeadTimeScope()
+        for attr, sql in LEAD_TIME_SCOPE_SOURCES.get(file_type, []):
+            values = self.db.execute(text(sql), {'since': since}).scalars().all()
+            getattr(scope, attr).update(v for v in values if v)
+        return scope
+    
+    def transform_lead_time(self, scope: Optional[LeadTimeScope] = None):
+        """
+        Calculate Lead Time Metrics (Purchase + Production + Storage)
+        
+        Set-based pipeline: every lookup is one SQL query (netted MB51 dates
+        per batch, ZRSD006 JSONB fields extracted in SQL), stages are column
+        arithmetic, and fact_lead_time is refreshed with one bulk ON CONFLICT
+        upsert + prune (never empty mid-run).
+        
+        Issue / DC receipt dates are the earliest MVT 601 / MVT 101 (plant
+        1401) surviving LIFO netting, read from fact_batch_netting - run
+        transform_batch_netting first. A reversed 601 / 101 never starts the
+        storage / transit stage. Batch keys are trimmed.
+        
+        Args:
+            scope: Only recompute rows depending on these source keys
+                (None = full refresh)
+        """
         print("Calculating Lead Time metrics...")
-        count = 0 
-
-        # Remove previous lead time facts to avoid unique constraint collisions on reruns
-        deleted_lt = self.db.query(FactLeadTime).delete(synchronize_session=False)
-        if deleted_lt:
-            print(f"  🔄 Cleared {deleted_lt} existing lead time rows")
         
-        # Track seen (order_number, batch) pairs to avoid duplicate inserts in one run
-        seen_pairs = set()
-
         # ---------------------------------------------------------
-        # 0. PREPARE OUTBOUND DATA (For Storage Time)
+        # 0. RESOLVE SCOPE → order numbers / batches to recompute
         # ---------------------------------------------------------
-        # Get MIN posting date for MVT 601 (Delivery) per Batch
-        outbound_df = pd.read_sql(
-            self.db.query(RawMb51.col_6_batch, func.min(RawMb51.col_0_posting_date).label('issue_date'))
-            .filter(RawMb51.col_1_mvt_type == 601)
-            .filter(RawMb51.col_6_batch.isnot(None))
-            .group_by(RawMb51.col_6_batch).statement,
-            self.db.bind
-        )
+        scoped = scope is not None
+        params = {'scoped': scoped, 'orders': [], 'batches': [], 'sales_orders': [], 'materials': []}
+        if scoped:
+            if scope.is_empty():
+                print("  ✓ Lead time up to date (empty scope)")
+                return
+            scope_batches = set(scope.batches)
+            if scope.deliveries or scope.purchase_orders:
+                # Delivery (MVT 601 reference) / PO (MVT 101) → batches
+                scope_batches.update(b for b in self.db.execute(text("""
+                    SELECT DISTINCT TRIM(col_6_batch) FROM raw_mb51
+                    WHERE col_6_batch IS NOT NULL AND (
+                        (col_1_mvt_type = 601 AND TRIM(col_12_reference) = ANY(:deliveries))
+                        OR (col_1_mvt_type = 101 AND TRIM(col_15_purchase_order) = ANY(:pos))
+                    )
+                """), {
+                    'deliveries': list(scope.deliveries), 'pos': list(scope.purchase_orders)
+                }).scalars().all() if b)
+            params.update({
+                'orders': list(scope.order_numbers | scope.purchase_orders),
+                'batches': list(scope_batches),
+                'sales_orders': list(scope.sales_orders),
+                'materials': list(scope.materials),
+            })
+            print(f"  🔄 Scoped refresh: {len(scope.order_numbers)} orders, {len(scope_batches)} batches, "
+                  f"{len(scope.sales_orders)} sales orders, {len(scope.materials)} materials")
         
-        # Create Lookup: Batch -> Issue Date
-        batch_issue_map = {}
-        if not outbound_df.empty:
-            for _, row in outbound_df.iterrows():
-                b = str(row['col_6_batch']).strip()
-                d = safe_convert(row['issue_date'])
-                if b and d:
-                    if isinstance(d, datetime): d = d.date()
-                    batch_issue_map[b] = d
-        
-        print(f"  [OK] Indexed {len(batch_issue_map)} outbound batches for storage calc")
-
         # ---------------------------------------------------------
-        # 0B. PREPARE BACKTRACKING DATA (For Preparation Time - MTO)
+        # 1. PRODUCTION ORDERS (MTO/MTS Internal) → Production Time
+        # PROCESS FIRST: production takes priority over purchase for a batch
         # ---------------------------------------------------------
-        # 1. Map: Batch -> PO Number (from RawMb51 101 where PO like '44%')
-        backtrack_data = pd.read_sql(
-            self.db.query(RawMb51.col_6_batch, RawMb51.col_15_purchase_order)
-            .filter(RawMb51.col_1_mvt_type == 101)
-            .filter(RawMb51.col_15_purchase_order.like('44%'))
-            .statement,
-            self.db.bind
-        )
-        
-        batch_po_map = {}
-        if not backtrack_data.empty:
-            for _, row in backtrack_data.iterrows():
-                b = str(row['col_6_batch']).strip()
-                p = str(row['col_15_purchase_order']).strip()
-                if b and p:
-                    batch_po_map[b] = p
-                    
-        # 2. Map: PO Number -> PO Date (from FactPurchaseOrder)
-        po_date_data = pd.read_sql(
-            self.db.query(FactPurchaseOrder.purch_order, FactPurchaseOrder.purch_date)
-            .filter(FactPurchaseOrder.purch_order.isnot(None))
-            .statement,
-            self.db.bind
-        )
-        
-        po_date_map = {}
-        if not po_date_data.empty:
-            for _, row in po_date_data.iterrows():
-                p = str(row['purch_order']).strip()
-                d = safe_convert(row['purch_date'])
-                if p and d:
-                    if isinstance(d, datetime): d = d.date()
-                    po_date_map[p] = d
-
-        print(f"  [OK] Indexed {len(batch_po_map)} batches for backtracking")
+        prod = self._read_frame("""
+            SELECT material_code, plant_code, order_number,
+                   NULLIF(TRIM(batch), '') AS batch, NULLIF(TRIM(sales_order), '') AS sales_order,
+                   TRIM(mrp_controller) AS mrp_controller, is_mto,
+                   release_date AS start_date, actual_finish_date AS end_date
+            FROM fact_production
+            WHERE actual_finish_date IS NOT NULL AND release_date IS NOT NULL
+              AND (NOT :scoped
+                   OR order_number = ANY(:orders) OR TRIM(batch) = ANY(:batches)
+                   OR TRIM(sales_order) = ANY(:sales_orders) OR material_code = ANY(:materials))
+            ORDER BY id
+        """, params)
+        start, end = pd.to_datetime(prod['start_date']), pd.to_datetime(prod['end_date'])
+        prod['production_days'] = (end - start).dt.days
+        prod = prod[prod['production_days'] >= 0]
+        production_batches = set(prod['batch'].dropna())
         
         # ---------------------------------------------------------
-        # 0C. PREPARE CHANNEL DATA (For Distribution Channel)
+        # 2. PURCHASE ORDERS (External) → Transit Time
+        # ONLY for batches NOT in Production
         # ---------------------------------------------------------
-        # Map 1: Sales Order -> Channel Code (from FactBilling) - for MTO
-        channel_data = pd.read_sql(
-            self.db.query(FactBilling.so_number, FactBilling.dist_channel)
-            .filter(FactBilling.so_number.isnot(None))
-            .filter(FactBilling.dist_channel.isnot(None))
-            .statement,
-            self.db.bind
-        )
-        
-        so_channel_map = {}
-        if not channel_data.empty:
-            for _, row in channel_data.iterrows():
-                so = str(row['so_number']).strip()
-                ch = str(row['dist_channel']).strip()
-                if so and ch:
-                    so_channel_map[so] = ch
-                    
-        print(f"  [OK] Indexed {len(so_channel_map)} sales orders for channel lookup")
-        
-        # Map 2: Material -> Channel Code (from RawZrsd006) - for MTS
-        # Note: zrsd006 loader doesn't populate material column, use raw_data instead
-        from src.db.models import RawZrsd006
-        import json
-        
-        zrsd006_records = self.db.query(RawZrsd006.raw_data).all()
-        
-        material_channel_map = {}
-        for record in zrsd006_records:
-            if record.raw_data:
-                data = json.loads(record.raw_data) if isinstance(record.raw_data, str) else record.raw_data
-                mat = data.get('Material Code')
-                ch = data.get('Distribution Channel')
-                
-                if mat and ch:
-                    mat_str = str(mat).strip()
-                    ch_str = str(ch).strip()
-                    if mat_str and ch_str:
-                        material_channel_map[mat_str] = ch_str
-                    
-        print(f"  [OK] Indexed {len(material_channel_map)} materials for channel lookup")
+        purchase_batches = list(set(params['batches']) | production_batches) if scoped else []
+        purchase = self._read_frame("""
+            SELECT m.col_4_material AS material_code, m.col_2_plant AS plant_code,
+                   TRIM(m.col_15_purchase_order) AS order_number, NULLIF(TRIM(m.col_6_batch), '') AS batch,
+                   p.purch_date AS start_date, m.col_0_posting_date::date AS end_date
+            FROM raw_mb51 m
+            JOIN fact_purchase_order p ON p.purch_order = TRIM(m.col_15_purchase_order)
+            WHERE m.col_1_mvt_type = 101
+              AND NULLIF(TRIM(m.col_15_purchase_order), '') IS NOT NULL
+              AND m.col_0_posting_date IS NOT NULL AND p.purch_date IS NOT NULL
+              AND (NOT :scoped
+                   OR TRIM(m.col_6_batch) = ANY(:purchase_batches) OR TRIM(m.col_15_purchase_order) = ANY(:orders))
+            ORDER BY m.id, p.id
+        """, {**params, 'purchase_batches': purchase_batches})
+        if scoped and not purchase.empty:
+            # Production rows outside the scope still claim their batches
+            production_batches.update(self.db.execute(text("""
+                SELECT DISTINCT TRIM(batch) FROM fact_production
+                WHERE actual_finish_date IS NOT NULL AND release_date IS NOT NULL
+                  AND actual_finish_date >= release_date
+                  AND TRIM(batch) = ANY(:batches)
+            """), {'batches': purchase['batch'].dropna().unique().tolist()}).scalars().all())
+        purchase = purchase[~purchase['batch'].isin(production_batches)]
         
-        # Track processed batches to avoid duplicates (Production takes priority)
-        processed_batches = set()
+        # ---------------------------------------------------------
+        # 3. LOOKUPS (one query each, restricted to the batches in play)
+        # ---------------------------------------------------------
+        lookup = {
+            'scoped': scoped,
+            'batches': list(set(prod['batch'].dropna()) | set(purchase['batch'].dropna())) if scoped else [],
+            'sales_orders': prod['sales_order'].dropna().unique().tolist() if scoped else [],
+            'materials': prod['material_code'].dropna().unique().tolist() if scoped else [],
+        }
+        
+        # Earliest MVT 601 (Delivery) surviving 601/602 netting per Batch
+        issue_dates = self._read_frame("""
+            SELECT TRIM(batch) AS batch, MIN(first_valid_date)::date AS issue_date
+            FROM fact_batch_netting
+            WHERE mvt_pair = '601/602' AND NOT is_fully_reversed
+              AND NULLIF(TRIM(batch), '') IS NOT NULL AND first_valid_date IS NOT NULL
+              AND (NOT :scoped OR TRIM(batch) = ANY(:batches))
+            GROUP BY TRIM(batch)
+        """, lookup)
+        
+        # Earliest MVT 101 at DC (plant 1401) surviving 101/102 netting per Batch
+        dc_receipts = self._read_frame("""
+            SELECT TRIM(batch) AS batch, MIN(first_valid_date)::date AS dc_receipt_date
+            FROM fact_batch_netting
+            WHERE mvt_pair = '101/102' AND plant_code = 1401 AND NOT is_fully_reversed
+              AND NULLIF(TRIM(batch), '') IS NOT NULL AND first_valid_date IS NOT NULL
+              AND (NOT :scoped OR TRIM(batch) = ANY(:batches))
+            GROUP BY TRIM(batch)
+        """, lookup)
+        print(f"  [OK] Indexed {len(issue_dates)} outbound batches for storage calc")
+        
+        # Backtracking (Preparation Time - MTO): Batch → PO (MVT 101, PO '44%') → PO Date
+        batch_po_dates = self._read_frame("""
+            SELECT bp.batch, po.purch_date AS po_date
+            FROM (
+                SELECT DISTINCT ON (TRIM(col_6_batch))
+                    TRIM(col_6_batch) AS batch, TRIM(col_15_purchase_order) AS po_number
+                FROM raw_mb51
+                WHERE col_1_mvt_type = 101 AND col_15_purchase_order LIKE '44%'
+                  AND col_6_batch IS NOT NULL
+                  AND (NOT :scoped OR TRIM(col_6_batch) = ANY(:batches))
+                ORDER BY TRIM(col_6_batch), id DESC
+            ) bp
+            JOIN (
+                SELECT DISTINCT ON (TRIM(purch_order)) TRIM(purch_order) AS po_number, purch_date
+                FROM fact_purchase_order
+                WHERE purch_order IS NOT NULL AND purch_date IS NOT NULL
+                ORDER BY TRIM(purch_order), id DESC
+            ) po ON po.po_number = bp.po_number
+        """, lookup)
+        print(f"  [OK] Indexed {len(batch_po_dates)} batches for backtracking")
+        
+        # Channel 1: Sales Order → Channel Code (FactBilling) - for MTO
+        so_channels = self._read_frame("""
+            SELECT DISTINCT ON (TRIM(so_number)) TRIM(so_number) AS sales_order, TRIM(dist_channel) AS so_channel
+            FROM fact_billing
+            WHERE so_number IS NOT NULL AND dist_channel IS NOT NULL
+              AND (NOT :scoped OR TRIM(so_number) = ANY(:sales_orders))
+            ORDER BY TRIM(so_number), id DESC
+        """, lookup)
+        print(f"  [OK] Indexed {len(so_channels)} sales orders for channel lookup")
+        
+        # Channel 2: Material → Channel Code (RawZrsd006 raw_data JSONB) - for MTS
+        # Note: zrsd006 loader doesn't populate material column; raw_data may hold a JSON-encoded string
+        material_channels = self._read_frame("""
+            SELECT DISTINCT ON (material_code) material_code, material_channel
+            FROM (
+                SELECT id,
+                       NULLIF(TRIM(doc->>'Material Code'), '') AS material_code,
+                       NULLIF(TRIM(doc->>'Distribution Channel'), '') AS material_channel
+                FROM (
+                    SELECT id,
+                           CASE WHEN jsonb_typeof(raw_data) = 'string'
+                                THEN (raw_data #>> '{}')::jsonb ELSE raw_data END AS doc
+                    FROM raw_zrsd006
+                    WHERE raw_data IS NOT NULL
+                ) r
+            ) m
+            WHERE material_code IS NOT NULL AND material_channel IS NOT NULL
+              AND (NOT :scoped OR material_code = ANY(:materials))
+            ORDER BY material_code, id DESC
+        """, lookup)
+        print(f"  [OK] Indexed {len(material_channels)} materials for channel lookup")
         
         # ---------------------------------------------------------
-        # 1. PRODUCTION ORDERS (MTO/MTS Internal) → Production Time
-        # PROCESS FIRST to ensure correct classification
+        # 4. STAGES (column arithmetic)
         # ---------------------------------------------------------
-        prod_df = pd.read_sql(
-            self.db.query(FactProduction).filter(FactProduction.actual_finish_date.isnot(None)).statement,
-            self.db.bind
+        prod = (
+            prod.merge(dc_receipts, on='batch', how='left')
+            .merge(issue_dates, on='batch', how='left')
+            .merge(batch_po_dates, on='batch', how='left')
+            .merge(so_channels, on='sales_order', how='left')
+            .merge(material_channels, on='material_code', how='left')
         )
+        start, end = pd.to_datetime(prod['start_date']), pd.to_datetime(prod['end_date'])
+        is_mto = prod['is_mto'].fillna(False).astype(bool)
+        
+        # Transit Time (Factory → DC): production finish → MVT 101 at DC 1401 (P01 only)
+        transit = (pd.to_datetime(prod['dc_receipt_date']) - end).dt.days
+        prod['transit_days'] = transit.where((prod['mrp_controller'] == 'P01') & (transit >= 0), 0)
+        
+        # Storage Time: DC receipt (finish + transit) → first valid issue
+        storage = (pd.to_datetime(prod['issue_date']) - (end + pd.to_timedelta(prod['transit_days'], unit='D'))).dt.days
+        prod['storage_days'] = storage.where(storage >= 0, 0)
+        
+        # Preparation Time (MTO only): PO date → release
+        prep = (start - pd.to_datetime(prod['po_date'])).dt.days
+        prod['preparation_days'] = prep.where(is_mto & (prep >= 0), 0)
+        prod['delivery_days'] = 0
+        prod['order_type'] = np.where(is_mto, 'MTO', 'MTS')
+        
+        # Channel: MTO sales order first, material fallback (MTO without SO match, and MTS)
+        prod['channel_code'] = prod['so_channel'].where(is_mto).fillna(prod['material_channel'])
+        
+        purchase = purchase.merge(issue_dates, on='batch', how='left')
+        gr_date = pd.to_datetime(purchase['end_date'])
+        purchase['transit_days'] = (gr_date - pd.to_datetime(purchase['start_date'])).dt.days
+        purchase = purchase[purchase['transit_days'] >= 0]
+        storage = (pd.to_datetime(purchase['issue_date']) - gr_date[purchase.index]).dt.days
+        purchase['storage_days'] = storage.where(storage >= 0, 0)
+        purchase['order_type'] = 'PURCHASE'
+        purchase['channel_code'] = None
+        for col in ('production_days', 'preparation_days', 'delivery_days'):
+            purchase[col] = 0
         
-        if not prod_df.empty:
-            for _, row in prod_df.iterrows():
-                start = safe_convert(row.get('release_date'))
-                end = safe_convert(row.get('actual_finish_date'))
-                batch = safe_convert(row.get('batch'))
-                sales_order = safe_convert(row.get('sales_order'))
-                is_mto = row.get('is_mto', False)
-                
-                if not start or not end: continue
-                if isinstance(start, datetime): start = start.date()
-                if isinstance(end, datetime): end = end.date()
-                
-                prod_days = (end - start).days
-                if prod_days < 0: continue
-                
-                # Calculate Transit Time (Factory → DC for P01 batches)
-                # Transit = Time from production finish (Factory) to MVT 101 at DC (1401)
-                transit_days = 0
-                mrp_controller = safe_convert(row.get('mrp_controller'))
-                if batch and mrp_controller == 'P01':
-                    # Get MVT 101 at DC (plant 1401) for this batch
-                    dc_receipt = self.db.query(func.min(RawMb51.col_0_posting_date))\
-                        .filter(RawMb51.col_6_batch == batch)\
-                        .filter(RawMb51.col_1_mvt_type == 101)\
-                        .filter(RawMb51.col_2_plant == 1401)\
-                        .scalar()
-                    
-                    if dc_receipt:
-                        if isinstance(dc_receipt, datetime):
-                            dc_receipt = dc_receipt.date()
-                        if dc_receipt >= end:
-                            transit_days = (dc_receipt - end).days
-                
-                # Calculate Storage Time (DC receipt to DC issue)
-                # Note: For batches with transit, storage starts from DC receipt, not production finish
-                storage_days = 0
-                storage_start = end
-                if transit_days > 0:
-                    # Storage starts after transit completes
-                    storage_start = end + timedelta(days=transit_days)
-                
-                if batch and batch in batch_issue_map:
-                    issue_date = batch_issue_map[batch]
-                    if issue_date >= storage_start:
-                        storage_days = (issue_date - storage_start).days
-                
-                # Calculate Preparation Time (MTO only)
-                prep_days = 0
-                order_type = 'MTS'
-                if is_mto:
-                    order_type = 'MTO'
-                    # Backtracking Strategy: Batch → PO (44xx) → PO Date
-                    if batch and batch in batch_po_map:
-                        po_num = batch_po_map[batch]
-                        if po_num in po_date_map:
-                            po_date = po_date_map[po_num]
-                            if start >= po_date:
-                                prep_days = (start - po_date).days
-                
-                # Lookup Channel Code
-                channel_code = None
-                material_code = safe_convert(row.get('material_code'))
-                
-                if is_mto:
-                    # MTO: Try Sales Order first
-                    if sales_order and sales_order in so_channel_map:
-                        channel_code = so_channel_map[sales_order]
-                
-                # Fallback to Material-based channel (for both MTO without SO match, and MTS)
-                if not channel_code and material_code and material_code in material_channel_map:
-                    channel_code = material_channel_map[material_code]
-                
-                order_number = safe_convert(row.get('order_number'))
-
-                # Skip duplicates within the same run (unique key: order_number + batch)
-                if order_number and batch and (order_number, batch) in seen_pairs:
-                    continue
-                if order_number and batch:
-                    seen_pairs.add((order_number, batch))
-
-                fact = FactLeadTime(
-                    material_code=safe_convert(row.get('material_code')),
-                    plant_code=safe_convert(row.get('plant_code')),
-                    order_number=order_number,
-                    order_type=order_type,
-                    batch=batch,
-                    channel_code=channel_code,
-                    start_date=start,
-                    end_date=end,
-                    lead_time_days=prod_days + transit_days + storage_days + prep_days, # Total
-                    production_days=prod_days, # Map to Production
-                    transit_days=transit_days, # Map to Transit (Factory → DC)
-                    storage_days=storage_days, # Map to Storage
-                    preparation_days=prep_days # Map to Preparation
-                )
-                self.db.add(fact)
-                count += 1
-                
-                # Batch commit every 1000 records to avoid memory issues
-                if count % 1000 == 0:
-                    self.db.commit()
-                
-                # Track this batch as processed (Production takes priority over Purchase)
-                if batch:
-                    processed_batches.add(batch)
-
         # ---------------------------------------------------------
-        # 2. PURCHASE ORDERS (External) → Transit Time
-        # ONLY for batches NOT in Production
+        # 5. BULK WRITE (unique key: order_number + batch, first occurrence wins)
         # ---------------------------------------------------------
-        raw_mb51 = pd.read_sql(
-            self.db.query(RawMb51).filter(RawMb51.col_1_mvt_type == 101).statement,
-            self.db.bind
+        columns = [
+            'material_code', 'plant_code', 'order_number', 'order_type', 'batch', 'channel_code',
+            'start_date', 'end_date', 'lead_time_days', 'production_days', 'transit_days',
+            'storage_days', 'preparation_days', 'delivery_days'
+        ]
+        facts = pd.concat([prod, purchase], ignore_index=True)
+        for col in ('production_days', 'transit_days', 'storage_days', 'preparation_days', 'delivery_days'):
+            facts[col] = facts[col].fillna(0).astype(int)
+        facts['lead_time_days'] = facts[['production_days', 'transit_days', 'storage_days', 'preparation_days']].sum(axis=1)
+        facts['start_date'] = pd.to_datetime(facts['start_date']).dt.date
+        facts['end_date'] = pd.to_datetime(facts['end_date']).dt.date
+        facts = facts[columns].drop_duplicates(['order_number', 'batch'])
+        
+        # Rows in scope that are no longer produced are pruned
+        prune_where, prune_params = None, None
+        if scoped:
+            prune_where = """
+                t.batch = ANY(:batches) OR t.order_number = ANY(:orders)
+                OR (t.order_type = 'PURCHASE' AND t.batch = ANY(:purchase_batches))
+            """
+            prune_params = {'batches': params['batches'], 'orders': params['orders'],
+                            'purchase_batches': purchase_batches}
+        
+        records = facts.astype(object).where(facts.notna(), None).to_dict('records')
+        for record in records:
+            record['row_hash'] = compute_row_hash(record)
+        
+        # Daily rollup days touched: current dates of the rows in play + their new dates
+        end_dates = None
+        if scoped:
+            end_dates = set(facts['end_date'].dropna())
+            end_dates.update(self.db.execute(text(f"""
+                SELECT DISTINCT end_date FROM fact_lead_time t
+                WHERE end_date IS NOT NULL AND (({prune_where}) OR t.order_number = ANY(:record_orders))
+            """), {**prune_params, 'record_orders': facts['order_number'].dropna().unique().tolist()}).scalars().all())
+        
+        stats = self._bulk_upsert(
+            'fact_lead_time', records, key_columns=['order_number', 'batch'],
+            prune=True, prune_where=prune_where, prune_params=prune_params
         )
-        raw_po = pd.read_sql(self.db.query(FactPurchaseOrder).statement, self.db.bind)
-        
-        if not raw_mb51.empty and not raw_po.empty:
-            raw_mb51['po_number'] = raw_mb51['col_15_purchase_order'].apply(lambda x: str(x).strip() if x else None)
-            merged_po = pd.merge(
-                raw_mb51[raw_mb51['po_number'].notna()],
-                raw_po[['purch_order', 'purch_date']],
-                left_on='po_number',
-                right_on='purch_order',
-                how='inner'
-            )
-            
-            for _, row in merged_po.iterrows():
-                batch = safe_convert(row.get('col_6_batch'))
-                
-                # SKIP if this batch was already processed as Production Order
-                if batch and batch in processed_batches:
-                    continue
-                    
-                gr_date = safe_convert(row.get('col_0_posting_date'))
-                po_date = safe_convert(row.get('purch_date'))
-                
-                if not gr_date or not po_date: continue
-                if isinstance(gr_date, datetime): gr_date = gr_date.date()
-                if isinstance(po_date, datetime): po_date = po_date.date()
-                
-                transit_days = (gr_date - po_date).days
-                if transit_days < 0: continue
-                
-                # Calculate Storage Time
-                storage_days = 0
-                if batch and batch in batch_issue_map:
-                    issue_date = batch_issue_map[batch]
-                    if issue_date >= gr_date:
-                        storage_days = (issue_date - gr_date).days
-                
-                order_number = safe_convert(row.get('po_number'))
-
-                # Skip duplicates within the same run (unique key: order_number + batch)
-                if order_number and batch and (order_number, batch) in seen_pairs:
-                    continue
-                if order_number and batch:
-                    seen_pairs.add((order_number, batch))
-
-                fact = FactLeadTime(
-                    material_code=safe_convert(row.get('col_4_material')),
-                    plant_code=safe_convert(row.get('col_2_plant')),
-                    order_number=order_number,
-                    order_type='PURCHASE', # External
-                    batch=batch, # Capture Batch!
-                    start_date=po_date,
-                    end_date=gr_date,
-                    lead_time_days=transit_days + storage_days, # Total
-                    transit_days=transit_days, # Map to Transit
-                    storage_days=storage_days, # Map to Storage
-                    # Others 0
-                )
-                self.db.add(fact)
-                count += 1
-                
-                # Batch commit every 1000 records
-                if count % 1000 == 0:
-                    self.db.commit()
-                
         self.db.commit()
-        print(f"  [OK] Calculated {count} lead time records (Production + Purchase + Storage)")
+        print(f"  [OK] Calculated {len(records)} lead time records (Production + Purchase + Storage)"
+              f" - new: {stats['inserted']}, updated: {stats['updated']}, removed: {stats['deleted']}")
+        
+        self.refresh_lead_time_daily(end_dates)
 
         print("TRANSFORMATION COMPLETE")
         print("=" * 60)
     
+    def refresh_lead_time_daily(self, end_dates: Optional[Set[date]] = None):
+        """
+        Rebuild fact_lead_time_daily from fact_lead_time (one GROUP BY)
+        
+        Delete + insert in one transaction: readers keep the previous rollup
+        until commit.
+        
+        Args:
+            end_dates: Only rebuild these days (None = full rebuild)
+        """
+        if end_dates is not None and not end_dates:
+            return
+        day_filter = "WHERE end_date = ANY(:end_dates)" if end_dates is not None else ""
+        params = {'end_dates': sorted(end_dates)} if end_dates is not None else {}
+        
+        self.db.execute(text(f"DELETE FROM fact_lead_time_daily {day_filter}"), params)
+        count = self.db.execute(text(f"""
+            INSERT INTO fact_lead_time_daily (
+                end_date, channel_code, order_type, lead_time_days, order_count,
+                sum_lead_time_days, sum_preparation_days, sum_production_days,
+                sum_transit_days, sum_storage_days, sum_delivery_days, refreshed_at
+            )
+            SELECT end_date, channel_code, order_type, lead_time_days, COUNT(*),
+                   SUM(lead_time_days), SUM(preparation_days), SUM(production_days),
+                   SUM(transit_days), SUM(storage_days), SUM(delivery_days), NOW()
+            FROM fact_lead_time
+            {day_filter}
+            GROUP BY end_date, channel_code, order_type, lead_time_days
+        """), params).rowcount
+        self.db.commit()
+        print(f"  [OK] Refreshed fact_lead_time_daily ({count} rows)")
+    
+    def _read_frame(self, sql: str, params: Optional[Dict] = None) -> pd.DataFrame:
+        """Run a query on the session connection and return a DataFrame"""
+        result = self.db.execute(text(sql), params or {})
+        return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+    
     def build_production_chains(self):
         """Production chain analysis removed - yield module decommissioned"""
         print("Building production chains (P03→P02→P01)...")
@@ -1244,60 +1753,167 @@ class Transformer:
         print("  ✓ Skipped yield calculations")
     
     def detect_alerts(self):
-        """Detect and insert alerts (stuck transit only - yield alerts removed)"""
+        """
+        Full evaluation of every registered alert rule (transit, stuck stock, low yield)
+        
+        Each rule emits its candidate set as a frame; one INSERT ... ON CONFLICT
+        (alert_type, entity_id) merges it and alerts of the evaluated types that
+        no longer qualify are auto-resolved - all in the caller's transaction.
+        """
         print("Detecting alerts...")
+        detector = self._alert_detector()
+        for rule in ALERT_RULES.values():
+            self._apply_alert_rule(rule, detector, keys=None)
+        self.db.commit()
+    
+    def evaluate_alert_rules(self, changed: Dict[str, Iterable[str]]):
+        """
+        Ingestion-time alert evaluation
         
-        mb51_df = self.normalize_mb51_df(self.load_raw_to_df(RawMb51))
+        Only the rules depending on the written tables run, and only for the
+        written keys (alerts outside those keys are left untouched).
         
-        if mb51_df.empty:
-            print("  ⚠ No mb51 data for alert detection")
+        Args:
+            changed: Fact table → entity keys just written,
+                e.g. {'fact_batch_netting': {'B001', ...}}
+        """
+        changed = {table: set(keys) for table, keys in changed.items() if keys}
+        rules = rules_for(changed)
+        if not rules:
             return
         
-        detector = AlertDetector(
-            mb51_df=mb51_df,
+        print(f"Evaluating {len(rules)} alert rules for {sum(len(k) for k in changed.values())} changed keys...")
+        rule_keys = {
+            rule.alert_type: sorted(set().union(*(changed.get(t, set()) for t in rule.depends_on)))
+            for rule in rules
+        }
+        # Netting state is only needed for batch-keyed rules
+        batches = set().union(*(
+            rule_keys[rule.alert_type] for rule in rules
+            if 'batch' in {rule.depends_on[t] for t in changed if t in rule.depends_on}
+        ))
+        detector = self._alert_detector(batches=sorted(batches))
+        for rule in rules:
+            self._apply_alert_rule(rule, detector, keys=rule_keys[rule.alert_type])
+        self.db.commit()
+    
+    def sweep_alerts(self):
+        """
+        Periodic sweep for time-based rules (python -m src.main sweep, e.g. from cron)
+        
+        Reads only conditions open longer than the threshold (index on
+        alert_type, open_since) - no netting, no history scan.
+        """
+        print("Sweeping time-based alerts...")
+        detector = AlertDetector(db=self.db)
+        cutoff = datetime.now() - timedelta(hours=detector.stuck_threshold)
+        for rule in ALERT_RULES.values():
+            if not rule.is_time_based:
+                continue
+            conditions = self._read_frame("""
+                SELECT alert_type, entity_id, batch, material, plant, open_since
+                FROM fact_alert_conditions
+                WHERE alert_type = :alert_type AND open_since < :cutoff
+            """, {'alert_type': rule.alert_type, 'cutoff': cutoff})
+            stats = self._merge_alerts(rule.promote(detector, conditions), alert_types=[rule.alert_type])
+            print(f"  ✓ {rule.alert_type}: {stats['inserted']} new, {stats['updated']} updated, "
+                  f"{stats['resolved']} auto-resolved")
+        self.db.commit()
+    
+    def _alert_detector(self, batches: Optional[List[str]] = None) -> AlertDetector:
+        """AlertDetector on this session with the persisted 101/102 netting at DC 1401"""
+        return AlertDetector(
             production_chain_df=None,  # No longer used - yield module decommissioned
-            uom_converter=self.uom_converter
+            uom_converter=self.uom_converter,
+            netting_state=self.load_batch_netting(101, 102, plant=1401, batches=batches),
+            db=self.db
         )
+    
+    def _apply_alert_rule(self, rule: AlertRule, detector: AlertDetector, keys: Optional[List[str]]):
+        """Evaluate one rule for `keys` (None = all) and merge its result"""
+        frame = rule.evaluate(detector, keys)
+        if rule.is_time_based:
+            # Keep the open conditions in sync, then promote the ones already over threshold
+            records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+            for record in records:
+                record['row_hash'] = compute_row_hash(record)
+            self._bulk_upsert(
+                'fact_alert_conditions', records, key_columns=['alert_type', 'entity_id'], prune=True,
+                prune_where="t.alert_type = :alert_type AND (NOT :scoped OR t.entity_id = ANY(:keys))",
+                prune_params={'alert_type': rule.alert_type, 'scoped': keys is not None, 'keys': keys or []}
+            )
+            frame = rule.promote(detector, frame)
         
-        # Detect stuck in transit (Factory → DC, so check at DC plant 1401)
-        stuck_alerts = detector.detect_stuck_in_transit(plant=1401)
-        
-        # Yield alerts removed - decommissioned
-        
-        # Insert alerts
-        all_alerts = stuck_alerts
-        count = 0
+        stats = self._merge_alerts(
+            frame, alert_types=[rule.alert_type], entity_ids=rule.scope_entities(detector, keys)
+        )
+        print(f"  ✓ {rule.alert_type}: {stats['inserted']} new alerts "
+              f"(updated: {stats['updated']}, auto-resolved: {stats['resolved']})")
+    
+    def _merge_alerts(
+        self,
+        candidates: pd.DataFrame,
+        alert_types: List[str],
+        entity_ids: Optional[List[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Merge rule candidates (ALERT_COLUMNS) into fact_alerts
         
-        for alert in all_alerts:
-            try:
-                # Check if similar alert already exists (prevent duplicates)
-                existing = self.db.query(FactAlert).filter_by(
-                    alert_type=alert.alert_type,
-                    entity_id=alert.entity_id
-                ).first()
-                
-                if not existing:
-                    # Map alert data to FactAlert columns
-                    # STUCK_IN_TRANSIT/DELAYED_TRANSIT → stuck_hours
-                    # LOW_YIELD → yield_pct
-                    fact = FactAlert(
-                        alert_type=alert.alert_type,
-                        severity=alert.severity,
-                        entity_type=alert.entity_type,
-                        entity_id=alert.entity_id,
-                        batch=alert.batch,
-                        material=alert.material,
-                        plant=alert.plant,
-                        stuck_hours=alert.metric_value if alert.alert_type in ('STUCK_IN_TRANSIT', 'DELAYED_TRANSIT') else None,
-                        yield_pct=alert.metric_value if alert.alert_type == 'LOW_YIELD' else None,
-                        message=alert.message,  # ← FIX: Add message field
-                        detected_at=alert.detected_at,
-                        status='ACTIVE'
-                    )
-                    self.db.add(fact)
-                    count += 1
-            except Exception as e:
-                print(f"  ⚠ Error inserting alert: {e}")
+        - New (alert_type, entity_id) → inserted ACTIVE
+        - Still qualifying → metrics / severity / message refreshed, detected_at kept;
+          AUTO_RESOLVED alerts re-open, manually RESOLVED ones stay resolved
+        - ACTIVE alerts of `alert_types` missing from candidates → AUTO_RESOLVED
+          (restricted to `entity_ids` when given - scoped evaluation)
         
-        self.db.commit()
-        print(f"  ✓ Detected {count} new alerts")
+        Returns:
+            Dict with inserted / updated / resolved counts
+        """
+        columns = list(candidates.columns)
+        col_list = ', '.join(columns)
+        stage_name = 'stg_fact_alerts'
+        
+        self.db.execute(text(f"DROP TABLE IF EXISTS {stage_name}"))
+        self.db.execute(text(f"""
+            CREATE TEMP TABLE {stage_name} ON COMMIT DROP AS
+            SELECT {col_list} FROM fact_alerts WITH NO DATA
+        """))
+        records = candidates.astype(object).where(candidates.notna(), None).to_dict('records')
+        if records:
+            stage = sa_table(stage_name, *[sa_column(c) for c in columns])
+            self.db.execute(stage.insert(), records)
+        
+        keys = ('alert_type', 'entity_id')
+        values = [c for c in columns if c not in keys]
+        updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in values)
+        current = ', '.join(f"fact_alerts.{c}" for c in values)
+        excluded = ', '.join(f"EXCLUDED.{c}" for c in values)
+        result = self.db.execute(text(f"""
+            INSERT INTO fact_alerts ({col_list}, status, detected_at)
+            SELECT DISTINCT ON (alert_type, entity_id) {col_list}, 'ACTIVE', NOW()
+            FROM {stage_name}
+            ORDER BY alert_type, entity_id
+            ON CONFLICT (alert_type, entity_id) DO UPDATE
+            SET {updates}, status = 'ACTIVE', resolved_at = NULL
+            WHERE fact_alerts.status <> 'RESOLVED'
+              AND (fact_alerts.status = 'AUTO_RESOLVED' OR ({current}) IS DISTINCT FROM ({excluded}))
+            RETURNING (xmax = 0) AS inserted
+        """))
+        flags = [row.inserted for row in result]
+        
+        resolved = self.db.execute(text(f"""
+            UPDATE fact_alerts t
+            SET status = 'AUTO_RESOLVED', resolved_at = NOW()
+            WHERE t.alert_type = ANY(:alert_types) AND t.status = 'ACTIVE'
+              AND (NOT :scoped OR t.entity_id = ANY(:entity_ids))
+              AND NOT EXISTS (
+                  SELECT 1 FROM {stage_name} s
+                  WHERE s.alert_type = t.alert_type AND s.entity_id = t.entity_id
+              )
+        """), {
+            'alert_types': alert_types, 'scoped': entity_ids is not None, 'entity_ids': entity_ids or []
+        }).rowcount
+        
+        self.db.execute(text(f"DROP TABLE {stage_name}"))
+        
+        inserted = sum(1 for f in flags if f)
+        return {'inserted': inserted, 'updated': len(flags) - inserted, 'resolved': resolved}
@@ -5,6 +5,9 @@ Usage:
     python -m src.main init      # Initialize database
     python -m src.main load      # Load raw data
     python -m src.main transform # Transform to warehouse
+    python -m src.main rebuild   # Transform into shadow tables + atomic swap
+    python -m src.main rollback  # Restore previous warehouse generation
+    python -m src.main sweep     # Promote time-based alert conditions (run periodically)
     python -m src.main run       # Full pipeline
     python -m src.main test      # Test connection
 """
@@ -16,6 +19,24 @@ from src.db.connection import test_connection, init_db, engine, SessionLocal
 from src.db.models import Base
 from src.etl.loaders import load_all_raw_data
 from src.etl.transform import Transformer
+from src.etl.shadow_rebuild import rebuild_warehouse, rollback_generation, REBUILD_TABLES
+from src.db.generations import bump_generations, publish_changes
+
+
+def bump_data_generations(tables, refresh_views: bool = True):
+    """
+    Publish tables a command rewrote: refresh dependent materialized views
+    (unless they were swapped in already) and invalidate cached responses
+    """
+    db = SessionLocal()
+    try:
+        if refresh_views:
+            publish_changes(db, tables)
+        else:
+            bump_generations(db, tables)
+        print(f"✓ Bumped data generation of {len(tables)} tables")
+    finally:
+        db.close()
 
 
 def cmd_init():
@@ -58,6 +79,8 @@ def cmd_truncate():
         transformer.truncate_warehouse()
     finally:
         db.close()
+    
+    bump_data_generations(REBUILD_TABLES)
 
 
 def cmd_transform():
@@ -72,6 +95,43 @@ def cmd_transform():
         transformer.transform_all()
     finally:
         db.close()
+    
+    bump_data_generations(REBUILD_TABLES)
+
+
+def cmd_rebuild():
+    """Rebuild warehouse in shadow tables, then swap in (dashboards stay online)"""
+    print("\n" + "=" * 60)
+    print("REBUILDING WAREHOUSE (SHADOW + SWAP)")
+    print("=" * 60)
+    
+    rebuild_warehouse()
+    bump_data_generations(REBUILD_TABLES, refresh_views=False)
+
+
+def cmd_rollback():
+    """Swap the previous warehouse generation back in"""
+    print("\n" + "=" * 60)
+    print("ROLLING BACK WAREHOUSE")
+    print("=" * 60)
+    
+    if rollback_generation():
+        bump_data_generations(REBUILD_TABLES, refresh_views=False)
+
+
+def cmd_sweep():
+    """Promote open time-based alert conditions past their threshold (e.g. hourly cron)"""
+    print("\n" + "=" * 60)
+    print("SWEEPING ALERTS")
+    print("=" * 60)
+    
+    db = SessionLocal()
+    try:
+        Transformer(db).sweep_alerts()
+    finally:
+        db.close()
+    
+    bump_data_generations(['fact_alerts', 'fact_alert_conditions'])
 
 
 def cmd_run():
@@ -94,11 +154,9 @@ def cmd_run():
     # Step 3: Load raw data
     cmd_load()
     
-    # Step 4: Truncate warehouse (prevent duplication)
-    cmd_truncate()
-    
-    # Step 5: Transform
-    cmd_transform()
+    # Step 4: Transform into shadow tables and swap in
+    # (replaces truncate + transform - live tables are never empty)
+    cmd_rebuild()
     
     # Done
     end_time = datetime.now()
@@ -130,6 +188,9 @@ Commands:
   load      Load raw data from Excel files
   transform Transform raw data to warehouse
   truncate  Truncate warehouse tables (prevent duplication)
+  rebuild   Transform into shadow tables, then atomic swap
+  rollback  Restore previous warehouse generation
+  sweep     Promote time-based alert conditions (run periodically)
   run       Run full ELT pipeline
   test      Test database connection
         """
@@ -137,7 +198,7 @@ Commands:
     
     parser.add_argument(
         'command',
-        choices=['init', 'load', 'transform', 'truncate', 'run', 'test'],
+        choices=['init', 'load', 'transform', 'truncate', 'rebuild', 'rollback', 'sweep', 'run', 'test'],
         help='Command to execute'
     )
     
@@ -148,6 +209,9 @@ Commands:
         'load': cmd_load,
         'transform': cmd_transform,
         'truncate': cmd_truncate,
+        'rebuild': cmd_rebuild,
+        'rollback': cmd_rollback,
+        'sweep': cmd_sweep,
         'run': cmd_run,
         'test': cmd_test,
     }
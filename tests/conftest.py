@@ -0,0 +1,46 @@
+"""
+Shared fixtures for the PostgreSQL-backed tests
+
+Set TEST_DATABASE_URL to a dedicated (disposable) PostgreSQL 15+ database to
+run them; without it they are skipped. The schema is created once per run,
+and each test's `db` session is rolled back afterwards (commits inside a
+test only release savepoints).
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from src.db.connection import Base
+from src.db import models, auth_models  # noqa: F401 - register models on Base.metadata
+
+
+@pytest.fixture(scope='session')
+def pg_engine():
+    """Engine on TEST_DATABASE_URL with every warehouse table created"""
+    url = os.getenv('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip("TEST_DATABASE_URL not set - PostgreSQL tests skipped")
+    engine = create_engine(url)
+    try:
+        Base.metadata.create_all(engine)
+    except OperationalError as e:
+        pytest.skip(f"PostgreSQL not reachable: {e}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(pg_engine):
+    """Session inside a transaction rolled back after the test"""
+    conn = pg_engine.connect()
+    transaction = conn.begin()
+    session = Session(bind=conn, join_transaction_mode='create_savepoint')
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        conn.close()
@@ -0,0 +1,96 @@
+"""
+Tests for the registered alert rules
+"""
+import pytest
+import pandas as pd
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session
+
+import src.db.connection
+from src.core.alerts import AlertDetector, ALERT_RULES, CONDITION_COLUMNS, rules_for
+from src.db.models import FactBatchNetting, FactProduction, FactProductionPerformanceV2
+
+
+class TestAlertRules:
+    """Test rule registry and condition promotion (no database)"""
+
+    def test_rules_for_tables(self):
+        """Ingestion re-evaluates only the rules depending on the written tables"""
+        assert {r.alert_type for r in rules_for(['fact_batch_netting'])} == {'DELAYED_TRANSIT', 'STUCK_IN_TRANSIT'}
+        assert [r.alert_type for r in rules_for(['fact_production_performance_v2'])] == ['LOW_YIELD']
+        assert rules_for(['fact_billing']) == []
+        assert ALERT_RULES['STUCK_IN_TRANSIT'].is_time_based
+        assert not ALERT_RULES['LOW_YIELD'].is_time_based
+
+    def test_stuck_candidates_threshold_and_severity(self):
+        """Conditions open longer than the threshold become alerts, graded by hours open"""
+        now = datetime(2025, 1, 10, 12)
+        conditions = pd.DataFrame([
+            ('STUCK_IN_TRANSIT', 'B1', 'B1', 'M1', 1401, now - timedelta(hours=24)),
+            ('STUCK_IN_TRANSIT', 'B2', 'B2', 'M1', 1401, now - timedelta(hours=50)),
+            ('STUCK_IN_TRANSIT', 'B3', 'B3', 'M1', 1401, now - timedelta(hours=100)),
+        ], columns=CONDITION_COLUMNS)
+
+        candidates = AlertDetector(stuck_threshold_hours=48).stuck_candidates(conditions, now=now)
+
+        assert candidates['entity_id'].tolist() == ['B2', 'B3']
+        assert candidates['severity'].tolist() == ['HIGH', 'CRITICAL']
+        assert candidates['stuck_hours'].tolist() == [50.0, 100.0]
+
+
+class TestAlertRulesDb:
+    """Test the SQL rules on PostgreSQL"""
+
+    NOW = datetime.now()
+
+    @pytest.fixture
+    def alert_sources(self, db: Session):
+        """B1 received at DC and never issued, B2 received and issued; two ZRPP062 orders"""
+        received = self.NOW - timedelta(hours=60)
+        for batch, pair, fully_reversed in [('B1', '101/102', False), ('B2', '101/102', False),
+                                            ('B2', '601/602', False)]:
+            forward, reverse = map(int, pair.split('/'))
+            db.add(FactBatchNetting(
+                plant_code=1401, batch=batch, mvt_pair=pair, forward_mvt=forward, reverse_mvt=reverse,
+                material_code='M1', first_valid_date=received, last_valid_date=received,
+                is_fully_reversed=fully_reversed,
+            ))
+        db.add(FactProduction(plant_code=1201, order_number='ORD1', batch='B1', mrp_controller='P01',
+                              material_code='M1', actual_finish_date=(self.NOW - timedelta(days=5)).date()))
+        period = date(2025, 1, 1)
+        db.add(FactProductionPerformanceV2(process_order_id='PO1', batch_id='Y1', material_code='M1',
+                                           loss_pct=25, loss_kg=10, reference_date=period))
+        db.add(FactProductionPerformanceV2(process_order_id='PO2', batch_id='Y2', material_code='M1',
+                                           loss_pct=5, loss_kg=1, reference_date=period))
+        db.commit()
+
+    def test_received_not_issued_conditions(self, db: Session, alert_sources):
+        """Only the receipt without a valid 601 stays open"""
+        conditions = AlertDetector(db=db).received_not_issued_conditions(plant=1401)
+
+        assert conditions['entity_id'].tolist() == ['B1']
+        assert AlertDetector(db=db).received_not_issued_conditions(plant=1401, batches=['B2']).empty
+
+    def test_low_yield_candidates(self, db: Session, alert_sources):
+        """Yield = 100 - loss %, below the default threshold only"""
+        detector = AlertDetector(db=db, yield_threshold_pct=85)
+        candidates = detector.low_yield_candidates(periods=['2025-01-01'])
+
+        assert candidates['entity_id'].tolist() == ['PO1/Y1']
+        assert candidates['severity'].tolist() == ['HIGH']
+        assert sorted(detector.yield_entities(['2025-01-01'])) == ['PO1/Y1', 'PO2/Y2']
+
+    def test_detect_all_alerts_without_db(self, db: Session, alert_sources, monkeypatch):
+        """db=None reads through a private session; every registered rule runs at DC 1401"""
+        monkeypatch.setattr(src.db.connection, 'SessionLocal', lambda: Session(bind=db.connection()))
+        netting = pd.DataFrame([{
+            'batch': 'B1', 'plant': 1401, 'is_fully_reversed': False,
+            'last_valid_date': self.NOW - timedelta(hours=60),
+        }])
+
+        alerts = AlertDetector(netting_state=netting, stuck_threshold_hours=48).detect_all_alerts()
+
+        assert {(a.alert_type, a.entity_id) for a in alerts} == {
+            ('DELAYED_TRANSIT', 'B1'), ('STUCK_IN_TRANSIT', 'B1'), ('LOW_YIELD', 'PO1/Y1'),
+        }
+        assert all(a.plant == 1401 for a in alerts if a.alert_type != 'LOW_YIELD')
@@ -0,0 +1,34 @@
+"""
+Tests for Transformer._bulk_upsert (staged INSERT ... ON CONFLICT)
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.etl.transform import Transformer, compute_row_hash
+
+
+def delivery(line_item: int, qty: float, raw_id: int) -> dict:
+    record = {'delivery': 'D1', 'line_item': line_item, 'delivery_qty': qty}
+    return {**record, 'row_hash': compute_row_hash(record), 'raw_id': raw_id}
+
+
+class TestBulkUpsert:
+    """Test upsert statistics on PostgreSQL (fact_delivery)"""
+
+    def test_duplicates_counted_apart_from_unchanged(self, db: Session):
+        """In-batch repeats of a key are duplicates, not skipped (unchanged) rows"""
+        transformer = Transformer(db)
+        first = transformer._bulk_upsert('fact_delivery', [delivery(10, 5, 1), delivery(20, 7, 2)],
+                                         key_columns=['delivery', 'line_item'])
+
+        stats = transformer._bulk_upsert(
+            'fact_delivery', [delivery(10, 5, 3), delivery(20, 7, 4), delivery(20, 9, 5)],
+            key_columns=['delivery', 'line_item']
+        )
+
+        assert (first['inserted'], first['duplicates']) == (2, 0)
+        assert {k: stats[k] for k in ('inserted', 'updated', 'skipped', 'duplicates')} == {
+            'inserted': 0, 'updated': 1, 'skipped': 1, 'duplicates': 1,
+        }
+        qty = db.execute(text("SELECT delivery_qty FROM fact_delivery WHERE line_item = 20")).scalar()
+        assert qty == 9  # highest raw_id wins
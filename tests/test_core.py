@@ -5,9 +5,12 @@ import pytest
 import pandas as pd
 from datetime import datetime, timedelta
 
-from src.core.netting import StackNettingEngine
+from src.core.netting import StackNettingEngine, extend_stack, stack_entry
 from src.core.uom_converter import UomConverter
-from src.core.business_logic import OrderClassifier
+from src.core.business_logic import OrderClassifier, LeadTimeCalculator
+from src.core.leadtime_calculator import LeadTimeCalculator as FactLeadTimeCalculator
+from src.core.leadtime_engine import leadtime_status
+from src.core.sales_analytics import period_bounds, whole_months
 
 
 class TestStackNetting:
@@ -86,6 +89,124 @@ class TestStackNetting:
         result_1401 = engine.apply_stack_netting('BATCH001', 1401, 601, 602)
         assert result_1401.remaining_forward == 0
 
+    def test_bulk_netting_matches_per_batch(self):
+        """net_all_batches must agree with apply_stack_netting for every batch"""
+        import numpy as np
+        rng = np.random.default_rng(42)
+        n = 500
+        data = {
+            'col_0_posting_date': pd.Timestamp(2025, 1, 1) + pd.to_timedelta(rng.permutation(n), unit='D'),
+            'col_1_mvt_type': rng.choice([601, 602, 101, 102], n),
+            'col_2_plant': rng.choice([1201, 1401], n),
+            'col_6_batch': rng.choice([f'BATCH{i:03d}' for i in range(20)], n),
+            'col_4_material': 'MAT001',
+            'col_7_qty': rng.integers(1, 50, n).astype(float),
+        }
+        engine = StackNettingEngine(pd.DataFrame(data))
+
+        for fwd, rev in [(601, 602), (101, 102)]:
+            bulk = engine.net_all_batches(fwd, rev)
+            assert len(bulk) > 0
+            for _, row in bulk.iterrows():
+                single = engine.apply_stack_netting(row['batch'], int(row['plant']), fwd, rev)
+                assert row['remaining_forward'] == single.remaining_forward
+                assert row['net_quantity'] == pytest.approx(single.net_quantity)
+                if single.last_valid_date is None:
+                    assert pd.isna(row['last_valid_date'])
+                else:
+                    assert row['last_valid_date'] == single.last_valid_date
+
+    def test_bulk_netting_lifo_and_plant_separation(self):
+        """Bulk API on the LIFO / plant-separation fixtures"""
+        data = {
+            'col_0_posting_date': [
+                datetime(2025, 1, 1),
+                datetime(2025, 1, 2),
+                datetime(2025, 1, 3),
+                datetime(2025, 1, 4),
+            ],
+            'col_1_mvt_type': [601, 601, 602, 602],
+            'col_2_plant': [1201, 1201, 1201, 1401],
+            'col_6_batch': ['BATCH001'] * 4,
+            'col_4_material': ['MAT001'] * 4,
+            'col_7_qty': [10, 5, -5, -10],
+        }
+        bulk = StackNettingEngine(pd.DataFrame(data)).net_all_batches(601, 602).set_index('plant')
+
+        assert bulk.loc[1201, 'remaining_forward'] == 1
+        assert bulk.loc[1201, 'last_valid_date'] == datetime(2025, 1, 1)
+        assert bulk.loc[1201, 'net_quantity'] == 10
+        assert bulk.loc[1401, 'remaining_forward'] == 0
+        assert bulk.loc[1401, 'is_fully_reversed']
+
+    def test_netted_count_from_stack(self):
+        """A reverse on an empty stack cancels nothing - netted_count counts cancelled forwards"""
+        data = {
+            'col_0_posting_date': [datetime(2025, 1, d) for d in (1, 2, 3, 4)],
+            'col_1_mvt_type': [602, 601, 601, 602],
+            'col_2_plant': [1201] * 4,
+            'col_6_batch': ['BATCH001'] * 4,
+            'col_4_material': ['MAT001'] * 4,
+            'col_7_qty': [-5, 10, 5, -5],
+        }
+        engine = StackNettingEngine(pd.DataFrame(data))
+        
+        result = engine.apply_stack_netting('BATCH001', 1201, 601, 602)
+        assert (result.total_forward, result.total_reverse) == (2, 2)
+        assert result.remaining_forward == 1
+        assert result.netted_count == 1
+        
+        bulk = engine.net_all_batches(601, 602).iloc[0]
+        assert bulk['netted_count'] == 1
+
+    def test_reverse_on_empty_stack_not_netted(self):
+        """netted_count = total_forward - remaining_forward (was min(total_forward, total_reverse) = 1)"""
+        data = {
+            'col_0_posting_date': [datetime(2025, 1, 1), datetime(2025, 1, 2)],
+            'col_1_mvt_type': [602, 601],
+            'col_2_plant': [1201, 1201],
+            'col_6_batch': ['BATCH001'] * 2,
+            'col_4_material': ['MAT001'] * 2,
+            'col_7_qty': [5, -5],
+        }
+        engine = StackNettingEngine(pd.DataFrame(data))
+        
+        result = engine.apply_stack_netting('BATCH001', 1201, 601, 602)
+        assert (result.total_forward, result.total_reverse, result.remaining_forward) == (1, 1, 1)
+        assert result.netted_count == 0
+        assert not result.is_fully_reversed
+        
+        bulk = engine.net_all_batches(601, 602).iloc[0]
+        assert bulk['netted_count'] == 0
+
+    def test_extend_stack_matches_replay(self):
+        """Continuing a persisted stack with newer rows equals netting the full history"""
+        data = {
+            'id': [1, 2, 3, 4, 5],
+            'col_0_posting_date': [datetime(2025, 1, d) for d in (1, 2, 3, 4, 5)],
+            'col_1_mvt_type': [601, 601, 602, 601, 602],
+            'col_2_plant': [1201] * 5,
+            'col_6_batch': ['BATCH001'] * 5,
+            'col_4_material': ['MAT001'] * 5,
+            'col_7_qty': [10, 5, -5, 7, -7],
+            'col_11_material_doc': ['D1', 'D2', 'D3', 'D4', 'D5'],
+        }
+        df = pd.DataFrame(data)
+
+        def as_stack(valid):
+            return [stack_entry(r.id, r.posting_date, r.qty, r.material_doc) for r in valid.itertuples()]
+
+        stack = as_stack(StackNettingEngine(df.iloc[:3]).get_valid_movements(601, 602))
+        new_rows = df.iloc[3:].rename(columns={
+            'id': 'raw_id', 'col_0_posting_date': 'posting_date', 'col_1_mvt_type': 'mvt_type',
+            'col_7_qty': 'qty', 'col_11_material_doc': 'material_doc'
+        })
+        stack, n_fwd, n_rev = extend_stack(stack, new_rows, 601, 602)
+
+        assert (n_fwd, n_rev) == (1, 1)
+        assert stack == as_stack(StackNettingEngine(df).get_valid_movements(601, 602))
+        assert [s['raw_id'] for s in stack] == [1]
+
 
 class TestOrderClassifier:
     """Test MTO/MTS classification and order status"""
@@ -145,6 +266,113 @@ class TestOrderClassifier:
         assert OrderClassifier.is_sales_po(None) == False
 
 
+class TestLeadTimeEngine:
+    """Test join-based lead-time engine and its two facades"""
+    
+    @staticmethod
+    def _fixture():
+        mb51 = pd.DataFrame({
+            'col_0_posting_date': [datetime(2025, 1, d) for d in (10, 15, 20, 21)],
+            'col_1_mvt_type': [101, 601, 601, 602],
+            'col_2_plant': [1401] * 4,
+            'col_6_batch': ['B1'] * 4,
+            'col_4_material': ['MAT001'] * 4,
+            'col_7_qty': [10, -4, -6, 6],
+            'col_12_reference': [None, 'D1', 'D2', None],
+            'col_15_purchase_order': ['4400001', None, None, None],
+        })
+        po = pd.DataFrame({'purch_order': ['4400001'], 'purch_date': [datetime(2024, 12, 25)]})
+        deliveries = pd.DataFrame({'delivery': ['D1'], 'actual_gi_date': [datetime(2025, 1, 18)]})
+        orders = pd.DataFrame({
+            'batch': ['B1', 'B2'],
+            'plant': [1401, 1401],
+            'order': ['O1', 'O2'],
+            'release_date_actual': [datetime(2025, 1, 1), datetime(2025, 1, 2)],
+            'actual_finish_date': [datetime(2025, 1, 5), datetime(2025, 1, 9)],
+            'sales_order': ['SO1', None],
+            'mrp_controller': ['P01', 'P01'],
+            'delivered_quantity': [10, 5],
+        })
+        return mb51, po, deliveries, orders
+    
+    def test_status_thresholds(self):
+        """np.select status: 0/missing UNKNOWN, <=target ON_TIME, <=120% DELAYED"""
+        totals = pd.Series([None, 0, 14, 16, 17, 30], dtype='Int64')
+        assert list(leadtime_status(totals, 14)) == [
+            'UNKNOWN', 'UNKNOWN', 'ON_TIME', 'DELAYED', 'CRITICAL', 'CRITICAL'
+        ]
+    
+    def test_all_leadtimes_matches_single_order(self):
+        """Batch result equals per-order results; issue date is netted (602 cancels Jan 20)"""
+        mb51, po, deliveries, orders = self._fixture()
+        calculator = LeadTimeCalculator(orders, mb51, po, deliveries)
+        result = calculator.calculate_all_leadtimes().set_index('order')
+        
+        mto = result.loc['O1']
+        assert mto['order_type'] == 'MTO'
+        assert mto['issue_date'] == datetime(2025, 1, 15)
+        assert [mto[c] for c in ('preparation_time', 'production_time', 'transit_time',
+                                 'storage_time', 'delivery_time', 'total_time')] == [7, 4, 5, 5, 3, 24]
+        
+        mts = result.loc['O2']
+        assert mts['order_type'] == 'MTS'
+        assert mts['total_time'] == 7
+        assert pd.isna(mts['receipt_date'])
+        
+        for _, row in orders.iterrows():
+            single = calculator.calculate_leadtime(row)
+            assert single.total_time == result.loc[row['order'], 'total_time']
+            assert single.order_type == result.loc[row['order'], 'order_type']
+    
+    def test_persisted_netting_state(self, monkeypatch):
+        """With netting_state (load_batch_netting rows) the MB51 frame is not re-netted"""
+        mb51, po, deliveries, orders = self._fixture()
+        state = pd.DataFrame([
+            # batch, plant, forward, reverse, first / last valid date, fully reversed
+            ('B1', 1401, 101, 102, datetime(2025, 1, 11), datetime(2025, 1, 11), False),
+            ('B1', 1401, 601, 602, datetime(2025, 1, 16), datetime(2025, 1, 16), False),
+            ('B2', 1401, 601, 602, None, None, True),
+        ], columns=['batch', 'plant', 'forward_mvt', 'reverse_mvt',
+                    'first_valid_date', 'last_valid_date', 'is_fully_reversed'])
+        monkeypatch.setattr(StackNettingEngine, 'net_all_batches', None)
+        
+        calculator = LeadTimeCalculator(orders, mb51, po, deliveries, netting_state=state)
+        result = calculator.calculate_all_leadtimes().set_index('order')
+        
+        assert result.loc['O1', 'receipt_date'] == datetime(2025, 1, 11)
+        assert result.loc['O1', 'issue_date'] == datetime(2025, 1, 16)
+        assert pd.isna(result.loc['O2', 'issue_date'])
+    
+    def test_fact_calculator_facade(self):
+        """leadtime_calculator facade on fact_inventory column names"""
+        mb51, po, deliveries, _ = self._fixture()
+        fact_mb51 = mb51.rename(columns={
+            'col_0_posting_date': 'posting_date', 'col_1_mvt_type': 'mvt_type',
+            'col_2_plant': 'plant_code', 'col_6_batch': 'batch', 'col_4_material': 'material_code',
+            'col_7_qty': 'qty', 'col_12_reference': 'reference', 'col_15_purchase_order': 'purchase_order',
+        })
+        calculator = FactLeadTimeCalculator(fact_mb51, po, deliveries)
+        order = {
+            'batch': 'B1', 'plant_code': 1401,
+            'release_date': datetime(2025, 1, 1), 'actual_finish_date': datetime(2025, 1, 5),
+        }
+        
+        mto = calculator.calculate_mto_leadtime(order)
+        assert mto['prep_time_days'] == 7
+        assert mto['delivery_time_days'] == 3
+        assert mto['total_leadtime_days'] == 24
+        assert mto['leadtime_status'] == 'DELAYED'
+        
+        mts = calculator.calculate_mts_leadtime(order)
+        assert mts['prep_time_days'] is None
+        assert mts['total_leadtime_days'] == 14
+        assert mts['leadtime_status'] == 'ON_TIME'
+        
+        missing = calculator.calculate_mts_leadtime({**order, 'release_date': None})
+        assert missing['total_leadtime_days'] is None
+        assert missing['leadtime_status'] == 'UNKNOWN'
+
+
 class TestUomConverter:
     """Test UOM conversion PC to KG"""
     
@@ -176,6 +404,46 @@ class TestUomConverter:
         assert result is None
         assert method == 'no_conversion_factor'
 
+    def test_normalize_frame_matches_row_logic(self):
+        """Vectorized normalize_frame should agree with normalize_to_kg"""
+        converter = UomConverter()
+        converter.conversion_table['MAT001'] = type('obj', (object,), {
+            'kg_per_unit': 2.5,
+            'is_valid': True
+        })()
+
+        df = pd.DataFrame({
+            'qty': [10, None, 3, 7, 8],
+            'uom': ['pc', 'KG', 'KG', 'EA', 'L'],
+            'material': ['MAT001', 'MAT001', 'UNKNOWN', 'UNKNOWN', 'MAT001'],
+        })
+        result = converter.normalize_frame(df, 'qty', 'uom', 'material')
+
+        assert result['qty_kg'].tolist()[0] == 25
+        assert result['qty_kg'].tolist()[2] == 3
+        assert result['qty_kg'].isna().tolist() == [False, True, False, True, True]
+        assert result['qty_kg_method'].tolist() == [
+            'converted', 'null_qty', 'already_kg', 'no_conversion_factor', 'unknown_uom'
+        ]
+        assert result['qty_kg_method'].dtype.name == 'category'
+
+
+
+class TestSalesPeriods:
+    """Test half-open periods split into whole months + edges"""
+    
+    def test_whole_months(self):
+        """Only calendar months fully inside the period are whole months"""
+        from datetime import date
+        
+        assert whole_months(*period_bounds(date(2026, 1, 1), date(2026, 3, 31))) == (date(2026, 1, 1), date(2026, 4, 1))
+        assert whole_months(*period_bounds(date(2026, 1, 15), date(2026, 3, 30))) == (date(2026, 2, 1), date(2026, 3, 1))
+        assert whole_months(*period_bounds(date(2025, 12, 2), date(2026, 2, 28))) == (date(2026, 1, 1), date(2026, 3, 1))
+        
+        # No whole month: empty range
+        start, end_before = whole_months(*period_bounds(date(2026, 1, 5), date(2026, 1, 20)))
+        assert start >= end_before
+
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
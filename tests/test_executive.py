@@ -0,0 +1,99 @@
+"""
+Tests for the fact_sales_daily rollup and the executive endpoints reading it
+"""
+import pytest
+from datetime import date
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.api.routers.executive import get_revenue_by_division, get_top_customers
+from src.db.models import FactBilling
+from src.etl.transform import Transformer
+
+
+class TestSalesDailyRollup:
+    """Test fact_sales_daily refresh and the executive queries on it"""
+
+    @pytest.fixture
+    def billing_data(self, db: Session):
+        """Two customers over two days, one customer with two invoices on one order"""
+        lines = [
+            # (document, item, day, channel, customer, sales order, net value)
+            ('INV1', 10, date(2025, 1, 5), '11', 'Customer A', 'SO1', 100),
+            ('INV1', 20, date(2025, 1, 5), '11', 'Customer A', 'SO1', 50),
+            ('INV2', 10, date(2025, 1, 6), '11', 'Customer A', 'SO1', 30),
+            ('INV3', 10, date(2025, 1, 6), '15', 'Customer B', 'SO2', 500),
+        ]
+        for doc, item, day, channel, customer, so, value in lines:
+            db.add(FactBilling(billing_document=doc, billing_item=item, billing_date=day,
+                               dist_channel=channel, customer_name=customer, so_number=so, net_value=value))
+        db.commit()
+        Transformer(db).refresh_sales_daily()
+
+    @staticmethod
+    def _daily(db: Session):
+        return [tuple(r) for r in db.execute(text("""
+            SELECT billing_date, customer_name, net_value::float, line_count, invoice_count
+            FROM fact_sales_daily ORDER BY billing_date, customer_name
+        """))]
+
+    def test_rollup_grain(self, db: Session, billing_data):
+        """One row per day / division / customer / sales order"""
+        assert self._daily(db) == [
+            (date(2025, 1, 5), 'Customer A', 150.0, 2, 1),
+            (date(2025, 1, 6), 'Customer A', 30.0, 1, 1),
+            (date(2025, 1, 6), 'Customer B', 500.0, 1, 1),
+        ]
+
+    def test_scoped_refresh_only_rebuilds_given_days(self, db: Session, billing_data):
+        """Days outside billing_dates keep their rollup rows"""
+        db.add(FactBilling(billing_document='INV4', billing_item=10, billing_date=date(2025, 1, 5),
+                           dist_channel='11', customer_name='Customer A', so_number='SO1', net_value=25))
+        db.execute(text("UPDATE fact_sales_daily SET line_count = 99 WHERE billing_date = '2025-01-06'"))
+
+        Transformer(db).refresh_sales_daily({date(2025, 1, 5)})
+
+        assert self._daily(db) == [
+            (date(2025, 1, 5), 'Customer A', 175.0, 3, 2),
+            (date(2025, 1, 6), 'Customer A', 30.0, 99, 1),
+            (date(2025, 1, 6), 'Customer B', 500.0, 99, 1),
+        ]
+
+    def test_revenue_by_division(self, db: Session, billing_data):
+        """Division revenue with distinct customers / orders in the date range"""
+        rows = get_revenue_by_division.__wrapped__(
+            start_date='2025-01-06', end_date='2025-01-31', limit=10, db=db, current_user=None
+        )
+
+        assert [(r.division_code, r.revenue, r.customer_count, r.order_count) for r in rows] == [
+            ('15', 500.0, 1, 1), ('11', 30.0, 1, 1),
+        ]
+
+    def test_top_customers(self, db: Session, billing_data):
+        """Customers ordered by revenue; no range = all days"""
+        rows = get_top_customers.__wrapped__(start_date=None, end_date=None, limit=1, db=db, current_user=None)
+
+        assert [(r.customer_name, r.revenue, r.order_count) for r in rows] == [('Customer B', 500.0, 1)]
+
+    def test_monthly_rollup_scoped_to_months(self, db: Session, billing_data):
+        """fact_sales_monthly sums the daily rows; other months keep their rows"""
+        db.add(FactBilling(billing_document='INV5', billing_item=10, billing_date=date(2025, 2, 3),
+                           dist_channel='15', customer_name='Customer B', so_number='SO3', net_value=70))
+        transformer = Transformer(db)
+        transformer.refresh_sales_daily({date(2025, 2, 3)})
+        transformer.refresh_sales_monthly()
+        db.execute(text("UPDATE fact_sales_monthly SET line_count = 99 WHERE billing_month = '2025-02-01'"))
+        db.execute(text("UPDATE fact_sales_daily SET net_value = 200 WHERE customer_name = 'Customer B'"
+                        " AND billing_date = '2025-01-06'"))
+
+        transformer.refresh_sales_monthly({date(2025, 1, 1)})
+
+        monthly = [tuple(r) for r in db.execute(text("""
+            SELECT billing_month, customer_name, so_number, net_value::float, line_count
+            FROM fact_sales_monthly ORDER BY billing_month, customer_name
+        """))]
+        assert monthly == [
+            (date(2025, 1, 1), 'Customer A', 'SO1', 180.0, 3),
+            (date(2025, 1, 1), 'Customer B', 'SO2', 200.0, 1),
+            (date(2025, 2, 1), 'Customer B', 'SO3', 70.0, 99),
+        ]
@@ -0,0 +1,86 @@
+"""
+Tests for the set-based Transformer.transform_lead_time
+"""
+import pytest
+from datetime import date, datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.db.models import FactBilling, FactProduction, FactPurchaseOrder, RawMb51
+from src.etl.transform import Transformer, LeadTimeScope
+
+
+class TestTransformLeadTime:
+    """Lead time stages from production, purchase and the persisted batch netting"""
+
+    @pytest.fixture
+    def lead_time_sources(self, db: Session):
+        """One MTO production batch (with 601/602 reversal) and one purchased batch"""
+        db.add(FactProduction(
+            plant_code=1201, order_number='ORD1', material_code='M1', batch='B1',
+            sales_order='SO1', mrp_controller='P01', is_mto=True,
+            release_date=date(2024, 1, 1), actual_finish_date=date(2024, 1, 10),
+        ))
+        movements = [
+            # (posting date, mvt, plant, batch, purchase order)
+            (datetime(2024, 1, 5), 101, 1201, 'B1', '4400001'),   # backtracking PO receipt
+            (datetime(2024, 1, 12), 101, 1401, 'B1', None),       # DC receipt
+            (datetime(2024, 1, 20), 601, 1401, 'B1', None),
+            (datetime(2024, 1, 21), 602, 1401, 'B1', None),       # reverses 01-20 - issue is 01-25
+            (datetime(2024, 1, 25), 601, 1401, 'B1', None),
+            (datetime(2024, 2, 10), 101, 1201, ' P1 ', '4500001'),
+            (datetime(2024, 2, 15), 601, 1201, 'P1', None),
+        ]
+        for posted, mvt, plant, batch, po in movements:
+            db.add(RawMb51(col_0_posting_date=posted, col_1_mvt_type=mvt, col_2_plant=plant,
+                           col_4_material='M1', col_6_batch=batch, col_15_purchase_order=po))
+        db.add(FactPurchaseOrder(purch_order='4400001', item=10, purch_date=date(2023, 12, 25)))
+        db.add(FactPurchaseOrder(purch_order='4500001', item=10, purch_date=date(2024, 2, 1)))
+        db.add(FactBilling(billing_document='INV1', billing_item=10, so_number='SO1', dist_channel='11'))
+        db.commit()
+        Transformer(db).transform_batch_netting()
+
+    @staticmethod
+    def _lead_times(db: Session):
+        rows = db.execute(text("""
+            SELECT order_number, batch, order_type, channel_code, preparation_days, production_days,
+                   transit_days, storage_days, lead_time_days
+            FROM fact_lead_time ORDER BY order_number
+        """))
+        return [tuple(r) for r in rows]
+
+    def test_netted_issue_and_receipt_dates(self, db: Session, lead_time_sources):
+        """Earliest surviving 601 / 1401 receipt dates, production batches win over purchase"""
+        Transformer(db).transform_lead_time()
+
+        assert self._lead_times(db) == [
+            ('4500001', 'P1', 'PURCHASE', None, 0, 0, 9, 5, 14),
+            ('ORD1', 'B1', 'MTO', '11', 7, 9, 2, 13, 31),
+        ]
+
+    def test_scoped_refresh_is_idempotent(self, db: Session, lead_time_sources):
+        """A scoped rerun leaves unchanged rows (and their hashes) alone"""
+        transformer = Transformer(db)
+        transformer.transform_lead_time()
+        hashes = db.execute(text("SELECT row_hash FROM fact_lead_time ORDER BY order_number")).scalars().all()
+
+        transformer.transform_lead_time(scope=LeadTimeScope(batches={'B1', 'P1'}))
+
+        assert len(self._lead_times(db)) == 2
+        assert db.execute(text("SELECT row_hash FROM fact_lead_time ORDER BY order_number")).scalars().all() == hashes
+
+    def test_scoped_daily_rollup_only_touches_affected_days(self, db: Session, lead_time_sources):
+        """Days outside the scope keep their rollup rows; touched days match a full rebuild"""
+        transformer = Transformer(db)
+        transformer.transform_lead_time()
+        full = db.execute(text(
+            "SELECT end_date, order_type, order_count FROM fact_lead_time_daily ORDER BY end_date"
+        )).all()
+        db.execute(text("UPDATE fact_lead_time_daily SET order_count = 99 WHERE order_type = 'PURCHASE'"))
+
+        transformer.transform_lead_time(scope=LeadTimeScope(batches={'B1'}))
+
+        rollup = db.execute(text(
+            "SELECT end_date, order_type, order_count FROM fact_lead_time_daily ORDER BY end_date"
+        )).all()
+        assert rollup == [full[0], (date(2024, 2, 10), 'PURCHASE', 99)]
@@ -0,0 +1,153 @@
+"""
+Tests for conditional GETs (ETag / 304) and JSON response compression
+"""
+import asyncio
+import gzip
+import pytest
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import Headers
+
+from src.api import cache
+from src.api.cache import cached_response
+from src.api.pagination import NEXT_CURSOR_HEADER, keyset_page
+from src.api.middleware import ConditionalGetMiddleware, JSONGZipMiddleware
+
+
+def asgi_get(app, path: str, headers: dict = None):
+    """(status, headers, body) of a GET sent straight to the ASGI app"""
+    sent = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.Event().wait()  # No disconnect
+
+    async def send(message):
+        sent.append(message)
+
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query.encode(), 'client': ('testclient', 50000), 'server': ('testserver', 80),
+        'headers': [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+    asyncio.run(app(scope, receive, send))
+    body = b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+    return sent[0]['status'], Headers(raw=sent[0]['headers']), body
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """App with one generation-cached, authenticated route (generations kept in memory)"""
+    generations = {'fact_billing': 1}
+    calls = []
+    monkeypatch.setattr(cache, 'RESPONSE_CACHE_ENABLED', False)
+    monkeypatch.setattr(cache, 'current_generations', lambda db, tables: dict(generations))
+
+    def current_user(authorization: str = Header(None)):
+        if authorization != 'Bearer valid':
+            raise HTTPException(status_code=401, detail="Could not validate credentials")
+        return 'user'
+
+    app = FastAPI()
+    app.add_middleware(ConditionalGetMiddleware)
+    app.add_middleware(JSONGZipMiddleware, minimum_size=100)
+
+    @app.get("/summary")
+    @cached_response('fact_billing')
+    def get_summary(rows: int = 1, db=Depends(lambda: 'session'), current_user=Depends(current_user)):
+        calls.append(rows)
+        return [{'customer_name': f'Customer {i}', 'revenue': i} for i in range(rows)]
+
+    @app.get("/items")
+    @keyset_page(lambda item: [item['revenue']])
+    @cached_response('fact_billing')
+    def get_items(limit: int = 2, db=Depends(lambda: 'session'), current_user=Depends(current_user)):
+        calls.append(limit)
+        return [{'revenue': i} for i in range(limit)]
+
+    @app.get("/export")
+    def export():
+        return StreamingResponse(iter(['code,qty\r\n', 'A,1\r\n' * 100]), media_type='text/csv')
+
+    app.state.generations, app.state.calls = generations, calls
+    return app
+
+
+class TestConditionalGet:
+    """Test ETag / If-None-Match on @cached_response routes"""
+
+    AUTH = {'Authorization': 'Bearer valid'}
+
+    def test_matching_etag_is_304_without_running_handler(self, api):
+        """The second request revalidates; the handler body does not run"""
+        status, headers, _ = asgi_get(api, '/summary', self.AUTH)
+        etag = headers['etag']
+
+        status_304, headers_304, body = asgi_get(api, '/summary', {**self.AUTH, 'If-None-Match': etag})
+
+        assert status == 200 and 'Authorization' in headers['vary']
+        assert (status_304, headers_304['etag'], body) == (304, etag, b'')
+        assert api.state.calls == [1]
+
+    def test_keyset_paged_route_304(self, api):
+        """A 304 passes through @keyset_page without a cursor header"""
+        status, headers, _ = asgi_get(api, '/items', self.AUTH)
+
+        status_304, headers_304, body = asgi_get(api, '/items', {**self.AUTH, 'If-None-Match': headers['etag']})
+
+        assert status == 200 and NEXT_CURSOR_HEADER.lower() in headers
+        assert (status_304, body) == (304, b'') and NEXT_CURSOR_HEADER.lower() not in headers_304
+        assert api.state.calls == [2]
+
+    def test_etag_follows_query_and_generation(self, api):
+        """Other parameters or a bumped source table give a new ETag"""
+        etag = asgi_get(api, '/summary', self.AUTH)[1]['etag']
+
+        assert asgi_get(api, '/summary?rows=2', self.AUTH)[1]['etag'] != etag
+        api.state.generations['fact_billing'] += 1
+        status, headers, _ = asgi_get(api, '/summary', {**self.AUTH, 'If-None-Match': etag})
+        assert status == 200 and headers['etag'] != etag
+
+    def test_unauthenticated_never_304(self, api):
+        """The route's auth dependency runs before the ETag is compared"""
+        etag = asgi_get(api, '/summary', self.AUTH)[1]['etag']
+
+        status, headers, _ = asgi_get(api, '/summary', {'If-None-Match': etag})
+
+        assert status == 401 and 'etag' not in headers
+
+    def test_uncached_routes_have_no_etag(self, api):
+        """Only generation-keyed routes get validators"""
+        assert 'etag' not in asgi_get(api, '/export')[1]
+
+
+class TestCompression:
+    """Test gzip of JSON responses"""
+
+    GZIP = {'Authorization': 'Bearer valid', 'Accept-Encoding': 'gzip, br'}
+
+    def test_large_json_gzipped(self, api):
+        status, headers, body = asgi_get(api, '/summary?rows=20', self.GZIP)
+
+        assert status == 200
+        assert headers['content-encoding'] == 'gzip' and 'Accept-Encoding' in headers['vary']
+        assert gzip.decompress(body).startswith(b'[{"customer_name":"Customer 0"')
+
+    def test_small_json_sent_as_is(self, api):
+        _, headers, body = asgi_get(api, '/summary', self.GZIP)
+
+        assert 'content-encoding' not in headers and 'Accept-Encoding' not in headers.get('vary', '')
+        assert body == b'[{"customer_name":"Customer 0","revenue":0}]'
+
+    def test_streamed_export_not_compressed(self, api):
+        """CSV / NDJSON exports stream uncompressed, without Vary"""
+        _, headers, body = asgi_get(api, '/export', self.GZIP)
+
+        assert 'content-encoding' not in headers and 'vary' not in headers
+        assert body.startswith(b'code,qty\r\nA,1\r\n')
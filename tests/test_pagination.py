@@ -0,0 +1,103 @@
+"""
+Tests for keyset pagination cursors and streaming export
+"""
+import asyncio
+import pytest
+from datetime import date
+from decimal import Decimal
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from src.api import pagination
+from src.api.pagination import (
+    NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, keyset_filter, keyset_page, stream_export
+)
+
+
+class TestCursor:
+    """Test cursor encoding and the keyset predicate"""
+
+    def test_round_trip(self):
+        """Decimals / dates are encoded as JSON numbers / ISO strings"""
+        cursor = encode_cursor([Decimal('12.5'), date(2025, 1, 31), 'ORD/1'])
+
+        assert '=' not in cursor
+        assert decode_cursor(cursor, 3) == [12.5, '2025-01-31', 'ORD/1']
+
+    @pytest.mark.parametrize('cursor', ['not-base64!', encode_cursor(['a', 'b']), encode_cursor({'a': 1})])
+    def test_invalid_cursor_is_400(self, cursor):
+        """Malformed cursors or cursors of another endpoint (key size) are rejected"""
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor(cursor, 3)
+        assert exc.value.status_code == 400
+
+    def test_row_value_predicate(self):
+        """(keys) < (cursor values) with typed binds; no cursor = no filter"""
+        keys = [("COALESCE(total_target, 0)", "numeric"), ("customer_name", "text")]
+
+        assert keyset_filter(None, keys) == ("TRUE", {})
+        where, params = keyset_filter(encode_cursor([100, 'Customer A']), keys)
+        assert where == (
+            "(COALESCE(total_target, 0), customer_name) < "
+            "(CAST(:cursor_0 AS numeric), CAST(:cursor_1 AS text))"
+        )
+        assert params == {'cursor_0': 100, 'cursor_1': 'Customer A'}
+
+    def test_next_cursor_only_on_full_page(self):
+        """X-Next-Cursor encodes the last item's key when the page is full"""
+        @keyset_page(lambda item: [item['qty'], item['code']])
+        def get_items(limit: int):
+            return [{'qty': 5, 'code': 'A'}, {'qty': 3, 'code': 'B'}][:limit]
+
+        full, partial = Response(), Response()
+        get_items(response=full, limit=2)
+        get_items(response=partial, limit=3)
+
+        assert decode_cursor(full.headers[NEXT_CURSOR_HEADER], 2) == [3, 'B']
+        assert NEXT_CURSOR_HEADER not in partial.headers
+
+
+class TestStreamExport:
+    """Test chunked CSV / NDJSON export (SQLite engine)"""
+
+    @pytest.fixture
+    def export_engine(self, monkeypatch):
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE items (code TEXT, qty NUMERIC)"))
+            conn.execute(text("INSERT INTO items VALUES ('A', 1.5), ('B', 2), ('C', 3)"))
+        monkeypatch.setattr(pagination, 'engine', engine)
+        monkeypatch.setattr(pagination, 'EXPORT_CHUNK_ROWS', 2)
+        return engine
+
+    @staticmethod
+    def _body(response) -> list:
+        async def collect():
+            return [chunk async for chunk in response.body_iterator]
+        return asyncio.run(collect())
+
+    def test_csv_chunks_and_session_released(self, export_engine):
+        """Header + rows in cursor-sized chunks; the request session is closed first"""
+        db = Session(export_engine)
+        db.execute(text("SELECT 1"))
+
+        response = stream_export(db, text("SELECT code, qty FROM items ORDER BY code"), {}, 'csv', 'items')
+
+        assert not db.in_transaction()
+        assert response.media_type == 'text/csv'
+        assert response.headers['content-disposition'] == 'attachment; filename="items.csv"'
+        chunks = self._body(response)
+        assert ''.join(chunks) == 'code,qty\r\nA,1.5\r\nB,2\r\nC,3\r\n'
+        assert len(chunks) > 1
+
+    def test_ndjson(self, export_engine):
+        """One JSON object per line"""
+        response = stream_export(
+            Session(export_engine), text("SELECT code, qty FROM items WHERE code = :code"), {'code': 'B'},
+            'ndjson', 'items'
+        )
+
+        assert response.media_type == 'application/x-ndjson'
+        assert self._body(response) == ['{"code": "B", "qty": 2}\n']
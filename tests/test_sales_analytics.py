@@ -2,10 +2,11 @@
 Unit tests for Sales Analytics
 """
 import pytest
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from sqlalchemy.orm import Session
-from src.core.sales_analytics import SalesAnalytics, CustomerSegment, ChurnRiskCustomer
+from src.core.sales_analytics import SalesAnalytics, CustomerSegment, ChurnRiskCustomer, churn_periods
 from src.db.models import FactBilling
+from src.etl.transform import Transformer
 
 
 class TestSalesAnalytics:
@@ -87,3 +88,85 @@ class TestSalesAnalytics:
         # Customer B (Casual): low frequency + low revenue
         assert cust_map['Customer B'].order_frequency < cust_map['Customer A'].order_frequency
         assert cust_map['Customer B'].total_revenue < cust_map['Customer A'].total_revenue
+
+
+def legacy_segment_classes(segments):
+    """Row-by-row classification of the previous implementation (upper-middle medians)"""
+    revenues = sorted(s.total_revenue for s in segments)
+    frequencies = sorted(s.order_frequency for s in segments)
+    median_rev, median_freq = revenues[len(revenues) // 2], frequencies[len(frequencies) // 2]
+    classes = {}
+    for seg in segments:
+        if seg.order_frequency >= median_freq:
+            classes[seg.customer_name] = 'VIP' if seg.total_revenue >= median_rev else 'LOYAL'
+        else:
+            classes[seg.customer_name] = 'HIGH_VALUE' if seg.total_revenue >= median_rev else 'CASUAL'
+    return classes
+
+
+def legacy_churn_risk(lines, today):
+    """Churn risk of the previous implementation (Python quartile, per-customer previous month)"""
+    p = churn_periods(today)
+    last_rev, previous_rev, current = {}, {}, set()
+    for customer, day, value in lines:
+        if p['last_start'] <= day < today:
+            last_rev[customer] = last_rev.get(customer, 0) + value
+        if p['previous_start'] <= day < p['last_start']:
+            previous_rev[customer] = previous_rev.get(customer, 0) + value
+        if day >= p['current_start']:
+            current.add(customer)
+    revenues = sorted(v for v in last_rev.values() if v)
+    threshold = revenues[-1] if len(revenues) < 4 else revenues[int(len(revenues) * 0.75)]
+    return {
+        (c, float(v), float(previous_rev.get(c, 0)))
+        for c, v in last_rev.items() if v >= threshold and c not in current
+    }
+
+
+class TestSetBasedParity:
+    """Set-based SQL (percentile_cont, FILTERed aggregates) vs the previous Python implementation"""
+    
+    TODAY = datetime.utcnow().date()
+    
+    @pytest.fixture
+    def parity_lines(self, db: Session):
+        """Five customers - odd counts, so upper-middle and interpolated medians / quartiles coincide"""
+        p = churn_periods(self.TODAY)
+        lines = []
+        for i, customer in enumerate(['Cust 1', 'Cust 2', 'Cust 3', 'Cust 4', 'Cust 5']):
+            for n in range(i + 1):
+                lines.append((customer, p['last_start'], 1000 * (5 - i) + n))
+            lines.append((customer, p['previous_start'], 300 * i))
+        # Cust 1 and Cust 3 already billed this month; segmentation period data
+        lines += [('Cust 1', p['current_start'], 10), ('Cust 3', p['current_start'], 20)]
+        lines += [(f'Seg {k}', date(2025, 1, 5 + k), 100 * k) for k in range(1, 6) for _ in range(k % 3 + 1)]
+        for i, (customer, day, value) in enumerate(lines):
+            db.add(FactBilling(billing_document=f'PAR{i}', billing_item=10, customer_name=customer,
+                               so_number=f'SO-{customer}-{i % 4}', billing_date=day, net_value=value))
+        db.commit()
+        transformer = Transformer(db)
+        transformer.refresh_sales_daily()
+        transformer.refresh_sales_monthly()
+        return lines
+    
+    def test_segment_classification_matches_legacy(self, db: Session, parity_lines):
+        """Same VIP / LOYAL / HIGH_VALUE / CASUAL per customer"""
+        analytics = SalesAnalytics(db)
+        start, end = date(2025, 1, 1), date(2025, 1, 31)
+        
+        classified = analytics.get_customer_segmentation_with_classification(start, end)
+        
+        assert len(classified) == 5
+        expected = legacy_segment_classes(analytics.get_customer_segmentation(start, end))
+        assert {c['customer_name']: c['segment_class'] for c in classified} == expected
+    
+    def test_churn_risk_matches_legacy(self, db: Session, parity_lines):
+        """Same at-risk customers and revenues; ordered by last-month revenue"""
+        at_risk = SalesAnalytics(db).get_churn_risk(limit=50)
+        
+        assert {
+            (c.customer_name, c.last_month_revenue, c.previous_month_revenue) for c in at_risk
+        } == legacy_churn_risk(parity_lines, self.TODAY)
+        assert [c.last_month_revenue for c in at_risk] == sorted(
+            (c.last_month_revenue for c in at_risk), reverse=True
+        )
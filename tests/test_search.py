@@ -0,0 +1,65 @@
+"""
+Tests for material / customer search and the autocomplete endpoint
+"""
+import pytest
+from datetime import date
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.api.routers.search import autocomplete
+from src.api.search import contains_pattern, escape_like
+from src.db.models import DimMaterial, FactArAging, FactBilling
+from src.db.views import materialized_view_ddl
+
+
+class TestPatterns:
+    """Test LIKE escaping (no database)"""
+
+    def test_wildcards_taken_literally(self):
+        """% and _ in a term match themselves, backslash is escaped first"""
+        assert escape_like('50%_A\\B') == '50\\%\\_A\\\\B'
+        assert contains_pattern('a_b') == '%a\\_b%'
+
+
+class TestAutocomplete:
+    """Test autocomplete over the search views on PostgreSQL (built inside the test transaction)"""
+
+    @pytest.fixture
+    def search_views(self, db: Session):
+        """Materials from dim_material / billing, customers from billing / AR"""
+        db.add(DimMaterial(material_code='MAT-100', material_description='Blue Paint'))
+        db.add(DimMaterial(material_code='XMAT-200', material_description='Red Paint'))
+        db.add(FactBilling(billing_document='INV1', billing_item=10, material_code='PAINT-1',
+                           material_description='Primer', customer_name='Alpha Paint Co'))
+        db.add(FactArAging(customer_name='Beta Builders', report_date=date(2025, 1, 31)))
+        db.add(FactArAging(customer_name='Alpha Paint Co', report_date=date(2025, 1, 31)))
+        db.flush()
+        db.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for name in ('view_search_materials', 'view_search_customers'):
+            db.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {name}"))
+            for statement in materialized_view_ddl(name):
+                db.execute(text(statement))
+
+    @staticmethod
+    def _values(q: str, kind: str, db: Session):
+        return [s['value'] for s in autocomplete(q=q, kind=kind, limit=10, db=db, current_user=None)]
+
+    def test_material_prefix_first(self, db: Session, search_views):
+        """Code prefix matches rank before substring / description matches"""
+        assert self._values('mat', 'material', db) == ['MAT-100', 'XMAT-200']
+        assert self._values('paint', 'material', db)[0] == 'PAINT-1'
+
+    def test_short_term_prefix_only(self, db: Session, search_views):
+        """Under 3 characters only prefixes match"""
+        assert self._values('XM', 'material', db) == ['XMAT-200']
+        assert self._values('AT', 'material', db) == []
+
+    def test_customers_from_billing_and_ar(self, db: Session, search_views):
+        """Customer names come from both sources, one row per name"""
+        assert self._values('b', 'customer', db) == ['Beta Builders']
+        assert self._values('paint', 'customer', db) == ['Alpha Paint Co']
+        assert db.execute(text("SELECT COUNT(*) FROM view_search_customers")).scalar() == 2
+
+    def test_blank_term(self, db: Session, search_views):
+        """Whitespace-only queries return nothing"""
+        assert self._values('   ', 'customer', db) == []
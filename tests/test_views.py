@@ -0,0 +1,115 @@
+"""
+Tests for materialized view refresh and response cache invalidation
+"""
+import pytest
+from datetime import date, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.api import cache
+from src.api.routers.executive import get_top_customers
+from src.db import views
+from src.db.generations import bump_generations, current_generations
+from src.db.models import FactBilling
+from src.db.views import materialized_view_ddl, views_for_tables
+
+
+class TestViewDependencies:
+    """Test source table → view mapping (no database)"""
+
+    def test_views_for_tables(self):
+        """Only views declaring a changed table are refreshed"""
+        assert views_for_tables(['fact_alerts']) == ['view_executive_kpis']
+        assert set(views_for_tables(['fact_target'])) == {'view_sales_performance'}
+        assert views_for_tables(['fact_delivery']) == []
+        assert views_for_tables(None) == list(views.MATERIALIZED_VIEWS)
+
+    def test_unique_keys_are_not_nullable_join_columns(self):
+        """view_sales_performance is keyed on columns that are never NULL"""
+        statements = materialized_view_ddl('view_sales_performance', schema='shadow')
+
+        assert statements[1] == (
+            "CREATE UNIQUE INDEX uq_view_sales_performance ON shadow.view_sales_performance "
+            "(salesman_name, target_id, uom_key)"
+        )
+
+
+class TestMaterializedRefresh:
+    """Test CONCURRENTLY refresh on PostgreSQL (committed data, cleaned up afterwards)"""
+
+    @pytest.fixture
+    def view_engine(self, pg_engine, monkeypatch):
+        """view_sales_performance built on the test database"""
+        monkeypatch.setattr(views, 'engine', pg_engine)
+        with pg_engine.begin() as conn:
+            conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS view_sales_performance"))
+            for statement in materialized_view_ddl('view_sales_performance'):
+                conn.execute(text(statement))
+        yield pg_engine
+        with pg_engine.begin() as conn:
+            conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS view_sales_performance"))
+            conn.execute(text("DELETE FROM fact_billing WHERE billing_document LIKE 'TVIEW%'"))
+            conn.execute(text("DELETE FROM view_refresh_log WHERE view_name = 'view_sales_performance'"))
+
+    def test_refresh_with_null_target_and_unit(self, view_engine):
+        """Rows without target / unit refresh concurrently and are logged"""
+        with Session(view_engine) as db:
+            for i, unit in enumerate(['KG', None, None]):
+                db.add(FactBilling(billing_document=f'TVIEW{i}', billing_item=10, salesman_name='Sales A',
+                                   billing_date=date(2025, 1, 5), sales_unit=unit, net_value=10))
+            db.commit()
+
+        durations = views.refresh_materialized_views(['fact_billing'])
+
+        assert 'view_sales_performance' in durations
+        with view_engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT target_id, uom_key, uom, total_invoices FROM view_sales_performance
+                WHERE salesman_name = 'Sales A' ORDER BY uom_key
+            """)).all()
+            logged = conn.execute(text(
+                "SELECT mode FROM view_refresh_log WHERE view_name = 'view_sales_performance' ORDER BY id DESC"
+            )).scalar()
+        assert [tuple(r) for r in rows] == [(0, '', None, 2), (0, 'KG', 'KG', 1)]
+        assert logged == 'CONCURRENT'
+
+
+class TestCacheKey:
+    """Test response cache keys (no database)"""
+
+    def test_key_changes_with_the_day(self, monkeypatch):
+        """Date-windowed handlers are not served yesterday's result"""
+        key = cache.cache_key('executive.get_top_customers', {'limit': 10}, {'fact_sales_daily': 3})
+
+        class Tomorrow(date):
+            @classmethod
+            def today(cls):
+                return date.today() + timedelta(days=1)
+
+        monkeypatch.setattr(cache, 'date', Tomorrow)
+        assert cache.cache_key('executive.get_top_customers', {'limit': 10}, {'fact_sales_daily': 3}) != key
+
+
+class TestResponseCache:
+    """Test generation-keyed cache invalidation on PostgreSQL"""
+
+    def test_bump_invalidates_cached_response(self, db: Session):
+        """A cached response is served until its source table's generation changes"""
+        db.add(FactBilling(billing_document='INV1', billing_item=10, customer_name='Customer A',
+                           billing_date=date(2025, 1, 5), net_value=100))
+        db.commit()
+        db.execute(text("""
+            INSERT INTO fact_sales_daily (billing_date, customer_name, net_value, line_count, invoice_count)
+            VALUES ('2025-01-05', 'Customer A', 100, 1, 1)
+        """))
+        before = current_generations(db, ['fact_sales_daily'])['fact_sales_daily']
+        kwargs = dict(start_date=None, end_date=None, limit=10, db=db, current_user=None)
+
+        assert get_top_customers(**kwargs)[0].revenue == 100.0
+        db.execute(text("UPDATE fact_sales_daily SET net_value = 250"))
+        assert get_top_customers(**kwargs)[0]['revenue'] == 100.0  # served from api_response_cache
+
+        bump_generations(db, ['fact_sales_daily'])
+
+        assert current_generations(db, ['fact_sales_daily'])['fact_sales_daily'] == before + 1
+        assert get_top_customers(**kwargs)[0].revenue == 250.0